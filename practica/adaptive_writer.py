@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Escritor de insert_many con lotes adaptativos y reintentos.
+
+Sustituye a los lotes fijos de BATCH_SIZE documentos de las cargas, en los
+que un lote que fallaba solo se escribía en el log y se perdía:
+
+- Tamaño de lote: se mide el tamaño BSON de los documentos y la latencia de
+  cada insert_many. El siguiente lote lleva los bytes que el servidor
+  escribe en target_latency_s (media móvil de bytes/s), como mucho el doble
+  o la mitad del anterior, y siempre dentro de los límites del servidor
+  (maxWriteBatchSize documentos y maxMessageSizeBytes por mensaje).
+- Reintentos: los errores transitorios (red, cambio de primario, timeouts,
+  etiqueta RetryableWriteError) se reintentan con backoff exponencial con
+  jitter, partiendo el lote a la mitad. De un BulkWriteError solo se
+  reintentan los documentos con error transitorio (por su índice en el
+  lote); las claves duplicadas cuentan como "ya estaban" y el resto de
+  errores (validación...) como rechazados.
+- Los documentos llevan _id antes del primer intento: reintentar un lote
+  cuyo resultado se desconoce (timeout de red) no duplica nada, los que ya
+  entraron vuelven como clave duplicada y cuentan como insertados.
+- Si se agotan los reintentos se lanza InsertRetriesExhausted: el lote no
+  se pierde en silencio (la carga incremental no confirma esos row groups y
+  los reanuda en la siguiente ejecución).
+
+summary() da los documentos/s sostenidos y el recorrido del tamaño de lote.
+El mismo escritor sirve a varios threads (carga paralela) y, con
+write_async(), al driver asíncrono (async_ingest.py).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import bson
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError, ConnectionFailure, ExecutionTimeout, PyMongoError, WTimeoutError
+
+from arrow_bson import MAX_MESSAGE_BYTES, MESSAGE_OVERHEAD
+from ingest_metrics import measure
+
+DUPLICATE_KEY_ERROR = 11000
+MAX_WRITE_BATCH_SIZE = 100000  # maxWriteBatchSize del servidor (MongoDB >= 3.6)
+TARGET_LATENCY_S = 1.0  # Duración objetivo de cada insert_many
+MIN_BATCH_DOCS = 500
+MAX_RETRIES = 6
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30
+RATE_SMOOTHING = 0.3  # Peso de la última medida en la media móvil de bytes/s
+SIZE_SAMPLE_DOCS = 50  # dicts codificados para estimar su tamaño BSON
+REJECTED_KEPT = 20  # Errores de documentos rechazados que se guardan para el resumen
+
+# Códigos de error de escritura transitorios: red, cambio de primario, timeouts, conflictos
+TRANSIENT_ERROR_CODES = {
+    6, 7, 50, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436,
+}
+
+
+class InsertRetriesExhausted(RuntimeError):
+    """Documentos que siguen sin insertarse tras MAX_RETRIES reintentos."""
+
+
+def is_transient(error):
+    """¿Se puede reintentar el insert_many que lanzó `error`? (BulkWriteError se mira por documento)."""
+    if isinstance(error, BulkWriteError):
+        return False
+    if isinstance(error, (ConnectionFailure, ExecutionTimeout, WTimeoutError)):
+        return True
+    return isinstance(error, PyMongoError) and (
+        error.has_error_label('RetryableWriteError') or getattr(error, 'code', None) in TRANSIENT_ERROR_CODES)
+
+
+def server_limits(collection):
+    """(maxWriteBatchSize, maxMessageSizeBytes) del servidor, o los valores por defecto si no responde."""
+    try:
+        hello = collection.database.command('hello')
+    except PyMongoError:
+        return MAX_WRITE_BATCH_SIZE, MAX_MESSAGE_BYTES
+    return (hello.get('maxWriteBatchSize', MAX_WRITE_BATCH_SIZE),
+            hello.get('maxMessageSizeBytes', MAX_MESSAGE_BYTES))
+
+
+class AdaptiveBulkWriter:
+    """
+    Inserta documentos con lotes que se ajustan a su tamaño y a la latencia.
+
+    Args:
+        collection: Colección MongoDB (o CompactCollection)
+        initial_batch (int): Documentos del primer lote
+        target_latency_s (float): Duración objetivo de cada insert_many
+        min_batch (int): Mínimo de documentos por lote
+        max_batch (int, optional): Máximo de documentos por lote (None = maxWriteBatchSize)
+        adaptive (bool): Con False el lote es siempre initial_batch (solo hay reintentos)
+        max_retries (int): Reintentos por documento antes de InsertRetriesExhausted
+        backoff_s (float): Espera antes del primer reintento (se dobla en cada uno)
+        metrics (IngestMetrics, optional): Mide cada insert_many (etapa 'insert')
+        verbose (bool): Imprime una línea por lote insertado (reintentos y
+            errores se imprimen siempre)
+    """
+
+    def __init__(self, collection, initial_batch=20000, target_latency_s=TARGET_LATENCY_S,
+                 min_batch=MIN_BATCH_DOCS, max_batch=None, adaptive=True, max_retries=MAX_RETRIES,
+                 backoff_s=BACKOFF_BASE_S, metrics=None, verbose=True):
+        self.collection = collection
+        self.target_latency_s = target_latency_s
+        self.adaptive = adaptive
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.metrics = metrics
+        self.verbose = verbose
+        self.min_batch = max(1, min(min_batch, initial_batch))
+        self.max_batch = max_batch
+        self.max_bytes = None
+        self.batch_docs = initial_batch
+        self.rejected_errors = []
+        self._rate = None
+        self._dict_bytes = None
+        self._lock = threading.Lock()
+        self.stats = {'inserted': 0, 'duplicates': 0, 'rejected': 0, 'retries': 0, 'batches': 0,
+                      'bytes': 0, 'insert_s': 0.0, 'batch_min': None, 'batch_max': None}
+        self._started = self._last = None
+
+    # ==================== ESCRITURA ====================
+
+    def write(self, docs, filename=None, batch_no=None, collection=None):
+        """
+        Inserta documentos (RawBSONDocument, bytes BSON o dicts) en lotes adaptativos.
+
+        Args:
+            docs (list): Documentos
+            filename (str, optional): Fichero de origen (mensajes y métricas)
+            batch_no (int, optional): Número del lote ya formado que se escribe
+                (carga paralela); si se parte, los trozos son batch_no.1, batch_no.2...
+            collection (optional): Colección de destino de esta llamada (p. ej.
+                la partición de un mes, ver partitioned_store.py); None = la del escritor
+
+        Returns:
+            tuple: (insertados, duplicados)
+        """
+        collection = collection if collection is not None else self.collection
+        attempts = self._attempts(self._prepare(docs), filename, batch_no)
+        try:
+            part, delay, label = next(attempts)
+            while True:
+                if delay:
+                    time.sleep(delay)
+                outcome = self._send(collection, part, label, filename)
+                part, delay, label = attempts.send(outcome)
+        except StopIteration as stop:
+            return stop.value
+
+    async def write_async(self, async_collection, docs, filename=None, batch_no=None):
+        """write() con una colección de AsyncMongoClient (misma política de lotes y reintentos)."""
+        attempts = self._attempts(self._prepare(docs), filename, batch_no)
+        try:
+            part, delay, label = next(attempts)
+            while True:
+                if delay:
+                    await asyncio.sleep(delay)
+                with measure(self.metrics, 'insert', file=filename, batch=label, rows_in=len(part)) as rec:
+                    rec['bytes'] = self._part_bytes(part)
+                    t0 = time.perf_counter()
+                    try:
+                        await async_collection.insert_many(part, ordered=False)
+                        error = None
+                    except Exception as e:
+                        error = e
+                        rec['rows_out'] = e.details.get('nInserted', 0) if isinstance(e, BulkWriteError) else 0
+                    outcome = (error, time.perf_counter() - t0)
+                part, delay, label = attempts.send(outcome)
+        except StopIteration as stop:
+            return stop.value
+
+    def _send(self, collection, part, label, filename):
+        """Un insert_many. Devuelve (excepción o None, segundos)."""
+        with measure(self.metrics, 'insert', file=filename, batch=label, rows_in=len(part)) as rec:
+            rec['bytes'] = self._part_bytes(part)
+            t0 = time.perf_counter()
+            try:
+                collection.insert_many(part, ordered=False)
+                error = None
+            except Exception as e:
+                error = e
+                rec['rows_out'] = e.details.get('nInserted', 0) if isinstance(e, BulkWriteError) else 0
+            return error, time.perf_counter() - t0
+
+    def _attempts(self, docs, filename, batch_no):
+        """
+        Política de lotes y reintentos, sin E/S: produce (documentos, espera s,
+        etiqueta) por cada insert_many y recibe su (excepción o None, segundos).
+        Devuelve (insertados, duplicados).
+        """
+        prefix = f"[{filename}] " if filename else ""
+        inserted = duplicates = 0
+        start = n = 0
+        while start < len(docs):
+            end = self._batch_end(docs, start)
+            n += 1
+            if batch_no is None:
+                label = n
+            else:
+                label = batch_no if start == 0 and end == len(docs) else f"{batch_no}.{n}"
+            work = deque([(docs[start:end], 0, False)])
+            while work:
+                # unknown: un intento anterior de estos documentos pudo escribirlos
+                part, attempt, unknown = work.popleft()
+                delay = self._backoff(attempt) if attempt else 0
+                error, seconds = yield part, delay, label
+                if error is None:
+                    self._observe(part, seconds, inserted=len(part))
+                    inserted += len(part)
+                    self._log(f"   ✓ {prefix}Lote {label}: {len(part)} documentos insertados", always=False)
+                    continue
+
+                if isinstance(error, BulkWriteError):
+                    ok, dup, retry = self._bulk_outcome(error, part)
+                    if unknown:
+                        ok, dup = ok + dup, 0
+                    self._observe(part, seconds, inserted=ok, duplicates=dup)
+                    inserted += ok
+                    duplicates += dup
+                    rejected = len(part) - ok - dup - len(retry)
+                    if rejected:
+                        self._log(f"   ⚠️  {prefix}Lote {label}: {ok} insertados, {rejected} errores")
+                    elif dup:
+                        self._log(f"   ✓ {prefix}Lote {label}: {ok} insertados, {dup} ya estaban", always=False)
+                    if retry:
+                        self._check_retries(retry, attempt, label, error)
+                        self._log(f"   🔁 {prefix}Lote {label}: {ok} insertados, reintento de "
+                                  f"{len(retry)} documentos con error transitorio")
+                        work.append((retry, attempt + 1, unknown))
+                    continue
+
+                if not is_transient(error):
+                    raise error
+                self._check_retries(part, attempt, label, error)
+                self._shrink()
+                self._log(f"   🔁 {prefix}Lote {label}: {str(error)[:80]} → reintento {attempt + 1}/"
+                          f"{self.max_retries} (lotes de {self.batch_docs:,})")
+                for sub in range(0, len(part), self.batch_docs):
+                    work.append((part[sub:sub + self.batch_docs], attempt + 1, True))
+            start = end
+        return inserted, duplicates
+
+    def _bulk_outcome(self, error, part):
+        """(insertados, duplicados, documentos a reintentar) de un BulkWriteError."""
+        retry = []
+        duplicates = 0
+        for err in error.details.get('writeErrors', []):
+            code = err.get('code')
+            if code == DUPLICATE_KEY_ERROR:
+                duplicates += 1
+            elif code in TRANSIENT_ERROR_CODES:
+                retry.append(part[err['index']])
+            else:
+                with self._lock:
+                    self.stats['rejected'] += 1
+                    if len(self.rejected_errors) < REJECTED_KEPT:
+                        self.rejected_errors.append({'code': code, 'errmsg': err.get('errmsg')})
+        return error.details.get('nInserted', 0), duplicates, retry
+
+    def _check_retries(self, part, attempt, label, error):
+        if attempt >= self.max_retries:
+            raise InsertRetriesExhausted(
+                f"Lote {label}: {len(part):,} documentos sin insertar tras {self.max_retries} "
+                f"reintentos ({str(error)[:100]})") from error
+        with self._lock:
+            self.stats['retries'] += 1
+
+    def _backoff(self, attempt):
+        """Backoff exponencial con jitter (entre la mitad y el total)."""
+        return min(BACKOFF_MAX_S, self.backoff_s * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    def _log(self, line, always=True):
+        if always or self.verbose:
+            print(line)
+
+    # ==================== TAMAÑO DE LOTE ====================
+
+    def _prepare(self, docs):
+        """Documentos listos para insert_many: RawBSONDocument o dicts con _id."""
+        if self.max_bytes is None:
+            max_docs, max_message = server_limits(self.collection)
+            self.max_batch = min(self.max_batch or max_docs, max_docs)
+            self.max_bytes = max_message - MESSAGE_OVERHEAD
+            self.batch_docs = max(self.min_batch, min(self.batch_docs, self.max_batch))
+        docs = [RawBSONDocument(doc) if isinstance(doc, bytes) else doc for doc in docs]
+        dicts = [doc for doc in docs if not isinstance(doc, RawBSONDocument)]
+        for doc in dicts:
+            doc.setdefault('_id', ObjectId())
+        if dicts:
+            step = max(1, len(dicts) // SIZE_SAMPLE_DOCS)
+            sample = dicts[::step]
+            self._dict_bytes = sum(len(bson.encode(doc)) for doc in sample) / len(sample)
+        with self._lock:
+            if self._started is None:
+                self._started = time.perf_counter()
+        return docs
+
+    def _doc_bytes(self, doc):
+        return len(doc.raw) if isinstance(doc, RawBSONDocument) else self._dict_bytes
+
+    def _part_bytes(self, part):
+        return int(sum(self._doc_bytes(doc) for doc in part))
+
+    def _batch_end(self, docs, start):
+        """Fin del siguiente lote: batch_docs documentos sin pasar de max_bytes."""
+        limit = min(len(docs), start + self.batch_docs)
+        end, size = start, 0
+        while end < limit:
+            size += self._doc_bytes(docs[end])
+            if end > start and size > self.max_bytes:
+                break
+            end += 1
+        return end
+
+    def _observe(self, part, seconds, inserted=0, duplicates=0):
+        """Registra un insert_many que llegó al servidor y ajusta el tamaño del siguiente lote."""
+        nbytes = self._part_bytes(part)
+        with self._lock:
+            stats = self.stats
+            stats['inserted'] += inserted
+            stats['duplicates'] += duplicates
+            stats['batches'] += 1
+            stats['bytes'] += nbytes
+            stats['insert_s'] += seconds
+            stats['batch_min'] = min(stats['batch_min'] or len(part), len(part))
+            stats['batch_max'] = max(stats['batch_max'] or 0, len(part))
+            self._last = time.perf_counter()
+            # Lotes pequeños (reintentos, restos) no son una medida fiable del servidor
+            if not self.adaptive or seconds <= 0 or len(part) < self.batch_docs // 2:
+                return
+            rate = nbytes / seconds
+            self._rate = rate if self._rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self._rate
+            target = self._rate * self.target_latency_s / (nbytes / len(part))
+            target = min(max(target, self.batch_docs / 2), self.batch_docs * 2)
+            self.batch_docs = int(max(self.min_batch, min(target, self.max_batch)))
+
+    def _shrink(self):
+        """Error transitorio: lotes a la mitad (también con adaptive=False)."""
+        with self._lock:
+            self.batch_docs = max(self.min_batch, self.batch_docs // 2)
+
+    # ==================== RESUMEN ====================
+
+    def summary(self):
+        """Totales, documentos/s sostenidos (desde la primera escritura) y tamaños de lote."""
+        with self._lock:
+            summary = dict(self.stats)
+            wall = (self._last - self._started) if self._last is not None else 0.0
+        summary['wall_s'] = wall
+        summary['docs_per_s'] = summary['inserted'] / wall if wall > 0 else None
+        summary['insert_docs_per_s'] = summary['inserted'] / summary['insert_s'] if summary['insert_s'] else None
+        summary['mb_per_s'] = summary['bytes'] / (1024 * 1024) / wall if wall > 0 else None
+        summary['batch_docs'] = self.batch_docs
+        summary['rejected_errors'] = list(self.rejected_errors)
+        return summary
+
+    def print_summary(self):
+        s = self.summary()
+        rate = f"{s['docs_per_s']:,.0f} docs/s sostenidos" if s['docs_per_s'] else "sin escrituras"
+        print(f"📈 Escritura: {s['inserted']:,} insertados ({s['duplicates']:,} ya estaban, "
+              f"{s['rejected']:,} rechazados) | {rate} | lotes {s['batch_min'] or 0:,}–{s['batch_max'] or 0:,} "
+              f"(último {s['batch_docs']:,}) | {s['retries']} reintentos")
+        for err in s['rejected_errors'][:3]:
+            print(f"   ⚠️  Rechazado (código {err['code']}): {str(err['errmsg'])[:100]}")
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Caché en disco de resultados de collection.aggregate().
+
+Al iterar sobre los gráficos del notebook se repiten los mismos aggregate
+aunque la colección de viajes no haya cambiado. AggregateCache.aggregate()
+devuelve el resultado guardado si coinciden:
+
+- el pipeline normalizado (JSON compacto; incluye match_base y la salida de
+  platform_match_clause(), que forman parte del $match). El orden de las
+  claves se conserva porque en $sort o en un _id compuesto cambia el resultado,
+- la base de datos y la colección,
+- el token de versión de datos de la colección.
+
+El token vive en la colección `data_versions` ({_id: colección, token,
+version, updated_at}) y lo cambian los cargadores con bump_data_version()
+después de cada inserción o borrado (insert_data_to_mongodb, carga
+incremental, carga paralela). Un token nuevo invalida todo lo anterior: las
+entradas con otro token se borran en la siguiente consulta.
+
+Los resultados se guardan como BSON comprimido con zlib (un fichero por
+entrada) con un índice JSON; cuando el tamaño total supera max_bytes se
+eliminan las entradas usadas hace más tiempo (LRU). BSON conserva tipos
+(int frente a double, fechas, ObjectId) y claves ausentes, y se decodifica
+con las CodecOptions de la colección: un acierto devuelve exactamente los
+mismos documentos que el aggregate original (el hash de entradas de
+render_report no cambia entre la primera ejecución y las siguientes).
+"""
+
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+import bson
+from bson.errors import InvalidDocument
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_COLLECTION = 'data_versions'
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / 'outputs' / 'aggregate_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+# ==================== VERSIÓN DE DATOS ====================
+
+def bump_data_version(collection):
+    """Marca la colección como modificada (invalida los resultados cacheados)."""
+    token = uuid.uuid4().hex
+    collection.database[DATA_VERSION_COLLECTION].update_one(
+        {'_id': collection.name},
+        {'$set': {'token': token, 'updated_at': dt.datetime.utcnow()}, '$inc': {'version': 1}},
+        upsert=True,
+    )
+    return token
+
+
+def get_data_version(collection):
+    """Token de versión actual (se crea uno si la colección aún no tiene)."""
+    doc = collection.database[DATA_VERSION_COLLECTION].find_one({'_id': collection.name})
+    if doc is None or 'token' not in doc:
+        return bump_data_version(collection)
+    return doc['token']
+
+
+# ==================== CLAVE ====================
+
+def _json_default(value):
+    """Serialización estable de tipos BSON/Python no JSON (con etiqueta de tipo)."""
+    if isinstance(value, dt.datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, dt.date):
+        return {'$day': value.isoformat()}
+    return {'$' + type(value).__name__: str(value)}
+
+
+def canonical_pipeline(pipeline):
+    """JSON canónico de un pipeline (sin espacios, tipos etiquetados, orden de claves intacto)."""
+    return json.dumps(pipeline, separators=(',', ':'), default=_json_default)
+
+
+def cache_key(collection, pipeline, data_version):
+    """SHA-256 de base de datos + colección + pipeline normalizado + versión de datos."""
+    payload = '\n'.join([collection.database.name, collection.name, canonical_pipeline(pipeline), data_version])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# ==================== CACHÉ ====================
+
+def _encode_records(records):
+    """Lista de documentos → BSON concatenado y comprimido (sin pérdida de tipos)."""
+    return zlib.compress(b''.join(bson.encode(record) for record in records), 1)
+
+
+def _decode_records(data, codec_options):
+    """Inversa de _encode_records con las CodecOptions de la colección."""
+    return bson.decode_all(zlib.decompress(data), codec_options)
+
+
+class AggregateCache:
+    """Caché LRU en disco de resultados de aggregate, acotada por tamaño."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_path = self.cache_dir / 'index.json'
+        self.index = self._load_index()
+        # Entradas Parquet de versiones anteriores (perdían tipos): se descartan
+        for key in [k for k, e in self.index.items() if (e.get('file') or '').endswith('.parquet')]:
+            self._remove(key)
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'uncacheable': 0,
+                         'evictions': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        if self.index_path.exists():
+            try:
+                return json.loads(self.index_path.read_text(encoding='utf-8'))
+            except ValueError:
+                logger.warning("⚠️ Índice de caché corrupto, se empieza de cero")
+        return {}
+
+    def _save_index(self):
+        tmp = self.index_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.index), encoding='utf-8')
+        os.replace(tmp, self.index_path)
+
+    def _remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry and entry.get('file'):
+            try:
+                (self.cache_dir / entry['file']).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _invalidate_stale(self, collection, data_version):
+        """Borra las entradas de esta colección guardadas con otro token."""
+        name = f"{collection.database.name}.{collection.name}"
+        stale = [k for k, e in self.index.items() if e['collection'] == name and e['data_version'] != data_version]
+        for key in stale:
+            self._remove(key)
+        if stale:
+            self.counters['invalidations'] += len(stale)
+            logger.info(f"🗑️ Caché: {len(stale)} resultados obsoletos eliminados ({name})")
+        return len(stale)
+
+    def _read(self, key, codec_options):
+        entry = self.index[key]
+        entry['last_access'] = time.time()
+        if entry['rows'] == 0:
+            return []
+        return _decode_records((self.cache_dir / entry['file']).read_bytes(), codec_options)
+
+    def _store(self, key, collection, data_version, records):
+        try:
+            data = _encode_records(records) if records else None
+        except (InvalidDocument, TypeError) as e:
+            self.counters['uncacheable'] += 1
+            logger.debug(f"Resultado no cacheable: {e}")
+            return
+        file_name = f"{key}.bson.z" if data is not None else None
+        size = 0
+        if data is not None:
+            tmp = self.cache_dir / f"{file_name}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, self.cache_dir / file_name)
+            size = len(data)
+        self.index[key] = {
+            'collection': f"{collection.database.name}.{collection.name}",
+            'data_version': data_version,
+            'file': file_name,
+            'rows': len(records),
+            'bytes': size,
+            'created': time.time(),
+            'last_access': time.time(),
+        }
+        self.counters['stores'] += 1
+        self._evict()
+
+    def _evict(self):
+        """LRU: elimina entradas hasta quedar por debajo de max_bytes."""
+        total = sum(e['bytes'] for e in self.index.values())
+        for key, entry in sorted(self.index.items(), key=lambda kv: kv[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= entry['bytes']
+            self._remove(key)
+            self.counters['evictions'] += 1
+
+    def aggregate(self, collection, pipeline, **kwargs):
+        """
+        Igual que list(collection.aggregate(pipeline, **kwargs)) pero con caché.
+
+        Args:
+            collection: Colección MongoDB
+            pipeline (list): Pipeline de agregación
+            **kwargs: Opciones de aggregate (allowDiskUse...), no forman parte de la clave
+
+        Returns:
+            list: Documentos del resultado
+        """
+        data_version = get_data_version(collection)
+        key = cache_key(collection, pipeline, data_version)
+        with self._lock:
+            self._invalidate_stale(collection, data_version)
+            if key in self.index:
+                self.counters['hits'] += 1
+                records = self._read(key, collection.codec_options)
+                self._save_index()
+                return records
+            self.counters['misses'] += 1
+
+        records = list(collection.aggregate(pipeline, **kwargs))
+        with self._lock:
+            self._store(key, collection, data_version, records)
+            self._save_index()
+        return records
+
+    def clear(self):
+        """Vacía la caché."""
+        with self._lock:
+            for key in list(self.index):
+                self._remove(key)
+            self._save_index()
+
+    def stats(self):
+        """Aciertos, fallos, entradas y bytes en disco."""
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'hit_rate_pct': self.counters['hits'] / lookups * 100 if lookups else 0.0,
+            'entries': len(self.index),
+            'bytes': sum(e['bytes'] for e in self.index.values()),
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+Codificación columnar de DataFrames / record batches de Arrow a BSON.
+
+Con sanitize_for_mongo() la carga construye un dict Python por viaje y
+pymongo vuelve a recorrer cada dict para codificarlo a BSON. Aquí los
+documentos se escriben directamente en un buffer de bytes con NumPy, una
+columna cada vez:
+
+    1. por columna: longitud del elemento de cada fila (tipo + clave + valor)
+    2. longitud de cada documento y posición en el buffer (cumsum)
+    3. por columna: se escriben tipo, clave y valor de todas las filas (los
+       strings se codifican una vez por valor distinto). Las filas con el
+       mismo layout (mismas longitudes) forman una matriz filas × bytes y cada
+       columna se copia con un slice; solo con muchos layouts distintos se
+       escribe byte a byte con índices
+
+El resultado son RawBSONDocument (uno por fila) que insert_many envía sin
+volver a codificar, agrupados con iter_insert_batches() en lotes que
+respetan el límite de 16 MB por documento y de 48 MB por mensaje.
+
+encode_frame() produce EXACTAMENTE los mismos bytes que
+bson.encode(doc) de cada documento de sanitize_for_mongo(df) (nulos,
+milisegundos de las fechas, int32/int64 según el valor, double), con el _id
+(ObjectId) primero, igual que lo coloca pymongo. Las columnas con tipos poco
+habituales (objetos mezclados, extension dtypes) se codifican valor a valor
+con bson para no cambiar el resultado.
+
+encode_record_batch() trabaja sobre Arrow sin pasar por pandas (export a
+.bson): los tipos siguen el esquema Arrow (un entero con nulos sigue siendo
+entero).
+
+Comparación con el camino de dicts: ver bench_arrow_bson.py.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from bson import encode as bson_encode
+from bson.raw_bson import RawBSONDocument
+
+from compact_schema import CompactCollection
+from hvfhv_cleaning import float64_values
+from mongo_sanitize import (DATETIME_COLS, _box_value, _is_date_column, _normalize_datetime_series,
+                            sanitize_for_mongo)
+
+# Tipos de elemento BSON
+BSON_DOUBLE = 0x01
+BSON_STRING = 0x02
+BSON_OBJECTID = 0x07
+BSON_BOOL = 0x08
+BSON_DATETIME = 0x09
+BSON_NULL = 0x0A
+BSON_INT32 = 0x10
+BSON_INT64 = 0x12
+
+MAX_DOCUMENT_BYTES = 16 * 1024 * 1024
+MAX_MESSAGE_BYTES = 48 * 1000 * 1000
+MESSAGE_OVERHEAD = 16 * 1024  # cabecera del mensaje y del comando insert
+
+_INT32_MIN, _INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+# Con más layouts de fila distintos, _assemble() escribe byte a byte en vez de por bloques
+MAX_BLOCK_LAYOUTS = 256
+
+
+# ==================== ESCRITURA VECTORIZADA ====================
+
+def _scatter_rows(out, pos, rows):
+    """Escribe rows[i] (matriz m × w de uint8) en out[pos[i]:pos[i] + w]."""
+    if len(pos) == 0 or rows.shape[1] == 0:
+        return
+    out[pos[:, None] + np.arange(rows.shape[1])] = rows
+
+
+def _scatter_ragged(out, dst, flat, src, lengths):
+    """Copia flat[src[i]:src[i] + lengths[i]] en out[dst[i]:...] para cada i."""
+    total = int(lengths.sum())
+    if total == 0:
+        return
+    within = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    out[np.repeat(dst, lengths) + within] = flat[np.repeat(src, lengths) + within]
+
+
+def _gather_block(flat, src, width):
+    """Matriz m × width con flat[src[i]:src[i] + width] en cada fila."""
+    return flat[src[:, None] + np.arange(width)]
+
+
+def _key_bytes(name):
+    return np.frombuffer(str(name).encode('utf-8') + b'\x00', dtype=np.uint8)
+
+
+# Columnas: elementos BSON de una columna. Todas tienen
+#   lengths()                        bytes del elemento (tipo + clave + valor) en cada fila
+#   write(out, pos)                  escribe cada fila en out[pos[i]:]
+#   write_block(block, rows, offset) escribe las filas `rows` (misma longitud) en block[:, offset:]
+
+class _FixedColumn:
+    """
+    Valores de tamaño fijo (double, int32/int64, bool, fecha, ObjectId).
+
+    `values` es una matriz n × 8 (o n × 12) de bytes little-endian; `widths`
+    indica cuántos bytes de cada fila se escriben (0 = null).
+    """
+
+    def __init__(self, name, type_codes, values, widths):
+        self.key = _key_bytes(name)
+        self.type_codes = type_codes.astype(np.uint8)
+        self.values = values
+        self.widths = widths.astype(np.int64)
+
+    def lengths(self):
+        return 1 + len(self.key) + self.widths
+
+    def write(self, out, pos):
+        n = len(self.type_codes)
+        header = np.empty((n, 1 + len(self.key)), dtype=np.uint8)
+        header[:, 0] = self.type_codes
+        header[:, 1:] = self.key
+        _scatter_rows(out, pos, header)
+        value_pos = pos + header.shape[1]
+        for width in np.unique(self.widths):
+            if width:
+                rows = np.flatnonzero(self.widths == width)
+                _scatter_rows(out, value_pos[rows], self.values[rows, :width])
+
+    def write_block(self, block, rows, offset):
+        key_end = offset + 1 + len(self.key)
+        block[:, offset] = self.type_codes[rows]
+        block[:, offset + 1:key_end] = self.key
+        width = self.widths[rows[0]]
+        if width:
+            block[:, key_end:key_end + width] = self.values[rows, :width]
+
+
+class _StringColumn:
+    """Strings codificados una vez por valor distinto (codes = -1 → null)."""
+
+    def __init__(self, name, codes, uniques):
+        self.key = _key_bytes(name)
+        self.codes = np.asarray(codes, dtype=np.int64)
+        blobs = []
+        for value in uniques:
+            raw = value.encode('utf-8')
+            blobs.append(np.int32(len(raw) + 1).astype('<i4').tobytes() + raw + b'\x00')
+        self.flat = np.frombuffer(b''.join(blobs), dtype=np.uint8) if blobs else np.zeros(0, np.uint8)
+        self.blob_len = np.array([len(b) for b in blobs], dtype=np.int64)
+        self.blob_start = np.cumsum(self.blob_len) - self.blob_len
+        self.has_value = self.codes >= 0
+        safe = np.where(self.has_value, self.codes, 0)
+        self.value_len = np.where(self.has_value, self.blob_len[safe] if len(blobs) else 0, 0)
+
+    def lengths(self):
+        return 1 + len(self.key) + self.value_len
+
+    def write(self, out, pos):
+        n = len(self.codes)
+        header = np.empty((n, 1 + len(self.key)), dtype=np.uint8)
+        header[:, 0] = np.where(self.has_value, BSON_STRING, BSON_NULL)
+        header[:, 1:] = self.key
+        _scatter_rows(out, pos, header)
+        rows = np.flatnonzero(self.has_value)
+        codes = self.codes[rows]
+        _scatter_ragged(out, pos[rows] + header.shape[1], self.flat, self.blob_start[codes], self.blob_len[codes])
+
+    def write_block(self, block, rows, offset):
+        key_end = offset + 1 + len(self.key)
+        has_value = self.has_value[rows[0]]
+        block[:, offset] = BSON_STRING if has_value else BSON_NULL
+        block[:, offset + 1:key_end] = self.key
+        if has_value:
+            width = self.value_len[rows[0]]
+            block[:, key_end:key_end + width] = _gather_block(self.flat, self.blob_start[self.codes[rows]], width)
+
+
+class _EncodedColumn:
+    """Elementos ya codificados por bson valor a valor (tipos poco habituales)."""
+
+    def __init__(self, name, values):
+        blobs = [bson_encode({name: v})[4:-1] for v in values]
+        self.flat = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        self.blob_len = np.array([len(b) for b in blobs], dtype=np.int64)
+        self.blob_start = np.cumsum(self.blob_len) - self.blob_len
+
+    def lengths(self):
+        return self.blob_len
+
+    def write(self, out, pos):
+        _scatter_ragged(out, pos, self.flat, self.blob_start, self.blob_len)
+
+    def write_block(self, block, rows, offset):
+        width = self.blob_len[rows[0]]
+        block[:, offset:offset + width] = _gather_block(self.flat, self.blob_start[rows], width)
+
+
+def _as_bytes(values, dtype):
+    """Array numérico → matriz n × itemsize de bytes little-endian."""
+    arr = np.ascontiguousarray(values, dtype=dtype)
+    return arr.view(np.uint8).reshape(len(arr), arr.dtype.itemsize)
+
+
+def _double_column(name, values, null_mask=None):
+    values = np.asarray(values, dtype='<f8')
+    null = np.isnan(values) if null_mask is None else (null_mask | np.isnan(values))
+    return _FixedColumn(name, np.where(null, BSON_NULL, BSON_DOUBLE), _as_bytes(values, '<f8'),
+                        np.where(null, 0, 8))
+
+
+def _int_column(name, values, null_mask=None):
+    """Enteros: int32 si caben (como pymongo con int de Python), si no int64."""
+    values = np.asarray(values, dtype=np.int64)
+    fits = (values >= _INT32_MIN) & (values <= _INT32_MAX)
+    types = np.where(fits, BSON_INT32, BSON_INT64)
+    widths = np.where(fits, 4, 8)
+    if null_mask is not None:
+        types = np.where(null_mask, BSON_NULL, types)
+        widths = np.where(null_mask, 0, widths)
+    # Los 4 bytes bajos de un int64 little-endian son su int32
+    return _FixedColumn(name, types, _as_bytes(values, '<i8'), widths)
+
+
+def _bool_column(name, values, null_mask=None):
+    values = np.asarray(values, dtype=np.uint8)
+    null = np.zeros(len(values), dtype=bool) if null_mask is None else null_mask
+    return _FixedColumn(name, np.where(null, BSON_NULL, BSON_BOOL), values.reshape(-1, 1), np.where(null, 0, 1))
+
+
+def _datetime_column(name, micros, null_mask):
+    """Fecha BSON: milisegundos desde epoch (pymongo trunca los microsegundos)."""
+    millis = np.floor_divide(np.where(null_mask, 0, micros), 1000)
+    return _FixedColumn(name, np.where(null_mask, BSON_NULL, BSON_DATETIME), _as_bytes(millis, '<i8'),
+                        np.where(null_mask, 0, 8))
+
+
+# ==================== OBJECTID ====================
+
+_oid_lock = threading.Lock()
+_oid_state = {'pid': None, 'random': None, 'counter': 0}
+
+
+def _objectid_column(n):
+    """
+    n ObjectId nuevos: segundos (4 bytes BE) + 5 bytes aleatorios + contador (3 bytes BE).
+
+    Los 5 bytes aleatorios son propios de este módulo (distintos de los de
+    bson.ObjectId), así que no pueden coincidir con ids generados por pymongo.
+    """
+    with _oid_lock:
+        if _oid_state['pid'] != os.getpid():
+            _oid_state.update(pid=os.getpid(), random=os.urandom(5),
+                              counter=int.from_bytes(os.urandom(3), 'big'))
+        first = _oid_state['counter']
+        _oid_state['counter'] = (first + n) % (1 << 24)
+        prefix = int(time.time()).to_bytes(4, 'big') + _oid_state['random']
+    counters = (first + np.arange(n, dtype=np.int64)) % (1 << 24)
+    values = np.empty((n, 12), dtype=np.uint8)
+    values[:, :9] = np.frombuffer(prefix, dtype=np.uint8)
+    values[:, 9:] = _as_bytes(counters, '>i8')[:, 5:]
+    return _FixedColumn('_id', np.full(n, BSON_OBJECTID), values, np.full(n, 12))
+
+
+# ==================== DOCUMENTOS ====================
+
+def _layouts(lengths, n):
+    """
+    Agrupa las filas por layout (longitud de cada elemento).
+
+    Returns:
+        tuple: (número de layouts, layout de cada fila)
+    """
+    key, radix = np.zeros(n, dtype=np.int64), 1
+    for length in lengths:
+        low, high = int(length.min()), int(length.max())
+        if low == high:
+            continue
+        radix *= high - low + 1
+        if radix >= 2 ** 62:
+            # Demasiadas combinaciones para una clave entera: unique por filas
+            varying = [v for v in lengths if v.min() != v.max()]
+            layouts, inverse = np.unique(np.column_stack(varying), axis=0, return_inverse=True)
+            return len(layouts), inverse.reshape(-1)
+        key = key * (high - low + 1) + (length - low)
+    layouts, inverse = np.unique(key, return_inverse=True)
+    return len(layouts), inverse.reshape(-1)
+
+
+def _assemble(columns, n):
+    """
+    Buffer con los n documentos concatenados.
+
+    Las filas con el mismo layout (mismas longitudes de elemento, p. ej. sin
+    nulos y strings de igual longitud) ocupan posiciones relativas idénticas:
+    se escriben como una matriz filas × bytes, columna a columna, con
+    asignaciones por slices. Si hay demasiados layouts distintos se escribe
+    byte a byte con índices (más lento pero sin coste por grupo).
+
+    Returns:
+        tuple: (bytes, inicios, longitudes)
+    """
+    lengths = [np.broadcast_to(np.asarray(c.lengths(), dtype=np.int64), (n,)) for c in columns]
+    doc_len = 5 + np.sum(lengths, axis=0) if lengths else np.full(n, 5)
+    doc_len = np.asarray(doc_len, dtype=np.int64)
+    too_big = np.flatnonzero(doc_len > MAX_DOCUMENT_BYTES)
+    if len(too_big):
+        raise ValueError(f"Documento {too_big[0]} de {doc_len[too_big[0]]:,} bytes (máximo 16 MB)")
+
+    n_layouts, layout = _layouts(lengths, n)
+    if n_layouts > max(MAX_BLOCK_LAYOUTS, n // 32):
+        return _assemble_scattered(columns, lengths, doc_len)
+
+    order = np.argsort(layout, kind='stable')
+    counts = np.bincount(layout, minlength=n_layouts)
+    out = np.empty(int(doc_len.sum()), dtype=np.uint8)
+    starts = np.empty(n, dtype=np.int64)
+    base = 0
+    for rows in np.split(order, np.cumsum(counts)[:-1]):
+        size = int(doc_len[rows[0]])
+        block = out[base:base + len(rows) * size].reshape(len(rows), size)
+        block[:, :4] = np.frombuffer(np.int32(size).astype('<i4').tobytes(), dtype=np.uint8)
+        offset = 4
+        for column, length in zip(columns, lengths):
+            column.write_block(block, rows, offset)
+            offset += int(length[rows[0]])
+        block[:, offset] = 0
+        starts[rows] = base + np.arange(len(rows)) * size
+        base += block.size
+    return out.tobytes(), starts, doc_len
+
+
+def _assemble_scattered(columns, lengths, doc_len):
+    """_assemble() escribiendo cada fila en su posición con índices (muchos layouts)."""
+    starts = np.cumsum(doc_len) - doc_len
+    out = np.empty(int(doc_len.sum()), dtype=np.uint8)
+    _scatter_rows(out, starts, _as_bytes(doc_len, '<i4'))
+    pos = starts + 4
+    for column, length in zip(columns, lengths):
+        column.write(out, pos)
+        pos = pos + length
+    out[pos] = 0
+    return out.tobytes(), starts, doc_len
+
+
+def _split(buffer, starts, lengths):
+    ends = starts + lengths
+    return [buffer[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+def _frame_column(name, s):
+    """Columna de pandas → elementos BSON (mismos valores que mongo_sanitize._column_to_list)."""
+    dtype = s.dtype
+    if dtype == 'Int64':
+        return _int_column(name, s.to_numpy(dtype='int64', na_value=0))
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if getattr(dtype, 'tz', None) is not None:
+            s = s.dt.tz_convert('UTC').dt.tz_localize(None)
+        values = np.asarray(s.to_numpy(), dtype='datetime64[us]')
+        return _datetime_column(name, values.view(np.int64), np.isnat(values))
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        values = s.to_numpy()
+        if dtype.kind == 'f':
+            return _double_column(name, float64_values(s))
+        if dtype.kind == 'b':
+            return _bool_column(name, values)
+        return _int_column(name, values)
+
+    if isinstance(dtype, pd.StringDtype):
+        # Dtype string de pandas (por defecto en pandas 3): nulos → código -1
+        codes, uniques = pd.factorize(s)
+        return _StringColumn(name, codes, [str(u) for u in uniques])
+
+    mask = s.isna().to_numpy()
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.categories.dtype.kind in 'biufO':
+        values = np.asarray(dtype.categories, dtype=object).take(s.cat.codes.to_numpy(), mode='clip')
+    elif pd.api.types.is_object_dtype(dtype):
+        values = s.to_numpy(dtype=object, copy=True)
+    else:
+        return _EncodedColumn(name, [None if m else _box_value(v) for v, m in zip(s, mask)])
+    values[mask] = None
+    if pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+        codes, uniques = pd.factorize(values)
+        return _StringColumn(name, codes, list(uniques))
+    return _EncodedColumn(name, [_box_value(v) for v in values])
+
+
+def encode_frame_bytes(df, with_id=True):
+    """
+    Documentos BSON (bytes) de un DataFrame limpio, idénticos a los de sanitize_for_mongo().
+
+    Args:
+        df (pd.DataFrame): Datos limpios (salida de clean_hvfhv_data)
+        with_id (bool): Añade un ObjectId nuevo como primer campo (como insert_many)
+
+    Returns:
+        list: bytes de cada documento
+    """
+    n = len(df)
+    if n == 0:
+        return []
+    columns = [_objectid_column(n)] if with_id else []
+    for col in df.columns:
+        s = df[col]
+        if col in DATETIME_COLS:
+            s = _normalize_datetime_series(s)
+        if _is_date_column(col, s):
+            s = s.astype(str)
+        columns.append(_frame_column(col, s))
+    return _split(*_assemble(columns, n))
+
+
+def encode_frame(df, with_id=True):
+    """Como encode_frame_bytes() pero devuelve RawBSONDocument listos para insert_many."""
+    return [RawBSONDocument(raw) for raw in encode_frame_bytes(df, with_id)]
+
+
+def _arrow_column(name, arr):
+    """Columna Arrow → elementos BSON según su tipo Arrow."""
+    t = arr.type
+    null = arr.is_null().to_numpy(zero_copy_only=False)
+    if pa.types.is_dictionary(t):
+        arr, t = arr.cast(t.value_type), t.value_type
+    if pa.types.is_timestamp(t):
+        micros = arr.view(pa.int64()).view(pa.timestamp(t.unit)).cast(pa.timestamp('us'), safe=False)
+        values = pc.fill_null(micros.view(pa.int64()), 0).to_numpy()
+        return _datetime_column(name, values, null)
+    if pa.types.is_date(t):
+        arr = pc.strftime(arr.cast(pa.timestamp('s')), format='%Y-%m-%d')
+        t = arr.type
+    if pa.types.is_floating(t):
+        return _double_column(name, pc.fill_null(arr.cast(pa.float64()), 0.0).to_numpy(), null)
+    if pa.types.is_integer(t):
+        return _int_column(name, pc.fill_null(arr.cast(pa.int64()), 0).to_numpy(), null)
+    if pa.types.is_boolean(t):
+        return _bool_column(name, pc.fill_null(arr, False).to_numpy(zero_copy_only=False), null)
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        encoded = arr.cast(pa.string()).dictionary_encode()
+        codes = pc.fill_null(encoded.indices.cast(pa.int64()), -1).to_numpy()
+        return _StringColumn(name, codes, encoded.dictionary.to_pylist())
+    return _EncodedColumn(name, arr.to_pylist())
+
+
+def encode_record_batch(batch, with_id=False):
+    """
+    Documentos BSON (bytes) de un record batch de Arrow, sin pasar por pandas ni dicts.
+
+    Returns:
+        list: bytes de cada documento (una fila = un documento)
+    """
+    n = batch.num_rows
+    if n == 0:
+        return []
+    columns = [_objectid_column(n)] if with_id else []
+    columns += [_arrow_column(name, col) for name, col in zip(batch.schema.names, batch.columns)]
+    return _split(*_assemble(columns, n))
+
+
+# ==================== LOTES ====================
+
+def iter_insert_batches(documents, max_docs=20000, max_bytes=MAX_MESSAGE_BYTES - MESSAGE_OVERHEAD):
+    """
+    Agrupa documentos en lotes de insert_many de como mucho max_docs y max_bytes.
+
+    Acepta RawBSONDocument, bytes BSON o dicts; los dicts cuentan solo para
+    max_docs (su tamaño no se conoce sin codificarlos).
+    """
+    batch, size = [], 0
+    for doc in documents:
+        if isinstance(doc, bytes):
+            doc_size = len(doc)
+        elif isinstance(doc, RawBSONDocument):
+            doc_size = len(doc.raw)
+        else:
+            doc_size = 0
+        if batch and (len(batch) >= max_docs or size + doc_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(doc)
+        size += doc_size
+    if batch:
+        yield batch
+
+
+def documents_for(df, collection):
+    """
+    Documentos a insertar en `collection`.
+
+    RawBSONDocument codificados por columnas; para una CompactCollection
+    (compact_schema.py), dicts de sanitize_for_mongo() que la colección
+    compacta al insertar.
+    """
+    if isinstance(collection, CompactCollection):
+        return sanitize_for_mongo(df)
+    return encode_frame(df)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Carga asíncrona (asyncio) de ficheros Parquet HVFHV a MongoDB.
+
+    lectura/limpieza/codificación ──(lotes BSON)──> cola acotada ──> N insert_many en vuelo ──> MongoDB
+            (executor)                                               (corrutinas escritoras)
+
+En la carga secuencial cada insert_many bloquea el único thread: mientras un
+lote de 20.000 documentos viaja al servidor no se lee ni se limpia nada. Aquí:
+
+- Las tareas (bloques de row groups, por defecto uno) se preparan con
+  prepare_task de parallel_ingest.py en un executor: un thread (workers=0)
+  o un ProcessPoolExecutor. Hay hasta `prefetch` tareas preparándose por
+  delante de la que se está encolando.
+- Hasta max_in_flight lotes se insertan a la vez: con el driver asíncrono
+  de pymongo (AsyncMongoClient, pymongo >= 4.9) si se pasa mongo_uri, o
+  con insert_many síncrono en un pool de max_in_flight threads.
+- La cola de lotes es acotada: si el servidor va lento la cola se llena, la
+  corrutina lectora espera en put() y no se preparan más tareas
+  (backpressure) en lugar de acumular meses enteros en memoria.
+
+Los totales por fichero, la contabilidad de cada lote (nInserted,
+writeErrors, claves duplicadas) y los reintentos son los de la carga
+paralela: los dos modos escriben con un AdaptiveBulkWriter (adaptive_writer.py). Comparación
+con la carga síncrona contra un mongod local: bench_async_ingest.py.
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from adaptive_writer import AdaptiveBulkWriter
+from aggregate_cache import bump_data_version
+from compact_schema import CompactCollection
+from parallel_ingest import ROW_GROUPS_PER_TASK, insert_raw_batch, plan_tasks, prepare_task
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # pymongo < 4.9: las escrituras van en threads
+    AsyncMongoClient = None
+
+MAX_IN_FLIGHT = 4  # Lotes insertándose a la vez
+
+
+def open_async_collection(mongo_uri, collection):
+    """
+    La misma colección con el driver asíncrono de pymongo.
+
+    Args:
+        mongo_uri (str): URI de MongoDB (None = sin driver asíncrono)
+        collection: Colección síncrona (o CompactCollection) de la carga
+
+    Returns:
+        tuple: (AsyncMongoClient, colección asíncrona), o (None, None) si no hay
+               URI o la versión de pymongo no tiene AsyncMongoClient
+    """
+    if mongo_uri is None or AsyncMongoClient is None:
+        return None, None
+    client = AsyncMongoClient(mongo_uri)
+    return client, client[collection.database.name][collection.name]
+
+
+async def _writer(insert, batches, results):
+    """Corrutina escritora: un lote en vuelo cada vez."""
+    while True:
+        filename, batch_no, raw_docs = await batches.get()
+        try:
+            # El await va antes de la suma: `+= await` leería el total antes de esperar
+            inserted = await insert(raw_docs, batch_no, filename)
+            results[filename]['inserted'] += inserted
+        except Exception as e:
+            # Lote sin escribir (p. ej. reintentos agotados): el fichero queda con error
+            print(f"❌ [{filename}] Lote {batch_no}: {str(e)[:150]}")
+            results[filename]['error'] = str(e)
+        finally:
+            batches.task_done()
+
+
+async def _produce(tasks, prepare, executor, batches, results, prefetch, metrics=None):
+    """Prepara las tareas en el executor (en orden) y encola sus lotes."""
+    loop = asyncio.get_running_loop()
+    remaining = iter(tasks)
+    pending = deque()
+
+    def submit():
+        task = next(remaining, None)
+        if task is not None:
+            pending.append((task, loop.run_in_executor(executor, prepare, task)))
+
+    for _ in range(prefetch):
+        submit()
+    while pending:
+        (path, _), future = pending.popleft()
+        filename = Path(path).name
+        try:
+            prepared = await future
+        except Exception as e:
+            print(f"❌ ERROR procesando {filename}: {str(e)}")
+            results[filename]['error'] = str(e)
+            submit()
+            continue
+        if prepared['metrics'] is not None:
+            metrics.merge(prepared['metrics'])
+        for key in ('total_rows', 'sampled_rows', 'clean_rows'):
+            results[filename][key] += prepared[key]
+        # La siguiente tarea se prepara mientras se encolan (y escriben) los lotes de esta
+        submit()
+        for raw_docs in prepared['batches']:
+            results[filename]['batches'] += 1
+            # Espera si los escritores van por detrás (backpressure)
+            await batches.put((filename, results[filename]['batches'], raw_docs))
+
+
+async def ingest_files_async(parquet_files, collection, sample_rate=40, batch_size=20000, workers=0,
+                             max_in_flight=MAX_IN_FLIGHT, queue_size=None, prefetch=None, columns=None,
+                             read_batch_size=100000, row_groups_per_task=ROW_GROUPS_PER_TASK, tag_source=False,
+                             sampling_plan=None, metrics=None, clean_options=None, mongo_uri=None,
+                             writer=None, cache=None):
+    """
+    Carga varios ficheros Parquet solapando lectura/limpieza y escrituras.
+
+    Args:
+        parquet_files (list): Rutas de ficheros Parquet
+        collection: Colección MongoDB; con una CompactCollection los documentos
+            se codifican en el esquema compacto
+        sample_rate (int): Muestreo sistemático 1 de N
+        batch_size (int): Documentos por insert_many
+        workers (int): Procesos de lectura/limpieza (0 = un thread del propio proceso)
+        max_in_flight (int): Lotes insertándose a la vez
+        queue_size (int, optional): Lotes máximos en cola (None = 2 × max_in_flight)
+        prefetch (int, optional): Tareas preparándose por delante (None = max(workers, 1))
+        columns (list, optional): Columnas a leer (None = todas)
+        read_batch_size (int): Filas por record batch al leer Parquet
+        row_groups_per_task (int, optional): Row groups por tarea (None = fichero entero)
+        tag_source (bool): Añade source_file/source_row a cada documento
+        sampling_plan (SamplingPlan, optional): Muestreo estratificado con pesos
+            (stratified_sampler.py); sustituye a sample_rate
+        metrics (IngestMetrics, optional): Instrumentación por etapa (ver ingest_metrics.py)
+        clean_options (dict, optional): Opciones de clean_hvfhv_data (ver hvfhv_cleaning.py)
+        mongo_uri (str, optional): Con pymongo >= 4.9 las escrituras usan
+            AsyncMongoClient; si no, insert_many en un pool de threads
+        writer (AdaptiveBulkWriter, optional): Escritor de los lotes (ver
+            adaptive_writer.py); None = uno adaptativo que empieza con lotes
+            de batch_size
+        cache (SampleCache, optional): Caché de muestras limpias (ver
+            sample_cache.py); las tareas de unos row groups sacan sus filas de
+            la entrada del fichero entero si existe (no la crean: con
+            row_groups_per_task=None sí se guarda)
+
+    Returns:
+        dict: {nombre_fichero: {'total_rows', 'sampled_rows', 'clean_rows', 'inserted', 'error'}}
+    """
+    max_in_flight = max(1, max_in_flight)
+    compact = isinstance(collection, CompactCollection)
+    batches = asyncio.Queue(maxsize=queue_size or 2 * max_in_flight)
+    prepare = partial(prepare_task, sample_rate=sample_rate, columns=columns, read_batch_size=read_batch_size,
+                      batch_size=batch_size, tag_source=tag_source, compact=compact, sampling_plan=sampling_plan,
+                      metrics_config=metrics.config() if metrics is not None else None,
+                      clean_options=clean_options, cache=cache)
+
+    tasks = plan_tasks(parquet_files, row_groups_per_task)
+    results = {
+        Path(p).name: {'total_rows': 0, 'sampled_rows': 0, 'clean_rows': 0, 'inserted': 0,
+                       'batches': 0, 'error': None}
+        for p in parquet_files
+    }
+
+    loop = asyncio.get_running_loop()
+    writer = writer or AdaptiveBulkWriter(collection, initial_batch=batch_size, metrics=metrics)
+    async_client, async_collection = open_async_collection(mongo_uri, collection)
+    write_pool = None
+    if async_collection is not None:
+        async def insert(raw_docs, batch_no, filename):
+            inserted, _ = await writer.write_async(async_collection, raw_docs, filename, batch_no)
+            return inserted
+    else:
+        write_pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='writer')
+
+        def insert(raw_docs, batch_no, filename):
+            return loop.run_in_executor(write_pool, insert_raw_batch, collection, raw_docs, batch_no,
+                                        filename, metrics, writer)
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else ThreadPoolExecutor(max_workers=1)
+    print(f"⚙️  Carga asíncrona: {len(tasks)} tareas | "
+          f"{f'{workers} workers' if workers > 0 else 'lectura en thread'} | "
+          f"{max_in_flight} lotes en vuelo ({'AsyncMongoClient' if write_pool is None else 'threads'}) | "
+          f"cola máx. {batches.maxsize} lotes")
+
+    started = time.perf_counter()
+    writers = [asyncio.create_task(_writer(insert, batches, results)) for _ in range(max_in_flight)]
+    try:
+        with executor:
+            await _produce(tasks, prepare, executor, batches, results, prefetch or max(workers, 1), metrics)
+        await batches.join()
+    finally:
+        for w in writers:
+            w.cancel()
+        await asyncio.gather(*writers, return_exceptions=True)
+        if write_pool is not None:
+            write_pool.shutdown()
+        if async_client is not None:
+            await async_client.close()
+        bump_data_version(collection)
+    elapsed = time.perf_counter() - started
+
+    for filename, res in results.items():
+        if res['error']:
+            print(f"❌ {filename}: ERROR - {res['error']}")
+        else:
+            print(f"✅ {filename}: {res['inserted']:,} documentos insertados "
+                  f"({res['sampled_rows']:,} muestreadas de {res['total_rows']:,})")
+    total = sum(res['inserted'] for res in results.values())
+    print(f"⚡ {total:,} documentos en {elapsed:,.1f} s ({total / max(elapsed, 1e-9):,.0f} docs/s)")
+
+    return results
+
+
+def run_ingest_async(parquet_files, collection, **kwargs):
+    """
+    ingest_files_async() desde código síncrono (scripts de carga).
+
+    En Jupyter, que ya tiene un event loop, usar `await ingest_files_async(...)`.
+    """
+    return asyncio.run(ingest_files_async(parquet_files, collection, **kwargs))
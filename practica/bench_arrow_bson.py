@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: codificación BSON por columnas (arrow_bson) vs dicts + bson.encode.
+
+Compara filas/segundo de los dos caminos de la carga:
+    - dicts : sanitize_for_mongo(df) y bson.encode de cada documento
+    - raw   : encode_frame_bytes(df) (buffer único escrito con NumPy)
+
+y comprueba que los bytes son idénticos (sin _id). Con --uri mide además
+insert_many contra una colección temporal con ambos tipos de documento.
+
+Uso:
+    python bench_arrow_bson.py                    # 200.000 filas sintéticas
+    python bench_arrow_bson.py 1000000            # 1M filas sintéticas
+    python bench_arrow_bson.py ./data/fhvhv_tripdata_2025-01.parquet 40
+    python bench_arrow_bson.py 200000 --uri mongodb://localhost:27017/
+"""
+
+import argparse
+import sys
+import time
+
+import bson
+import pyarrow.parquet as pq
+from bson.raw_bson import RawBSONDocument
+
+from arrow_bson import encode_frame_bytes, iter_insert_batches
+from bench_sanitize import time_it
+from hvfhv_cleaning import clean_hvfhv_data
+from mongo_sanitize import sanitize_for_mongo
+from synthetic_hvfhv import make_synthetic_trips
+
+BENCH_COLLECTION = "bench_arrow_bson"
+
+
+def load_clean_frame(argv):
+    """DataFrame de prueba (sintético o desde Parquet) pasado por clean_hvfhv_data."""
+    if argv and argv[0].endswith('.parquet'):
+        sample_rate = int(argv[1]) if len(argv) > 1 else 40
+        df = pq.read_table(argv[0]).to_pandas().iloc[::sample_rate].reset_index(drop=True)
+        label = f"{argv[0]} (1 de {sample_rate})"
+    else:
+        n_rows = int(argv[0]) if argv else 200000
+        df, label = make_synthetic_trips(n_rows), f"sintético ({n_rows:,} filas)"
+    return clean_hvfhv_data(df), label
+
+
+def encode_dicts(df):
+    """Camino actual: un dict por fila y bson.encode de cada uno."""
+    return [bson.encode(doc) for doc in sanitize_for_mongo(df)]
+
+
+def encode_raw(df):
+    """Camino columnar (sin _id, para comparar bytes)."""
+    return encode_frame_bytes(df, with_id=False)
+
+
+def time_insert(collection, documents, batch_size):
+    """Segundos de insertar `documents` por lotes (vacía la colección antes)."""
+    collection.delete_many({})
+    t0 = time.perf_counter()
+    for batch in iter_insert_batches(documents, batch_size):
+        collection.insert_many(batch, ordered=False)
+    return time.perf_counter() - t0
+
+
+def bench_inserts(uri, df, batch_size=20000):
+    """insert_many de dicts vs RawBSONDocument en una colección temporal."""
+    from pymongo import MongoClient
+
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    collection = client["nyc_hvfhv"][BENCH_COLLECTION]
+    try:
+        n = len(df)
+        t_dicts = time_insert(collection, sanitize_for_mongo(df), batch_size)
+        t0 = time.perf_counter()
+        raw = [RawBSONDocument(b) for b in encode_frame_bytes(df)]
+        t_raw = time_insert(collection, raw, batch_size) + (time.perf_counter() - t0)
+        print(f"   insert dicts : {t_dicts:8.3f} s  → {n / t_dicts:>12,.0f} docs/s")
+        print(f"   insert raw   : {t_raw:8.3f} s  → {n / t_raw:>12,.0f} docs/s (codificación incluida)")
+        print(f"   Speedup      : ×{t_dicts / t_raw:.1f}")
+    finally:
+        collection.drop()
+        client.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark BSON columnar vs dicts")
+    parser.add_argument('source', nargs='*', help="Nº de filas sintéticas o fichero Parquet [muestra]")
+    parser.add_argument('--uri', default=None, help="MongoDB para medir también insert_many")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    df, label = load_clean_frame(args.source)
+    n = len(df)
+
+    print("=" * 80)
+    print(f"⏱️  BENCHMARK codificación BSON — {label}")
+    print(f"   Filas limpias: {n:,} | Columnas: {len(df.columns)}")
+    print("=" * 80)
+
+    t_dicts, docs_dicts = time_it(encode_dicts, df, repeat=1)
+    t_raw, docs_raw = time_it(encode_raw, df)
+
+    print(f"   Dicts + bson.encode : {t_dicts:8.3f} s  → {n / t_dicts:>12,.0f} filas/s")
+    print(f"   Columnar (raw)      : {t_raw:8.3f} s  → {n / t_raw:>12,.0f} filas/s")
+    print(f"   Speedup             : ×{t_dicts / t_raw:.1f}")
+    print(f"   Tamaño medio        : {sum(map(len, docs_raw)) / max(n, 1):.0f} bytes/documento")
+
+    if docs_dicts != docs_raw:
+        print("❌ Los bytes NO coinciden")
+        sys.exit(1)
+    print("✅ BSON idéntico byte a byte")
+
+    if args.uri:
+        print("\n💾 insert_many:")
+        bench_inserts(args.uri, df)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: carga síncrona vs carga asíncrona (async_ingest.py) contra un mongod local.
+
+Con los mismos ficheros, tareas (row groups) y lotes mide el rendimiento
+(documentos/s) de:
+    - sync:          preparar una tarea y luego insertar sus lotes uno a uno
+                     (cada insert_many bloquea el único thread)
+    - threads ×N:    ingest_files_async con N lotes en vuelo en un pool de threads
+    - driver ×N:     ingest_files_async con AsyncMongoClient (pymongo >= 4.9)
+
+y comprueba que cada modo deja en la colección los mismos documentos que
+cuenta como insertados (y los mismos que la carga síncrona).
+
+Uso:
+    python bench_async_ingest.py                            # 2 meses sintéticos × 400.000 filas
+    python bench_async_ingest.py --in-flight 1 2 4 8 --workers 2
+    python bench_async_ingest.py --files ./data/fhvhv_tripdata_2025-01.parquet --sample-rate 40
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+
+from pymongo import MongoClient
+
+from async_ingest import AsyncMongoClient, ROW_GROUPS_PER_TASK, run_ingest_async
+from parallel_ingest import insert_raw_batch, plan_tasks, prepare_task
+from synthetic_hvfhv import write_synthetic_month_files
+
+BENCH_DATABASE = 'hvfhv_bench'
+BENCH_COLLECTION = 'trips_async'
+
+
+def run_sync(parquet_files, collection, sample_rate, batch_size, row_groups_per_task):
+    """Carga síncrona de referencia. Devuelve los documentos insertados."""
+    inserted = 0
+    for task in plan_tasks(parquet_files, row_groups_per_task):
+        prepared = prepare_task(task, sample_rate, None, 100000, batch_size)
+        for batch_no, raw_docs in enumerate(prepared['batches'], 1):
+            inserted += insert_raw_batch(collection, raw_docs, batch_no, prepared['file'])
+    return inserted
+
+
+def run_async(parquet_files, collection, sample_rate, batch_size, row_groups_per_task, **kwargs):
+    results = run_ingest_async(parquet_files, collection, sample_rate=sample_rate, batch_size=batch_size,
+                               row_groups_per_task=row_groups_per_task, **kwargs)
+    return sum(res['inserted'] for res in results.values())
+
+
+def timed(collection, load):
+    """Vacía la colección, ejecuta la carga sin su salida por lote. Devuelve (s, insertados, en colección)."""
+    collection.drop()
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        inserted = load()
+        elapsed = time.perf_counter() - t0
+    return elapsed, inserted, collection.count_documents({})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga síncrona vs asíncrona contra un mongod local")
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--files', nargs='*', default=None, help="Ficheros Parquet (por defecto, sintéticos)")
+    parser.add_argument('--rows', type=int, default=400000, help="Filas sintéticas por mes")
+    parser.add_argument('--months', type=int, default=2)
+    parser.add_argument('--sample-rate', type=int, default=4, help="Muestreo 1 de N")
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--row-groups-per-task', type=int, default=ROW_GROUPS_PER_TASK)
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--workers', type=int, default=0, help="Procesos de lectura/limpieza (0 = thread)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    client = MongoClient(args.uri, serverSelectionTimeoutMS=5000)
+    collection = client[BENCH_DATABASE][BENCH_COLLECTION]
+    tmp_dir = None
+    parquet_files = args.files
+    if not parquet_files:
+        tmp_dir = tempfile.TemporaryDirectory()
+        print(f"🧪 Generando {args.months} × {args.rows:,} viajes sintéticos...")
+        parquet_files = write_synthetic_month_files(tmp_dir.name, args.months, args.rows)
+
+    print("=" * 80)
+    print(f"⚡ BENCHMARK carga síncrona vs asíncrona — {len(parquet_files)} ficheros, muestra 1 de "
+          f"{args.sample_rate}, lotes de {args.batch_size:,}")
+    print("=" * 80)
+
+    common = (parquet_files, collection, args.sample_rate, args.batch_size, args.row_groups_per_task)
+    runs = [('sync', lambda: run_sync(*common))]
+    for n in args.in_flight:
+        runs.append((f'threads ×{n}', lambda n=n: run_async(*common, workers=args.workers, max_in_flight=n)))
+    if AsyncMongoClient is not None:
+        for n in args.in_flight:
+            runs.append((f'driver ×{n}', lambda n=n: run_async(*common, workers=args.workers, max_in_flight=n,
+                                                               mongo_uri=args.uri)))
+    else:
+        print("   (pymongo sin AsyncMongoClient: solo se mide el modo con threads)")
+
+    print(f"\n   {'modo':14s}{'tiempo s':>10s}{'docs':>12s}{'docs/s':>12s}{'vs sync':>9s}")
+    reference = None
+    problems = []
+    for name, load in runs:
+        elapsed, inserted, stored = timed(collection, load)
+        if reference is None:
+            reference = (elapsed, stored)
+        print(f"   {name:14s}{elapsed:>10.2f}{inserted:>12,}{inserted / elapsed:>12,.0f}"
+              f"{reference[0] / elapsed:>8.2f}×")
+        if inserted != stored or stored != reference[1]:
+            problems.append(f"{name}: {inserted:,} contados, {stored:,} en la colección")
+
+    collection.drop()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+    if problems:
+        print("❌ Documentos distintos: " + "; ".join(problems))
+        sys.exit(1)
+    print("✅ Todos los modos insertan los mismos documentos")
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: clean_hvfhv_data normal vs modo ligero (lean=True).
+
+Mide por modo el tiempo, la memoria del DataFrame limpio
+(memory_usage(deep=True)) y el pico de memoria de Python durante la limpieza
+(tracemalloc: NumPy y objetos Python, no los buffers de Arrow), y comprueba
+que el resultado es el mismo:
+    - documentos BSON idénticos (encode_frame_bytes y sanitize_for_mongo, sin _id)
+    - mismo rollup (frame_to_rollup) y mismas medidas OD (frame_to_od)
+
+Uso:
+    python bench_cleaning.py                               # 500.000 filas sintéticas
+    python bench_cleaning.py ./data/fhvhv_tripdata_2025-01.parquet       # mes completo
+    python bench_cleaning.py ./data/fhvhv_tripdata_2025-01.parquet 40 --budget 256
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+
+import bson
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from arrow_bson import encode_frame_bytes
+from hvfhv_cleaning import clean_hvfhv_data
+from mongo_sanitize import sanitize_for_mongo
+from od_matrix import frame_to_od
+from rollup import frame_to_rollup
+from synthetic_hvfhv import make_synthetic_trips
+
+
+def load_raw_frame(source, sample_rate):
+    """Muestra sin limpiar (sintética o desde Parquet)."""
+    if source.endswith('.parquet'):
+        df = pq.read_table(source).to_pandas()
+        if sample_rate > 1:
+            df = df.iloc[::sample_rate].reset_index(drop=True)
+        return df, f"{source} (1 de {sample_rate})" if sample_rate > 1 else f"{source} (completo)"
+    n_rows = int(source)
+    return make_synthetic_trips(n_rows), f"sintético ({n_rows:,} filas)"
+
+
+def measure_cleaning(raw, **options):
+    """Limpia una copia de `raw`. Devuelve (segundos, pico tracemalloc MB, DataFrame limpio)."""
+    df = raw.copy()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    clean = clean_hvfhv_data(df, **options)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del df
+    return elapsed, peak / (1024 * 1024), clean
+
+
+def frame_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def same_output(normal, lean):
+    """Lista de diferencias entre el resultado normal y el ligero (vacía si coinciden)."""
+    problems = []
+    if encode_frame_bytes(normal, with_id=False) != encode_frame_bytes(lean, with_id=False):
+        problems.append("encode_frame_bytes")
+    docs_normal, docs_lean = sanitize_for_mongo(normal), sanitize_for_mongo(lean)
+    if len(docs_normal) != len(docs_lean) or any(bson.encode(a) != bson.encode(b)
+                                                 for a, b in zip(docs_normal, docs_lean)):
+        problems.append("sanitize_for_mongo")
+    try:
+        pd.testing.assert_frame_equal(frame_to_rollup(normal, 'bench'), frame_to_rollup(lean, 'bench'),
+                                      check_dtype=False, check_exact=True)
+    except AssertionError:
+        problems.append("frame_to_rollup")
+    od_normal, od_lean = frame_to_od(normal), frame_to_od(lean)
+    if not all(np.array_equal(a, b) for a, b in zip(od_normal[:4], od_lean[:4])) or any(
+            not np.array_equal(od_normal[4][k], od_lean[4][k]) for k in od_normal[4]):
+        problems.append("frame_to_od")
+    return problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memoria de clean_hvfhv_data normal vs modo ligero")
+    parser.add_argument('source', nargs='?', default='500000', help="Fichero Parquet o número de filas sintéticas")
+    parser.add_argument('sample_rate', nargs='?', type=int, default=1, help="Muestra 1 de N del Parquet")
+    parser.add_argument('--budget', type=float, default=None, help="memory_budget_mb del modo ligero")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    raw, label = load_raw_frame(args.source, args.sample_rate)
+
+    print("=" * 80)
+    print(f"🧹 BENCHMARK clean_hvfhv_data — {label}")
+    print(f"   Filas: {len(raw):,} | Columnas: {len(raw.columns)} | Entrada: {frame_mb(raw):,.1f} MB")
+    print("=" * 80)
+
+    t_normal, peak_normal, normal = measure_cleaning(raw)
+    t_lean, peak_lean, lean = measure_cleaning(raw, lean=True, memory_budget_mb=args.budget)
+
+    mb_normal, mb_lean = frame_mb(normal), frame_mb(lean)
+    print(f"\n   {'':8s}{'tiempo s':>10s}{'limpio MB':>12s}{'pico MB':>10s}")
+    print(f"   {'Normal':8s}{t_normal:>10.2f}{mb_normal:>12,.1f}{peak_normal:>10,.1f}")
+    print(f"   {'Ligero':8s}{t_lean:>10.2f}{mb_lean:>12,.1f}{peak_lean:>10,.1f}")
+    print(f"   Memoria del DataFrame limpio: ×{mb_normal / mb_lean:.1f} menos | "
+          f"pico: ×{peak_normal / max(peak_lean, 1e-9):.1f} menos")
+
+    print("\n   Tipos del modo ligero:")
+    for dtype, cols in lean.dtypes.groupby(lean.dtypes.astype(str)).groups.items():
+        print(f"   {dtype:>10s}: {', '.join(cols)}")
+
+    problems = same_output(normal, lean)
+    if problems:
+        print(f"❌ Resultados distintos: {', '.join(problems)}")
+        sys.exit(1)
+    print("✅ Documentos, rollup y medidas OD idénticos")
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark y explain de los pipelines del notebook sobre datos sintéticos.
+
+Carga viajes sintéticos con semilla (synthetic_hvfhv.py → clean_hvfhv_data →
+sanitize_for_mongo) en una base de datos de pruebas de un mongod local y:
+
+1. Ejecuta cada pipeline con nombre del notebook (pipeline_hourly,
+   pipeline_day_hour, pipeline_revenue, pipeline_driver, pipeline_wav,
+   pipeline_platform, pipeline_od, ...) sin índices y con los índices de
+   create_indexes(), y guarda por pipeline:
+     - tiempo de pared (mediana de N repeticiones),
+     - documentos y claves examinados, documentos devueltos,
+     - índice elegido (o COLLSCAN) y el plan ganador de explain.
+2. Mide el rendimiento de inserción (documentos/s) sin índices, con cada
+   índice del notebook por separado y con todos, y el tamaño de cada índice.
+
+El informe es un JSON con claves ordenadas para poder hacer diff entre
+ejecuciones; con --baseline se compara con un informe anterior y se marcan
+las regresiones (tiempo, documentos examinados o índice elegido).
+
+Uso:
+    python bench_pipelines.py                              # 2 meses × 100.000 filas
+    python bench_pipelines.py --rows 500000 --months 3 --repeats 5
+    python bench_pipelines.py --baseline outputs/bench_pipelines_prev.json
+"""
+
+import argparse
+import datetime as dt
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import bson
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING, MongoClient
+
+import hvfhv_pipelines as hp
+from hvfhv_cleaning import clean_hvfhv_data
+from mongo_sanitize import sanitize_for_mongo
+from regression_check import find_regressions, print_regressions
+from synthetic_hvfhv import make_synthetic_trips
+
+BENCH_DATABASE = 'hvfhv_bench'
+BENCH_COLLECTION = 'trips'
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / 'outputs' / 'bench_pipelines.json'
+
+# Índices de create_indexes() en el notebook (nombre → claves)
+NOTEBOOK_INDEXES = {
+    'pickup_datetime': [('pickup_datetime', ASCENDING)],
+    'dropoff_datetime': [('dropoff_datetime', ASCENDING)],
+    'PULocationID': [('PULocationID', ASCENDING)],
+    'DOLocationID': [('DOLocationID', ASCENDING)],
+    'pickup_hour': [('pickup_hour', ASCENDING)],
+    'pickup_day_of_week': [('pickup_day_of_week', ASCENDING)],
+    'hvfhs_license_num': [('hvfhs_license_num', ASCENDING)],
+    'pickup_datetime+hvfhs_license_num': [('pickup_datetime', ASCENDING), ('hvfhs_license_num', ASCENDING)],
+}
+
+# Umbral de regresión de tiempo frente al informe base
+TIME_REGRESSION_RATIO = 1.25
+
+
+def notebook_pipelines(start, end, platforms=None):
+    """Pipelines del notebook con el nombre de su variable en la celda."""
+    window = hp.match_base(start, end, platforms)
+    all_platforms = hp.match_base(start, end)
+    stages = {
+        'pipeline_hourly': (window, hp.hourly_stages()),
+        'pipeline_daily': (window, hp.daily_stages()),
+        'pipeline_monthly': (window, hp.monthly_stages()),
+        'pipeline_day_hour': (window, hp.day_hour_stages()),
+        'pipeline_revenue': (window, hp.revenue_stages()),
+        'pipeline_driver': (window, hp.driver_stages()),
+        'pipeline_wav': (window, hp.wav_stages()),
+        'pipeline_wav_platform': (window, hp.wav_platform_stages()),
+        'pipeline_shared': (window, hp.shared_stages()),
+        'pipeline_hourly_shared': (window, hp.shared_hourly_stages()),
+        'pipeline_platform': (all_platforms, hp.platform_stages()),
+        'pipeline_fleet_evolution': (all_platforms, hp.fleet_evolution_stages()),
+        'pipeline_locations': (window, hp.pickup_locations_stages()),
+        'pipeline_dropoff': (window, hp.dropoff_locations_stages()),
+        'pipeline_top_pickups': (window, hp.top_pickups_stages()),
+        'pipeline_od': (window, hp.od_flows_from_top_pickups_stages()),
+        'pipeline_morning': (window, hp.rush_hour_stages(6, 9)),
+        'pipeline_evening': (window, hp.rush_hour_stages(17, 20)),
+    }
+    return {name: hp.with_match(match, s) for name, (match, s) in stages.items()}
+
+
+# ==================== DATOS ====================
+
+def synthetic_documents(rows_per_month, months, seed=42, year=2025):
+    """Documentos limpios y sanitizados, como los que inserta la carga."""
+    docs = []
+    for i in range(months):
+        df = make_synthetic_trips(rows_per_month, seed=seed + i, year=year, month=i + 1)
+        docs.extend(sanitize_for_mongo(clean_hvfhv_data(df)))
+    return docs
+
+
+def encode_documents(docs):
+    """BSON precodificado (la inserción mide solo el servidor y la red)."""
+    return [bson.encode(doc) for doc in docs]
+
+
+def reset_collection(collection, index_names):
+    """Vacía la colección y crea los índices indicados."""
+    collection.drop()
+    for name in index_names:
+        collection.create_index(NOTEBOOK_INDEXES[name], name=name)
+
+
+def insert_all(collection, raw_docs, batch_size):
+    """Inserta todos los documentos. Devuelve segundos."""
+    t0 = time.perf_counter()
+    for i in range(0, len(raw_docs), batch_size):
+        collection.insert_many([RawBSONDocument(r) for r in raw_docs[i:i + batch_size]], ordered=False)
+    return time.perf_counter() - t0
+
+
+# ==================== EXPLAIN ====================
+
+def _find_all(node, key):
+    """Todos los valores de `key` en un documento anidado (explain cambia de forma entre versiones)."""
+    found = []
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                found.append(v)
+            found.extend(_find_all(v, key))
+    elif isinstance(node, list):
+        for v in node:
+            found.extend(_find_all(v, key))
+    return found
+
+
+def summarize_explain(explain):
+    """Datos del explain (executionStats) que interesan para comparar ejecuciones."""
+    stats = _find_all(explain, 'executionStats')
+    winning = _find_all(explain, 'winningPlan')
+    stages = set(_find_all(winning, 'stage'))
+    indexes = sorted(set(_find_all(winning, 'indexName')))
+    first = stats[0] if stats else {}
+    return {
+        'index': '+'.join(indexes) if indexes else ('COLLSCAN' if 'COLLSCAN' in stages else None),
+        'docs_examined': sum(s.get('totalDocsExamined', 0) for s in stats),
+        'keys_examined': sum(s.get('totalKeysExamined', 0) for s in stats),
+        'n_returned': first.get('nReturned'),
+        'execution_ms': first.get('executionTimeMillis'),
+        'winning_plan': winning[0] if winning else None,
+    }
+
+
+def explain_pipeline(collection, pipeline):
+    explain = collection.database.command(
+        'explain', {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}},
+        verbosity='executionStats')
+    return summarize_explain(explain)
+
+
+def run_pipeline(collection, name, pipeline, repeats):
+    """Tiempo de pared (mediana) + resumen del explain de un pipeline."""
+    list(collection.aggregate(pipeline, allowDiskUse=True))  # calentamiento (caché del motor)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+        times.append(time.perf_counter() - t0)
+    result = {'wall_ms': round(statistics.median(times) * 1000, 3),
+              'wall_ms_min': round(min(times) * 1000, 3), 'rows': len(rows)}
+    result.update(explain_pipeline(collection, pipeline))
+    print(f"   {name:28s}{result['wall_ms']:>10.1f} ms  docs {result['docs_examined']:>10,}  "
+          f"keys {result['keys_examined']:>10,}  {result['index']}")
+    return result
+
+
+# ==================== BENCHMARKS ====================
+
+def bench_inserts(collection, raw_docs, batch_size, repeats):
+    """Documentos/s sin índices, con cada índice del notebook y con todos."""
+    scenarios = {'no_indexes': []}
+    scenarios.update({f'only:{name}': [name] for name in NOTEBOOK_INDEXES})
+    scenarios['all_notebook_indexes'] = list(NOTEBOOK_INDEXES)
+
+    results = {}
+    for label, index_names in scenarios.items():
+        times = []
+        for _ in range(repeats):
+            reset_collection(collection, index_names)
+            times.append(insert_all(collection, raw_docs, batch_size))
+        seconds = statistics.median(times)
+        stats = collection.database.command('collStats', collection.name)
+        results[label] = {
+            'indexes': index_names,
+            'seconds': round(seconds, 4),
+            'docs_per_s': round(len(raw_docs) / seconds, 1),
+            'index_sizes': {k: v for k, v in stats.get('indexSizes', {}).items() if k != '_id_'},
+        }
+        print(f"   {label:40s}{results[label]['docs_per_s']:>12,.0f} docs/s")
+
+    base = results['no_indexes']['docs_per_s']
+    for res in results.values():
+        res['slowdown_vs_no_indexes'] = round(base / res['docs_per_s'], 3) if res['docs_per_s'] else None
+    return results
+
+
+def bench_pipelines(collection, raw_docs, batch_size, pipelines, repeats):
+    """Cada pipeline sin índices (solo _id) y con los índices del notebook."""
+    results = {}
+    for label, index_names in (('no_indexes', []), ('notebook_indexes', list(NOTEBOOK_INDEXES))):
+        print(f"\n🔎 Pipelines ({label})")
+        reset_collection(collection, index_names)
+        insert_all(collection, raw_docs, batch_size)
+        results[label] = {name: run_pipeline(collection, name, p, repeats) for name, p in pipelines.items()}
+
+    # Índices que no elige ningún pipeline (solo cuestan en la inserción)
+    used = set()
+    for res in results['notebook_indexes'].values():
+        if res['index'] and res['index'] != 'COLLSCAN':
+            used.update(res['index'].split('+'))
+    results['unused_indexes'] = sorted(set(NOTEBOOK_INDEXES) - used)
+    return results
+
+
+def compare_reports(current, baseline, ratio=TIME_REGRESSION_RATIO):
+    """
+    Regresiones frente a un informe anterior.
+
+    Returns:
+        list: Mensajes (vacía si no hay regresiones)
+    """
+    metrics = []
+    for scenario in ('no_indexes', 'notebook_indexes'):
+        for name, now in current['pipelines'].get(scenario, {}).items():
+            before = baseline.get('pipelines', {}).get(scenario, {}).get(name)
+            if before is None:
+                continue
+            label = f"{scenario}/{name}"
+            metrics += [(label, before['wall_ms'], now['wall_ms'], 'time', 'ms'),
+                        (f"{label} docs examinados", before['docs_examined'], now['docs_examined'], 'count', ''),
+                        (f"{label} índice", before['index'], now['index'], 'same', '')]
+    for label, now in current.get('inserts', {}).items():
+        before = baseline.get('inserts', {}).get(label) or {}
+        metrics.append((f"inserts/{label}", before.get('docs_per_s'), now['docs_per_s'], 'rate', 'docs/s'))
+    return find_regressions(metrics, ratio)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark y explain de los pipelines del notebook")
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--rows', type=int, default=100000, help="Filas sintéticas por mes (antes de limpiar)")
+    parser.add_argument('--months', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=20000)
+    parser.add_argument('--platforms', nargs='*', default=None, help="Filtro de plataforma (p. ej. HV0003)")
+    parser.add_argument('--skip-inserts', action='store_true', help="No mide la inserción por índice")
+    parser.add_argument('--output', default=str(DEFAULT_OUTPUT))
+    parser.add_argument('--baseline', default=None, help="Informe anterior para detectar regresiones")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    client = MongoClient(args.uri, serverSelectionTimeoutMS=5000)
+    collection = client[BENCH_DATABASE][BENCH_COLLECTION]
+
+    print(f"🧪 Generando {args.months} × {args.rows:,} viajes sintéticos (semilla {args.seed})...")
+    raw_docs = encode_documents(synthetic_documents(args.rows, args.months, args.seed))
+    start = dt.datetime(2025, 1, 1)
+    end = dt.datetime(2025, 1 + args.months, 1) if args.months < 12 else dt.datetime(2026, 1, 1)
+    pipelines = notebook_pipelines(start, end, args.platforms)
+
+    report = {
+        'meta': {
+            'created': dt.datetime.now().isoformat(timespec='seconds'),
+            'mongodb_version': client.server_info().get('version'),
+            'python': sys.version.split()[0],
+            'machine': platform.machine(),
+            'documents': len(raw_docs),
+            'rows_per_month': args.rows,
+            'months': args.months,
+            'seed': args.seed,
+            'repeats': args.repeats,
+            'platforms': args.platforms,
+        },
+    }
+    if not args.skip_inserts:
+        print(f"\n📥 Inserción ({len(raw_docs):,} documentos, lotes de {args.batch_size:,})")
+        report['inserts'] = bench_inserts(collection, raw_docs, args.batch_size, args.repeats)
+    report['pipelines'] = bench_pipelines(collection, raw_docs, args.batch_size, pipelines, args.repeats)
+    collection.drop()
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.output).write_text(json.dumps(report, indent=2, sort_keys=True, default=str), encoding='utf-8')
+    print(f"\n⚠️ Índices que no usa ningún pipeline: {', '.join(report['pipelines']['unused_indexes']) or '-'}")
+    print(f"📄 Informe guardado en {args.output}")
+
+    if args.baseline:
+        problems = compare_reports(report, json.loads(Path(args.baseline).read_text(encoding='utf-8')))
+        sys.exit(print_regressions(problems))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: muestra limpia leyendo el Parquet (en frío) vs desde sample_cache.py (en caliente).
+
+Con los mismos ficheros y parámetros mide por modo de limpieza (normal y
+ligero) el tiempo de:
+    - frío:      leer y muestrear el Parquet + clean_hvfhv_data + guardar en la caché
+    - caliente:  tabla Arrow memory-mapped + to_pandas
+
+y comprueba que la muestra de la caché da los mismos documentos BSON
+(encode_frame_bytes, sin _id) que la recién limpiada.
+
+Uso:
+    python bench_sample_cache.py                                 # 2 meses sintéticos × 400.000 filas
+    python bench_sample_cache.py --files ./data/fhvhv_tripdata_2025-01.parquet --sample-rate 40
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+import pyarrow as pa
+
+from arrow_bson import encode_frame_bytes
+from hvfhv_cleaning import clean_hvfhv_data
+from ingest_manifest import sample_settings
+from sample_cache import SampleCache, load_clean_sample
+from synthetic_hvfhv import write_synthetic_month_files
+
+
+def timed(func):
+    t0 = time.perf_counter()
+    result = func()
+    return time.perf_counter() - t0, result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Muestra limpia: Parquet vs caché Arrow memory-mapped")
+    parser.add_argument('--files', nargs='*', default=None, help="Ficheros Parquet (por defecto, sintéticos)")
+    parser.add_argument('--rows', type=int, default=400000, help="Filas sintéticas por mes")
+    parser.add_argument('--months', type=int, default=2)
+    parser.add_argument('--sample-rate', type=int, default=4, help="Muestreo 1 de N")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    tmp_dir = tempfile.TemporaryDirectory()
+    parquet_files = args.files
+    if not parquet_files:
+        print(f"🧪 Generando {args.months} × {args.rows:,} viajes sintéticos...")
+        parquet_files = write_synthetic_month_files(tmp_dir.name, args.months, args.rows)
+    cache = SampleCache(f"{tmp_dir.name}/cache", max_mb=None)
+    settings = sample_settings(args.sample_rate)
+
+    print("=" * 80)
+    print(f"♻️  BENCHMARK caché de muestras limpias — {len(parquet_files)} ficheros, "
+          f"muestra 1 de {args.sample_rate}")
+    print("=" * 80)
+
+    problems = []
+    rows = []
+    for mode, clean_options in (('normal', {}), ('ligero', {'lean': True})):
+        cold = warm = table_s = 0.0
+        for path in parquet_files:
+            elapsed, (fresh, _, hit) = timed(lambda: load_clean_sample(path, clean_hvfhv_data, settings,
+                                                                        clean_options, cache))
+            cold += elapsed
+            elapsed, (table, _) = timed(lambda: cache.get_table(path, settings, clean_options))
+            table_s += elapsed
+            elapsed, (cached, _, hit) = timed(lambda: load_clean_sample(path, clean_hvfhv_data, settings,
+                                                                         clean_options, cache))
+            warm += elapsed
+            if not hit:
+                problems.append(f"{mode} {path}: no se leyó de la caché")
+            elif encode_frame_bytes(fresh, with_id=False) != encode_frame_bytes(cached, with_id=False):
+                problems.append(f"{mode} {path}: documentos distintos")
+            del table
+        rows.append((mode, cold, table_s, warm))
+
+    print(f"\n   {'limpieza':10s}{'frío s':>10s}{'tabla s':>10s}{'caliente s':>12s}{'×':>8s}")
+    for mode, cold, table_s, warm in rows:
+        print(f"   {mode:10s}{cold:>10.2f}{table_s:>10.3f}{warm:>12.3f}{cold / warm:>8.1f}")
+    print(f"   Caché: {cache.total_mb():,.1f} MB en {len(cache.entries())} entradas | "
+          f"memoria Arrow asignada ahora: {pa.total_allocated_bytes() / 2 ** 20:,.1f} MB")
+
+    tmp_dir.cleanup()
+    if problems:
+        print("❌ " + "; ".join(problems))
+        sys.exit(1)
+    print("✅ La caché devuelve los mismos documentos que la limpieza")
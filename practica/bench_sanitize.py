@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: sanitize_for_mongo columnar vs implementación legacy.
+
+Mide filas/segundo de ambas versiones y comprueba que los documentos
+producidos son idénticos (comparando su codificación BSON).
+
+Uso:
+    python bench_sanitize.py                      # 200.000 filas sintéticas
+    python bench_sanitize.py 1000000              # 1M filas sintéticas
+    python bench_sanitize.py ./data/fhvhv_tripdata_2025-01.parquet 40
+                                                  # fichero real, muestra 1 de 40
+"""
+
+import sys
+import time
+
+import pyarrow.parquet as pq
+
+from mongo_sanitize import sanitize_for_mongo, sanitize_for_mongo_legacy
+from synthetic_hvfhv import add_derived_columns, make_synthetic_trips
+
+
+def documents_equal(docs_a, docs_b):
+    """Compara dos listas de documentos por su BSON (o por igualdad si no hay bson)."""
+    if len(docs_a) != len(docs_b):
+        return False
+    try:
+        import bson
+    except ImportError:
+        return docs_a == docs_b
+    return all(bson.encode(a) == bson.encode(b) for a, b in zip(docs_a, docs_b))
+
+
+def time_it(func, df, repeat=3):
+    """Devuelve (mejor tiempo en segundos, resultado)."""
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(df)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load_frame(argv):
+    """Obtiene el DataFrame de prueba (sintético o desde Parquet)."""
+    if argv and argv[0].endswith('.parquet'):
+        sample_rate = int(argv[1]) if len(argv) > 1 else 40
+        df = pq.read_table(argv[0]).to_pandas().iloc[::sample_rate].reset_index(drop=True)
+        return add_derived_columns(df), f"{argv[0]} (1 de {sample_rate})"
+    n_rows = int(argv[0]) if argv else 200000
+    return add_derived_columns(make_synthetic_trips(n_rows)), f"sintético ({n_rows:,} filas)"
+
+
+if __name__ == "__main__":
+    df, label = load_frame(sys.argv[1:])
+    n = len(df)
+
+    print("=" * 80)
+    print(f"⏱️  BENCHMARK sanitize_for_mongo — {label}")
+    print(f"   Filas: {n:,} | Columnas: {len(df.columns)}")
+    print("=" * 80)
+
+    t_legacy, docs_legacy = time_it(sanitize_for_mongo_legacy, df, repeat=1)
+    t_columnar, docs_columnar = time_it(sanitize_for_mongo, df)
+
+    print(f"   Legacy   : {t_legacy:8.3f} s  → {n / t_legacy:>12,.0f} filas/s")
+    print(f"   Columnar : {t_columnar:8.3f} s  → {n / t_columnar:>12,.0f} filas/s")
+    print(f"   Speedup  : ×{t_legacy / t_columnar:.1f}")
+
+    if documents_equal(docs_legacy, docs_columnar):
+        print("✅ Documentos idénticos")
+    else:
+        print("❌ Los documentos NO coinciden")
+        sys.exit(1)
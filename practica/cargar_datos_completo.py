@@ -3,109 +3,142 @@
 SCRIPT COMPLETO: Carga de datos HVFHV a MongoDB
 EJECUTAR DIRECTAMENTE CON: python cargar_datos_completo.py
 
+Carga en paralelo (procesos de lectura/limpieza + threads escritores):
+    python cargar_datos_completo.py --workers 6 --writers 3
+
+Por defecto la carga es incremental (ver ingest_manifest.py): solo se cargan
+los meses nuevos o cambiados y una carga interrumpida se reanuda. Para vaciar
+la colección y recargarlo todo:
+    python cargar_datos_completo.py --full-reload
+
+Esquema compacto (claves cortas, flags en bits, ver compact_schema.py) en la
+colección trips_2025_compact, con su propio manifiesto y rollup:
+    python cargar_datos_completo.py --compact
+
+Matrices origen-destino en disco (ver od_matrix.py), mantenidas con la carga:
+    python cargar_datos_completo.py --od-matrix
+
+Sketches de percentiles (mediana, p95...) de tarifa, pago al conductor,
+duración y millas por plataforma/mes/hora/zona (ver quantile_sketch.py):
+    python cargar_datos_completo.py --quantiles
+
+Muestreo estratificado con pesos por documento (ver stratified_sampler.py):
+menos viajes normales y muchos más de los estratos raros (WAV, compartidos,
+aeropuertos); las estimaciones usan sample_weight en lugar de ×40:
+    python cargar_datos_completo.py --stratified
+
+Instrumentación por etapa (lectura, limpieza, codificación, inserción...) con
+informe JSON/CSV en outputs/ingest_metrics (ver ingest_metrics.py); una etapa
+se puede perfilar con cProfile o tracemalloc:
+    python cargar_datos_completo.py --metrics --profile-stage clean
+
+Carga asíncrona (ver async_ingest.py): la lectura y la limpieza se solapan con
+varios insert_many en vuelo (con --workers, la lectura va en procesos):
+    python cargar_datos_completo.py --async-ingest --in-flight 4
+
+Los lotes de insert_many se ajustan al tamaño de los documentos y a la
+latencia del servidor, y los errores transitorios se reintentan (ver
+adaptive_writer.py); para lotes fijos de BATCH_SIZE:
+    python cargar_datos_completo.py --fixed-batches
+
+Limpieza en modo ligero (category, float32 e int8/16/32, ver hvfhv_cleaning.py):
+mismos documentos con menos memoria; --clean-budget limpia por bloques de filas:
+    python cargar_datos_completo.py --lean --clean-budget 256
+
+En todos los modos la muestra limpia de cada fichero se guarda en
+outputs/sample_cache (Arrow IPC, ver sample_cache.py) y se reutiliza
+mientras no cambien el fichero, el muestreo ni la limpieza:
+    python cargar_datos_completo.py --full-reload --cache-max-mb 2048
+    python cargar_datos_completo.py --full-reload --no-sample-cache
+
+Por defecto se leen todas las columnas (los documentos guardan todos los
+campos). Con --narrow-columns solo se decodifican las que usan la limpieza,
+los pipelines, el rollup, los sketches y las matrices OD (NARROW_COLUMNS):
+    python cargar_datos_completo.py --full-reload --narrow-columns
+
+Una colección por mes (trips_2025_01, trips_2025_02..., ver partitioned_store.py),
+carga completa y secuencial; los meses se consultan con PartitionRouter:
+    python cargar_datos_completo.py --partitioned
+
 Soluciona el error: NaTType does not support utcoffset
 """
 
-import pandas as pd
-import numpy as np
-import pyarrow.parquet as pq
 from pymongo import MongoClient
-from pymongo.errors import BulkWriteError
-import datetime as dt
 from glob import glob
+import argparse
 import os
+import sys
+
+from adaptive_writer import TARGET_LATENCY_S, AdaptiveBulkWriter
+from aggregate_cache import bump_data_version
+from arrow_bson import documents_for
+from async_ingest import run_ingest_async
+from compact_schema import COMPACT_SUFFIX, CompactCollection
+from hvfhv_cleaning import clean_hvfhv_data
+from ingest_manifest import MANIFEST_COLLECTION, load_incremental, sample_settings
+from ingest_metrics import STAGES, IngestMetrics, measure
+from od_matrix import ODStore, od_store_dir
+from parallel_ingest import ROW_GROUPS_PER_TASK, ingest_files_parallel
+from partitioned_store import PartitionedStore
+from quantile_sketch import QUANTILE_COLLECTION, SketchStore
+from rollup import ROLLUP_COLLECTION, apply_rollup, ensure_rollup_indexes, rebuild_rollup
+from sample_cache import MAX_CACHE_MB, SampleCache, load_clean_sample
+from stratified_sampler import RARE_STRATA_PLAN
 
 # ==================== CONFIGURACIÓN ====================
 MONGO_URI = "mongodb://localhost:27017/"
 DATABASE_NAME = "nyc_hvfhv"
 COLLECTION_NAME = "trips_2025"
-BATCH_SIZE = 20000
+BATCH_SIZE = 20000  # Lote inicial; después se ajusta a bytes y latencia (ver adaptive_writer.py)
+ADAPTIVE_BATCHES = True  # False = lotes fijos de BATCH_SIZE (los reintentos se mantienen)
 SAMPLE_FRACTION = 0.025  # 2.5% de cada archivo
+READ_BATCH_SIZE = 100000  # Filas decodificadas a la vez (acota la memoria)
+COLUMNS = None  # Columnas a leer (None = todas, los documentos guardan todas)
+# Con --narrow-columns solo se leen las que usan clean_hvfhv_data, los pipelines del
+# notebook, el rollup, los sketches, las matrices OD, local_metrics y el muestreo
+# estratificado: menos decodificación, pero los documentos ya no guardan las bases
+# (dispatching/originating_base_num), request/on_scene_datetime ni cbd_congestion_fee
+NARROW_COLUMNS = ['hvfhs_license_num', 'pickup_datetime', 'dropoff_datetime', 'PULocationID', 'DOLocationID',
+                  'trip_miles', 'trip_time', 'base_passenger_fare', 'tolls', 'bcf', 'sales_tax', 'congestion_surcharge',
+                  'airport_fee', 'tips', 'driver_pay', 'shared_request_flag', 'shared_match_flag',
+                  'access_a_ride_flag', 'wav_request_flag', 'wav_match_flag']
+NARROW_READ = False  # True = leer NARROW_COLUMNS por defecto
+PARALLEL_WORKERS = 0  # Procesos de lectura/limpieza (0 = carga secuencial)
+WRITER_THREADS = 2  # Threads escritores en la carga paralela
+ASYNC_IN_FLIGHT = 4  # Lotes insertándose a la vez en la carga asíncrona
+LEAN_CLEANING = False  # Limpieza con tipos pequeños (mismos documentos, menos memoria)
+CLEAN_MEMORY_BUDGET_MB = None  # Memoria de trabajo de la limpieza ligera (None = sin bloques)
+USE_SAMPLE_CACHE = True  # Muestra limpia desde outputs/sample_cache si no ha cambiado
 
 # Directorio con archivos Parquet
 DATA_DIR = r"c:\Users\Usuario\Documents\master\mongodb\practica\data"
 
-print("=" * 80)
-print("🚀 CARGA DE DATOS NYC HVFHV A MONGODB")
-print("=" * 80)
-
 # ==================== FUNCIONES CORREGIDAS ====================
 
-def normalize_datetimes(df, datetime_cols):
-    """Normaliza columnas datetime para MongoDB: UTC naive sin NaT."""
-    for col in datetime_cols:
-        if col in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[col]):
-                s = df[col]
-                if hasattr(s.dtype, 'tz') and s.dtype.tz is not None:
-                    s = s.dt.tz_convert('UTC').dt.tz_localize(None)
-            else:
-                s = pd.to_datetime(df[col], errors='coerce')
-            df[col] = s.where(s.notna(), None)
-    return df
-
+def insert_data_to_mongodb(df, collection, batch_size=20000, metrics=None, filename=None, writer=None):
+    """
+    Inserta DataFrame a MongoDB en lotes (BSON codificado por columnas, ver arrow_bson.py).
 
-def sanitize_for_mongo(df):
-    """Sanitiza DataFrame para MongoDB - SOLUCIÓN BRUTAL."""
-    df_clean = df.copy()
-    
-    numeric_time_fields = ['pickup_hour', 'pickup_day_of_week', 'pickup_month']
-    
-    # Normalizar columnas datetime
-    datetime_cols = ['pickup_datetime', 'dropoff_datetime', 'request_datetime', 'on_scene_datetime']
-    df_clean = normalize_datetimes(df_clean, datetime_cols)
-    
-    # Convertir datetime.date a STRING
-    for col in df_clean.columns:
-        if col not in numeric_time_fields and len(df_clean) > 0:
-            first_valid = df_clean[col].dropna().iloc[0] if len(df_clean[col].dropna()) > 0 else None
-            if first_valid is not None and isinstance(first_valid, dt.date) and not isinstance(first_valid, dt.datetime):
-                df_clean[col] = df_clean[col].astype(str)
-    
-    # Convertir Int64 a int
-    for col in df_clean.select_dtypes(include=['Int64']).columns:
-        df_clean[col] = df_clean[col].fillna(0).astype(int)
-    
-    # BRUTAL: Convertir a diccionarios y limpiar NaT manualmente
-    records = df_clean.to_dict('records')
-    clean_records = []
-    
-    for record in records:
-        clean_record = {}
-        for key, value in record.items():
-            if pd.isna(value):
-                clean_record[key] = None
-            elif isinstance(value, (np.integer, np.floating)):
-                clean_record[key] = value.item()
-            else:
-                clean_record[key] = value
-        clean_records.append(clean_record)
-    
-    return clean_records
-
-
-def insert_data_to_mongodb(df, collection, batch_size=20000):
-    """Inserta DataFrame a MongoDB en lotes."""
+    Los lotes los escribe `writer` (AdaptiveBulkWriter, ver adaptive_writer.py):
+    tamaño según bytes y latencia y reintento de los errores transitorios; sin
+    writer, uno nuevo que empieza con lotes de batch_size. Si un lote agota los
+    reintentos se lanza InsertRetriesExhausted (el fichero queda con error).
+    Con metrics (ingest_metrics.py) se mide la codificación (o
+    sanitize_for_mongo en el esquema compacto) y cada insert_many.
+    """
     try:
-        records = sanitize_for_mongo(df)
-        total_inserted = 0
+        encode_stage = 'sanitize' if isinstance(collection, CompactCollection) else 'encode'
+        with measure(metrics, encode_stage, file=filename, rows_in=len(df)) as rec:
+            records = documents_for(df, collection)
+            rec['bytes'] = sum(len(doc.raw) for doc in records) if encode_stage == 'encode' else None
         
         print(f"📦 Preparando {len(records):,} documentos para inserción...")
         
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i + batch_size]
-            try:
-                result = collection.insert_many(batch, ordered=False)
-                total_inserted += len(result.inserted_ids)
-                print(f"   ✓ Lote {i//batch_size + 1}: {len(result.inserted_ids)} documentos insertados")
-            except BulkWriteError as e:
-                inserted_count = e.details.get('nInserted', 0)
-                total_inserted += inserted_count
-                print(f"   ⚠️  Lote {i//batch_size + 1}: {inserted_count} insertados, {len(e.details.get('writeErrors', []))} errores")
-            except Exception as e:
-                print(f"   ❌ Lote {i//batch_size + 1}: Error - {str(e)[:100]}")
+        writer = writer or AdaptiveBulkWriter(collection, initial_batch=batch_size, metrics=metrics)
+        total_inserted, _ = writer.write(records, filename)
         
         print(f"✅ Total insertado: {total_inserted:,} documentos")
+        bump_data_version(collection)  # invalida los aggregate cacheados
         return total_inserted
     
     except Exception as e:
@@ -113,120 +146,374 @@ def insert_data_to_mongodb(df, collection, batch_size=20000):
         raise
 
 
-def clean_hvfhv_data(df):
-    """Limpia y prepara datos HVFHV."""
-    print("🧹 Limpiando datos...")
-    
-    # Convertir columnas datetime
-    datetime_cols = ['pickup_datetime', 'dropoff_datetime', 'request_datetime', 'on_scene_datetime']
-    for col in datetime_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
+# ==================== CONEXIÓN A MONGODB ====================
+def connect_and_clear(clear=True, compact=False):
+    """
+    Conecta a MongoDB y (si clear=True) vacía la colección de destino, el manifiesto y el rollup.
+
+    Con compact=True la colección es trips_2025_compact envuelta en una
+    CompactCollection (el manifiesto y el rollup llevan el mismo sufijo).
+    """
+    suffix = COMPACT_SUFFIX if compact else ''
+    print("\n🔌 Conectando a MongoDB...")
+    try:
+        mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+        mongo_client.admin.command('ping')
+        print("✅ Conexión exitosa a MongoDB")
+        
+        mongo_db = mongo_client[DATABASE_NAME]
+        collection = mongo_db[COLLECTION_NAME + suffix]
+        if compact:
+            collection = CompactCollection(collection)
+        
+        # Limpiar colección
+        doc_count = collection.count_documents({}) if clear else 0
+        if clear:
+            mongo_db[MANIFEST_COLLECTION + suffix].delete_many({})
+            mongo_db[ROLLUP_COLLECTION + suffix].delete_many({})
+        if doc_count > 0:
+            print(f"\n🗑️  Limpiando colección existente ({doc_count:,} documentos)...")
+            collection.delete_many({})
+            bump_data_version(collection)
+            print("✅ Colección limpiada")
+        
+        return collection
     
-    # Calcular duración del viaje
-    df['trip_duration_minutes'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
+    except Exception as e:
+        print(f"❌ Error conectando a MongoDB: {e}")
+        sys.exit(1)
+
+
+# ==================== BUSCAR ARCHIVOS PARQUET ====================
+def find_parquet_files():
+    """Lista los ficheros mensuales a cargar."""
+    print(f"\n📂 Buscando archivos en: {DATA_DIR}")
+    parquet_files = sorted(glob(os.path.join(DATA_DIR, "fhvhv_tripdata_2025-*.parquet")))
     
-    # Filtrar valores extremos
-    df = df[
-        (df['trip_duration_minutes'] > 0) & 
-        (df['trip_duration_minutes'] <= 300) &  # Menos de 5 horas
-        (df['trip_miles'] > 0) & 
-        (df['trip_miles'] <= 100)
-    ]
+    if not parquet_files:
+        print(f"❌ No se encontraron archivos Parquet en {DATA_DIR}")
+        sys.exit(1)
     
-    # Crear columnas temporales
-    df['pickup_hour'] = df['pickup_datetime'].dt.hour
-    df['pickup_day_of_week'] = df['pickup_datetime'].dt.dayofweek
-    df['pickup_day_name'] = df['pickup_datetime'].dt.day_name()
-    df['pickup_month'] = df['pickup_datetime'].dt.month
-    df['pickup_date'] = df['pickup_datetime'].dt.date
+    print(f"✅ Encontrados {len(parquet_files)} archivos:")
+    for f in parquet_files:
+        print(f"   - {os.path.basename(f)}")
+    return parquet_files
+
+
+# ==================== CARGAR ARCHIVOS ====================
+def read_and_clean(file_path, sampling_plan=None, metrics=None, clean_options=None, cache=None, columns=COLUMNS):
+    """
+    Lee la muestra de un fichero y la limpia (o la toma de la caché de muestras limpias).
+
+    Returns:
+        tuple: (DataFrame limpio, estadísticas de la lectura)
+    """
+    settings = sample_settings(int(1 / SAMPLE_FRACTION), columns=columns, sampling_plan=sampling_plan)
+    if sampling_plan is not None:
+        print(f"📖 Leyendo archivo (muestra estratificada: {sampling_plan})...")
+    else:
+        # Muestreo sistemático en streaming (sin decodificar el fichero completo)
+        print(f"📖 Leyendo archivo (muestra: {SAMPLE_FRACTION*100}%)...")
+    df_clean, sample_stats, hit = load_clean_sample(file_path, clean_hvfhv_data, settings, clean_options, cache,
+                                                    READ_BATCH_SIZE, metrics=metrics)
+    if hit:
+        print(f"♻️  Muestra limpia desde la caché: {len(df_clean):,} filas")
+        return df_clean, sample_stats
     
-    print(f"✅ Datos limpios: {len(df):,} filas")
-    return df
+    print(f"   Total filas: {sample_stats['total_rows']:,}")
+    print(f"   Filas muestreadas: {sample_stats['sampled_rows']:,}")
+    print(f"   Decode evitado: {sample_stats['decode_skipped_pct']:.1f}% "
+          f"({sample_stats['row_groups_read']}/{sample_stats['row_groups_total']} row groups, "
+          f"{sample_stats['columns_read']}/{sample_stats['columns_total']} columnas)")
+    return df_clean, sample_stats
 
 
-# ==================== CONEXIÓN A MONGODB ====================
-print("\n🔌 Conectando a MongoDB...")
-try:
-    mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    mongo_client.admin.command('ping')
-    print("✅ Conexión exitosa a MongoDB")
+def build_od_from_samples(parquet_files, od_store, sampling_plan=None, metrics=None, clean_options=None,
+                          cache=None, columns=COLUMNS):
+    """
+    Matrices OD de una carga completa desde la misma muestra limpia que se insertó.
+
+    Los viajes de la carga completa no llevan source_file (no se pueden
+    recalcular desde la colección): cada fichero se vuelve a tomar con
+    load_clean_sample y los mismos ajustes que read_and_clean (muestra
+    sistemática o estratificada, limpieza), normalmente desde la caché.
+    """
+    settings = sample_settings(int(1 / SAMPLE_FRACTION), columns=columns, sampling_plan=sampling_plan)
+    for file_path in parquet_files:
+        filename = os.path.basename(file_path)
+        try:
+            df_clean, _, _ = load_clean_sample(file_path, clean_hvfhv_data, settings, clean_options, cache,
+                                               READ_BATCH_SIZE)
+            with measure(metrics, 'od', file=filename, rows_in=len(df_clean)):
+                od_store.remove(filename)
+                trips = od_store.add_frame(df_clean, filename)
+            print(f"   {filename}: {trips:,} viajes")
+        except Exception as e:
+            print(f"❌ ERROR construyendo la matriz OD de {filename}: {str(e)}")
+
+
+def load_files_sequential(parquet_files, collection, rollup=None, sampling_plan=None, metrics=None,
+                          clean_options=None, writer=None, partitions=None, sketches=None, cache=None,
+                          od_store=None, columns=COLUMNS):
+    """
+    Carga los ficheros uno a uno. Devuelve el total de documentos insertados.
+
+    Con partitions (PartitionedStore) los viajes van a la colección de su mes
+    en lugar de a `collection`. Con sketches (SketchStore) cada fichero se
+    suma a los sketches de percentiles, y con od_store (ODStore) a las
+    matrices origen-destino. Con cache (SampleCache) la muestra limpia de un
+    fichero sin cambios se lee de la caché en lugar del Parquet.
+    """
+    total_docs_inserted = 0
+    rebuild_needed = False
     
-    mongo_db = mongo_client[DATABASE_NAME]
-    collection = mongo_db[COLLECTION_NAME]
+    for idx, file_path in enumerate(parquet_files, 1):
+        filename = os.path.basename(file_path)
+        print(f"\n{'=' * 80}")
+        print(f"📄 [{idx}/{len(parquet_files)}] Procesando: {filename}")
+        print(f"{'=' * 80}")
+        
+        try:
+            # Muestra limpia: desde la caché (sample_cache.py) o leyendo y limpiando el Parquet
+            df_clean, _ = read_and_clean(file_path, sampling_plan, metrics, clean_options, cache, columns)
+            
+            # Insertar a MongoDB
+            print(f"💾 Insertando a MongoDB...")
+            if partitions is not None:
+                by_month = partitions.insert_frame(df_clean, writer, filename, BATCH_SIZE, metrics)
+                print("   " + ", ".join(f"{month}: {n:,}" for month, n in by_month.items()))
+                inserted = sum(by_month.values())
+            else:
+                inserted = insert_data_to_mongodb(df_clean, collection, BATCH_SIZE, metrics, filename, writer)
+            total_docs_inserted += inserted
+            
+            # Actualizar el rollup y los sketches (si faltan documentos, se recalculan al final)
+            if inserted == len(df_clean):
+                if rollup is not None:
+                    with measure(metrics, 'rollup', file=filename, rows_in=len(df_clean)):
+                        apply_rollup(rollup, df_clean)
+                if sketches is not None:
+                    with measure(metrics, 'quantiles', file=filename, rows_in=len(df_clean)):
+                        sketches.add_frame(df_clean)
+                if od_store is not None:
+                    with measure(metrics, 'od', file=filename, rows_in=len(df_clean)):
+                        od_store.add_frame(df_clean, filename)
+            else:
+                rebuild_needed = True
+            
+            print(f"✅ Archivo completado: {inserted:,} documentos insertados")
+            
+        except Exception as e:
+            print(f"❌ ERROR procesando {filename}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            continue
     
-    # Limpiar colección
-    doc_count = collection.count_documents({})
-    if doc_count > 0:
-        print(f"\n🗑️  Limpiando colección existente ({doc_count:,} documentos)...")
-        collection.delete_many({})
-        print("✅ Colección limpiada")
+    if rebuild_needed and od_store is not None:
+        print("⚠️  Faltan documentos de algún fichero: sus matrices OD no se han actualizado")
+    if rebuild_needed and partitions is not None:
+        print("⚠️  Faltan documentos en alguna partición: el rollup y los sketches no están completos")
+    elif rebuild_needed:
+        if rollup is not None:
+            print("🧊 Recalculando rollup desde la colección...")
+            rebuild_rollup(collection, rollup)
+        if sketches is not None:
+            print("🧮 Recalculando sketches de percentiles desde la colección...")
+            sketches.rebuild_from_collection(collection, None, match={})
     
-except Exception as e:
-    print(f"❌ Error conectando a MongoDB: {e}")
-    exit(1)
+    return total_docs_inserted
 
-# ==================== BUSCAR ARCHIVOS PARQUET ====================
-print(f"\n📂 Buscando archivos en: {DATA_DIR}")
-parquet_files = sorted(glob(os.path.join(DATA_DIR, "fhvhv_tripdata_2025-*.parquet")))
 
-if not parquet_files:
-    print(f"❌ No se encontraron archivos Parquet en {DATA_DIR}")
-    exit(1)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga de datos HVFHV a MongoDB")
+    parser.add_argument('--workers', type=int, default=PARALLEL_WORKERS,
+                        help="Procesos de lectura/limpieza en paralelo (0 = secuencial)")
+    parser.add_argument('--writers', type=int, default=WRITER_THREADS,
+                        help="Threads escritores a MongoDB en la carga paralela")
+    parser.add_argument('--row-groups-per-task', type=int, default=ROW_GROUPS_PER_TASK,
+                        help="Row groups por tarea de la carga paralela (0 = fichero entero, todo el mes en memoria)")
+    parser.add_argument('--full-reload', action='store_true',
+                        help="Vacía la colección y recarga todos los ficheros (sin manifiesto)")
+    parser.add_argument('--prune-missing', action='store_true',
+                        help="Carga incremental: borra los meses cuyo fichero ya no existe")
+    parser.add_argument('--compact', action='store_true',
+                        help="Guarda los viajes en el esquema compacto (colección trips_2025_compact)")
+    parser.add_argument('--stratified', action='store_true',
+                        help="Muestreo estratificado con pesos (RARE_STRATA_PLAN de stratified_sampler.py)")
+    parser.add_argument('--od-matrix', action='store_true',
+                        help="Mantiene las matrices origen-destino en outputs/od_matrix (ver od_matrix.py)")
+    parser.add_argument('--quantiles', action='store_true',
+                        help="Mantiene los sketches de percentiles (quantile_sketch.py)")
+    parser.add_argument('--metrics', action='store_true',
+                        help="Mide cada etapa/fichero/lote y guarda el informe en outputs/ingest_metrics")
+    parser.add_argument('--profile-stage', choices=STAGES, default=None,
+                        help="Perfila una etapa con cProfile (implica --metrics)")
+    parser.add_argument('--trace-stage', choices=STAGES, default=None,
+                        help="Mide la memoria de una etapa con tracemalloc (implica --metrics)")
+    parser.add_argument('--async-ingest', action='store_true',
+                        help="Carga asíncrona: solapa lectura/limpieza con varios insert_many en vuelo")
+    parser.add_argument('--in-flight', type=int, default=ASYNC_IN_FLIGHT,
+                        help="Lotes insertándose a la vez en la carga asíncrona")
+    parser.add_argument('--fixed-batches', action='store_true', default=not ADAPTIVE_BATCHES,
+                        help="Lotes fijos de BATCH_SIZE documentos (sin ajustar a bytes y latencia)")
+    parser.add_argument('--target-latency', type=float, default=TARGET_LATENCY_S, metavar='S',
+                        help="Duración objetivo de cada insert_many con lotes adaptativos")
+    parser.add_argument('--lean', action='store_true', default=LEAN_CLEANING,
+                        help="Limpieza en modo ligero: tipos pequeños, mismos documentos (ver hvfhv_cleaning.py)")
+    parser.add_argument('--clean-budget', type=float, default=CLEAN_MEMORY_BUDGET_MB, metavar='MB',
+                        help="Memoria de trabajo de la limpieza ligera; limpia por bloques de filas (implica --lean)")
+    parser.add_argument('--no-sample-cache', dest='sample_cache', action='store_false', default=USE_SAMPLE_CACHE,
+                        help="No usa la caché de muestras limpias (sample_cache.py)")
+    parser.add_argument('--cache-max-mb', type=float, default=MAX_CACHE_MB, metavar='MB',
+                        help="Tamaño máximo de la caché de muestras limpias")
+    parser.add_argument('--narrow-columns', action='store_true', default=NARROW_READ,
+                        help="Lee solo NARROW_COLUMNS (los documentos pierden las bases, request/on_scene_datetime "
+                             "y cbd_congestion_fee)")
+    parser.add_argument('--partitioned', action='store_true',
+                        help="Una colección por mes (partitioned_store.py); carga completa y secuencial")
+    return parser.parse_args()
 
-print(f"✅ Encontrados {len(parquet_files)} archivos:")
-for f in parquet_files:
-    print(f"   - {os.path.basename(f)}")
 
-# ==================== CARGAR ARCHIVOS ====================
-print("\n" + "=" * 80)
-print("📥 INICIANDO CARGA DE ARCHIVOS")
-print("=" * 80)
+def main():
+    args = parse_args()
+    if args.partitioned:
+        if args.compact:
+            print("❌ --partitioned no admite el esquema compacto")
+            sys.exit(1)
+        if not args.full_reload or args.workers > 0 or args.async_ingest:
+            print("ℹ️  --partitioned: carga completa y secuencial")
+        args.full_reload, args.workers, args.async_ingest = True, 0, False
+    
+    print("=" * 80)
+    print("🚀 CARGA DE DATOS NYC HVFHV A MONGODB")
+    print("=" * 80)
+    
+    suffix = COMPACT_SUFFIX if args.compact else ''
+    collection = connect_and_clear(clear=args.full_reload, compact=args.compact)
+    rollup = collection.database[ROLLUP_COLLECTION + suffix]
+    ensure_rollup_indexes(rollup)
+    sampling_plan = RARE_STRATA_PLAN if args.stratified else None
+    od_dir = od_store_dir(COLLECTION_NAME + suffix) if args.od_matrix else None
+    od_store = ODStore(od_dir) if od_dir is not None else None
+    if od_store is not None and args.full_reload:
+        od_store.clear()
+    sketches = SketchStore(collection.database[QUANTILE_COLLECTION + suffix]) if args.quantiles else None
+    if sketches is not None:
+        sketches.ensure_indexes()
+        if args.full_reload:
+            sketches.clear()
+    parquet_files = find_parquet_files()
+    metrics = None
+    if args.metrics or args.profile_stage or args.trace_stage:
+        metrics = IngestMetrics(profile_stage=args.profile_stage, trace_stage=args.trace_stage)
+    async_options = {'max_in_flight': args.in_flight, 'mongo_uri': MONGO_URI} if args.async_ingest else None
+    writer = AdaptiveBulkWriter(collection, initial_batch=BATCH_SIZE, target_latency_s=args.target_latency,
+                                adaptive=not args.fixed_batches, metrics=metrics)
+    clean_options = {'lean': args.lean or args.clean_budget is not None, 'memory_budget_mb': args.clean_budget}
+    cache = SampleCache(max_mb=args.cache_max_mb) if args.sample_cache else None
+    columns = NARROW_COLUMNS if args.narrow_columns else COLUMNS
+    partitions = None
+    if args.partitioned:
+        partitions = PartitionedStore(collection.database)
+        partitions.clear()
+    
+    print("\n" + "=" * 80)
+    print("📥 INICIANDO CARGA DE ARCHIVOS")
+    print("=" * 80)
+    
+    if not args.full_reload:
+        try:
+            results = load_incremental(
+                parquet_files, collection, clean_hvfhv_data,
+                sample_rate=int(1 / SAMPLE_FRACTION), columns=columns, batch_size=BATCH_SIZE,
+                read_batch_size=READ_BATCH_SIZE, prune_missing=args.prune_missing,
+                workers=args.workers, writers=args.writers,
+                manifest_collection=MANIFEST_COLLECTION + suffix, rollup_collection=ROLLUP_COLLECTION + suffix,
+                od_dir=od_dir, sampling_plan=sampling_plan, metrics=metrics, clean_options=clean_options,
+                async_options=async_options, writer=writer,
+                quantile_collection=QUANTILE_COLLECTION + suffix if args.quantiles else None, cache=cache,
+            )
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        total_docs_inserted = sum(r['inserted'] for r in results.values())
+    elif args.async_ingest:
+        results = run_ingest_async(
+            parquet_files, collection,
+            sample_rate=int(1 / SAMPLE_FRACTION), batch_size=BATCH_SIZE, workers=args.workers,
+            columns=columns, read_batch_size=READ_BATCH_SIZE, sampling_plan=sampling_plan,
+            metrics=metrics, clean_options=clean_options, writer=writer, cache=cache, **async_options,
+        )
+        total_docs_inserted = sum(r['inserted'] for r in results.values())
+        print("🧊 Calculando rollup desde la colección...")
+        with measure(metrics, 'rollup'):
+            rebuild_rollup(collection, rollup)
+        if sketches is not None:
+            print("🧮 Calculando sketches de percentiles desde la colección...")
+            with measure(metrics, 'quantiles'):
+                sketches.rebuild_from_collection(collection, None, match={})
+    elif args.workers > 0:
+        results = ingest_files_parallel(
+            parquet_files, collection,
+            sample_rate=int(1 / SAMPLE_FRACTION), batch_size=BATCH_SIZE,
+            workers=args.workers, writers=args.writers, columns=columns,
+            read_batch_size=READ_BATCH_SIZE, row_groups_per_task=args.row_groups_per_task,
+            sampling_plan=sampling_plan, metrics=metrics, clean_options=clean_options, writer=writer,
+            cache=cache,
+        )
+        total_docs_inserted = sum(r['inserted'] for r in results.values())
+        print("🧊 Calculando rollup desde la colección...")
+        with measure(metrics, 'rollup'):
+            rebuild_rollup(collection, rollup)
+        if sketches is not None:
+            print("🧮 Calculando sketches de percentiles desde la colección...")
+            with measure(metrics, 'quantiles'):
+                sketches.rebuild_from_collection(collection, None, match={})
+    else:
+        total_docs_inserted = load_files_sequential(parquet_files, collection, rollup, sampling_plan, metrics,
+                                                    clean_options, writer, partitions, sketches, cache, od_store,
+                                                    columns)
+    
+    # Carga completa paralela o asíncrona: los DataFrames limpios se quedaron en los
+    # workers, las matrices se construyen con la misma muestra limpia (desde la caché)
+    if od_store is not None and args.full_reload and (args.async_ingest or args.workers > 0):
+        print("🧭 Construyendo matrices OD desde las muestras limpias...")
+        build_od_from_samples(parquet_files, od_store, sampling_plan, metrics, clean_options, cache, columns)
+    
+    # ==================== RESUMEN FINAL ====================
+    print("\n" + "=" * 80)
+    print("🎉 PROCESO COMPLETADO")
+    print("=" * 80)
+    print(f"Total documentos insertados: {total_docs_inserted:,}")
+    if partitions is not None:
+        for month in partitions.months():
+            print(f"   {partitions.partition_name(month)}: {partitions.partition(month).count_documents({}):,}")
+    else:
+        print(f"Total documentos en MongoDB: {collection.count_documents({}):,}")
+    print(f"Documentos en el rollup ({rollup.name}): {rollup.count_documents({}):,}")
+    writer.print_summary()
+    if sketches is not None:
+        print(f"Celdas con sketches de percentiles ({sketches.collection.name}): "
+              f"{sketches.collection.count_documents({}):,}")
+    if od_store is not None:
+        print(f"Matrices OD ({od_dir}): {', '.join(od_store.months()) or 'ninguna'}")
+    if metrics is not None:
+        metrics.finish().print_summary()
+        report_path = metrics.write_report(meta={
+            'mode': 'incremental' if not args.full_reload else 'partitioned' if args.partitioned else (
+                'async' if args.async_ingest else 'parallel' if args.workers > 0 else 'sequential'),
+            'async_in_flight': args.in_flight if args.async_ingest else None,
+            'workers': args.workers, 'writers': args.writers, 'batch_size': BATCH_SIZE,
+            'read_batch_size': READ_BATCH_SIZE, 'sample_fraction': SAMPLE_FRACTION,
+            'compact': args.compact, 'stratified': args.stratified, 'files': len(parquet_files),
+            'quantiles': args.quantiles, 'sample_cache': args.sample_cache, 'narrow_columns': args.narrow_columns,
+            'lean': clean_options['lean'], 'clean_budget_mb': args.clean_budget,
+            'adaptive_batches': not args.fixed_batches, 'target_latency_s': args.target_latency,
+            'writer': {k: v for k, v in writer.summary().items() if k != 'rejected_errors'},
+        })
+        print(f"📄 Informe de instrumentación: {report_path} (+ .csv)")
+    print("\n✅ Datos listos para análisis en MongoDB Compass o agregaciones")
 
-total_docs_inserted = 0
 
-for idx, file_path in enumerate(parquet_files, 1):
-    filename = os.path.basename(file_path)
-    print(f"\n{'=' * 80}")
-    print(f"📄 [{idx}/{len(parquet_files)}] Procesando: {filename}")
-    print(f"{'=' * 80}")
-    
-    try:
-        # Leer archivo con muestreo
-        print(f"📖 Leyendo archivo (muestra: {SAMPLE_FRACTION*100}%)...")
-        parquet_file = pq.ParquetFile(file_path)
-        total_rows = parquet_file.metadata.num_rows
-        
-        # Muestreo sistemático
-        skip = int(1 / SAMPLE_FRACTION)
-        row_indices = list(range(0, total_rows, skip))
-        
-        df = parquet_file.read(columns=None).to_pandas()
-        df_sampled = df.iloc[row_indices].reset_index(drop=True)
-        
-        print(f"   Total filas: {total_rows:,}")
-        print(f"   Filas muestreadas: {len(df_sampled):,}")
-        
-        # Limpiar datos
-        df_clean = clean_hvfhv_data(df_sampled)
-        
-        # Insertar a MongoDB
-        print(f"💾 Insertando a MongoDB...")
-        inserted = insert_data_to_mongodb(df_clean, collection, BATCH_SIZE)
-        total_docs_inserted += inserted
-        
-        print(f"✅ Archivo completado: {inserted:,} documentos insertados")
-        
-    except Exception as e:
-        print(f"❌ ERROR procesando {filename}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        continue
-
-# ==================== RESUMEN FINAL ====================
-print("\n" + "=" * 80)
-print("🎉 PROCESO COMPLETADO")
-print("=" * 80)
-print(f"Total documentos insertados: {total_docs_inserted:,}")
-print(f"Total documentos en MongoDB: {collection.count_documents({}):,}")
-print("\n✅ Datos listos para análisis en MongoDB Compass o agregaciones")
+if __name__ == "__main__":
+    main()
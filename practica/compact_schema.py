@@ -0,0 +1,672 @@
+# -*- coding: utf-8 -*-
+"""
+Esquema compacto (opcional) para los documentos de viajes HVFHV.
+
+Con decenas de millones de viajes la colección y sus índices dejan de caber
+en RAM. Cada documento repite nombres de campo largos ("congestion_surcharge"
+ocupa más que su valor), guarda la plataforma como string, los flags como
+"Y"/"N" y varios campos derivados de pickup_datetime. En el esquema compacto:
+
+    hvfhs_license_num      p     código entero (índice en PLATFORMS)
+    pickup_datetime        t     (resto de campos: claves cortas, ver FIELD_MAP)
+    tarifas                f     sub-documento {b, tl, bc, tx, cs, af, tp, dp, cb}; los nulos se omiten
+    *_flag                 fl    entero con 2 bits por flag: 'Y' → bit 2i, 'N' → bit 2i+1
+    pickup_hour, pickup_day_of_week, pickup_day_name, pickup_month,
+    pickup_date, trip_duration_minutes              no se guardan (se calculan)
+
+Capa de traducción: CompactCollection envuelve la colección y traduce los
+pipelines, filtros e índices escritos con los nombres originales, así que
+los pipelines del notebook (hvfhv_pipelines.py, report_engine.py,
+rollup.rebuild_rollup) se ejecutan sin cambios:
+
+    "$base_passenger_fare"        →  "$f.b"
+    "$hvfhs_license_num"          →  {$arrayElemAt: [PLATFORMS, "$p"]}
+    {$eq: ["$wav_request_flag", "Y"]}  →  comprobación del bit
+    "$pickup_hour"                →  {$hour: "$t"}
+
+La traducción se aplica hasta la primera etapa que cambia la forma del
+documento ($project de inclusión, $group, $facet, $replaceRoot...): a partir
+de ahí los nombres ya son los de la salida de esa etapa.
+
+Los flags con valores distintos de 'Y'/'N' se leen como null. Los campos
+source_file/source_row de la carga incremental se guardan sin cambios.
+
+Uso:
+    python cargar_datos_completo.py --compact       # carga en trips_2025_compact
+    python compact_schema.py --convert              # o convierte la colección existente
+    python compact_schema.py --report               # tamaño, índices y tiempos de ambos esquemas
+"""
+
+import argparse
+import datetime as dt
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+
+from bson.raw_bson import RawBSONDocument
+
+from aggregate_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+COMPACT_SUFFIX = '_compact'
+
+# El orden es parte del formato almacenado: solo se pueden añadir al final
+PLATFORMS = ['HV0002', 'HV0003', 'HV0004', 'HV0005']
+PLATFORM_CODES = {code: i for i, code in enumerate(PLATFORMS)}
+
+PLATFORM_FIELD = 'hvfhs_license_num'
+FLAGS_KEY = 'fl'
+FARES_KEY = 'f'
+
+# Campos renombrados (nombre original → clave corta)
+FIELD_MAP = {
+    PLATFORM_FIELD: 'p',
+    'dispatching_base_num': 'db',
+    'originating_base_num': 'ob',
+    'request_datetime': 'rq',
+    'on_scene_datetime': 'os',
+    'pickup_datetime': 't',
+    'dropoff_datetime': 'te',
+    'PULocationID': 'pu',
+    'DOLocationID': 'do',
+    'trip_miles': 'mi',
+    'trip_time': 'tt',
+    'sample_weight': 'sw',
+    'sample_stratum': 'ss',
+}
+
+# Componentes de la tarifa → clave dentro del sub-documento FARES_KEY
+FARE_MAP = {
+    'base_passenger_fare': 'b',
+    'tolls': 'tl',
+    'bcf': 'bc',
+    'sales_tax': 'tx',
+    'congestion_surcharge': 'cs',
+    'airport_fee': 'af',
+    'tips': 'tp',
+    'driver_pay': 'dp',
+    'cbd_congestion_fee': 'cb',
+}
+
+# Flag → posición (bits 2i = 'Y', 2i + 1 = 'N'); solo se pueden añadir al final
+FLAG_BITS = {
+    'shared_request_flag': 0,
+    'shared_match_flag': 1,
+    'access_a_ride_flag': 2,
+    'wav_request_flag': 3,
+    'wav_match_flag': 4,
+}
+
+DAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+_PICKUP = '$' + FIELD_MAP['pickup_datetime']
+_DROPOFF = '$' + FIELD_MAP['dropoff_datetime']
+
+# Campos derivados que no se guardan → expresión equivalente (mismos valores que clean_hvfhv_data)
+COMPUTED_FIELDS = {
+    'pickup_hour': {'$hour': _PICKUP},
+    # pandas: lunes = 0; $dayOfWeek: domingo = 1
+    'pickup_day_of_week': {'$mod': [{'$add': [{'$dayOfWeek': _PICKUP}, 5]}, 7]},
+    'pickup_day_name': {'$arrayElemAt': [DAY_NAMES, {'$subtract': [{'$dayOfWeek': _PICKUP}, 1]}]},
+    'pickup_month': {'$month': _PICKUP},
+    'pickup_date': {'$dateToString': {'format': '%Y-%m-%d', 'date': _PICKUP}},
+    'trip_duration_minutes': {'$divide': [{'$subtract': [_DROPOFF, _PICKUP]}, 60000]},
+}
+
+
+def short_path(field):
+    """Ruta compacta de un campo almacenado (None si no se renombra)."""
+    if field in FIELD_MAP:
+        return FIELD_MAP[field]
+    if field in FARE_MAP:
+        return f'{FARES_KEY}.{FARE_MAP[field]}'
+    return None
+
+
+# ==================== DOCUMENTOS ====================
+
+def compact_document(doc):
+    """Documento con los nombres originales (sanitize_for_mongo) → esquema compacto."""
+    out = {}
+    fares = {}
+    flags = 0
+    has_flags = False
+    for key, value in doc.items():
+        if key in COMPUTED_FIELDS:
+            continue
+        if key == PLATFORM_FIELD:
+            out['p'] = PLATFORM_CODES.get(value, value)
+        elif key in FLAG_BITS:
+            has_flags = True
+            if value == 'Y':
+                flags |= 1 << (2 * FLAG_BITS[key])
+            elif value == 'N':
+                flags |= 1 << (2 * FLAG_BITS[key] + 1)
+        elif key in FARE_MAP:
+            if value is not None:
+                fares[FARE_MAP[key]] = value
+        else:
+            out[FIELD_MAP.get(key, key)] = value
+    if fares:
+        out[FARES_KEY] = fares
+    if has_flags:
+        out[FLAGS_KEY] = flags
+    return out
+
+
+def expand_document(doc):
+    """Documento compacto → nombres originales (incluidos los campos derivados)."""
+    long_names = {short: field for field, short in FIELD_MAP.items()}
+    out = {}
+    for key, value in doc.items():
+        if key == 'p':
+            out[PLATFORM_FIELD] = PLATFORMS[value] if isinstance(value, int) else value
+        elif key == FARES_KEY:
+            fare_names = {short: field for field, short in FARE_MAP.items()}
+            out.update({fare_names.get(k, k): v for k, v in value.items()})
+        elif key == FLAGS_KEY:
+            for flag, i in FLAG_BITS.items():
+                out[flag] = 'Y' if value >> (2 * i) & 1 else 'N' if value >> (2 * i + 1) & 1 else None
+        else:
+            out[long_names.get(key, key)] = value
+
+    pickup, dropoff = out.get('pickup_datetime'), out.get('dropoff_datetime')
+    if isinstance(pickup, dt.datetime):
+        out['pickup_hour'] = pickup.hour
+        out['pickup_day_of_week'] = pickup.weekday()
+        out['pickup_day_name'] = pickup.strftime('%A')
+        out['pickup_month'] = pickup.month
+        out['pickup_date'] = pickup.strftime('%Y-%m-%d')
+        if isinstance(dropoff, dt.datetime):
+            out['trip_duration_minutes'] = (dropoff - pickup).total_seconds() / 60
+    return out
+
+
+# ==================== TRADUCCIÓN DE EXPRESIONES ====================
+
+def _bit_set(bit):
+    """Expresión: el bit `bit` de FLAGS_KEY está a 1."""
+    word = {'$ifNull': [f'${FLAGS_KEY}', 0]}
+    return {'$eq': [{'$mod': [{'$floor': {'$divide': [word, 2 ** bit]}}, 2]}, 1]}
+
+
+def _flag_expr(flag):
+    """Expresión que reconstruye el valor 'Y'/'N'/null de un flag."""
+    i = FLAG_BITS[flag]
+    return {'$switch': {'branches': [{'case': _bit_set(2 * i), 'then': 'Y'},
+                                     {'case': _bit_set(2 * i + 1), 'then': 'N'}],
+                        'default': None}}
+
+
+def _platform_expr():
+    return {'$cond': [{'$isNumber': '$p'}, {'$arrayElemAt': [PLATFORMS, '$p']}, '$p']}
+
+
+def _field_ref(node, shadowed):
+    """Traduce una referencia "$campo[.sub]" (devuelve el nodo si no es de un campo conocido)."""
+    field, _, rest = node[1:].partition('.')
+    if field in shadowed:
+        return node
+    if field == PLATFORM_FIELD:
+        return _platform_expr()
+    if field in FLAG_BITS:
+        return _flag_expr(field)
+    if field in COMPUTED_FIELDS:
+        return COMPUTED_FIELDS[field]
+    path = short_path(field)
+    if path is None:
+        return node
+    return f'${path}.{rest}' if rest else f'${path}'
+
+
+def _flag_comparison(node, shadowed):
+    """{$eq: ["$flag", "Y"|"N"]} → comprobación directa del bit (None si no aplica)."""
+    args = node.get('$eq')
+    if len(node) != 1 or not isinstance(args, list) or len(args) != 2:
+        return None
+    ref, value = args
+    if isinstance(value, str) and value.startswith('$'):
+        ref, value = value, ref
+    if not (isinstance(ref, str) and ref.startswith('$') and ref[1:] in FLAG_BITS and ref[1:] not in shadowed):
+        return None
+    if value not in ('Y', 'N'):
+        return None
+    return _bit_set(2 * FLAG_BITS[ref[1:]] + (value == 'N'))
+
+
+def translate_expr(node, shadowed=frozenset()):
+    """Traduce una expresión de agregación escrita con los nombres originales."""
+    if isinstance(node, str):
+        if node.startswith('$') and not node.startswith('$$'):
+            return _field_ref(node, shadowed)
+        return node
+    if isinstance(node, list):
+        return [translate_expr(v, shadowed) for v in node]
+    if isinstance(node, dict):
+        if '$literal' in node:
+            return node
+        flag_check = _flag_comparison(node, shadowed)
+        if flag_check is not None:
+            return flag_check
+        return {k: translate_expr(v, shadowed) for k, v in node.items()}
+    return node
+
+
+# ==================== TRADUCCIÓN DE FILTROS ====================
+
+_COMPARISONS = {'$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$in', '$nin'}
+
+
+def _as_expr(ref_expr, condition):
+    """Condición de consulta sobre un valor calculado → expresión para $expr."""
+    if not isinstance(condition, dict) or not any(k.startswith('$') for k in condition):
+        condition = {'$eq': condition}
+    clauses = []
+    for op, value in condition.items():
+        if op not in _COMPARISONS:
+            raise ValueError(f"Operador {op} no soportado sobre un campo calculado del esquema compacto")
+        if op == '$nin':
+            clauses.append({'$not': [{'$in': [ref_expr, value]}]})
+        else:
+            clauses.append({op: [ref_expr, value]})
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def _platform_value(value):
+    if isinstance(value, list):
+        return [PLATFORM_CODES.get(v, v) for v in value]
+    if isinstance(value, dict):
+        return {k: _platform_value(v) for k, v in value.items()}
+    return PLATFORM_CODES.get(value, value)
+
+
+def _flag_query(flag, value):
+    i = FLAG_BITS[flag]
+    if value == 'Y':
+        return {FLAGS_KEY: {'$bitsAllSet': [2 * i]}}
+    if value == 'N':
+        return {FLAGS_KEY: {'$bitsAllSet': [2 * i + 1]}}
+    if value is None:
+        return {FLAGS_KEY: {'$bitsAllClear': [2 * i, 2 * i + 1]}}
+    raise ValueError(f"Valor de {flag} no representable en el esquema compacto: {value!r}")
+
+
+def _flag_condition(flag, condition):
+    if not isinstance(condition, dict):
+        return _flag_query(flag, condition)
+    clauses = []
+    for op, value in condition.items():
+        if op == '$eq':
+            clauses.append(_flag_query(flag, value))
+        elif op == '$ne':
+            clauses.append({'$nor': [_flag_query(flag, value)]})
+        elif op == '$in':
+            clauses.append({'$or': [_flag_query(flag, v) for v in value]})
+        elif op == '$nin':
+            clauses.append({'$nor': [_flag_query(flag, v) for v in value]})
+        else:
+            raise ValueError(f"Operador {op} no soportado sobre {flag} en el esquema compacto")
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def translate_query(query, shadowed=frozenset()):
+    """Traduce un filtro de consulta ($match, count_documents, find...)."""
+    out = {}
+    extra = []
+    for key, condition in query.items():
+        if key in ('$and', '$or', '$nor'):
+            out[key] = [translate_query(q, shadowed) for q in condition]
+        elif key == '$expr':
+            out[key] = translate_expr(condition, shadowed)
+        elif key in shadowed:
+            out[key] = condition
+        elif key == PLATFORM_FIELD:
+            out['p'] = _platform_value(condition)
+        elif key in FLAG_BITS:
+            extra.append(_flag_condition(key, condition))
+        elif key in COMPUTED_FIELDS:
+            extra.append({'$expr': _as_expr(COMPUTED_FIELDS[key], condition)})
+        else:
+            field, _, rest = key.partition('.')
+            path = short_path(field)
+            out[(f'{path}.{rest}' if rest else path) if path else key] = condition
+    if extra:
+        out.setdefault('$and', []).extend(extra)
+    return out
+
+
+# ==================== TRADUCCIÓN DE PIPELINES ====================
+
+def _is_inclusion(projection):
+    """True si el $project define la forma de la salida (inclusión o expresiones)."""
+    return any(not (v in (0, False)) for k, v in projection.items() if k != '_id')
+
+
+def _sort_key(key, shadowed):
+    field, _, rest = key.partition('.')
+    if field in shadowed:
+        return key
+    if field == PLATFORM_FIELD or field in FLAG_BITS or field in COMPUTED_FIELDS:
+        raise ValueError(f"$sort por {key} no soportado antes de reagrupar en el esquema compacto")
+    path = short_path(field)
+    return (f'{path}.{rest}' if rest else path) if path else key
+
+
+def translate_pipeline(pipeline, shadowed=frozenset()):
+    """
+    Traduce un pipeline escrito con los nombres originales.
+
+    Solo se traducen las etapas que ven documentos de viaje; tras la primera
+    etapa que cambia la forma del documento el resto se copia tal cual.
+    """
+    shadowed = set(shadowed)
+    out = []
+    for n, stage in enumerate(pipeline):
+        (name, spec), = stage.items()
+        reshaped = True
+        if name == '$match':
+            spec, reshaped = translate_query(spec, shadowed), False
+        elif name == '$project':
+            if _is_inclusion(spec):
+                spec = {k: (translate_expr(f'${k}', shadowed) if v in (1, True) and k != '_id'
+                            else translate_expr(v, shadowed)) for k, v in spec.items()}
+            else:
+                spec = {_sort_key(k, shadowed) if k != '_id' else k: v for k, v in spec.items()}
+                reshaped = False
+        elif name in ('$addFields', '$set'):
+            spec = {k: translate_expr(v, shadowed) for k, v in spec.items()}
+            shadowed.update(k.split('.')[0] for k in spec)
+            reshaped = False
+        elif name == '$unset':
+            keys = [spec] if isinstance(spec, str) else spec
+            spec = [_sort_key(k, shadowed) for k in keys]
+            reshaped = False
+        elif name == '$sort':
+            spec = {_sort_key(k, shadowed): v for k, v in spec.items()}
+            reshaped = False
+        elif name in ('$limit', '$skip', '$sample'):
+            reshaped = False
+        elif name == '$unwind':
+            path = spec if isinstance(spec, str) else spec['path']
+            new_path = '$' + _sort_key(path[1:], shadowed)
+            spec = new_path if isinstance(spec, str) else {**spec, 'path': new_path}
+            reshaped = False
+        elif name == '$facet':
+            spec = {k: translate_pipeline(sub, shadowed) for k, sub in spec.items()}
+        elif name in ('$group', '$replaceRoot', '$replaceWith', '$bucket', '$bucketAuto', '$sortByCount'):
+            spec = translate_expr(spec, shadowed)
+        # $count, $merge, $out... se copian (y cambian la forma o cierran el pipeline)
+        out.append({name: spec})
+        if reshaped:
+            return out + [dict(s) for s in pipeline[n + 1:]]
+    return out
+
+
+def translate_index_keys(keys):
+    """Claves de índice → claves compactas (None si algún campo es calculado)."""
+    if isinstance(keys, str):
+        keys = [(keys, 1)]
+    translated = []
+    for field, direction in keys:
+        if field in COMPUTED_FIELDS or field in FLAG_BITS:
+            return None
+        translated.append((short_path(field) or field, direction))
+    return translated
+
+
+# ==================== COLECCIÓN ====================
+
+class CompactCursor:
+    """
+    Cursor de find() con los nombres originales.
+
+    sort() traduce los campos al esquema compacto; el resto de métodos
+    (limit, skip, batch_size, hint, max_time_ms...) se delegan en el cursor de
+    pymongo y, si este se devuelve a sí mismo, se devuelve este envoltorio para
+    poder encadenarlos. Los documentos se expanden al iterar.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self.cursor, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self.cursor else result
+        return chained
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            args = (_sort_key(key_or_list, frozenset()),) + (() if direction is None else (direction,))
+            self.cursor.sort(*args)
+        else:
+            items = key_or_list.items() if isinstance(key_or_list, dict) else key_or_list
+            self.cursor.sort([(_sort_key(k, frozenset()), d) for k, d in items])
+        return self
+
+    def clone(self):
+        return CompactCursor(self.cursor.clone())
+
+    def __getitem__(self, index):
+        # cursor[5:10] aplica skip/limit y devuelve el cursor; cursor[3] devuelve un documento
+        result = self.cursor[index]
+        return self if result is self.cursor else expand_document(result)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return expand_document(next(self.cursor))
+
+    next = __next__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+
+class CompactCollection:
+    """
+    Colección en esquema compacto con la interfaz de pymongo y los nombres originales.
+
+    Traduce aggregate, count_documents, distinct, find (CompactCursor), delete_many y
+    create_index; insert_many/insert_one compactan los documentos (los
+    RawBSONDocument de la carga paralela ya vienen compactados). El resto de
+    atributos (database, name, list_indexes...) son los de la colección real.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def aggregate(self, pipeline, **kwargs):
+        return self.collection.aggregate(translate_pipeline(pipeline), **kwargs)
+
+    def count_documents(self, filter, **kwargs):
+        return self.collection.count_documents(translate_query(filter), **kwargs)
+
+    def distinct(self, key, filter=None):
+        pipeline = [{'$match': filter or {}}, {'$group': {'_id': f'${key}'}}]
+        return [doc['_id'] for doc in self.aggregate(pipeline)]
+
+    def find(self, filter=None, *args, **kwargs):
+        return CompactCursor(self.collection.find(translate_query(filter or {}), *args, **kwargs))
+
+    def find_one(self, filter=None, *args, **kwargs):
+        doc = self.collection.find_one(translate_query(filter or {}), *args, **kwargs)
+        return expand_document(doc) if doc is not None else None
+
+    def delete_many(self, filter, **kwargs):
+        return self.collection.delete_many(translate_query(filter), **kwargs)
+
+    def create_index(self, keys, **kwargs):
+        """Índice con los nombres originales (los de campos calculados se omiten)."""
+        translated = translate_index_keys(keys)
+        if translated is None:
+            logger.info(f"Índice {keys} omitido: el campo no se guarda en el esquema compacto")
+            return None
+        return self.collection.create_index(translated, **kwargs)
+
+    def insert_many(self, documents, **kwargs):
+        docs = [d if isinstance(d, RawBSONDocument) else compact_document(d) for d in documents]
+        return self.collection.insert_many(docs, **kwargs)
+
+    def insert_one(self, document, **kwargs):
+        doc = document if isinstance(document, RawBSONDocument) else compact_document(document)
+        return self.collection.insert_one(doc, **kwargs)
+
+
+def convert_collection(source, target, batch_size=20000):
+    """
+    Copia una colección con el esquema original al esquema compacto.
+
+    Args:
+        source: Colección original
+        target (CompactCollection): Colección compacta de destino (se vacía)
+        batch_size (int): Documentos por insert_many
+
+    Returns:
+        int: Documentos convertidos
+    """
+    target.collection.delete_many({})
+    total = 0
+    batch = []
+    for doc in source.find({}, batch_size=batch_size):
+        batch.append(compact_document(doc))
+        if len(batch) >= batch_size:
+            target.collection.insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        target.collection.insert_many(batch, ordered=False)
+        total += len(batch)
+
+    # Mismos índices que la colección original (salvo los de campos calculados)
+    for index in source.list_indexes():
+        if index['name'] == '_id_':
+            continue
+        options = {k: index[k] for k in ('name', 'unique', 'sparse') if k in index}
+        if 'partialFilterExpression' in index:
+            options['partialFilterExpression'] = translate_query(index['partialFilterExpression'])
+        target.create_index(list(index['key'].items()), **options)
+    bump_data_version(target)
+    logger.info(f"📦 {total:,} documentos convertidos a {target.name}")
+    return total
+
+
+# ==================== INFORME ====================
+
+def collection_size(collection):
+    """Tamaños de collStats (bytes sin escalar)."""
+    stats = collection.database.command('collStats', collection.name)
+    return {
+        'count': stats.get('count', 0),
+        'avg_obj_size': stats.get('avgObjSize', 0),
+        'size': stats.get('size', 0),
+        'storage_size': stats.get('storageSize', 0),
+        'total_index_size': stats.get('totalIndexSize', 0),
+        'index_sizes': stats.get('indexSizes', {}),
+    }
+
+
+def _median_seconds(func, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def compare_layouts(standard, compact, start, end, repeats=3):
+    """
+    Tamaño de datos e índices y tiempos de consulta de ambos esquemas.
+
+    Los tiempos son la mediana de `repeats` ejecuciones de cada sección del
+    notebook (report_engine.notebook_report, sin caché) y del informe completo.
+    También comprueba que los resultados son idénticos.
+
+    Returns:
+        dict: Informe (ver --report)
+    """
+    import hvfhv_pipelines as hp
+    from report_engine import notebook_report
+
+    window = hp.match_base(start, end)
+    sections = notebook_report(standard, start, end).sections
+
+    report = {'window': [start.isoformat(), end.isoformat()], 'repeats': repeats,
+              'layouts': {}, 'queries': {}, 'results_match': {}}
+    for label, coll in (('standard', standard), ('compact', compact)):
+        report['layouts'][label] = collection_size(coll)
+        report['layouts'][label]['count_window'] = coll.count_documents(window)
+
+    for name, (match, stages) in sections.items():
+        pipeline = hp.with_match(match, stages)
+        timings = {}
+        for label, coll in (('standard', standard), ('compact', compact)):
+            timings[label] = _median_seconds(lambda: list(coll.aggregate(pipeline, allowDiskUse=True)), repeats)
+        report['queries'][name] = timings
+        report['results_match'][name] = (list(standard.aggregate(pipeline, allowDiskUse=True))
+                                         == list(compact.aggregate(pipeline, allowDiskUse=True)))
+
+    report['queries']['full_report'] = {
+        label: _median_seconds(lambda: notebook_report(coll, start, end).run(), repeats)
+        for label, coll in (('standard', standard), ('compact', compact))
+    }
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Esquema compacto de la colección de viajes")
+    parser.add_argument('--convert', action='store_true', help="Crea la colección compacta desde la original")
+    parser.add_argument('--report', action='store_true', help="Compara tamaño, índices y tiempos de ambos esquemas")
+    parser.add_argument('--start', default='2025-01-01')
+    parser.add_argument('--end', default='2025-07-01')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default=str(Path(__file__).resolve().parent / 'outputs' / 'compact_schema_report.json'))
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    from cargar_datos_completo import COLLECTION_NAME, DATABASE_NAME, MONGO_URI
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    args = parse_args()
+    db = MongoClient(MONGO_URI)[DATABASE_NAME]
+    standard = db[COLLECTION_NAME]
+    compact = CompactCollection(db[COLLECTION_NAME + COMPACT_SUFFIX])
+
+    if args.convert:
+        convert_collection(standard, compact)
+
+    if args.report:
+        start, end = dt.datetime.fromisoformat(args.start), dt.datetime.fromisoformat(args.end)
+        report = compare_layouts(standard, compact, start, end, args.repeats)
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+        std, cmp_ = report['layouts']['standard'], report['layouts']['compact']
+        print(f"\n{'':24s}{'original':>16s}{'compacto':>16s}{'ahorro':>10s}")
+        for key, label in (('avg_obj_size', 'Tamaño medio doc (B)'), ('size', 'Datos (B)'),
+                           ('storage_size', 'Almacenamiento (B)'), ('total_index_size', 'Índices (B)')):
+            saved = (1 - cmp_[key] / std[key]) * 100 if std[key] else 0.0
+            print(f"{label:24s}{std[key]:>16,.0f}{cmp_[key]:>16,.0f}{saved:>9.1f}%")
+        print()
+        for name, t in report['queries'].items():
+            ok = report['results_match'].get(name, True)
+            print(f"{'✅' if ok else '❌'} {name:20s}{t['standard']:>10.3f} s{t['compact']:>10.3f} s")
+        print(f"\n📄 Informe guardado en {args.output}")
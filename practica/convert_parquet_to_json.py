@@ -1,16 +1,43 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Script para convertir archivos Parquet a JSON (OPCIONAL)
+Script para convertir archivos Parquet a NDJSON o BSON para mongoimport / mongorestore (OPCIONAL)
 NO ES NECESARIO para el proyecto - el notebook ya hace la conversión directa.
 
+Exportación en streaming: cada fichero se lee por record batches y cada
+batch se codifica y se escribe antes de leer el siguiente, así que la
+memoria no depende del tamaño del fichero (un mes de 20M filas ocupa lo
+mismo que uno de 1M).
+
+- NDJSON: la codificación es columnar con pyarrow.compute (cada columna se
+  convierte a texto JSON una vez por batch y las líneas se unen
+  elemento a elemento); las fechas se escriben como Extended JSON
+  {"$date": "...Z"} (mongoimport las guarda como Date) o como string ISO.
+  Los números enteros/decimales conservan su tipo (3.0 se escribe "3.0",
+  no "3"), los NaN/nulos se escriben null, igual que df.to_json().
+- BSON: documentos concatenados (formato de mongodump) para mongorestore.
+- Compresión opcional gzip o zstd (streams comprimidos de pyarrow).
+- convert_all_parquet_files() convierte varios ficheros en paralelo
+  (un proceso por fichero).
+
 Uso:
-    python convert_parquet_to_json.py
+    python convert_parquet_to_json.py                              # ./data → NDJSON
+    python convert_parquet_to_json.py --compression zstd --workers 4
+    python convert_parquet_to_json.py --format bson --compression gzip
 """
 
-import pandas as pd
-from pathlib import Path
+import argparse
+import json
 import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from ingest_metrics import peak_rss_mb
 
 # Configurar logging
 logging.basicConfig(
@@ -19,152 +46,313 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 100000
+FORMATS = ('ndjson', 'bson')
+COMPRESSIONS = (None, 'gzip', 'zstd')
+DATETIME_MODES = ('extended', 'iso')
+COMPRESSION_SUFFIX = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+# ==================== CODIFICACIÓN JSON (COLUMNAR) ====================
+
+def _json_strings(col):
+    """Strings escapados para JSON (json.dumps una vez por valor distinto)."""
+    if not pa.types.is_dictionary(col.type):
+        col = pc.cast(col, pa.string()).dictionary_encode()
+    dictionary = col.dictionary.cast(pa.string())
+    escaped = pa.array([json.dumps(v) for v in dictionary.to_pylist()], pa.string())
+    return pc.fill_null(escaped.take(col.indices), 'null')
+
+
+def _json_numbers(col):
+    """Números como texto JSON; los decimales enteros mantienen el '.0' (siguen siendo double)."""
+    if pa.types.is_floating(col.type):
+        col = pc.if_else(pc.is_finite(col), col, pa.scalar(None, col.type))
+        text = pc.cast(col, pa.string())
+        integral = pc.match_substring_regex(text, r'^-?[0-9]+$')
+        return pc.fill_null(pc.if_else(integral, pc.binary_join_element_wise(text, '.0', ''), text), 'null')
+    return pc.fill_null(pc.cast(col, pa.string()), 'null')
+
+
+def _json_datetimes(col, datetime_mode):
+    """Fechas como {"$date": "...Z"} (extended) o "YYYY-MM-DDTHH:MM:SS.mmm" (iso), en UTC."""
+    if pa.types.is_timestamp(col.type):
+        # Los valores ya son UTC: se quita la zona sin convertir
+        col = col.view(pa.int64()).view(pa.timestamp(col.type.unit))
+    col = pc.cast(col, pa.timestamp('ms'), safe=False)
+    text = pc.strftime(col, format='%Y-%m-%dT%H:%M:%S')
+    if datetime_mode == 'extended':
+        text = pc.binary_join_element_wise('{"$date":"', text, 'Z"}', '')
+    else:
+        text = pc.binary_join_element_wise('"', text, '"', '')
+    return pc.fill_null(text, 'null')
+
+
+def _json_values(col, datetime_mode):
+    """Texto JSON de cada valor de una columna (sin nulos: null)."""
+    t = col.type
+    if pa.types.is_timestamp(t) or pa.types.is_date(t):
+        return _json_datetimes(col, datetime_mode)
+    if pa.types.is_boolean(t):
+        return pc.fill_null(pc.cast(col, pa.string()), 'null')
+    if pa.types.is_integer(t) or pa.types.is_floating(t):
+        return _json_numbers(col)
+    return _json_strings(col)
+
+
+def ndjson_batch(batch, datetime_mode='extended'):
+    """
+    Codifica un record batch como NDJSON (un documento por línea).
+
+    Returns:
+        pa.Buffer: Bytes de todas las líneas (terminadas en '\\n')
+    """
+    parts = []
+    for i, (name, col) in enumerate(zip(batch.schema.names, batch.columns)):
+        parts.append(('{' if i == 0 else ',') + json.dumps(name) + ':')
+        parts.append(_json_values(col, datetime_mode))
+    parts.append('}\n')
+    lines = pc.binary_join_element_wise(*parts, '')
+    # Las líneas están contiguas en el buffer de datos del StringArray
+    _, offsets_buffer, data = lines.buffers()
+    offset_type = pa.int64() if pa.types.is_large_string(lines.type) else pa.int32()
+    offsets = pa.Array.from_buffers(offset_type, len(lines) + 1, [None, offsets_buffer], offset=lines.offset)
+    start, end = offsets[0].as_py(), offsets[-1].as_py()
+    return data[start:end]
+
+
+# ==================== CODIFICACIÓN BSON ====================
+
+def bson_batch(batch):
+    """Codifica un record batch como documentos BSON concatenados (formato .bson de mongodump)."""
+    from arrow_bson import encode_record_batch  # por columnas, sin to_pylist()
+    return b''.join(encode_record_batch(batch))
+
+
+# ==================== CONVERSIÓN ====================
+
+def output_path(parquet_file, output_dir, fmt='ndjson', compression=None):
+    """Ruta del fichero exportado (.json / .bson + .gz / .zst)."""
+    ext = '.json' if fmt == 'ndjson' else '.bson'
+    return Path(output_dir) / f"{Path(parquet_file).stem}{ext}{COMPRESSION_SUFFIX[compression]}"
 
-def convert_parquet_to_json(parquet_file, output_dir='./data', sample_rows=None):
+
+def convert_parquet_to_json(parquet_file, output_dir='./data', sample_rows=None, fmt='ndjson',
+                            compression=None, datetime_mode='extended', batch_size=DEFAULT_BATCH_SIZE,
+                            columns=None):
     """
-    Convierte un archivo Parquet a JSON (NDJSON format).
-    
+    Convierte un archivo Parquet a NDJSON o BSON en streaming.
+
     Args:
         parquet_file (Path): Ruta al archivo Parquet
         output_dir (str): Directorio de salida
         sample_rows (int, optional): Número de filas a exportar (None = todas)
-    
+        fmt (str): 'ndjson' (mongoimport) o 'bson' (mongorestore)
+        compression (str, optional): None, 'gzip' o 'zstd'
+        datetime_mode (str): 'extended' ({"$date": ...}, se importan como Date) o 'iso' (strings)
+        batch_size (int): Filas por record batch (acota la memoria)
+        columns (list, optional): Columnas a exportar (None = todas)
+
     Returns:
-        Path: Ruta al archivo JSON generado
+        dict: Ruta generada, filas, tiempos y rendimiento (filas/s, MB/s)
     """
+    if fmt not in FORMATS or compression not in COMPRESSIONS or datetime_mode not in DATETIME_MODES:
+        raise ValueError(f"Opciones no válidas: fmt={fmt}, compression={compression}, datetime_mode={datetime_mode}")
+    parquet_file = Path(parquet_file)
     try:
         logger.info(f"🔄 Procesando: {parquet_file.name}")
-        
-        # Leer Parquet
-        df = pd.read_parquet(parquet_file, engine='pyarrow')
-        total_rows = len(df)
+
+        parquet = pq.ParquetFile(parquet_file)
+        total_rows = parquet.metadata.num_rows
         logger.info(f"   📊 Total de filas en Parquet: {total_rows:,}")
-        
-        # Limitar filas si se especifica
         if sample_rows and sample_rows < total_rows:
-            df = df.head(sample_rows)
             logger.info(f"   ✂️  Exportando solo {sample_rows:,} filas")
-        
-        # Convertir columnas datetime a string (requerido para JSON)
-        datetime_cols = df.select_dtypes(include=['datetime64']).columns
-        for col in datetime_cols:
-            df[col] = df[col].astype(str)
-            logger.info(f"   ✓ Convertido {col} a string")
-        
-        # Definir archivo de salida
-        output_file = Path(output_dir) / f"{parquet_file.stem}.json"
-        
-        # Exportar a JSON (NDJSON - newline delimited JSON)
-        # orient='records' → Cada fila es un objeto JSON
-        # lines=True → Cada objeto en una línea (formato para mongoimport)
-        df.to_json(output_file, orient='records', lines=True, date_format='iso')
-        
+
+        output_file = output_path(parquet_file, output_dir, fmt, compression)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+
+        t0 = time.perf_counter()
+        rows = raw_bytes = 0
+        with pa.output_stream(str(output_file), compression=compression) as out:
+            for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+                if sample_rows is not None:
+                    if rows >= sample_rows:
+                        break
+                    batch = batch.slice(0, sample_rows - rows)
+                data = ndjson_batch(batch, datetime_mode) if fmt == 'ndjson' else bson_batch(batch)
+                out.write(data)
+                rows += batch.num_rows
+                raw_bytes += len(data)
+        elapsed = time.perf_counter() - t0
+
         # Información del archivo generado
-        file_size_mb = output_file.stat().st_size / (1024 * 1024)
-        logger.info(f"✅ JSON generado: {output_file.name}")
-        logger.info(f"   💾 Tamaño: {file_size_mb:.2f} MB")
-        logger.info(f"   📄 Registros: {len(df):,}")
-        
-        return output_file
-    
+        stats = {
+            'input': str(parquet_file),
+            'output': str(output_file),
+            'format': fmt,
+            'compression': compression,
+            'rows': rows,
+            'seconds': elapsed,
+            'input_mb': parquet_file.stat().st_size / (1024 * 1024),
+            'output_mb': output_file.stat().st_size / (1024 * 1024),
+            'uncompressed_mb': raw_bytes / (1024 * 1024),
+            'rows_per_s': rows / elapsed if elapsed else 0.0,
+            'mb_per_s': raw_bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+        logger.info(f"✅ Generado: {output_file.name}")
+        logger.info(f"   💾 Tamaño: {stats['output_mb']:.2f} MB ({stats['uncompressed_mb']:.2f} MB sin comprimir)")
+        logger.info(f"   📄 Registros: {rows:,}")
+        logger.info(f"   ⚡ {stats['rows_per_s']:,.0f} filas/s | {stats['mb_per_s']:.1f} MB/s")
+
+        return stats
+
     except Exception as e:
         logger.error(f"❌ Error al convertir {parquet_file.name}: {str(e)}")
         raise
 
 
-def convert_all_parquet_files(data_dir='./data', sample_rows=None):
+def convert_all_parquet_files(data_dir='./data', sample_rows=None, workers=None, output_dir=None, **options):
     """
-    Convierte todos los archivos Parquet en un directorio a JSON.
-    
+    Convierte todos los archivos Parquet de un directorio, en paralelo.
+
     Args:
         data_dir (str): Directorio que contiene archivos Parquet
         sample_rows (int, optional): Número de filas por archivo
-    
+        workers (int, optional): Procesos en paralelo (None = uno por core, 1 = secuencial)
+        output_dir (str, optional): Directorio de salida (None = data_dir)
+        **options: fmt, compression, datetime_mode, batch_size, columns (ver convert_parquet_to_json)
+
     Returns:
-        list: Lista de archivos JSON generados
+        list: Estadísticas de cada archivo generado
     """
     data_path = Path(data_dir)
-    
+    output_dir = output_dir or data_dir
+
     if not data_path.exists():
         logger.error(f"❌ El directorio {data_dir} no existe")
         return []
-    
+
     # Buscar archivos Parquet
-    parquet_files = list(data_path.glob('*.parquet'))
-    
+    parquet_files = sorted(data_path.glob('*.parquet'))
+
     if not parquet_files:
         logger.warning(f"⚠️  No se encontraron archivos .parquet en {data_dir}")
         return []
-    
+
     logger.info(f"📂 Encontrados {len(parquet_files)} archivos Parquet")
     logger.info("="*80)
-    
-    json_files = []
-    
-    for idx, parquet_file in enumerate(parquet_files, 1):
-        logger.info(f"\n[{idx}/{len(parquet_files)}] Procesando archivo...")
-        
-        try:
-            json_file = convert_parquet_to_json(parquet_file, data_dir, sample_rows)
-            json_files.append(json_file)
-        except Exception as e:
-            logger.error(f"⚠️  Saltando {parquet_file.name} debido a error")
-            continue
-    
+
+    results = []
+    t0 = time.perf_counter()
+    if workers == 1:
+        for parquet_file in parquet_files:
+            try:
+                results.append(convert_parquet_to_json(parquet_file, output_dir, sample_rows, **options))
+            except Exception:
+                logger.error(f"⚠️  Saltando {parquet_file.name} debido a error")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(convert_parquet_to_json, f, output_dir, sample_rows, **options): f
+                       for f in parquet_files}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception:
+                    logger.error(f"⚠️  Saltando {futures[future].name} debido a error")
+    elapsed = time.perf_counter() - t0
+
+    rows = sum(r['rows'] for r in results)
+    mb = sum(r['uncompressed_mb'] for r in results)
     logger.info("\n" + "="*80)
-    logger.info(f"🎉 Conversión completada: {len(json_files)}/{len(parquet_files)} archivos")
-    
-    return json_files
+    logger.info(f"🎉 Conversión completada: {len(results)}/{len(parquet_files)} archivos")
+    if elapsed > 0:
+        logger.info(f"⚡ Total: {rows:,} filas en {elapsed:.1f} s ({rows / elapsed:,.0f} filas/s, {mb / elapsed:.1f} MB/s)")
+
+    return sorted(results, key=lambda r: r['output'])
 
 
-def import_to_mongodb_instructions(json_files, db_name='nyc_hvfhv_db', collection_name='trips'):
+def import_to_mongodb_instructions(results, db_name='nyc_hvfhv_db', collection_name='trips'):
     """
-    Muestra las instrucciones para importar JSON a MongoDB usando mongoimport.
-    
+    Muestra las instrucciones para importar los ficheros con mongoimport / mongorestore.
+
     Args:
-        json_files (list): Lista de archivos JSON
+        results (list): Estadísticas devueltas por convert_all_parquet_files
         db_name (str): Nombre de la base de datos
         collection_name (str): Nombre de la colección
     """
-    if not json_files:
+    if not results:
         return
-    
+
     print("\n" + "="*80)
     print("📋 INSTRUCCIONES PARA IMPORTAR A MONGODB")
     print("="*80)
     print("\nEjecutar estos comandos en PowerShell:\n")
-    
-    for json_file in json_files:
-        print(f"# Importar {json_file.name}")
-        print(f'mongoimport --uri "mongodb://localhost:27017/" `')
-        print(f'            --db {db_name} `')
-        print(f'            --collection {collection_name} `')
-        print(f'            --file "{json_file}" `')
-        print(f'            --jsonArray')
+
+    for res in results:
+        output = Path(res['output'])
+        print(f"# Importar {output.name}")
+        if res['format'] == 'bson':
+            if res['compression'] == 'zstd':
+                print(f'# (mongorestore no lee zstd: descomprimir antes con  zstd -d "{output}")')
+                output = output.with_suffix('')
+            print(f'mongorestore --uri "mongodb://localhost:27017/" `')
+            print(f'             --db {db_name} `')
+            print(f'             --collection {collection_name} `')
+            if res['compression'] == 'gzip':
+                print(f'             --gzip `')
+            print(f'             "{output}"')
+        else:
+            # NDJSON: un documento por línea → SIN --jsonArray
+            if res['compression'] == 'gzip':
+                print(f'# (mongoimport no lee gzip: descomprimir antes, p. ej.  gzip -d "{output}")')
+                output = output.with_suffix('')
+            elif res['compression'] == 'zstd':
+                print(f'# (mongoimport no lee zstd: descomprimir antes con  zstd -d "{output}")')
+                output = output.with_suffix('')
+            print(f'mongoimport --uri "mongodb://localhost:27017/" `')
+            print(f'            --db {db_name} `')
+            print(f'            --collection {collection_name} `')
+            print(f'            --file "{output}"')
         print()
-    
+
     print("="*80)
     print("⚠️  NOTA: Este método es MENOS EFICIENTE que usar el notebook.")
     print("💡 RECOMENDACIÓN: Usa el notebook HVFHV_MongoDB_Analysis.ipynb")
     print("="*80)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Exporta Parquet a NDJSON/BSON para mongoimport/mongorestore")
+    parser.add_argument('data_dir', nargs='?', default='./data')
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default='ndjson')
+    parser.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='none')
+    parser.add_argument('--datetime', dest='datetime_mode', choices=DATETIME_MODES, default='extended',
+                        help="extended: {\"$date\": ...} (Date en MongoDB); iso: strings ISO 8601")
+    parser.add_argument('--sample-rows', type=int, default=None, help="Filas por archivo (None = todas)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=None, help="Procesos en paralelo (1 = secuencial)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    print("🔄 CONVERTIDOR PARQUET → JSON PARA MONGODB")
+    print("🔄 CONVERTIDOR PARQUET → NDJSON / BSON PARA MONGODB")
     print("="*80)
     print("⚠️  ADVERTENCIA: Este script NO es necesario para el proyecto.")
     print("💡 El notebook ya convierte Parquet → MongoDB directamente.")
     print("="*80)
     print()
-    
-    # Configuración
-    DATA_DIR = './data'
-    SAMPLE_ROWS = None  # None = exportar todas las filas
-    # SAMPLE_ROWS = 10000  # Descomentar para exportar solo 10K filas
-    
+
+    args = parse_args()
+
     # Convertir archivos
-    json_files = convert_all_parquet_files(DATA_DIR, sample_rows=SAMPLE_ROWS)
-    
+    results = convert_all_parquet_files(
+        args.data_dir, sample_rows=args.sample_rows, workers=args.workers, output_dir=args.output_dir,
+        fmt=args.fmt, compression=None if args.compression == 'none' else args.compression,
+        datetime_mode=args.datetime_mode, batch_size=args.batch_size,
+    )
+
     # Mostrar instrucciones de importación
-    if json_files:
-        import_to_mongodb_instructions(json_files)
+    if results:
+        import_to_mongodb_instructions(results)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Limpieza de datos HVFHV compartida por los scripts de carga.
+
+Vive en su propio módulo para que los procesos worker de la carga en
+paralelo (parallel_ingest.py) puedan importarla.
+
+Modo ligero (lean=True): mismos filtros y mismas columnas, con tipos más
+pequeños para que el DataFrame limpio ocupe menos memoria:
+
+    category    plataforma, bases, flags, pickup_day_name y pickup_date ('YYYY-MM-DD')
+    float32     importes y millas, solo si redondeando a sus decimales se
+                recuperan exactamente los float64 originales
+    int8/16/32  enteros (zonas, trip_time, hora, día, mes)
+
+Las filas se filtran en una sola pasada (cada columna se copia una vez, ya
+filtrada) y con memory_budget_mb el trabajo se hace por bloques de filas.
+Los documentos que salen son idénticos: las columnas float32 se restauran
+con float64_values() al codificar (arrow_bson.py, mongo_sanitize.py) y al
+sumar (rollup.py, od_matrix.py). Comparación de memoria: bench_cleaning.py.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Versión de la limpieza: súbela al cambiar filtros, tipos o columnas derivadas
+# (invalida las muestras limpias guardadas en sample_cache.py)
+CLEANING_VERSION = 1
+MAX_DURATION_MIN = 300  # Menos de 5 horas
+MAX_MILES = 100
+DATETIME_COLS = ['pickup_datetime', 'dropoff_datetime', 'request_datetime', 'on_scene_datetime']
+
+# Modo ligero: columnas de texto con pocos valores distintos → category
+CATEGORY_COLUMNS = ['hvfhs_license_num', 'dispatching_base_num', 'originating_base_num', 'shared_request_flag',
+                    'shared_match_flag', 'access_a_ride_flag', 'wav_request_flag', 'wav_match_flag']
+# Columnas float64 que pueden ir en float32 → decimales con los que se restauran
+FLOAT32_DECIMALS = {
+    'base_passenger_fare': 2, 'tolls': 2, 'bcf': 2, 'sales_tax': 2, 'congestion_surcharge': 2,
+    'airport_fee': 2, 'tips': 2, 'driver_pay': 2, 'trip_miles': 3,
+}
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Memoria de trabajo estimada por byte de fila de entrada (columna filtrada + conversiones)
+LEAN_WORK_FACTOR = 2
+MIN_CHUNK_ROWS = 10000
+
+
+def clean_hvfhv_data(df, lean=False, memory_budget_mb=None):
+    """
+    Limpia y prepara datos HVFHV.
+
+    Args:
+        df (pd.DataFrame): Muestra leída del Parquet
+        lean (bool): Modo ligero (tipos pequeños, mismos documentos)
+        memory_budget_mb (float, optional): Memoria de trabajo máxima del modo
+            ligero; si la muestra no cabe se limpia por bloques de filas
+
+    Returns:
+        pd.DataFrame: Viajes válidos con las columnas derivadas
+    """
+    print("🧹 Limpiando datos...")
+    if lean:
+        df = _clean_lean_chunked(df, memory_budget_mb)
+        print(f"✅ Datos limpios: {len(df):,} filas "
+              f"(modo ligero, {df.memory_usage(deep=True).sum() / (1024 * 1024):,.1f} MB)")
+        return df
+
+    # Convertir columnas datetime
+    for col in DATETIME_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    # Calcular duración del viaje
+    df['trip_duration_minutes'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
+
+    # Filtrar valores extremos
+    df = df[
+        (df['trip_duration_minutes'] > 0) &
+        (df['trip_duration_minutes'] <= MAX_DURATION_MIN) &
+        (df['trip_miles'] > 0) &
+        (df['trip_miles'] <= MAX_MILES)
+    ]
+
+    # Crear columnas temporales
+    df['pickup_hour'] = df['pickup_datetime'].dt.hour
+    df['pickup_day_of_week'] = df['pickup_datetime'].dt.dayofweek
+    df['pickup_day_name'] = df['pickup_datetime'].dt.day_name()
+    df['pickup_month'] = df['pickup_datetime'].dt.month
+    df['pickup_date'] = df['pickup_datetime'].dt.date
+
+    print(f"✅ Datos limpios: {len(df):,} filas")
+    return df
+
+
+def float64_values(s):
+    """
+    Valores float64 de una columna numérica.
+
+    Las columnas float32 del modo ligero (FLOAT32_DECIMALS) se redondean a sus
+    decimales, lo que devuelve exactamente los float64 originales.
+    """
+    values = s.to_numpy(dtype='float64', na_value=np.nan)
+    decimals = FLOAT32_DECIMALS.get(s.name)
+    if s.dtype == np.float32 and decimals is not None:
+        values = np.round(values, decimals)
+    return values
+
+
+# ==================== MODO LIGERO ====================
+
+def _clean_lean_chunked(df, memory_budget_mb=None):
+    """Modo ligero, por bloques de filas si la memoria de trabajo supera memory_budget_mb."""
+    chunk_rows = len(df)
+    if memory_budget_mb and len(df) > 0:
+        row_bytes = df.memory_usage(index=False).sum() / len(df)
+        chunk_rows = max(MIN_CHUNK_ROWS, int(memory_budget_mb * 1024 * 1024 / (row_bytes * LEAN_WORK_FACTOR)))
+    if chunk_rows >= len(df):
+        return _clean_lean(df)
+    print(f"   Limpieza por bloques de {chunk_rows:,} filas (presupuesto {memory_budget_mb:,.0f} MB)")
+    return _concat_lean([_clean_lean(df.iloc[start:start + chunk_rows])
+                         for start in range(0, len(df), chunk_rows)])
+
+
+def _clean_lean(df):
+    """clean_hvfhv_data() con tipos pequeños y un único filtrado de filas."""
+    pickup = _as_datetime(df['pickup_datetime'])
+    dropoff = _as_datetime(df['dropoff_datetime'])
+    duration = (dropoff - pickup).dt.total_seconds() / 60
+    miles = df['trip_miles']
+    keep = ((duration > 0) & (duration <= MAX_DURATION_MIN) & (miles > 0) & (miles <= MAX_MILES)).to_numpy()
+    rows = np.flatnonzero(keep)
+
+    # Cada columna se copia una sola vez, ya filtrada y con su tipo final (mismo orden de columnas).
+    # Se añaden una a una: el constructor con un dict volvería a copiarlas al consolidar bloques
+    out = pd.DataFrame(index=df.index[rows])
+    for col in df.columns:
+        if col == 'pickup_datetime':
+            s = pickup
+        elif col == 'dropoff_datetime':
+            s = dropoff
+        elif col in DATETIME_COLS:
+            s = _as_datetime(df[col])
+        else:
+            s = df[col]
+        out[col] = _lean_column(col, s.take(rows))
+
+    pickup = pickup.take(rows)
+    day_of_week = pickup.dt.dayofweek.to_numpy().astype(np.int8)
+    out['trip_duration_minutes'] = duration.to_numpy()[rows]
+    out['pickup_hour'] = pickup.dt.hour.to_numpy().astype(np.int8)
+    out['pickup_day_of_week'] = day_of_week
+    out['pickup_day_name'] = pd.Categorical.from_codes(day_of_week, categories=DAY_NAMES)
+    out['pickup_month'] = pickup.dt.month.to_numpy().astype(np.int8)
+    out['pickup_date'] = _date_strings(pickup)
+    return out
+
+
+def _as_datetime(s):
+    # pd.to_datetime recorre la columna aunque ya sea datetime64
+    return s if pd.api.types.is_datetime64_any_dtype(s.dtype) else pd.to_datetime(s, errors='coerce')
+
+
+def _lean_column(col, s):
+    """Columna filtrada con el tipo más pequeño que conserva sus valores."""
+    dtype = s.dtype
+    if col in CATEGORY_COLUMNS and not isinstance(dtype, pd.CategoricalDtype):
+        return pd.Categorical(s)
+    if col in FLOAT32_DECIMALS and dtype == np.float64:
+        values = s.to_numpy()
+        narrow = values.astype(np.float32)
+        if np.array_equal(np.round(narrow.astype(np.float64), FLOAT32_DECIMALS[col]), values, equal_nan=True):
+            return narrow
+        return values
+    if isinstance(dtype, np.dtype) and dtype.kind == 'i':
+        return pd.to_numeric(s, downcast='integer').to_numpy()
+    return s.array
+
+
+def _date_strings(pickup):
+    """pickup_date como category de strings 'YYYY-MM-DD' (lo que se guarda en MongoDB)."""
+    codes, days = pd.factorize(pickup.dt.floor('D'))
+    return pd.Categorical.from_codes(codes, categories=days.strftime('%Y-%m-%d'))
+
+
+def _concat_lean(parts):
+    """
+    Une los bloques columna a columna (cada columna de los bloques se libera al
+    copiarla, así que no hay dos copias completas a la vez): categorías
+    unificadas y float32 solo si lo es en todos los bloques.
+    """
+    parts = [p for p in parts if len(p)] or parts[:1]
+    if len(parts) == 1:
+        return parts[0]
+    out = pd.DataFrame(index=parts[0].index.append([p.index for p in parts[1:]]))
+    for col in list(parts[0].columns):
+        columns = [p.pop(col) for p in parts]
+        dtypes = [c.dtype for c in columns]
+        if isinstance(dtypes[0], pd.CategoricalDtype):
+            out[col] = union_categoricals([c.array for c in columns])
+        elif any(d == np.float32 for d in dtypes) and any(d != np.float32 for d in dtypes):
+            out[col] = np.concatenate([float64_values(c) for c in columns])
+        else:
+            out[col] = pd.concat(columns, ignore_index=True).array
+    return out
@@ -0,0 +1,566 @@
+# -*- coding: utf-8 -*-
+"""
+Pipelines de agregación de las secciones del notebook HVFHV_MongoDB_Analysis_FINAL.
+
+Cada función devuelve las etapas que van DESPUÉS del $match de la ventana
+temporal (match_base), tal y como están escritas en las celdas del notebook.
+Así el mismo pipeline se puede ejecutar suelto:
+
+    collection.aggregate(with_match(match_base, hourly_stages()))
+
+o combinado con el resto de secciones en una sola pasada (report_engine.py).
+
+Las secciones añaden estimaciones ponderadas de la población (<medida>_est)
+con su varianza (<medida>_var), ver weighted_sums() y stratified_sampler.py.
+Las medias, cuotas y porcentajes se calculan con esas sumas ponderadas
+(Σ w·x / Σ w) y los top-N se ordenan por la estimación: con un plan
+estratificado los recuentos de la muestra no son proporcionales a la población.
+"""
+
+# Componentes de "revenue" (mismo orden que en el notebook)
+REVENUE_FIELDS = ['base_passenger_fare', 'tolls', 'tips', 'congestion_surcharge', 'airport_fee']
+TOTAL_COST_FIELDS = ['base_passenger_fare', 'tolls', 'bcf', 'sales_tax', 'congestion_surcharge', 'airport_fee']
+
+# Peso de muestreo de cada viaje (stratified_sampler.py); las cargas 1 de N no lo guardan
+WEIGHT_FIELD = 'sample_weight'
+DEFAULT_WEIGHT = 40
+
+
+def match_base(start, end, platforms=None):
+    """$match de la ventana temporal (y plataformas) usado en todas las secciones."""
+    match = {"pickup_datetime": {"$gte": start, "$lt": end}}
+    if platforms:
+        match['hvfhs_license_num'] = {'$in': list(platforms)}
+    return match
+
+
+def with_match(match, stages):
+    """Pipeline completo: $match de la ventana + etapas de la sección."""
+    return [{"$match": match}] + list(stages)
+
+
+def _ifnull(field):
+    return {"$ifNull": [f"${field}", 0]}
+
+
+def _revenue():
+    return {"$add": [_ifnull(f) for f in REVENUE_FIELDS]}
+
+
+def _flag(field, value='Y'):
+    return {"$eq": [f"${field}", value]}
+
+
+def _count_if(condition):
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+def _pct(numerator, denominator):
+    return {"$multiply": [{"$divide": [numerator, denominator]}, 100]}
+
+
+def _pct_if_positive(numerator, denominator):
+    return {"$multiply": [{"$cond": [{"$gt": [denominator, 0]}, {"$divide": [numerator, denominator]}, 0]}, 100]}
+
+
+def _weight():
+    """Peso del viaje (DEFAULT_WEIGHT si el documento no lo guarda)."""
+    return {"$ifNull": [f"${WEIGHT_FIELD}", DEFAULT_WEIGHT]}
+
+
+def weighted_sums(name, value=None, weight=None):
+    """
+    Acumuladores $group del estimador de Horvitz-Thompson de un total.
+
+    <name>_est = Σ w·y y <name>_var = Σ w(w - 1)·y² (varianza estimada).
+
+    Args:
+        name (str): Prefijo de los campos de salida
+        value (dict | str, optional): Expresión y de cada viaje (None = recuento)
+        weight (dict | str, optional): Expresión del peso (por defecto sample_weight)
+    """
+    w = weight if weight is not None else _weight()
+    w_w1 = {"$multiply": [w, {"$subtract": [w, 1]}]}
+    if value is None:
+        return {f"{name}_est": {"$sum": w}, f"{name}_var": {"$sum": w_w1}}
+    return {f"{name}_est": {"$sum": {"$multiply": [w, value]}},
+            f"{name}_var": {"$sum": {"$multiply": [w_w1, value, value]}}}
+
+
+def _weighted_count_if(name, condition):
+    return weighted_sums(name, {"$cond": [condition, 1, 0]})
+
+
+def _weighted_fields(*names):
+    """Proyección de las estimaciones (redondeadas) y sus varianzas."""
+    fields = {}
+    for name in names:
+        fields[f"{name}_est"] = {"$round": [f"${name}_est", 2]}
+        fields[f"{name}_var"] = 1
+    return fields
+
+
+def _weighted_mean(total, count, scale=1):
+    """Media ponderada redondeada Σ w·x / (Σ w · scale) a partir de dos acumuladores <name>_est."""
+    denominator = f"${count}_est" if scale == 1 else {"$multiply": [f"${count}_est", scale]}
+    return {"$round": [{"$divide": [f"${total}_est", denominator]}, 2]}
+
+
+# ==================== TEMPORALES ====================
+
+def _time_stages(key, expr):
+    return [
+        {"$project": {key: expr, "revenue": _revenue(), "fare": _ifnull('base_passenger_fare'), "w": _weight()}},
+        {"$group": {
+            "_id": f"${key}",
+            "trips": {"$sum": 1},
+            "total_revenue": {"$sum": "$revenue"},
+            "avg_fare": {"$avg": "$fare"},
+            **weighted_sums("trips", weight="$w"),
+            **weighted_sums("revenue", "$revenue", weight="$w"),
+        }},
+        {"$project": {
+            "_id": 0,
+            key: "$_id",
+            "trips": 1,
+            "total_revenue": {"$round": ["$total_revenue", 2]},
+            "avg_fare": {"$round": ["$avg_fare", 2]},
+            **_weighted_fields("trips", "revenue"),
+        }},
+        {"$sort": {key: 1}},
+    ]
+
+
+def hourly_stages():
+    """pipeline_hourly (4.1)."""
+    return _time_stages('hour', {"$hour": "$pickup_datetime"})
+
+
+def daily_stages():
+    """pipeline_daily (4.2): day_of_week con 1 = domingo."""
+    return _time_stages('day_of_week', {"$dayOfWeek": "$pickup_datetime"})
+
+
+def monthly_stages():
+    """pipeline_monthly (4.3)."""
+    return _time_stages('month', {"$month": "$pickup_datetime"})
+
+
+def day_hour_stages():
+    """pipeline_day_hour (mapa de calor día × hora)."""
+    return [
+        {"$project": {
+            "day_of_week": {"$dayOfWeek": "$pickup_datetime"},
+            "hour": {"$hour": "$pickup_datetime"},
+            "revenue": _revenue(),
+            "w": _weight(),
+        }},
+        {"$group": {
+            "_id": {"day": "$day_of_week", "hour": "$hour"},
+            "trips": {"$sum": 1},
+            "total_revenue": {"$sum": "$revenue"},
+            **weighted_sums("trips", weight="$w"),
+            **weighted_sums("revenue", "$revenue", weight="$w"),
+        }},
+        {"$project": {
+            "_id": 0,
+            "day_of_week": "$_id.day",
+            "hour": "$_id.hour",
+            "trips": 1,
+            "total_revenue": {"$round": ["$total_revenue", 2]},
+            **_weighted_fields("trips", "revenue"),
+        }},
+        {"$sort": {"day_of_week": 1, "hour": 1}},
+    ]
+
+
+# ==================== ECONÓMICAS ====================
+
+def revenue_stages():
+    """pipeline_revenue: suma de cada componente de la tarifa."""
+    names = {'base_fare': 'base_passenger_fare', 'tolls': 'tolls', 'tips': 'tips',
+             'congestion': 'congestion_surcharge', 'airport_fee': 'airport_fee',
+             'bcf': 'bcf', 'sales_tax': 'sales_tax'}
+    estimates = {}
+    for out, field in names.items():
+        estimates.update(weighted_sums(out, _ifnull(field)))
+    return [
+        {"$group": {
+            "_id": None,
+            **{out: {"$sum": _ifnull(field)} for out, field in names.items()},
+            "trip_count": {"$sum": 1},
+            **estimates,
+            **weighted_sums("trip_count"),
+        }},
+        {"$project": {"_id": 0, **{out: {"$round": [f"${out}", 2]} for out in names}, "trip_count": 1,
+                      **_weighted_fields(*names, "trip_count")}},
+    ]
+
+
+def driver_stages():
+    """pipeline_driver: economía del conductor (driver_pay > 0 y coste total > 0)."""
+    return [
+        {"$project": {
+            "driver_pay": _ifnull('driver_pay'),
+            "total_cost": {"$add": [_ifnull(f) for f in TOTAL_COST_FIELDS]},
+            "tips": _ifnull('tips'),
+            "trip_miles": _ifnull('trip_miles'),
+            "trip_time_minutes": {"$divide": [_ifnull('trip_time'), 60]},
+            "w": _weight(),
+        }},
+        {"$match": {"driver_pay": {"$gt": 0}, "total_cost": {"$gt": 0}}},
+        {"$project": {
+            "driver_pay": 1,
+            "total_cost": 1,
+            "tips": 1,
+            "platform_cut": {"$subtract": ["$total_cost", "$driver_pay"]},
+            "pay_per_mile": {"$cond": [{"$gt": ["$trip_miles", 0]}, {"$divide": ["$driver_pay", "$trip_miles"]}, 0]},
+            "pay_per_minute": {"$cond": [
+                {"$gt": ["$trip_time_minutes", 0]}, {"$divide": ["$driver_pay", "$trip_time_minutes"]}, 0]},
+            "w": 1,
+        }},
+        {"$group": {
+            "_id": None,
+            "total_driver_earnings": {"$sum": "$driver_pay"},
+            "total_platform_revenue": {"$sum": "$platform_cut"},
+            "trip_count": {"$sum": 1},
+            **weighted_sums("total_driver_earnings", "$driver_pay", weight="$w"),
+            **weighted_sums("total_platform_revenue", "$platform_cut", weight="$w"),
+            **weighted_sums("total_cost", "$total_cost", weight="$w"),
+            **weighted_sums("tips", "$tips", weight="$w"),
+            **weighted_sums("pay_per_mile", "$pay_per_mile", weight="$w"),
+            **weighted_sums("pay_per_minute", "$pay_per_minute", weight="$w"),
+            **weighted_sums("trip_count", weight="$w"),
+        }},
+        {"$project": {
+            "_id": 0,
+            "avg_driver_pay": _weighted_mean("total_driver_earnings", "trip_count"),
+            "avg_total_cost": _weighted_mean("total_cost", "trip_count"),
+            "avg_platform_cut": _weighted_mean("total_platform_revenue", "trip_count"),
+            "total_driver_earnings": {"$round": ["$total_driver_earnings", 2]},
+            "total_platform_revenue": {"$round": ["$total_platform_revenue", 2]},
+            "avg_tips": _weighted_mean("tips", "trip_count"),
+            "avg_pay_per_mile": _weighted_mean("pay_per_mile", "trip_count"),
+            "avg_pay_per_minute": _weighted_mean("pay_per_minute", "trip_count"),
+            "trip_count": 1,
+            **_weighted_fields("total_driver_earnings", "total_platform_revenue", "trip_count"),
+        }},
+    ]
+
+
+# ==================== ACCESIBILIDAD Y VIAJES COMPARTIDOS ====================
+
+def wav_stages():
+    """pipeline_wav: solicitudes y asignaciones de vehículos accesibles."""
+    both = {"$and": [_flag('wav_request_flag'), _flag('wav_match_flag')]}
+    return [
+        {"$group": {
+            "_id": None,
+            "wav_requests": _count_if(_flag('wav_request_flag')),
+            "wav_matches": _count_if(_flag('wav_match_flag')),
+            "both_request_and_match": _count_if(both),
+            "match_without_request": _count_if(
+                {"$and": [_flag('wav_request_flag', 'N'), _flag('wav_match_flag')]}),
+            "total_trips": {"$sum": 1},
+            **_weighted_count_if("wav_requests", _flag('wav_request_flag')),
+            **_weighted_count_if("both_request_and_match", both),
+            **_weighted_count_if("match_without_request",
+                                 {"$and": [_flag('wav_request_flag', 'N'), _flag('wav_match_flag')]}),
+            **weighted_sums("total_trips"),
+        }},
+        {"$project": {
+            "_id": 0,
+            "wav_requests": 1,
+            "wav_matches": 1,
+            "both_request_and_match": 1,
+            "match_without_request": 1,
+            "total_trips": 1,
+            "fulfillment_rate": _pct_if_positive("$both_request_and_match", "$wav_requests"),
+            **_weighted_fields("wav_requests", "both_request_and_match", "match_without_request", "total_trips"),
+        }},
+    ]
+
+
+def wav_platform_stages():
+    """pipeline_platform de la sección WAV: tasa de cumplimiento por plataforma."""
+    both = {"$and": [_flag('wav_request_flag'), _flag('wav_match_flag')]}
+    return [
+        {"$group": {
+            "_id": "$hvfhs_license_num",
+            "wav_requests": _count_if(_flag('wav_request_flag')),
+            "both_request_and_match": _count_if(both),
+            "total_trips": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "platform": "$_id",
+            "wav_requests": 1,
+            "both_request_and_match": 1,
+            "fulfillment_rate": _pct_if_positive("$both_request_and_match", "$wav_requests"),
+        }},
+        {"$sort": {"fulfillment_rate": -1}},
+    ]
+
+
+def shared_stages():
+    """pipeline_shared: adopción y tasa de emparejamiento de viajes compartidos."""
+    return [
+        {"$group": {
+            "_id": None,
+            "shared_requests": _count_if(_flag('shared_request_flag')),
+            "shared_matches": _count_if(_flag('shared_match_flag')),
+            "total_trips": {"$sum": 1},
+            **_weighted_count_if("shared_requests", _flag('shared_request_flag')),
+            **_weighted_count_if("shared_matches", _flag('shared_match_flag')),
+            **weighted_sums("total_trips"),
+        }},
+        {"$project": {
+            "_id": 0,
+            "shared_requests": 1,
+            "shared_matches": 1,
+            "total_trips": 1,
+            **_weighted_fields("shared_requests", "shared_matches", "total_trips"),
+            "match_rate": _pct_if_positive("$shared_matches", "$shared_requests"),
+            "adoption_rate": _pct("$shared_requests", "$total_trips"),
+        }},
+    ]
+
+
+def shared_hourly_stages():
+    """pipeline_hourly_shared: adopción de viajes compartidos por hora."""
+    return [
+        {"$project": {
+            "hour": {"$hour": "$pickup_datetime"},
+            "is_shared": {"$cond": [_flag('shared_request_flag'), 1, 0]},
+        }},
+        {"$group": {"_id": "$hour", "shared_trips": {"$sum": "$is_shared"}, "total_trips": {"$sum": 1}}},
+        {"$project": {
+            "_id": 0,
+            "hour": "$_id",
+            "shared_trips": 1,
+            "adoption_pct": _pct("$shared_trips", "$total_trips"),
+        }},
+        {"$sort": {"hour": 1}},
+    ]
+
+
+# ==================== PLATAFORMAS ====================
+
+def platform_stages():
+    """pipeline_platform: comparativa multi-métrica por plataforma."""
+    return [
+        {"$project": {
+            "platform": "$hvfhs_license_num",
+            "revenue": _revenue(),
+            "trip_miles": _ifnull('trip_miles'),
+            "trip_time_sec": _ifnull('trip_time'),
+            "shared_request": {"$cond": [_flag('shared_request_flag'), 1, 0]},
+            "wav_request": {"$cond": [_flag('wav_request_flag'), 1, 0]},
+            "base_fare": _ifnull('base_passenger_fare'),
+            "tips": _ifnull('tips'),
+            "w": _weight(),
+        }},
+        {"$group": {
+            "_id": "$platform",
+            "trip_count": {"$sum": 1},
+            "total_revenue": {"$sum": "$revenue"},
+            "total_miles": {"$sum": "$trip_miles"},
+            **weighted_sums("trip_count", weight="$w"),
+            **weighted_sums("total_revenue", "$revenue", weight="$w"),
+            **weighted_sums("total_miles", "$trip_miles", weight="$w"),
+            **weighted_sums("base_fare", "$base_fare", weight="$w"),
+            **weighted_sums("tips", "$tips", weight="$w"),
+            **weighted_sums("trip_time_sec", "$trip_time_sec", weight="$w"),
+            **weighted_sums("shared_requests", "$shared_request", weight="$w"),
+            **weighted_sums("wav_requests", "$wav_request", weight="$w"),
+        }},
+        {"$project": {
+            "_id": 0,
+            "platform": "$_id",
+            "trip_count": 1,
+            "total_revenue": {"$round": ["$total_revenue", 2]},
+            "avg_fare": _weighted_mean("base_fare", "trip_count"),
+            "avg_tip": _weighted_mean("tips", "trip_count"),
+            "total_miles": {"$round": ["$total_miles", 2]},
+            "avg_miles": _weighted_mean("total_miles", "trip_count"),
+            "avg_duration_min": _weighted_mean("trip_time_sec", "trip_count", 60),
+            "shared_adoption_pct": {"$round": [_pct("$shared_requests_est", "$trip_count_est"), 2]},
+            "wav_adoption_pct": {"$round": [_pct("$wav_requests_est", "$trip_count_est"), 2]},
+            **_weighted_fields("trip_count", "total_revenue", "total_miles"),
+        }},
+        {"$sort": {"trip_count_est": -1}},
+    ]
+
+
+def fleet_evolution_stages():
+    """pipeline_fleet_evolution: viajes por plataforma y mes."""
+    return [
+        {"$project": {
+            "platform": "$hvfhs_license_num",
+            "month": {"$month": "$pickup_datetime"},
+            "year": {"$year": "$pickup_datetime"},
+            "w": _weight(),
+        }},
+        {"$group": {
+            "_id": {"platform": "$platform", "month": "$month", "year": "$year"},
+            "trip_count": {"$sum": 1},
+            **weighted_sums("trip_count", weight="$w"),
+        }},
+        {"$project": {
+            "_id": 0,
+            "platform": "$_id.platform",
+            "month": "$_id.month",
+            "year": "$_id.year",
+            "trip_count": 1,
+            **_weighted_fields("trip_count"),
+        }},
+        {"$sort": {"month": 1}},
+    ]
+
+
+# ==================== GEOGRÁFICAS ====================
+
+def pickup_locations_stages(limit=50):
+    """pipeline_locations: zonas de recogida con más viajes."""
+    return [
+        {"$group": {
+            "_id": "$PULocationID",
+            "trip_count": {"$sum": 1},
+            "total_revenue": {"$sum": _revenue()},
+            **weighted_sums("trip_count"),
+            **weighted_sums("total_revenue", _revenue()),
+            **weighted_sums("fare", _ifnull('base_passenger_fare')),
+        }},
+        {"$project": {
+            "_id": 0,
+            "location_id": "$_id",
+            "trip_count": 1,
+            "total_revenue": {"$round": ["$total_revenue", 2]},
+            "avg_fare": _weighted_mean("fare", "trip_count"),
+            **_weighted_fields("trip_count", "total_revenue"),
+        }},
+        {"$sort": {"trip_count_est": -1}},
+        {"$limit": limit},
+    ]
+
+
+def dropoff_locations_stages(limit=30):
+    """pipeline_dropoff: zonas de destino con más viajes."""
+    return [
+        {"$group": {
+            "_id": "$DOLocationID",
+            "trip_count": {"$sum": 1},
+            **weighted_sums("trip_count"),
+            **weighted_sums("fare", _ifnull('base_passenger_fare')),
+        }},
+        {"$project": {"_id": 0, "location_id": "$_id", "trip_count": 1,
+                      "avg_fare": _weighted_mean("fare", "trip_count"), **_weighted_fields("trip_count")}},
+        {"$sort": {"trip_count_est": -1}},
+        {"$limit": limit},
+    ]
+
+
+def top_pickups_stages(limit=15):
+    """pipeline_top_pickups: zonas de recogida más activas."""
+    return [
+        {"$group": {"_id": "$PULocationID", "pickup_count": {"$sum": 1}, **weighted_sums("pickup_count")}},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$sort": {"pickup_count_est": -1}},
+        {"$limit": limit},
+    ]
+
+
+def _od_filter_and_project(limit, min_trips):
+    # min_trips en viajes de la muestra 1 de DEFAULT_WEIGHT (la estimación ponderada / DEFAULT_WEIGHT)
+    return [
+        {"$match": {
+            "_id.destination": {"$ne": None},
+            "trip_count_est": {"$gte": min_trips * DEFAULT_WEIGHT},
+            "avg_distance": {"$gte": 0.5, "$lte": 20},
+        }},
+        {"$project": {
+            "_id": 0,
+            "origin": "$_id.origin",
+            "destination": "$_id.destination",
+            "trip_count": 1,
+            "avg_fare": {"$round": ["$avg_fare", 2]},
+            "avg_distance": {"$round": ["$avg_distance", 2]},
+            **_weighted_fields("trip_count"),
+        }},
+        {"$sort": {"trip_count_est": -1}},
+        {"$limit": limit},
+    ]
+
+
+def _od_group():
+    return [
+        {"$group": {
+            "_id": {"origin": "$PULocationID", "destination": "$DOLocationID"},
+            "trip_count": {"$sum": 1},
+            **weighted_sums("trip_count"),
+            **weighted_sums("fare", _ifnull('base_passenger_fare')),
+            **weighted_sums("distance", _ifnull('trip_miles')),
+        }},
+        {"$set": {
+            "avg_fare": {"$divide": ["$fare_est", "$trip_count_est"]},
+            "avg_distance": {"$divide": ["$distance_est", "$trip_count_est"]},
+        }},
+    ]
+
+
+def od_flows_stages(top_pickup_zones, limit=30, min_trips=50):
+    """pipeline_od: flujos origen-destino desde las zonas de recogida indicadas."""
+    stages = _od_group() + _od_filter_and_project(limit, min_trips)
+    stages[2]["$match"]["_id.origin"] = {"$ne": None, "$in": list(top_pickup_zones)}
+    return stages
+
+
+def od_flows_from_top_pickups_stages(top_n=15, limit=30, min_trips=50):
+    """
+    pipeline_od sin la consulta previa de top pickups.
+
+    Las zonas más activas se calculan dentro del mismo pipeline sumando los
+    pares origen-destino de cada origen, así la sección entera cabe en una
+    sola pasada (mismo resultado que top_pickups_stages + od_flows_stages).
+
+    Cada origen guarda solo sus `limit` pares con más viajes de entre los que
+    pasan el filtro final ($topN en lugar de $push de todos sus pares): ningún
+    otro par puede llegar al top global, y los documentos por origen no crecen
+    con el número de destinos (la sección va dentro del $facet de report_engine).
+    """
+    passes = {"$and": [
+        {"$ne": [{"$ifNull": ["$_id.destination", None]}, None]},
+        {"$gte": ["$trip_count_est", min_trips * DEFAULT_WEIGHT]},
+        {"$gte": ["$avg_distance", 0.5]},
+        {"$lte": ["$avg_distance", 20]},
+    ]}
+    return _od_group() + [
+        {"$match": {"_id.origin": {"$ne": None}}},
+        # Los pares que no pasan el filtro van al final del $topN (y se descartan después)
+        {"$set": {"rank": {"$cond": [passes, "$trip_count_est", -1]}}},
+        {"$group": {
+            "_id": "$_id.origin",
+            "pickup_count_est": {"$sum": "$trip_count_est"},
+            "pairs": {"$topN": {"n": limit, "sortBy": {"rank": -1}, "output": {
+                "_id": "$_id", "trip_count": "$trip_count",
+                "trip_count_est": "$trip_count_est", "trip_count_var": "$trip_count_var",
+                "avg_fare": "$avg_fare", "avg_distance": "$avg_distance",
+            }}},
+        }},
+        {"$sort": {"pickup_count_est": -1}},
+        {"$limit": top_n},
+        {"$unwind": "$pairs"},
+        {"$replaceRoot": {"newRoot": "$pairs"}},
+    ] + _od_filter_and_project(limit, min_trips)
+
+
+def rush_hour_stages(first_hour, last_hour, limit=20):
+    """pipeline_morning / pipeline_evening: zonas con más recogidas entre dos horas (incluidas)."""
+    return [
+        {"$project": {"location_id": "$PULocationID", "hour": {"$hour": "$pickup_datetime"}, "w": _weight()}},
+        {"$match": {"hour": {"$gte": first_hour, "$lte": last_hour}}},
+        {"$group": {"_id": "$location_id", "trip_count": {"$sum": 1}, **weighted_sums("trip_count", weight="$w")}},
+        {"$project": {"_id": 0, "location_id": "$_id", "trip_count": 1, **_weighted_fields("trip_count")}},
+        {"$sort": {"trip_count_est": -1}},
+        {"$limit": limit},
+    ]
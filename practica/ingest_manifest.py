@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+Carga incremental y reanudable con un manifiesto de ingesta.
+
+En lugar de delete_many({}) + recargar todos los meses, la colección
+`ingest_manifest` guarda por cada fichero fuente:
+
+    _id                    nombre del fichero (fhvhv_tripdata_2025-05.parquet)
+    size / mtime_ns        tamaño y fecha de modificación
+    checksum               SHA-256 del contenido
+    settings               parámetros de muestreo (sample_rate, método, semilla, columnas
+                           y, en el muestreo estratificado, el plan por estrato)
+    num_row_groups         row groups del fichero
+    committed_row_groups   row groups ya insertados y confirmados
+    status                 'in_progress' | 'complete'
+    inserted               documentos insertados
+
+Cada documento de viaje lleva `source_file` y `source_row` (índice global de
+la fila en el Parquet) con un índice único, así que reintentar un row group
+a medio insertar no crea duplicados.
+
+Al volver a ejecutar la carga:
+- ficheros completos con el mismo checksum y parámetros → se saltan
+- ficheros a medias → se reanudan desde el primer row group sin confirmar
+- ficheros nuevos → se cargan
+- ficheros cambiados (o con otros parámetros) → se borran solo sus documentos y se recargan
+- ficheros que ya no existen (prune_missing=True) → se borran sus documentos
+
+El rollup (rollup.py), las matrices OD (od_matrix.py) y los sketches de
+percentiles (quantile_sketch.py) se mantienen por source_file con el mismo
+criterio: se suman los bloques recién insertados y se recalcula desde los
+viajes la parte de un fichero reanudado o con incidencias.
+"""
+
+import datetime as dt
+import hashlib
+import os
+
+import numpy as np
+import pyarrow.parquet as pq
+from pymongo import ASCENDING
+
+from adaptive_writer import AdaptiveBulkWriter
+from aggregate_cache import bump_data_version
+from arrow_bson import documents_for
+from compact_schema import CompactCollection
+from ingest_metrics import measure
+from od_matrix import ODStore
+from parquet_sampler import read_sampled_parquet
+from quantile_sketch import SketchStore
+from rollup import ROLLUP_COLLECTION, apply_rollup, ensure_rollup_indexes, rebuild_rollup, remove_rollup_source
+from stratified_sampler import SamplingPlan, read_stratified_parquet
+
+MANIFEST_COLLECTION = 'ingest_manifest'
+SOURCE_FILE_FIELD = 'source_file'
+SOURCE_ROW_FIELD = 'source_row'
+SOURCE_INDEX_NAME = 'source_file_row_unique'
+
+
+def file_checksum(path, chunk_size=8 * 1024 * 1024):
+    """SHA-256 del fichero leído por bloques."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path, previous=None):
+    """
+    Tamaño, mtime y checksum del fichero.
+
+    Si el tamaño y el mtime coinciden con la entrada previa del manifiesto se
+    reutiliza su checksum (evita releer meses que no han cambiado).
+    """
+    st = os.stat(path)
+    fingerprint = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if previous and previous.get('size') == st.st_size and previous.get('mtime_ns') == st.st_mtime_ns:
+        fingerprint['checksum'] = previous['checksum']
+    else:
+        fingerprint['checksum'] = file_checksum(path)
+    return fingerprint
+
+
+def sample_settings(sample_rate, method='systematic', seed=None, columns=None, sampling_plan=None):
+    """Parámetros que, si cambian, obligan a recargar el fichero."""
+    settings = {'sample_rate': int(sample_rate), 'method': method, 'seed': seed,
+                'columns': list(columns) if columns is not None else None}
+    if sampling_plan is not None:
+        settings.update({'method': 'stratified', 'plan': sampling_plan.to_dict()})
+    return settings
+
+
+def read_sample(path, settings, batch_size=100000, row_groups=None, row_index_column=None):
+    """Muestra de un fichero según los parámetros del manifiesto (1 de N o estratificada)."""
+    if settings.get('plan') is not None:
+        return read_stratified_parquet(path, SamplingPlan.from_dict(settings['plan']), columns=settings['columns'],
+                                       batch_size=batch_size, row_groups=row_groups,
+                                       row_index_column=row_index_column)
+    return read_sampled_parquet(path, sample_rate=settings['sample_rate'], columns=settings['columns'],
+                                method=settings['method'], seed=settings['seed'], batch_size=batch_size,
+                                row_groups=row_groups, row_index_column=row_index_column)
+
+
+def ensure_source_index(collection):
+    """Índice único (source_file, source_row) que impide duplicados al reintentar."""
+    collection.create_index(
+        [(SOURCE_FILE_FIELD, ASCENDING), (SOURCE_ROW_FIELD, ASCENDING)],
+        name=SOURCE_INDEX_NAME, unique=True,
+        partialFilterExpression={SOURCE_FILE_FIELD: {'$exists': True}},
+    )
+
+
+class IngestManifest:
+    """Acceso a la colección de manifiesto."""
+
+    def __init__(self, db, collection_name=MANIFEST_COLLECTION):
+        self.collection = db[collection_name]
+
+    def get(self, filename):
+        return self.collection.find_one({'_id': filename})
+
+    def entries(self):
+        return list(self.collection.find())
+
+    def start(self, filename, fingerprint, settings, num_row_groups):
+        """Crea (o reinicia) la entrada de un fichero antes de cargarlo."""
+        self.collection.replace_one({'_id': filename}, {
+            '_id': filename,
+            **fingerprint,
+            'settings': settings,
+            'num_row_groups': num_row_groups,
+            'committed_row_groups': [],
+            'inserted': 0,
+            'status': 'in_progress',
+            'started_at': dt.datetime.utcnow(),
+        }, upsert=True)
+
+    def commit_row_groups(self, filename, row_groups, inserted):
+        """Marca row groups como insertados (tras confirmar la escritura)."""
+        self.collection.update_one({'_id': filename}, {
+            '$addToSet': {'committed_row_groups': {'$each': list(row_groups)}},
+            '$inc': {'inserted': inserted},
+            '$set': {'updated_at': dt.datetime.utcnow()},
+        })
+
+    def complete(self, filename, inserted=None):
+        update = {'status': 'complete', 'completed_at': dt.datetime.utcnow()}
+        if inserted is not None:
+            update['inserted'] = inserted
+        self.collection.update_one({'_id': filename}, {'$set': update})
+
+    def remove(self, filename):
+        self.collection.delete_one({'_id': filename})
+
+
+def remove_source_file(collection, manifest, filename, rollup=None, od_store=None, sketch_store=None):
+    """
+    Borra los documentos de un fichero (mes), su parte del rollup, de las
+    matrices OD y de los sketches, y su entrada del manifiesto.
+    """
+    result = collection.delete_many({SOURCE_FILE_FIELD: filename})
+    bump_data_version(collection)
+    if rollup is not None:
+        remove_rollup_source(rollup, filename)
+    if od_store is not None:
+        od_store.remove(filename)
+    if sketch_store is not None:
+        sketch_store.remove(filename)
+    manifest.remove(filename)
+    print(f"🗑️  {filename}: {result.deleted_count:,} documentos eliminados")
+    return result.deleted_count
+
+
+def plan_incremental_load(parquet_files, manifest, settings):
+    """
+    Decide qué hacer con cada fichero.
+
+    Returns:
+        list: Tuplas (acción, ruta, fingerprint, entrada previa) con acción en
+              'skip' | 'new' | 'resume' | 'reload'
+    """
+    plan = []
+    for path in parquet_files:
+        filename = os.path.basename(path)
+        entry = manifest.get(filename)
+        fingerprint = file_fingerprint(path, entry)
+        if entry is None:
+            action = 'new'
+        elif entry['checksum'] != fingerprint['checksum'] or entry.get('settings') != settings:
+            action = 'reload'
+        elif entry.get('status') == 'complete':
+            action = 'skip'
+        else:
+            action = 'resume'
+        plan.append((action, path, fingerprint, entry))
+    return plan
+
+
+def insert_documents(df, collection, batch_size=20000, metrics=None, filename=None, writer=None):
+    """
+    Inserta un DataFrame etiquetado con source_file/source_row.
+
+    Los errores de clave duplicada (filas ya insertadas en un intento previo)
+    no cuentan como error. Los lotes los forma `writer` (AdaptiveBulkWriter,
+    ver adaptive_writer.py; sin writer, uno nuevo con lotes iniciales de
+    batch_size): si agota los reintentos lanza InsertRetriesExhausted y el
+    bloque no se confirma en el manifiesto. Con metrics (ingest_metrics.py)
+    se mide la codificación y cada insert_many.
+
+    Returns:
+        tuple: (insertados, duplicados)
+    """
+    raw = not isinstance(collection, CompactCollection)
+    with measure(metrics, 'encode' if raw else 'sanitize', file=filename, rows_in=len(df)) as rec:
+        records = documents_for(df, collection)
+        rec['bytes'] = sum(len(doc.raw) for doc in records) if raw else None
+
+    writer = writer or AdaptiveBulkWriter(collection, initial_batch=batch_size, metrics=metrics, verbose=False)
+    total_inserted, total_duplicates = writer.write(records, filename)
+
+    if total_inserted:
+        bump_data_version(collection)
+    return total_inserted, total_duplicates
+
+
+def load_file_incremental(path, collection, manifest, clean_func, settings, fingerprint, entry=None,
+                          batch_size=20000, read_batch_size=100000, row_groups_per_commit=1, rollup=None,
+                          od_store=None, metrics=None, clean_options=None, writer=None, sketch_store=None,
+                          cache=None):
+    """
+    Carga (o reanuda) un fichero confirmando el avance por bloques de row groups.
+
+    Si se pasa `rollup` (o `od_store`, `sketch_store`), cada bloque insertado
+    sin incidencias se suma al rollup (o a las matrices OD, a los sketches). Al reanudar, o si algún bloque
+    tuvo duplicados o errores, la parte de este fichero se recalcula desde
+    los viajes al terminar. Con metrics se mide cada etapa por bloque.
+    clean_options se pasa a clean_func (p. ej. {'lean': True}) y writer
+    (AdaptiveBulkWriter) a insert_documents. Con cache (SampleCache) la
+    muestra limpia de los row groups pendientes se toma de una vez con
+    load_clean_sample (de sample_cache.py si está) y se reparte por bloques.
+
+    Returns:
+        int: Documentos insertados en esta ejecución
+    """
+    filename = os.path.basename(path)
+    num_row_groups = pq.ParquetFile(path).metadata.num_row_groups
+
+    if entry is None:
+        manifest.start(filename, fingerprint, settings, num_row_groups)
+        if od_store is not None:
+            od_store.remove(filename)
+        if sketch_store is not None:
+            sketch_store.remove(filename)
+        committed = set()
+    else:
+        committed = set(entry.get('committed_row_groups', []))
+
+    pending = [rg for rg in range(num_row_groups) if rg not in committed]
+    print(f"   Row groups pendientes: {len(pending)}/{num_row_groups}")
+
+    sample = None
+    if cache is not None and pending:
+        from sample_cache import load_clean_sample, row_group_of
+
+        sample, _, hit = load_clean_sample(path, clean_func, settings, clean_options, cache, read_batch_size,
+                                           row_groups=pending if entry is not None else None, row_index=True,
+                                           metrics=metrics)
+        sample_groups, _ = row_group_of(path, sample[SOURCE_ROW_FIELD].to_numpy())
+        if hit:
+            print(f"   ♻️  Muestra limpia desde la caché: {len(sample):,} filas")
+
+    inserted_total = 0
+    rebuild_needed = entry is not None
+    for start in range(0, len(pending), row_groups_per_commit):
+        block = pending[start:start + row_groups_per_commit]
+        if sample is not None:
+            df_clean = sample[np.isin(sample_groups, block)].copy()
+        else:
+            with measure(metrics, 'read', file=filename, batch=block[0]) as rec:
+                df, stats = read_sample(path, settings, batch_size=read_batch_size, row_groups=block,
+                                        row_index_column=SOURCE_ROW_FIELD)
+                rec.update(rows_in=stats['total_rows'], rows_out=len(df), bytes=stats['bytes_read'])
+            df_clean = df
+            if len(df) > 0:
+                with measure(metrics, 'clean', file=filename, batch=block[0], rows_in=len(df)) as rec:
+                    df_clean = clean_func(df, **(clean_options or {}))
+                    rec['rows_out'] = len(df_clean)
+        inserted = duplicates = 0
+        if len(df_clean) > 0:
+            df_clean[SOURCE_FILE_FIELD] = filename
+            inserted, duplicates = insert_documents(df_clean, collection, batch_size, metrics, filename,
+                                                    writer)
+            if not rebuild_needed:
+                if inserted == len(df_clean):
+                    if rollup is not None:
+                        with measure(metrics, 'rollup', file=filename, batch=block[0], rows_in=len(df_clean)):
+                            apply_rollup(rollup, df_clean, filename)
+                    if od_store is not None:
+                        with measure(metrics, 'od', file=filename, batch=block[0], rows_in=len(df_clean)):
+                            od_store.add_frame(df_clean, filename)
+                    if sketch_store is not None:
+                        with measure(metrics, 'quantiles', file=filename, batch=block[0], rows_in=len(df_clean)):
+                            sketch_store.add_frame(df_clean, filename)
+                else:
+                    rebuild_needed = True
+        manifest.commit_row_groups(filename, block, inserted)
+        inserted_total += inserted
+        dup_note = f" ({duplicates:,} ya estaban)" if duplicates else ""
+        print(f"   ✓ Row groups {block[0]}-{block[-1]}: {inserted:,} documentos{dup_note}")
+
+    if rollup is not None and rebuild_needed:
+        with measure(metrics, 'rollup', file=filename):
+            rebuild_rollup(collection, rollup, filename)
+    if od_store is not None and rebuild_needed:
+        with measure(metrics, 'od', file=filename):
+            od_store.rebuild_from_collection(collection, filename)
+    if sketch_store is not None and rebuild_needed:
+        with measure(metrics, 'quantiles', file=filename):
+            sketch_store.rebuild_from_collection(collection, filename)
+    manifest.complete(filename)
+    return inserted_total
+
+
+def _load_plan_parallel(plan, collection, manifest, settings, batch_size, read_batch_size, workers, writers,
+                        rollup=None, od_store=None, metrics=None, clean_options=None, async_options=None,
+                        writer=None, sketch_store=None, cache=None):
+    """
+    Ejecuta el plan con la carga paralela (ficheros completos, etiquetados).
+
+    Con async_options (argumentos de ingest_files_async: max_in_flight,
+    mongo_uri...) los ficheros se cargan con la carga asíncrona.
+
+    Los escritores insertan BSON ya codificado, así que el rollup, las
+    matrices OD y los sketches de cada fichero cargado se recalculan desde
+    los viajes al terminar (una pasada por mes).
+    """
+    from parallel_ingest import ingest_files_parallel
+
+    if settings['method'] not in ('systematic', 'stratified'):
+        raise ValueError("La carga paralela solo admite muestreo sistemático o estratificado")
+    plan = SamplingPlan.from_dict(settings['plan']) if settings.get('plan') is not None else None
+
+    results = {}
+    to_load = []
+    for action, path, fingerprint, entry in plan:
+        filename = os.path.basename(path)
+        print(f"📄 {filename}: {action}")
+        results[filename] = {'action': action, 'inserted': 0}
+        if action == 'skip':
+            continue
+        if action == 'reload':
+            remove_source_file(collection, manifest, filename, rollup, od_store, sketch_store)
+        if action != 'resume':
+            manifest.start(filename, fingerprint, settings, pq.ParquetFile(path).metadata.num_row_groups)
+        to_load.append(path)
+
+    if not to_load:
+        return results
+
+    if async_options is not None:
+        from async_ingest import run_ingest_async
+        loaded = run_ingest_async(to_load, collection, sample_rate=settings['sample_rate'],
+                                  batch_size=batch_size, workers=workers, columns=settings['columns'],
+                                  read_batch_size=read_batch_size, tag_source=True, sampling_plan=plan,
+                                  metrics=metrics, clean_options=clean_options, writer=writer, cache=cache,
+                                  **async_options)
+    else:
+        loaded = ingest_files_parallel(to_load, collection, sample_rate=settings['sample_rate'],
+                                       batch_size=batch_size, workers=workers, writers=writers,
+                                       columns=settings['columns'], read_batch_size=read_batch_size,
+                                       tag_source=True, sampling_plan=plan, metrics=metrics,
+                                       clean_options=clean_options, writer=writer, cache=cache)
+    for filename, res in loaded.items():
+        results[filename]['inserted'] = res['inserted']
+        if res['error']:
+            results[filename]['error'] = res['error']
+            continue
+        entry = manifest.get(filename)
+        manifest.commit_row_groups(filename, range(entry['num_row_groups']), res['inserted'])
+        if rollup is not None:
+            with measure(metrics, 'rollup', file=filename):
+                rebuild_rollup(collection, rollup, filename)
+        if od_store is not None:
+            with measure(metrics, 'od', file=filename):
+                od_store.rebuild_from_collection(collection, filename)
+        if sketch_store is not None:
+            with measure(metrics, 'quantiles', file=filename):
+                sketch_store.rebuild_from_collection(collection, filename)
+        manifest.complete(filename)
+    return results
+
+
+def load_incremental(parquet_files, collection, clean_func, sample_rate=40, method='systematic', seed=None,
+                     columns=None, batch_size=20000, read_batch_size=100000, row_groups_per_commit=1,
+                     prune_missing=False, manifest_collection=MANIFEST_COLLECTION, workers=0, writers=2,
+                     rollup_collection=ROLLUP_COLLECTION, od_dir=None, sampling_plan=None, metrics=None,
+                     clean_options=None, async_options=None, writer=None, quantile_collection=None, cache=None):
+    """
+    Carga incremental de varios ficheros usando el manifiesto.
+
+    Si la colección ya tiene viajes sin source_file (carga completa o anterior
+    al manifiesto) se lanza ValueError antes de insertar nada: no se pueden
+    asociar a su fichero y se duplicarían.
+
+    Args:
+        parquet_files (list): Ficheros Parquet
+        collection: Colección de viajes
+        clean_func (callable): Función de limpieza (clean_hvfhv_data)
+        sample_rate (int): Muestreo 1 de N
+        method (str): 'systematic' o 'random'
+        seed (int, optional): Semilla para muestreo aleatorio
+        columns (list, optional): Columnas a leer
+        batch_size (int): Documentos por insert_many
+        read_batch_size (int): Filas por record batch al leer
+        row_groups_per_commit (int): Row groups entre confirmaciones del manifiesto
+        prune_missing (bool): Borra los meses del manifiesto cuyo fichero ya no existe
+        manifest_collection (str): Nombre de la colección de manifiesto
+        workers (int): Si > 0, los ficheros pendientes se cargan con
+            ingest_files_parallel (clean_hvfhv_data del script); los ficheros
+            a medias se recargan enteros y el índice único descarta lo ya insertado
+        writers (int): Threads escritores de la carga paralela
+        rollup_collection (str, optional): Rollup a mantener (ver rollup.py); None lo desactiva
+        od_dir (str | Path, optional): Directorio de las matrices OD a mantener
+            (ver od_matrix.py); los meses ya cargados sin partición se calculan
+            desde la colección. None lo desactiva
+        sampling_plan (SamplingPlan, optional): Muestreo estratificado con pesos
+            (ver stratified_sampler.py) en lugar de 1 de sample_rate
+        metrics (IngestMetrics, optional): Instrumentación por etapa, fichero y lote
+            (ver ingest_metrics.py)
+        clean_options (dict, optional): Opciones de limpieza (lean, memory_budget_mb;
+            ver hvfhv_cleaning.py), también en la carga paralela
+        async_options (dict, optional): Carga los ficheros pendientes con
+            ingest_files_async (argumentos max_in_flight, mongo_uri...; ver
+            async_ingest.py), con los mismos reintentos que la carga paralela
+        writer (AdaptiveBulkWriter, optional): Escritor de todos los ficheros
+            (ver adaptive_writer.py); None = uno por bloque con lotes de batch_size
+        quantile_collection (str, optional): Colección de sketches de percentiles a
+            mantener (ver quantile_sketch.py); los meses ya cargados sin sketches
+            se calculan desde la colección. None lo desactiva
+        cache (SampleCache, optional): Caché de muestras limpias (ver
+            sample_cache.py) para los ficheros que se cargan o recargan
+
+    Returns:
+        dict: {nombre_fichero: {'action', 'inserted'}}
+    """
+    manifest = IngestManifest(collection.database, manifest_collection)
+    ensure_source_index(collection)
+    settings = sample_settings(sample_rate, method, seed, columns, sampling_plan)
+    rollup = collection.database[rollup_collection] if rollup_collection else None
+    if rollup is not None:
+        ensure_rollup_indexes(rollup)
+    od_store = ODStore(od_dir) if od_dir else None
+    sketch_store = SketchStore(collection.database[quantile_collection]) if quantile_collection else None
+    if sketch_store is not None:
+        sketch_store.ensure_indexes()
+
+    # Los viajes sin source_file (carga completa o anterior al manifiesto) no se pueden
+    # asociar a su fichero: la carga incremental los volvería a insertar
+    if collection.find_one({SOURCE_FILE_FIELD: {'$exists': False}}):
+        raise ValueError("La colección tiene documentos sin source_file (carga completa anterior): "
+                         "la carga incremental los duplicaría. Recarga con --full-reload.")
+
+    results = {}
+    plan = plan_incremental_load(parquet_files, manifest, settings)
+    if workers > 0 or async_options is not None:
+        results = _load_plan_parallel(plan, collection, manifest, settings, batch_size, read_batch_size,
+                                      workers, writers, rollup, od_store, metrics, clean_options,
+                                      async_options, writer, sketch_store, cache)
+        plan = []
+    for action, path, fingerprint, entry in plan:
+        filename = os.path.basename(path)
+        print(f"\n📄 {filename}: {action}")
+        if action == 'skip':
+            results[filename] = {'action': action, 'inserted': 0}
+            continue
+        try:
+            if action == 'reload':
+                remove_source_file(collection, manifest, filename, rollup, od_store, sketch_store)
+                entry = None
+            inserted = load_file_incremental(path, collection, manifest, clean_func, settings, fingerprint,
+                                             entry if action == 'resume' else None, batch_size,
+                                             read_batch_size, row_groups_per_commit, rollup, od_store,
+                                             metrics, clean_options, writer, sketch_store, cache)
+            results[filename] = {'action': action, 'inserted': inserted}
+            print(f"✅ {filename}: {inserted:,} documentos insertados")
+        except Exception as e:
+            print(f"❌ ERROR procesando {filename}: {str(e)}")
+            results[filename] = {'action': action, 'inserted': 0, 'error': str(e)}
+
+    if prune_missing:
+        present = {os.path.basename(p) for p in parquet_files}
+        for entry in manifest.entries():
+            if entry['_id'] not in present:
+                remove_source_file(collection, manifest, entry['_id'], rollup, od_store, sketch_store)
+                results[entry['_id']] = {'action': 'removed', 'inserted': 0}
+
+    if od_store is not None:
+        for entry in manifest.entries():
+            if entry.get('status') == 'complete' and not od_store.has(entry['_id']):
+                trips = od_store.rebuild_from_collection(collection, entry['_id'])
+                print(f"🔄 {entry['_id']}: matrices OD calculadas desde la colección ({trips:,} viajes)")
+    if sketch_store is not None:
+        for entry in manifest.entries():
+            if entry.get('status') == 'complete' and not sketch_store.has(entry['_id']):
+                trips = sketch_store.rebuild_from_collection(collection, entry['_id'])
+                print(f"🔄 {entry['_id']}: sketches de percentiles calculados desde la colección ({trips:,} viajes)")
+
+    return results
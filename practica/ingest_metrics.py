@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentación de la carga: tiempos y volumen por etapa, fichero y lote.
+
+Cada etapa de la carga se mide con un context manager:
+
+    metrics = IngestMetrics()
+    with metrics.stage('clean', file=filename, rows_in=len(df)) as rec:
+        df_clean = clean_hvfhv_data(df)
+        rec['rows_out'] = len(df_clean)
+
+y deja un registro con:
+
+    stage / file / batch   etapa (read, clean, sanitize, encode, insert, rollup, od), fichero y lote
+    wall_s / cpu_s         tiempo de pared y de CPU del thread (time.thread_time)
+    rows_in / rows_out     filas que entran y salen de la etapa
+    bytes                  bytes leídos del Parquet (read) o BSON enviados (encode, insert)
+    rss_mb / rss_delta_mb  memoria residente del proceso al terminar la etapa y su
+                           variación durante la etapa (en los threads de escritura
+                           incluye lo que reservan los demás threads a la vez)
+    pid / thread           proceso y thread (workers de parallel_ingest.py, escritores)
+
+Los workers de la carga paralela miden en su proceso y devuelven sus
+registros con export(); el proceso principal los une con merge().
+
+Opcionalmente una etapa se perfila con cProfile (profile_stage) o con
+tracemalloc (trace_stage: pico de memoria de Python por registro y las líneas
+que más reservan). Los perfiles de los workers se guardan en ficheros .prof y
+se combinan en el informe.
+
+El pico de memoria residente (ru_maxrss) es de toda la vida del proceso, así
+que solo aparece en los totales del informe (peak_rss_mb), no por etapa.
+
+Al terminar, write_report() guarda el informe JSON (resumen por etapa y por
+fichero + registros) y un CSV con los registros. Mientras tanto se muestra en
+stderr una línea de progreso con los documentos insertados y las filas/s.
+
+Uso (comparar dos ejecuciones y marcar regresiones):
+    python ingest_metrics.py outputs/ingest_metrics/ingest_20250601_120000.json
+    python ingest_metrics.py outputs/ingest_metrics/ingest_nueva.json --baseline outputs/ingest_metrics/ingest_prev.json
+"""
+
+import argparse
+import cProfile
+import csv
+import datetime as dt
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from regression_check import find_regressions, print_regressions
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_REPORT_DIR = Path(__file__).resolve().parent / 'outputs' / 'ingest_metrics'
+STAGES = ['read', 'clean', 'sanitize', 'encode', 'insert', 'rollup', 'od', 'quantiles']
+PROGRESS_STAGE = 'insert'  # La línea de progreso cuenta los documentos insertados
+RECORD_FIELDS = ['stage', 'file', 'batch', 'rows_in', 'rows_out', 'bytes', 'wall_s', 'cpu_s', 'rss_mb',
+                 'rss_delta_mb', 'traced_peak_mb', 'pid', 'thread']
+TRACE_TOP = 15
+TIME_REGRESSION_RATIO = 1.2
+
+
+def current_rss_mb():
+    """Memoria residente actual del proceso (MB), None si no se puede medir."""
+    try:
+        # Linux: páginas residentes en el segundo campo de statm
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso desde que arrancó (MB), None si no se puede medir."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KB, macOS: bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+
+
+class IngestMetrics:
+    """
+    Registros de las etapas de una carga.
+
+    Args:
+        profile_stage (str, optional): Etapa a perfilar con cProfile
+        trace_stage (str, optional): Etapa a medir con tracemalloc
+        profile_dir (str | Path, optional): Directorio de los .prof (por defecto DEFAULT_REPORT_DIR)
+        progress (bool): Muestra la línea de progreso (filas/s) en stderr
+        progress_interval (float): Segundos mínimos entre actualizaciones del progreso
+    """
+
+    def __init__(self, profile_stage=None, trace_stage=None, profile_dir=None, progress=True,
+                 progress_interval=1.0):
+        self.profile_stage = profile_stage
+        self.trace_stage = trace_stage
+        self.profile_dir = Path(profile_dir) if profile_dir else DEFAULT_REPORT_DIR
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.records = []
+        self.profile_files = []
+        self.trace_top = []
+        self.started_at = dt.datetime.now()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self._elapsed = None
+        self._lock = threading.Lock()
+        self._profilers = {}
+        self._trace_peak = 0
+        self._progress_rows = 0
+        self._progress_last = (self._started, 0)
+        self._progress_shown = False
+
+    # ==================== MEDICIÓN ====================
+
+    @contextmanager
+    def stage(self, name, file=None, batch=None, rows_in=None):
+        """
+        Mide una etapa. El dict que devuelve se puede completar dentro del
+        bloque (rows_out, bytes); rows_out por defecto es rows_in.
+        """
+        rec = {'stage': name, 'file': file, 'batch': batch, 'rows_in': rows_in, 'rows_out': None,
+               'bytes': None, 'pid': os.getpid(), 'thread': threading.current_thread().name}
+        profiler = self._profiler() if name == self.profile_stage else None
+        tracing = name == self.trace_stage
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        rss0 = current_rss_mb()
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+: un solo perfilador activo por proceso (otro escritor lo tiene)
+                profiler = None
+        try:
+            yield rec
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            rec['wall_s'] = time.perf_counter() - wall0
+            rec['cpu_s'] = time.thread_time() - cpu0
+            if rec['rows_out'] is None:
+                rec['rows_out'] = rows_in
+            rec['rss_mb'] = current_rss_mb()
+            rec['rss_delta_mb'] = rec['rss_mb'] - rss0 if rss0 is not None and rec['rss_mb'] is not None else None
+            rec['traced_peak_mb'] = self._trace_end() if tracing else None
+            with self._lock:
+                self.records.append(rec)
+            if name == PROGRESS_STAGE and rec['rows_out']:
+                self._advance(rec['rows_out'])
+
+    def _profiler(self):
+        # cProfile mide el thread que lo activa: uno por thread (escritores en paralelo)
+        ident = threading.get_ident()
+        with self._lock:
+            if ident not in self._profilers:
+                self._profilers[ident] = cProfile.Profile()
+            return self._profilers[ident]
+
+    def _trace_end(self):
+        """Pico de tracemalloc de la etapa (MB); guarda las líneas del registro con mayor pico."""
+        _, peak = tracemalloc.get_traced_memory()
+        if peak > self._trace_peak:
+            self._trace_peak = peak
+            stats = tracemalloc.take_snapshot().statistics('lineno')[:TRACE_TOP]
+            self.trace_top = [{'line': str(s.traceback), 'size_mb': s.size / (1024 * 1024), 'count': s.count}
+                              for s in stats]
+        return peak / (1024 * 1024)
+
+    # ==================== PROGRESO ====================
+
+    def _advance(self, rows):
+        with self._lock:
+            self._progress_rows += rows
+            now = time.perf_counter()
+            last_time, last_rows = self._progress_last
+            if not self.progress or now - last_time < self.progress_interval:
+                return
+            self._progress_last = (now, self._progress_rows)
+            total_rows = self._progress_rows
+        elapsed = now - self._started
+        line = (f"⏱️  {total_rows:,} documentos | {total_rows / elapsed:,.0f} filas/s "
+                f"(ahora {(total_rows - last_rows) / (now - last_time):,.0f}) | {elapsed:,.0f} s")
+        if sys.stderr.isatty():
+            print(f"\r{line}   ", end='', file=sys.stderr, flush=True)
+            self._progress_shown = True
+        else:
+            print(line, file=sys.stderr, flush=True)
+
+    def finish(self):
+        """Cierra la medición (tiempo total) y la línea de progreso."""
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._started
+            self.finished_at = dt.datetime.now()
+        if self._progress_shown:
+            print(file=sys.stderr)
+            self._progress_shown = False
+        if self.trace_stage and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return self
+
+    @property
+    def elapsed(self):
+        return self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+
+    # ==================== WORKERS ====================
+
+    def config(self):
+        """Parámetros para crear la instrumentación equivalente en un proceso worker."""
+        return {'profile_stage': self.profile_stage, 'trace_stage': self.trace_stage,
+                'profile_dir': str(self.profile_dir), 'progress': False}
+
+    def export(self, name='worker'):
+        """Registros (y perfil, en un .prof) de este proceso para enviarlos al principal."""
+        profile_file = None
+        if self._profilers:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            profile_file = self.profile_dir / f"{self.profile_stage}_{name}_{os.getpid()}_{time.time_ns()}.prof"
+            pstats.Stats(*self._profilers.values()).dump_stats(profile_file)
+        return {'records': list(self.records), 'profile_file': str(profile_file) if profile_file else None,
+                'trace_top': self.trace_top, 'trace_peak': self._trace_peak}
+
+    def merge(self, exported):
+        """Une los registros de un worker (ver export())."""
+        with self._lock:
+            self.records.extend(exported['records'])
+            if exported.get('profile_file'):
+                self.profile_files.append(exported['profile_file'])
+            if exported.get('trace_peak', 0) > self._trace_peak:
+                self._trace_peak = exported['trace_peak']
+                self.trace_top = exported['trace_top']
+        for rec in exported['records']:
+            if rec['stage'] == PROGRESS_STAGE and rec['rows_out']:
+                self._advance(rec['rows_out'])
+
+    # ==================== INFORME ====================
+
+    def summary(self, key='stage'):
+        """Totales por etapa (key='stage') o por fichero (key='file')."""
+        return summarize(self.records, key)
+
+    def report(self, meta=None):
+        """Informe completo (dict serializable a JSON)."""
+        stages = self.summary('stage')
+        inserted = stages.get(PROGRESS_STAGE, {}).get('rows_out', 0)
+        return {
+            'meta': {
+                'started': self.started_at.isoformat(timespec='seconds'),
+                'finished': (self.finished_at or dt.datetime.now()).isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+                'profile_stage': self.profile_stage,
+                'trace_stage': self.trace_stage,
+                **(meta or {}),
+            },
+            'totals': {
+                'elapsed_s': self.elapsed,
+                'documents_inserted': inserted,
+                'rows_per_s': inserted / self.elapsed if self.elapsed else 0.0,
+                # Pico de toda la vida del proceso principal (los workers no se suman)
+                'peak_rss_mb': peak_rss_mb(),
+            },
+            'stages': stages,
+            'files': self.summary('file'),
+            'trace_top': self.trace_top,
+            'records': self.records,
+        }
+
+    def write_report(self, path=None, meta=None):
+        """
+        Guarda <path>.json (informe), <path>.csv (registros) y, si se ha
+        perfilado una etapa, <path>.prof y <path>_profile.txt.
+
+        Args:
+            path (str | Path, optional): Ruta sin extensión (por defecto
+                outputs/ingest_metrics/ingest_<fecha>)
+            meta (dict, optional): Parámetros de la carga a guardar en el informe
+
+        Returns:
+            Path: Ruta del JSON
+        """
+        self.finish()
+        if path is None:
+            path = DEFAULT_REPORT_DIR / f"ingest_{self.started_at:%Y%m%d_%H%M%S}"
+        path = Path(path).with_suffix('')
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        report = self.report(meta)
+        profile = self._write_profile(path)
+        if profile is not None:
+            report['meta']['profile'] = profile
+        json_path = path.with_suffix('.json')
+        json_path.write_text(json.dumps(report, indent=2, sort_keys=True, default=str), encoding='utf-8')
+
+        with open(path.with_suffix('.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.records)
+        return json_path
+
+    def _write_profile(self, path):
+        """Combina los perfiles de este proceso y de los workers en un .prof y un resumen en texto."""
+        sources = list(self._profilers.values()) + [f for f in self.profile_files if os.path.exists(f)]
+        if not sources:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(*sources, stream=out)
+        prof_path = path.parent / f"{path.name}.prof"
+        stats.dump_stats(prof_path)
+        stats.sort_stats('cumulative').print_stats(40)
+        path.parent.joinpath(f"{path.name}_profile.txt").write_text(out.getvalue(), encoding='utf-8')
+        for f in self.profile_files:
+            os.remove(f)
+        return str(prof_path)
+
+    def print_summary(self):
+        """Tabla por etapa: tiempos, filas/s y memoria."""
+        print_stage_table(self.report())
+
+
+# ==================== RESUMEN ====================
+
+def summarize(records, key='stage'):
+    """
+    Agrega los registros por etapa o por fichero.
+
+    Las etapas de distintos workers/escritores se solapan, así que la suma de
+    wall_s puede superar el tiempo total; 'share' es la fracción de la suma.
+
+    Memoria: rss_mb es la mayor memoria residente al terminar una llamada y
+    rss_delta_mb el mayor crecimiento durante una llamada.
+
+    Returns:
+        dict: {clave: {'calls', 'wall_s', 'cpu_s', 'rows_in', 'rows_out', 'bytes',
+                       'rows_per_s', 'mb_per_s', 'cpu_pct', 'rss_mb', 'rss_delta_mb', 'share'}}
+    """
+    groups = {}
+    for rec in records:
+        name = rec.get(key) or '-'
+        g = groups.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows_in': 0, 'rows_out': 0,
+                                     'bytes': 0, 'rss_mb': None, 'rss_delta_mb': None})
+        g['calls'] += 1
+        g['wall_s'] += rec['wall_s']
+        g['cpu_s'] += rec['cpu_s']
+        g['rows_in'] += rec['rows_in'] or 0
+        g['rows_out'] += rec['rows_out'] or 0
+        g['bytes'] += rec['bytes'] or 0
+        for field in ('rss_mb', 'rss_delta_mb'):
+            if rec.get(field) is not None:
+                g[field] = rec[field] if g[field] is None else max(g[field], rec[field])
+
+    total_wall = sum(g['wall_s'] for g in groups.values())
+    for g in groups.values():
+        rows = g['rows_in'] or g['rows_out']
+        g['rows_per_s'] = rows / g['wall_s'] if g['wall_s'] else 0.0
+        g['mb_per_s'] = g['bytes'] / (1024 * 1024) / g['wall_s'] if g['wall_s'] else 0.0
+        g['cpu_pct'] = g['cpu_s'] / g['wall_s'] * 100 if g['wall_s'] else 0.0
+        g['share'] = g['wall_s'] / total_wall if total_wall else 0.0
+
+    return _in_stage_order(groups)
+
+
+def _in_stage_order(groups):
+    # Etapas en el orden de la carga (el JSON guardado las tiene en orden alfabético)
+    order = {name: i for i, name in enumerate(STAGES)}
+    return dict(sorted(groups.items(), key=lambda kv: (order.get(kv[0], len(order)), kv[0])))
+
+
+def print_stage_table(report):
+    """Imprime el resumen por etapa de un informe (IngestMetrics.report() o un JSON guardado)."""
+    totals = report['totals']
+    peak = f", pico RSS del proceso {totals['peak_rss_mb']:,.0f} MB" if totals.get('peak_rss_mb') else ''
+    print(f"\n📊 INSTRUMENTACIÓN DE LA CARGA ({totals['elapsed_s']:,.1f} s, "
+          f"{totals['documents_inserted']:,} documentos, {totals['rows_per_s']:,.0f} filas/s{peak})")
+    print(f"   {'etapa':10s}{'llamadas':>10s}{'pared s':>10s}{'CPU %':>8s}{'filas':>13s}"
+          f"{'filas/s':>12s}{'MB/s':>9s}{'% tiempo':>10s}{'RSS MB':>9s}{'Δ RSS':>8s}")
+    for name, s in _in_stage_order(report['stages']).items():
+        rss, delta = (f"{s[f]:,.0f}" if s.get(f) is not None else '-' for f in ('rss_mb', 'rss_delta_mb'))
+        print(f"   {name:10s}{s['calls']:>10,}{s['wall_s']:>10,.2f}{s['cpu_pct']:>8.0f}"
+              f"{s['rows_in'] or s['rows_out']:>13,}{s['rows_per_s']:>12,.0f}{s['mb_per_s']:>9,.1f}"
+              f"{s['share'] * 100:>10.1f}{rss:>9s}{delta:>8s}")
+    if report.get('trace_top'):
+        print(f"\n🧠 tracemalloc ({report['meta'].get('trace_stage')}): líneas que más reservan")
+        for item in report['trace_top'][:5]:
+            print(f"   {item['size_mb']:>8.1f} MB  {item['line']}")
+    if report['meta'].get('profile'):
+        print(f"\n🔬 Perfil de '{report['meta'].get('profile_stage')}': {report['meta']['profile']}")
+
+
+# ==================== NULO ====================
+
+@contextmanager
+def _null_stage():
+    yield {}
+
+
+def measure(metrics, name, file=None, batch=None, rows_in=None):
+    """metrics.stage(...) o un bloque sin medición si metrics es None."""
+    if metrics is None:
+        return _null_stage()
+    return metrics.stage(name, file=file, batch=batch, rows_in=rows_in)
+
+
+# ==================== COMPARACIÓN ====================
+
+def compare_reports(current, baseline, ratio=TIME_REGRESSION_RATIO):
+    """
+    Regresiones frente a un informe anterior (filas/s por etapa y total, pico de memoria del proceso).
+
+    Returns:
+        list: Mensajes (vacía si no hay regresiones)
+    """
+    metrics = []
+    for name, now in current['stages'].items():
+        before = baseline.get('stages', {}).get(name) or {}
+        metrics.append((name, before.get('rows_per_s'), now['rows_per_s'], 'rate', 'filas/s'))
+    now, before = current['totals'], baseline.get('totals', {})
+    metrics += [('total', before.get('rows_per_s'), now['rows_per_s'], 'rate', 'filas/s'),
+                ('pico RSS del proceso', before.get('peak_rss_mb'), now['peak_rss_mb'], 'size', 'MB')]
+    return find_regressions(metrics, ratio)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Resumen y comparación de informes de instrumentación de la carga")
+    parser.add_argument('report', help="Informe JSON de IngestMetrics.write_report()")
+    parser.add_argument('--baseline', default=None, help="Informe anterior para detectar regresiones")
+    parser.add_argument('--ratio', type=float, default=TIME_REGRESSION_RATIO,
+                        help="Empeoramiento tolerado antes de marcar una regresión")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = json.loads(Path(args.report).read_text(encoding='utf-8'))
+    print_stage_table(report)
+
+    if args.baseline:
+        problems = compare_reports(report, json.loads(Path(args.baseline).read_text(encoding='utf-8')), args.ratio)
+        sys.exit(print_regressions(problems))
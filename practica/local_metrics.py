@@ -0,0 +1,600 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas del notebook calculadas directamente sobre los Parquet (sin MongoDB).
+
+Recorre los fhvhv_tripdata_*.parquet por record batches (solo las columnas
+necesarias), aplica los mismos filtros que clean_hvfhv_data() y acumula con
+NumPy (np.bincount) sumas y recuentos en arrays de tamaño fijo:
+
+    tiempo        plataforma × mes × día de la semana × hora
+    plataforma    viajes, revenue, componentes de tarifa, conductor, WAV, compartidos
+    zonas         recogidas / destinos por zona, recogidas por hora y zona
+    OD            plataforma × origen × destino (viajes, tarifa, millas)
+
+Los acumuladores de cada fichero se calculan en un ProcessPoolExecutor y se
+suman al final, así que se puede usar el 100% de las filas. Con
+sample_rate=40 se leen exactamente las filas que carga cargar_datos_completo.py
+(muestreo sistemático), lo que permite comparar con MongoDB (compare_sections);
+con una SampleCache esa muestra limpia se toma de sample_cache.py (la misma
+entrada que la carga) en lugar de volver a leer el Parquet.
+
+Los resultados tienen las mismas claves que los pipelines del notebook
+(hvfhv_pipelines.py / report_engine.py). Diferencia conocida: los viajes sin
+PULocationID/DOLocationID no aparecen en las listas por zona (en MongoDB
+formarían un grupo null).
+
+Uso:
+    python local_metrics.py ./data                      # 100% de las filas
+    python local_metrics.py ./data --sample-rate 40 --compare
+    python local_metrics.py ./data --sample-rate 40 --no-sample-cache
+"""
+
+import argparse
+import datetime as dt
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from parquet_sampler import iter_sampled_batches
+
+# Plataformas conocidas; cualquier otro código cuenta como 'OTHER'
+PLATFORMS = ['HV0002', 'HV0003', 'HV0004', 'HV0005']
+PLATFORM_LABELS = PLATFORMS + ['OTHER']
+N_PLATFORMS = len(PLATFORM_LABELS)
+N_ZONES = 266  # LocationID 1..265 (0 sin usar)
+
+FARE_FIELDS = ['base_passenger_fare', 'tolls', 'tips', 'congestion_surcharge', 'airport_fee', 'bcf',
+               'sales_tax', 'driver_pay']
+REVENUE_FIELDS = ['base_passenger_fare', 'tolls', 'tips', 'congestion_surcharge', 'airport_fee']
+TOTAL_COST_FIELDS = ['base_passenger_fare', 'tolls', 'bcf', 'sales_tax', 'congestion_surcharge', 'airport_fee']
+FLAG_FIELDS = ['shared_request_flag', 'shared_match_flag', 'wav_request_flag', 'wav_match_flag']
+READ_COLUMNS = (['hvfhs_license_num', 'pickup_datetime', 'dropoff_datetime', 'PULocationID', 'DOLocationID',
+                 'trip_miles', 'trip_time'] + FARE_FIELDS + FLAG_FIELDS)
+
+# Mismos límites que clean_hvfhv_data()
+MAX_DURATION_MIN = 300
+MAX_MILES = 100
+
+# Medidas por plataforma (vector de N_PLATFORMS)
+PLATFORM_MEASURES = ['trips', 'revenue', 'trip_miles', 'trip_time',
+                     'base_passenger_fare', 'tolls', 'tips', 'congestion_surcharge', 'airport_fee', 'bcf',
+                     'sales_tax', 'shared_requests', 'shared_matches', 'wav_requests', 'wav_matches',
+                     'wav_both', 'wav_match_without_request',
+                     'drv_trips', 'drv_driver_pay', 'drv_total_cost', 'drv_tips', 'drv_pay_per_mile',
+                     'drv_pay_per_minute']
+
+SHAPES = {
+    'time_trips': (N_PLATFORMS, 12, 7, 24),
+    'time_revenue': (N_PLATFORMS, 12, 7, 24),
+    'time_fare': (N_PLATFORMS, 12, 7, 24),
+    'shared_hour': (N_PLATFORMS, 24),
+    'pu_trips': (N_PLATFORMS, N_ZONES),
+    'pu_revenue': (N_PLATFORMS, N_ZONES),
+    'pu_fare': (N_PLATFORMS, N_ZONES),
+    'pu_hour_trips': (N_PLATFORMS, 24, N_ZONES),
+    'do_trips': (N_PLATFORMS, N_ZONES),
+    'do_fare': (N_PLATFORMS, N_ZONES),
+    'od_trips': (N_PLATFORMS, N_ZONES, N_ZONES),
+    'od_fare': (N_PLATFORMS, N_ZONES, N_ZONES),
+    'od_miles': (N_PLATFORMS, N_ZONES, N_ZONES),
+    **{f'p_{m}': (N_PLATFORMS,) for m in PLATFORM_MEASURES},
+}
+
+
+# ==================== ACUMULACIÓN ====================
+
+def _float(batch, name):
+    """Columna como float64 con nulos a 0 ($ifNull: [campo, 0])."""
+    if name not in batch.schema.names:
+        return np.zeros(batch.num_rows)
+    col = pc.fill_null(batch.column(name).cast(pa.float64()), 0.0)
+    return col.to_numpy(zero_copy_only=False)
+
+
+def _flag(batch, name, value='Y'):
+    if name not in batch.schema.names:
+        return np.zeros(batch.num_rows, dtype=bool)
+    return pc.fill_null(pc.equal(batch.column(name), value), False).to_numpy(zero_copy_only=False)
+
+
+def _zone(batch, name):
+    """LocationID como int64 (-1 si es nulo o está fuera de rango)."""
+    col = pc.fill_null(batch.column(name).cast(pa.int64()), -1).to_numpy(zero_copy_only=False)
+    return np.where((col >= 0) & (col < N_ZONES), col, -1)
+
+
+def _timestamps(batch, name):
+    col = batch.column(name)
+    if not pa.types.is_timestamp(col.type):
+        col = pc.cast(col, pa.timestamp('us'))
+    return col.cast(pa.timestamp('us', tz=col.type.tz)).to_numpy(zero_copy_only=False).astype('datetime64[us]')
+
+
+def _bincount(index, weights, size):
+    return np.bincount(index, weights=weights, minlength=size)
+
+
+class MetricAccumulator:
+    """Sumas y recuentos mergeables de las métricas del notebook."""
+
+    def __init__(self):
+        self.arrays = {name: np.zeros(shape) for name, shape in SHAPES.items()}
+        self.fleet = {}  # (plataforma, año, mes) → viajes
+        self.rows_read = 0
+        self.rows_used = 0
+
+    def update(self, batch, start=None, end=None):
+        """Acumula un record batch (filtros de clean_hvfhv_data + ventana temporal)."""
+        self.rows_read += batch.num_rows
+        pickup = _timestamps(batch, 'pickup_datetime')
+        dropoff = _timestamps(batch, 'dropoff_datetime')
+        # Nulos como NaN: no pasan los filtros (igual que en pandas)
+        miles = batch.column('trip_miles').cast(pa.float64()).to_numpy(zero_copy_only=False)
+
+        # Mismo cálculo que clean_hvfhv_data: total_seconds() / 60
+        with np.errstate(invalid='ignore'):
+            duration_min = ((dropoff - pickup) / np.timedelta64(1, 's')) / 60
+            keep = (duration_min > 0) & (duration_min <= MAX_DURATION_MIN)
+            keep &= (miles > 0) & (miles <= MAX_MILES)
+        if start is not None:
+            keep &= pickup >= np.datetime64(start, 'us')
+        if end is not None:
+            keep &= pickup < np.datetime64(end, 'us')
+        if not keep.any():
+            return
+        self.rows_used += int(keep.sum())
+
+        idx = np.flatnonzero(keep)
+        pickup = pickup[idx]
+        miles = miles[idx]
+        fares = {f: _float(batch, f)[idx] for f in FARE_FIELDS}
+        trip_time = _float(batch, 'trip_time')[idx]
+        flags = {f: _flag(batch, f)[idx] for f in FLAG_FIELDS}
+        wav_request_n = _flag(batch, 'wav_request_flag', 'N')[idx]
+        platform = pc.fill_null(pc.index_in(batch.column('hvfhs_license_num'),
+                                            value_set=pa.array(PLATFORMS)), len(PLATFORMS))
+        platform = platform.to_numpy(zero_copy_only=False).astype('int64')[idx]
+        pu = _zone(batch, 'PULocationID')[idx]
+        do = _zone(batch, 'DOLocationID')[idx]
+
+        # Partes de la fecha con el criterio de MongoDB ($dayOfWeek: 1 = domingo)
+        days = pickup.astype('datetime64[D]')
+        hour = ((pickup - days) // np.timedelta64(1, 'h')).astype('int64')
+        dow = (days.astype('int64') + 4) % 7  # 1970-01-01 fue jueves → 0 = domingo
+        months = pickup.astype('datetime64[M]').astype('int64')
+        month = months % 12
+        year = months // 12 + 1970
+
+        revenue = sum(fares[f] for f in REVENUE_FIELDS)
+        total_cost = sum(fares[f] for f in TOTAL_COST_FIELDS)
+        a = self.arrays
+
+        # Cubo temporal
+        t_idx = ((platform * 12 + month) * 7 + dow) * 24 + hour
+        size = a['time_trips'].size
+        a['time_trips'] += _bincount(t_idx, None, size).reshape(SHAPES['time_trips'])
+        a['time_revenue'] += _bincount(t_idx, revenue, size).reshape(SHAPES['time_revenue'])
+        a['time_fare'] += _bincount(t_idx, fares['base_passenger_fare'], size).reshape(SHAPES['time_fare'])
+        a['shared_hour'] += _bincount(platform * 24 + hour, flags['shared_request_flag'].astype(float),
+                                      N_PLATFORMS * 24).reshape(SHAPES['shared_hour'])
+
+        # Por plataforma
+        pay = fares['driver_pay']
+        minutes = trip_time / 60
+        eligible = (pay > 0) & (total_cost > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_mile = np.where(miles > 0, pay / miles, 0)
+            per_minute = np.where(minutes > 0, pay / minutes, 0)
+        values = {
+            'trips': None, 'revenue': revenue, 'trip_miles': miles, 'trip_time': trip_time,
+            **{f: fares[f] for f in FARE_FIELDS if f != 'driver_pay'},
+            'shared_requests': flags['shared_request_flag'], 'shared_matches': flags['shared_match_flag'],
+            'wav_requests': flags['wav_request_flag'], 'wav_matches': flags['wav_match_flag'],
+            'wav_both': flags['wav_request_flag'] & flags['wav_match_flag'],
+            'wav_match_without_request': wav_request_n & flags['wav_match_flag'],
+            'drv_trips': eligible, 'drv_driver_pay': np.where(eligible, pay, 0),
+            'drv_total_cost': np.where(eligible, total_cost, 0), 'drv_tips': np.where(eligible, fares['tips'], 0),
+            'drv_pay_per_mile': np.where(eligible, per_mile, 0),
+            'drv_pay_per_minute': np.where(eligible, per_minute, 0),
+        }
+        for name, w in values.items():
+            weights = None if w is None else np.asarray(w, dtype=float)
+            a[f'p_{name}'] += _bincount(platform, weights, N_PLATFORMS)
+
+        # Zonas (sin nulos)
+        has_pu = pu >= 0
+        has_do = do >= 0
+        z = N_PLATFORMS * N_ZONES
+        pu_idx = platform[has_pu] * N_ZONES + pu[has_pu]
+        a['pu_trips'] += _bincount(pu_idx, None, z).reshape(SHAPES['pu_trips'])
+        a['pu_revenue'] += _bincount(pu_idx, revenue[has_pu], z).reshape(SHAPES['pu_revenue'])
+        a['pu_fare'] += _bincount(pu_idx, fares['base_passenger_fare'][has_pu], z).reshape(SHAPES['pu_fare'])
+        ph_idx = (platform[has_pu] * 24 + hour[has_pu]) * N_ZONES + pu[has_pu]
+        a['pu_hour_trips'] += _bincount(ph_idx, None, z * 24).reshape(SHAPES['pu_hour_trips'])
+        do_idx = platform[has_do] * N_ZONES + do[has_do]
+        a['do_trips'] += _bincount(do_idx, None, z).reshape(SHAPES['do_trips'])
+        a['do_fare'] += _bincount(do_idx, fares['base_passenger_fare'][has_do], z).reshape(SHAPES['do_fare'])
+
+        od = has_pu & has_do
+        od_idx = (platform[od] * N_ZONES + pu[od]) * N_ZONES + do[od]
+        zz = z * N_ZONES
+        a['od_trips'] += _bincount(od_idx, None, zz).reshape(SHAPES['od_trips'])
+        a['od_fare'] += _bincount(od_idx, fares['base_passenger_fare'][od], zz).reshape(SHAPES['od_fare'])
+        a['od_miles'] += _bincount(od_idx, miles[od], zz).reshape(SHAPES['od_miles'])
+
+        # Evolución de la flota (plataforma, año, mes)
+        keys, counts = np.unique(np.stack([platform, year, month + 1]), axis=1, return_counts=True)
+        for (p, y, m), n in zip(keys.T.tolist(), counts.tolist()):
+            self.fleet[(p, y, m)] = self.fleet.get((p, y, m), 0) + n
+
+    def merge(self, other):
+        """Suma otro acumulador (p. ej. el de otro fichero)."""
+        for name in self.arrays:
+            self.arrays[name] += other.arrays[name]
+        for key, n in other.fleet.items():
+            self.fleet[key] = self.fleet.get(key, 0) + n
+        self.rows_read += other.rows_read
+        self.rows_used += other.rows_used
+        return self
+
+
+def accumulate_file(path, sample_rate=1, start=None, end=None, batch_size=250000, cache=None, columns=None):
+    """
+    Acumula un fichero Parquet (se ejecuta en un proceso worker).
+
+    Con sample_rate=1 se leen todas las filas; con N > 1, la misma muestra
+    sistemática que la carga a MongoDB. Con cache (SampleCache) y N > 1 se
+    recorre la muestra limpia de load_clean_sample (leída con `columns`,
+    las columnas de la carga); los filtros de update() ya no quitan nada.
+    """
+    acc = MetricAccumulator()
+    if cache is not None and sample_rate > 1:
+        from hvfhv_cleaning import clean_hvfhv_data
+        from ingest_manifest import sample_settings
+        from sample_cache import load_clean_sample
+
+        df, stats, _ = load_clean_sample(path, clean_hvfhv_data, sample_settings(sample_rate, columns=columns),
+                                         cache=cache, batch_size=batch_size)
+        table = pa.Table.from_pandas(df[[c for c in READ_COLUMNS if c in df.columns]], preserve_index=False)
+        for batch in table.to_batches(batch_size):
+            acc.update(batch, start, end)
+        acc.rows_read += stats['sampled_rows'] - len(df)  # filas que descartó la limpieza
+        return acc
+    schema_names = pq.ParquetFile(path).schema_arrow.names
+    columns = [c for c in READ_COLUMNS if c in schema_names]
+    if sample_rate == 1:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+    else:
+        batches = iter_sampled_batches(path, sample_rate, columns=columns, batch_size=batch_size)
+    for batch in batches:
+        acc.update(batch, start, end)
+    return acc
+
+
+def compute_local_metrics(parquet_files, sample_rate=1, start=None, end=None, workers=None, batch_size=250000,
+                          cache=None, columns=None):
+    """
+    Acumula todos los ficheros en paralelo (un fichero por tarea).
+
+    Con cache (SampleCache) y sample_rate > 1 cada fichero se recorre desde
+    su muestra limpia en sample_cache.py (ver accumulate_file).
+
+    Returns:
+        LocalMetrics: Métricas listas para consultar
+    """
+    workers = workers or os.cpu_count() or 1
+    total = MetricAccumulator()
+    if workers == 1:
+        for path in parquet_files:
+            total.merge(accumulate_file(path, sample_rate, start, end, batch_size, cache, columns))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(parquet_files) or 1)) as executor:
+            futures = [executor.submit(accumulate_file, str(p), sample_rate, start, end, batch_size, cache, columns)
+                       for p in parquet_files]
+            for future in futures:
+                total.merge(future.result())
+    return LocalMetrics(total)
+
+
+# ==================== RESULTADOS ====================
+
+def _r(value):
+    return round(float(value), 2)
+
+
+def _div(a, b):
+    return a / b if b else None
+
+
+class LocalMetrics:
+    """Resultados con el mismo formato que los pipelines del notebook."""
+
+    def __init__(self, acc):
+        self.acc = acc
+        self.a = acc.arrays
+
+    def _platforms(self, platforms):
+        if not platforms:
+            return slice(None)
+        return [PLATFORM_LABELS.index(p) for p in platforms if p in PLATFORM_LABELS]
+
+    def _time(self, platforms, axes_keep):
+        sel = self._platforms(platforms)
+        sums = {}
+        for name in ('time_trips', 'time_revenue', 'time_fare'):
+            cube = self.a[name][sel]
+            drop = tuple(ax for ax in (0, 1, 2, 3) if ax not in axes_keep)
+            sums[name] = cube.sum(axis=drop)
+        return sums
+
+    def _time_summary(self, key, axis, offset, platforms):
+        sums = self._time(platforms, (axis,))
+        rows = []
+        for i, trips in enumerate(sums['time_trips']):
+            if trips:
+                rows.append({'trips': int(trips), key: i + offset,
+                             'total_revenue': _r(sums['time_revenue'][i]),
+                             'avg_fare': _r(sums['time_fare'][i] / trips)})
+        return rows
+
+    def hourly(self, platforms=None):
+        return self._time_summary('hour', 3, 0, platforms)
+
+    def daily(self, platforms=None):
+        return self._time_summary('day_of_week', 2, 1, platforms)
+
+    def monthly(self, platforms=None):
+        return self._time_summary('month', 1, 1, platforms)
+
+    def day_hour(self, platforms=None):
+        sums = self._time(platforms, (2, 3))
+        rows = []
+        for d in range(7):
+            for h in range(24):
+                trips = sums['time_trips'][d, h]
+                if trips:
+                    rows.append({'trips': int(trips), 'day_of_week': d + 1, 'hour': h,
+                                 'total_revenue': _r(sums['time_revenue'][d, h])})
+        return rows
+
+    def _p(self, measure, platforms=None):
+        return float(self.a[f'p_{measure}'][self._platforms(platforms)].sum())
+
+    def revenue(self, platforms=None):
+        names = {'base_fare': 'base_passenger_fare', 'tolls': 'tolls', 'tips': 'tips',
+                 'congestion': 'congestion_surcharge', 'airport_fee': 'airport_fee', 'bcf': 'bcf',
+                 'sales_tax': 'sales_tax'}
+        trips = self._p('trips', platforms)
+        if not trips:
+            return []
+        return [{**{out: _r(self._p(f, platforms)) for out, f in names.items()}, 'trip_count': int(trips)}]
+
+    def driver(self, platforms=None):
+        n = self._p('drv_trips', platforms)
+        if not n:
+            return []
+        pay, cost = self._p('drv_driver_pay', platforms), self._p('drv_total_cost', platforms)
+        return [{
+            'avg_driver_pay': _r(pay / n), 'avg_total_cost': _r(cost / n),
+            'avg_platform_cut': _r((cost - pay) / n), 'total_driver_earnings': _r(pay),
+            'total_platform_revenue': _r(cost - pay), 'avg_tips': _r(self._p('drv_tips', platforms) / n),
+            'avg_pay_per_mile': _r(self._p('drv_pay_per_mile', platforms) / n),
+            'avg_pay_per_minute': _r(self._p('drv_pay_per_minute', platforms) / n),
+            'trip_count': int(n),
+        }]
+
+    def wav(self, platforms=None):
+        total = self._p('trips', platforms)
+        if not total:
+            return []
+        requests, both = self._p('wav_requests', platforms), self._p('wav_both', platforms)
+        return [{'wav_requests': int(requests), 'wav_matches': int(self._p('wav_matches', platforms)),
+                 'both_request_and_match': int(both),
+                 'match_without_request': int(self._p('wav_match_without_request', platforms)),
+                 'total_trips': int(total), 'fulfillment_rate': (both / requests if requests else 0) * 100}]
+
+    def wav_platform(self, platforms=None):
+        rows = []
+        for p in self._platform_indexes(platforms):
+            requests, both = self.a['p_wav_requests'][p], self.a['p_wav_both'][p]
+            rows.append({'wav_requests': int(requests), 'both_request_and_match': int(both),
+                         'platform': PLATFORM_LABELS[p],
+                         'fulfillment_rate': (both / requests if requests else 0) * 100})
+        return sorted(rows, key=lambda r: -r['fulfillment_rate'])
+
+    def shared(self, platforms=None):
+        total = self._p('trips', platforms)
+        if not total:
+            return []
+        requests, matches = self._p('shared_requests', platforms), self._p('shared_matches', platforms)
+        return [{'shared_requests': int(requests), 'shared_matches': int(matches), 'total_trips': int(total),
+                 'match_rate': (matches / requests if requests else 0) * 100,
+                 'adoption_rate': requests / total * 100}]
+
+    def shared_hourly(self, platforms=None):
+        sel = self._platforms(platforms)
+        shared = self.a['shared_hour'][sel].sum(axis=0)
+        trips = self.a['time_trips'][sel].sum(axis=(0, 1, 2))
+        return [{'shared_trips': int(shared[h]), 'hour': h, 'adoption_pct': shared[h] / trips[h] * 100}
+                for h in range(24) if trips[h]]
+
+    def _platform_indexes(self, platforms=None):
+        sel = range(N_PLATFORMS) if not platforms else self._platforms(platforms)
+        return [p for p in sel if self.a['p_trips'][p] > 0]
+
+    def platform(self, platforms=None):
+        rows = []
+        for p in self._platform_indexes(platforms):
+            a = {m: self.a[f'p_{m}'][p] for m in PLATFORM_MEASURES}
+            n = a['trips']
+            rows.append({
+                'trip_count': int(n), 'platform': PLATFORM_LABELS[p], 'total_revenue': _r(a['revenue']),
+                'avg_fare': _r(a['base_passenger_fare'] / n), 'avg_tip': _r(a['tips'] / n),
+                'total_miles': _r(a['trip_miles']), 'avg_miles': _r(a['trip_miles'] / n),
+                'avg_duration_min': _r(a['trip_time'] / 60 / n),
+                'shared_adoption_pct': _r(a['shared_requests'] / n * 100),
+                'wav_adoption_pct': _r(a['wav_requests'] / n * 100),
+            })
+        return sorted(rows, key=lambda r: -r['trip_count'])
+
+    def fleet_evolution(self, platforms=None):
+        allowed = set(self._platform_indexes(platforms))
+        rows = [{'trip_count': n, 'platform': PLATFORM_LABELS[p], 'month': m, 'year': y}
+                for (p, y, m), n in self.acc.fleet.items() if p in allowed]
+        return sorted(rows, key=lambda r: (r['month'], r['year'], r['platform']))
+
+    def _top_zones(self, counts, limit):
+        order = np.argsort(-counts, kind='stable')
+        return [z for z in order[:limit] if counts[z] > 0]
+
+    def pickup_locations(self, platforms=None, limit=50):
+        sel = self._platforms(platforms)
+        trips, revenue, fare = (self.a[n][sel].sum(axis=0) for n in ('pu_trips', 'pu_revenue', 'pu_fare'))
+        return [{'trip_count': int(trips[z]), 'location_id': int(z), 'total_revenue': _r(revenue[z]),
+                 'avg_fare': _r(fare[z] / trips[z])} for z in self._top_zones(trips, limit)]
+
+    def dropoff_locations(self, platforms=None, limit=30):
+        sel = self._platforms(platforms)
+        trips, fare = (self.a[n][sel].sum(axis=0) for n in ('do_trips', 'do_fare'))
+        return [{'trip_count': int(trips[z]), 'location_id': int(z), 'avg_fare': _r(fare[z] / trips[z])}
+                for z in self._top_zones(trips, limit)]
+
+    def top_pickups(self, platforms=None, limit=15):
+        trips = self.a['pu_trips'][self._platforms(platforms)].sum(axis=0)
+        return [{'_id': int(z), 'pickup_count': int(trips[z])} for z in self._top_zones(trips, limit)]
+
+    def od_flows(self, platforms=None, top_n=15, limit=30, min_trips=50):
+        sel = self._platforms(platforms)
+        trips, fare, miles = (self.a[n][sel].sum(axis=0) for n in ('od_trips', 'od_fare', 'od_miles'))
+        origins = [p['_id'] for p in self.top_pickups(platforms, top_n)]
+        rows = []
+        for o in origins:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                avg_distance = miles[o] / trips[o]
+            ok = (trips[o] >= min_trips) & (avg_distance >= 0.5) & (avg_distance <= 20)
+            for d in np.flatnonzero(ok):
+                rows.append({'trip_count': int(trips[o, d]), 'origin': int(o), 'destination': int(d),
+                             'avg_fare': _r(fare[o, d] / trips[o, d]), 'avg_distance': _r(avg_distance[d])})
+        return sorted(rows, key=lambda r: -r['trip_count'])[:limit]
+
+    def rush_hour(self, first_hour, last_hour, platforms=None, limit=20):
+        trips = self.a['pu_hour_trips'][self._platforms(platforms)].sum(axis=0)[first_hour:last_hour + 1].sum(axis=0)
+        return [{'trip_count': int(trips[z]), 'location_id': int(z)} for z in self._top_zones(trips, limit)]
+
+    def sections(self, platforms=None):
+        """Todas las secciones con los nombres de report_engine.notebook_report()."""
+        return {
+            'hourly': self.hourly(platforms), 'daily': self.daily(platforms), 'monthly': self.monthly(platforms),
+            'day_hour': self.day_hour(platforms), 'revenue': self.revenue(platforms),
+            'driver': self.driver(platforms), 'wav': self.wav(platforms),
+            'wav_platform': self.wav_platform(platforms), 'shared': self.shared(platforms),
+            'shared_hourly': self.shared_hourly(platforms), 'platform': self.platform(),
+            'fleet_evolution': self.fleet_evolution(), 'pickup_locations': self.pickup_locations(platforms),
+            'dropoff_locations': self.dropoff_locations(platforms), 'top_pickups': self.top_pickups(platforms),
+            'od_flows': self.od_flows(platforms), 'morning_rush': self.rush_hour(6, 9, platforms),
+            'evening_rush': self.rush_hour(17, 20, platforms),
+        }
+
+
+# ==================== COMPARACIÓN CON MONGODB ====================
+
+# Claves para emparejar filas de cada sección (secciones de una fila: sin clave)
+SECTION_KEYS = {
+    'hourly': ['hour'], 'daily': ['day_of_week'], 'monthly': ['month'], 'day_hour': ['day_of_week', 'hour'],
+    'wav_platform': ['platform'], 'shared_hourly': ['hour'], 'platform': ['platform'],
+    'fleet_evolution': ['platform', 'year', 'month'], 'pickup_locations': ['location_id'],
+    'dropoff_locations': ['location_id'], 'top_pickups': ['_id'], 'od_flows': ['origin', 'destination'],
+    'morning_rush': ['location_id'], 'evening_rush': ['location_id'],
+}
+
+
+def compare_sections(local, mongo, atol=0.011, rtol=1e-9):
+    """
+    Compara secciones locales con las de MongoDB (report.records).
+
+    En las listas "top N" solo se comparan las filas presentes en ambas (los
+    empates pueden ordenarse distinto).
+
+    Returns:
+        dict: {sección: {'rows_local', 'rows_mongo', 'matched', 'mismatches'}}
+    """
+    report = {}
+    for name in sorted(set(local) & set(mongo)):
+        df_l, df_m = pd.DataFrame(local[name]), pd.DataFrame(mongo[name])
+        keys = SECTION_KEYS.get(name, [])
+        if df_l.empty or df_m.empty:
+            report[name] = {'rows_local': len(df_l), 'rows_mongo': len(df_m), 'matched': 0,
+                            'mismatches': 0 if df_l.empty and df_m.empty else 1}
+            continue
+        if keys:
+            merged = df_l.merge(df_m, on=keys, suffixes=('_local', '_mongo'))
+        else:
+            merged = df_l.add_suffix('_local').join(df_m.add_suffix('_mongo'))
+        mismatches = 0
+        for col in df_l.columns:
+            if col in keys or f'{col}_mongo' not in merged:
+                continue
+            a, b = merged[f'{col}_local'], merged[f'{col}_mongo']
+            if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+                mismatches += int((~np.isclose(a, b, atol=atol, rtol=rtol, equal_nan=True)).sum())
+            else:
+                mismatches += int((a != b).sum())
+        report[name] = {'rows_local': len(df_l), 'rows_mongo': len(df_m), 'matched': len(merged),
+                        'mismatches': mismatches}
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Métricas HVFHV directamente desde Parquet")
+    parser.add_argument('data_dir', help="Directorio con fhvhv_tripdata_*.parquet")
+    parser.add_argument('--sample-rate', type=int, default=1, help="1 = todas las filas; 40 = muestra de MongoDB")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--start', default='2025-01-01')
+    parser.add_argument('--end', default='2025-07-01')
+    parser.add_argument('--compare', action='store_true', help="Compara con MongoDB (report_engine)")
+    parser.add_argument('--no-sample-cache', dest='sample_cache', action='store_false',
+                        help="Con --sample-rate > 1, lee siempre el Parquet (sin sample_cache.py)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    files = sorted(glob(os.path.join(args.data_dir, "fhvhv_tripdata_*.parquet")))
+    start, end = dt.datetime.fromisoformat(args.start), dt.datetime.fromisoformat(args.end)
+
+    cache = columns = None
+    if args.sample_cache:
+        from cargar_datos_completo import COLUMNS as columns
+        from sample_cache import SampleCache
+
+        cache = SampleCache()
+
+    t0 = time.perf_counter()
+    metrics = compute_local_metrics(files, args.sample_rate, start, end, args.workers, cache=cache, columns=columns)
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {len(files)} ficheros | {metrics.acc.rows_read:,} filas leídas | "
+          f"{metrics.acc.rows_used:,} válidas en la ventana | {elapsed:.1f} s "
+          f"({metrics.acc.rows_read / elapsed:,.0f} filas/s)")
+    for row in metrics.platform():
+        print(f"   {row['platform']}: {row['trip_count']:,} viajes | revenue ${row['total_revenue']:,.2f}")
+
+    if args.compare:
+        from pymongo import MongoClient
+
+        from cargar_datos_completo import COLLECTION_NAME, DATABASE_NAME, MONGO_URI
+        from report_engine import notebook_report
+
+        collection = MongoClient(MONGO_URI)[DATABASE_NAME][COLLECTION_NAME]
+        report = notebook_report(collection, start, end)
+        report.run()
+        for name, res in compare_sections(metrics.sections(), report.records).items():
+            status = "✅" if res['mismatches'] == 0 else "❌"
+            print(f"   {status} {name}: {res['matched']}/{res['rows_mongo']} filas emparejadas, "
+                  f"{res['mismatches']} diferencias")
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Sanitización columnar de DataFrames HVFHV para MongoDB.
+
+Módulo compartido por cargar_datos_completo.py y fix_nat_error.py.
+
+La versión original de sanitize_for_mongo() hacía to_dict('records') y
+revisaba cada celda en Python (pd.isna + isinstance). Aquí cada columna se
+convierte UNA sola vez con NumPy (NaT/NaN → None, numpy → escalares Python,
+date → string, Int64 → int) y los documentos se construyen en una única
+pasada con zip().
+
+Los documentos resultantes son idénticos (mismo BSON) a los de la versión
+anterior, que se conserva como sanitize_for_mongo_legacy() para comparar
+(ver bench_sanitize.py).
+"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from hvfhv_cleaning import float64_values
+
+# Columnas datetime principales del dataset HVFHV
+DATETIME_COLS = ['pickup_datetime', 'dropoff_datetime', 'request_datetime', 'on_scene_datetime']
+
+# Campos numéricos temporales que NO se convierten a string
+NUMERIC_TIME_FIELDS = ['pickup_hour', 'pickup_day_of_week', 'pickup_month']
+
+
+def normalize_datetimes(df, datetime_cols):
+    """Normaliza columnas datetime para MongoDB: UTC naive sin NaT."""
+    for col in datetime_cols:
+        if col in df.columns:
+            df[col] = _normalize_datetime_series(df[col])
+    return df
+
+
+def _normalize_datetime_series(s):
+    """Versión por columna de normalize_datetimes() (no modifica el DataFrame)."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        if hasattr(s.dtype, 'tz') and s.dtype.tz is not None:
+            s = s.dt.tz_convert('UTC').dt.tz_localize(None)
+    else:
+        s = pd.to_datetime(s, errors='coerce')
+    return s.where(s.notna(), None)
+
+
+def _first_valid(s):
+    """Primer valor no nulo de la serie (equivale a s.dropna().iloc[0])."""
+    mask = s.notna().to_numpy()
+    if len(mask) == 0 or not mask.any():
+        return None
+    return s.iloc[int(mask.argmax())]
+
+
+def _is_date_column(col, s):
+    """True si la columna contiene datetime.date (no datetime) → se guarda como string."""
+    if col in NUMERIC_TIME_FIELDS or len(s) == 0:
+        return False
+    # Un datetime.date solo puede vivir en columnas object/category
+    if not (pd.api.types.is_object_dtype(s.dtype) or isinstance(s.dtype, pd.CategoricalDtype)):
+        return False
+    first_valid = _first_valid(s)
+    return isinstance(first_valid, dt.date) and not isinstance(first_valid, dt.datetime)
+
+
+def _box_value(value):
+    """Convierte un escalar numpy suelto (columnas object) a tipo Python."""
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _with_nulls(values, mask):
+    """Sustituye por None las posiciones nulas y devuelve una lista Python."""
+    if mask.any():
+        values = values.astype(object)
+        values[mask] = None
+    return values.tolist()
+
+
+def _column_to_list(s):
+    """
+    Convierte una columna a lista de valores listos para BSON.
+
+    Una sola operación vectorizada por columna; el resultado coincide con lo
+    que producía el bucle celda a celda de la versión legacy.
+    """
+    dtype = s.dtype
+
+    # Int64 (nullable) → int, nulos como 0 (igual que fillna(0).astype(int))
+    if dtype == 'Int64':
+        return s.to_numpy(dtype='int64', na_value=0).tolist()
+
+    # datetime64 (naive o con zona) → datetime.datetime / None
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        if getattr(dtype, 'tz', None) is not None:
+            s = s.dt.tz_convert('UTC').dt.tz_localize(None)
+        # NumPy convierte datetime64[us] a datetime.datetime en una sola operación
+        values = np.asarray(s.to_numpy(), dtype='datetime64[us]')
+        return _with_nulls(values, np.isnat(values))
+
+    # Numéricos y booleanos numpy: tolist() ya devuelve escalares Python
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        values = s.to_numpy()
+        if dtype.kind == 'f':
+            # float32 del modo ligero de clean_hvfhv_data → float64 originales
+            values = float64_values(s)
+            return _with_nulls(values, np.isnan(values))
+        return values.tolist()
+
+    mask = s.isna().to_numpy()
+
+    # Categóricas: se resuelven los códigos contra las categorías una vez
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.categories.dtype.kind in 'biufO':
+        categories = np.asarray(dtype.categories, dtype=object)
+        values = categories.take(s.cat.codes.to_numpy(), mode='clip')
+        values[mask] = None
+        return values.tolist()
+
+    # object: normalmente strings, solo se recorre si hay escalares numpy
+    if pd.api.types.is_object_dtype(dtype):
+        values = s.to_numpy(dtype=object, copy=True)
+        values[mask] = None
+        if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+            return [_box_value(v) for v in values]
+        return values.tolist()
+
+    # Resto de extension dtypes (string, Float64, boolean...): mismo criterio que legacy
+    return [None if m else _box_value(v) for v, m in zip(s, mask)]
+
+
+def sanitize_for_mongo(df):
+    """
+    Sanitiza DataFrame para MongoDB de forma columnar.
+
+    Args:
+        df (pd.DataFrame): Datos limpios (salida de clean_hvfhv_data)
+
+    Returns:
+        list: Lista de diccionarios listos para insert_many
+    """
+    columns = list(df.columns)
+    if len(df) == 0:
+        return []
+
+    column_values = []
+    for col in columns:
+        s = df[col]
+        if col in DATETIME_COLS:
+            s = _normalize_datetime_series(s)
+        if _is_date_column(col, s):
+            s = s.astype(str)
+        column_values.append(_column_to_list(s))
+
+    # Una única pasada para construir los documentos
+    return [dict(zip(columns, row)) for row in zip(*column_values)]
+
+
+def sanitize_for_mongo_legacy(df):
+    """Implementación original celda a celda (referencia para benchmarks)."""
+    df_clean = df.copy()
+
+    # Normalizar columnas datetime
+    df_clean = normalize_datetimes(df_clean, DATETIME_COLS)
+
+    # Convertir datetime.date a STRING
+    for col in df_clean.columns:
+        if col not in NUMERIC_TIME_FIELDS and len(df_clean) > 0:
+            first_valid = df_clean[col].dropna().iloc[0] if len(df_clean[col].dropna()) > 0 else None
+            if first_valid is not None and isinstance(first_valid, dt.date) and not isinstance(first_valid, dt.datetime):
+                df_clean[col] = df_clean[col].astype(str)
+
+    # Convertir Int64 a int
+    for col in df_clean.select_dtypes(include=['Int64']).columns:
+        df_clean[col] = df_clean[col].fillna(0).astype(int)
+
+    # Convertir a diccionarios y limpiar NaT manualmente
+    records = df_clean.to_dict('records')
+    clean_records = []
+
+    for record in records:
+        clean_record = {}
+        for key, value in record.items():
+            if pd.isna(value):
+                clean_record[key] = None
+            elif isinstance(value, (np.integer, np.floating)):
+                clean_record[key] = value.item()
+            else:
+                clean_record[key] = value
+        clean_records.append(clean_record)
+
+    return clean_records
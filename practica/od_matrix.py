@@ -0,0 +1,558 @@
+# -*- coding: utf-8 -*-
+"""
+Matrices origen-destino (OD) densas en arrays NumPy memory-mapped.
+
+La celda de flujos OD del notebook hace un $group por (PULocationID,
+DOLocationID) sobre todo el rango de fechas y filtra después en Python;
+cualquier otro corte (hora, plataforma, mes) es otro recorrido completo de
+la colección. Aquí las sumas se guardan ya agregadas en matrices
+zona × zona, una partición por fichero fuente (mes):
+
+    outputs/od_matrix/<colección>/<fichero>/
+        cube.npy     float32  medida × plataforma × hora × origen × destino
+        totals.npy   float64  medida × plataforma × origen × destino (todas las horas)
+        meta.json    fichero, mes (YYYY-MM), viajes
+
+con medidas trips, revenue (componentes de REVENUE_FIELDS), fare
+(base_passenger_fare), miles y duration_min. Cada viaje suma con peso
+sample_weight / DEFAULT_WEIGHT (1 en la carga 1 de N): las medidas están en
+viajes de muestra equivalentes, así que las particiones antiguas siguen
+siendo válidas y ×SCALING_FACTOR sigue dando el total estimado también con
+un plan estratificado. Las consultas abren los .npy
+con memory-map y suman solo las particiones / plataformas / horas del
+corte: top-k flujos, balance entrada/salida por zona y comparación de
+cortes son operaciones sobre arrays de 266 × 266.
+
+Tamaño en disco: ~170 MB por mes (el cubo horario es denso); totals.npy
+(~14 MB) basta para las consultas sin filtro de hora.
+
+Mantenimiento (mismo esquema que rollup.py, por source_file):
+- ODStore.add_frame(): suma un lote limpio recién insertado (carga incremental).
+- ODStore.rebuild_from_collection(): recalcula la partición de un fichero desde MongoDB.
+- build_from_parquet(): construye las particiones leyendo los Parquet en
+  streaming (los mismos filtros que clean_hvfhv_data, en paralelo por fichero).
+- ODStore.remove(): borra la partición (fichero recargado o eliminado).
+
+Uso:
+    python od_matrix.py ./data --sample-rate 40 --build
+    python od_matrix.py --top 20 --hours 7 8 9 --platform HV0003
+    python od_matrix.py --balance 10
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from hvfhv_cleaning import float64_values
+from hvfhv_pipelines import DEFAULT_WEIGHT, WEIGHT_FIELD
+from local_metrics import (MAX_DURATION_MIN, MAX_MILES, N_PLATFORMS, N_ZONES, PLATFORM_LABELS, PLATFORMS,
+                           REVENUE_FIELDS, _float, _timestamps, _zone)
+from parquet_sampler import iter_sampled_batches
+
+DEFAULT_OD_DIR = Path(__file__).resolve().parent / 'outputs' / 'od_matrix'
+MEASURES = ['trips', 'revenue', 'fare', 'miles', 'duration_min']
+N_MEASURES = len(MEASURES)
+N_HOURS = 24
+CUBE_SHAPE = (N_MEASURES, N_PLATFORMS, N_HOURS, N_ZONES, N_ZONES)
+TOTALS_SHAPE = (N_MEASURES, N_PLATFORMS, N_ZONES, N_ZONES)
+READ_COLUMNS = (['hvfhs_license_num', 'pickup_datetime', 'dropoff_datetime', 'PULocationID', 'DOLocationID',
+                 'trip_miles', 'base_passenger_fare'] + [f for f in REVENUE_FIELDS if f != 'base_passenger_fare'])
+
+_MONTH_RE = re.compile(r'(\d{4})-(\d{2})')
+
+
+def od_store_dir(collection_name, root=DEFAULT_OD_DIR):
+    """Directorio de las matrices OD de una colección (p. ej. trips_2025 o trips_2025_compact)."""
+    return Path(root) / collection_name
+
+
+def _platform_index(values):
+    """Código de plataforma → índice en PLATFORM_LABELS (desconocidos/nulos → OTHER)."""
+    codes = pd.Categorical(values, categories=PLATFORMS).codes.astype(np.int64)
+    return np.where(codes < 0, len(PLATFORMS), codes)
+
+
+def _sample_units(weight):
+    """Pesos de muestreo → viajes de muestra equivalentes (nulos → DEFAULT_WEIGHT, es decir 1)."""
+    return np.where(np.isnan(weight), DEFAULT_WEIGHT, weight) / DEFAULT_WEIGHT
+
+
+def _month_from_name(source_file):
+    match = _MONTH_RE.search(source_file or '')
+    return f"{match.group(1)}-{match.group(2)}" if match else None
+
+
+# ==================== ACUMULACIÓN ====================
+
+def _od_updates(platform, hour, origin, dest, values):
+    """
+    Claves planas únicas del cubo y de totals con sus sumas.
+
+    Args:
+        platform, hour, origin, dest (np.ndarray): Índices por viaje (origen/destino ya válidos)
+        values (dict): Medida → array por viaje
+
+    Returns:
+        tuple: (claves del cubo, sumas [medida × clave], claves de totals, sumas)
+    """
+    cell = origin * N_ZONES + dest
+    cube_key = (platform * N_HOURS + hour) * N_ZONES * N_ZONES + cell
+    total_key = platform * N_ZONES * N_ZONES + cell
+    out = []
+    for key in (cube_key, total_key):
+        unique, inverse = np.unique(key, return_inverse=True)
+        sums = np.stack([np.bincount(inverse, weights=values[m], minlength=len(unique)) for m in MEASURES])
+        out.extend([unique, sums])
+    return tuple(out)
+
+
+def frame_to_od(df):
+    """
+    Índices y medidas por viaje de un DataFrame limpio (salida de clean_hvfhv_data).
+
+    Returns:
+        tuple: (plataforma, hora, origen, destino, {medida: valores}, mes dominante 'YYYY-MM')
+    """
+    pickup = pd.to_datetime(df['pickup_datetime'], errors='coerce')
+    origin = pd.to_numeric(df['PULocationID'], errors='coerce').to_numpy(dtype='float64')
+    dest = pd.to_numeric(df['DOLocationID'], errors='coerce').to_numpy(dtype='float64')
+    valid = (pickup.notna().to_numpy() & np.isfinite(origin) & np.isfinite(dest)
+             & (origin >= 0) & (origin < N_ZONES) & (dest >= 0) & (dest < N_ZONES))
+    df, pickup = df[valid], pickup[valid]
+
+    def numeric(col):
+        if col not in df.columns:
+            return np.zeros(len(df))
+        values = float64_values(pd.to_numeric(df[col], errors='coerce'))
+        return np.where(np.isnan(values), 0.0, values)
+
+    if 'trip_duration_minutes' in df.columns:
+        duration = numeric('trip_duration_minutes')
+    else:
+        duration = ((pd.to_datetime(df['dropoff_datetime']) - pickup).dt.total_seconds() / 60).fillna(0).to_numpy()
+    if WEIGHT_FIELD in df.columns:
+        units = _sample_units(float64_values(pd.to_numeric(df[WEIGHT_FIELD], errors='coerce')))
+    else:
+        units = np.ones(len(df))
+    values = {
+        'trips': units,
+        'revenue': sum(numeric(f) for f in REVENUE_FIELDS) * units,
+        'fare': numeric('base_passenger_fare') * units,
+        'miles': numeric('trip_miles') * units,
+        'duration_min': duration * units,
+    }
+    months = pickup.dt.strftime('%Y-%m')
+    month = months.mode().iloc[0] if len(months) else None
+    return (_platform_index(df['hvfhs_license_num']), pickup.dt.hour.to_numpy(dtype=np.int64),
+            origin[valid].astype(np.int64), dest[valid].astype(np.int64), values, month)
+
+
+def batch_to_od(batch):
+    """Como frame_to_od() para un record batch de Parquet (aplica los filtros de clean_hvfhv_data)."""
+    pickup = _timestamps(batch, 'pickup_datetime')
+    dropoff = _timestamps(batch, 'dropoff_datetime')
+    miles = batch.column('trip_miles').cast(pa.float64()).to_numpy(zero_copy_only=False)
+    with np.errstate(invalid='ignore'):
+        duration = ((dropoff - pickup) / np.timedelta64(1, 's')) / 60
+        keep = (duration > 0) & (duration <= MAX_DURATION_MIN) & (miles > 0) & (miles <= MAX_MILES)
+    origin = _zone(batch, 'PULocationID')
+    dest = _zone(batch, 'DOLocationID')
+    keep &= (origin >= 0) & (dest >= 0)
+    idx = np.flatnonzero(keep)
+
+    platform = pc.fill_null(pc.index_in(batch.column('hvfhs_license_num'), value_set=pa.array(PLATFORMS)),
+                            len(PLATFORMS))
+    pickup = pickup[idx]
+    hour = ((pickup - pickup.astype('datetime64[D]')) // np.timedelta64(1, 'h')).astype(np.int64)
+    fare = _float(batch, 'base_passenger_fare')[idx]
+    if WEIGHT_FIELD in batch.schema.names:
+        units = _sample_units(batch.column(WEIGHT_FIELD).cast(pa.float64()).to_numpy(zero_copy_only=False)[idx])
+    else:
+        units = np.ones(len(idx))
+    values = {
+        'trips': units,
+        'revenue': (fare + sum(_float(batch, f)[idx] for f in REVENUE_FIELDS if f != 'base_passenger_fare')) * units,
+        'fare': fare * units,
+        'miles': miles[idx] * units,
+        'duration_min': duration[idx] * units,
+    }
+    months, counts = np.unique(pickup.astype('datetime64[M]'), return_counts=True)
+    month = str(months[np.argmax(counts)]) if len(months) else None
+    return (platform.to_numpy(zero_copy_only=False).astype(np.int64)[idx], hour,
+            origin[idx], dest[idx], values, month)
+
+
+# ==================== ALMACÉN ====================
+
+class ODStore:
+    """Particiones OD (una por fichero fuente) en un directorio."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _dir(self, source_file):
+        return self.root / Path(str(source_file)).stem
+
+    def _read_meta(self, path):
+        try:
+            with open(path / 'meta.json', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, path, meta):
+        tmp = path / 'meta.json.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, path / 'meta.json')
+
+    def partitions(self):
+        """Metadatos de las particiones completas, ordenados por mes."""
+        if not self.root.exists():
+            return []
+        metas = [self._read_meta(p) for p in sorted(self.root.iterdir()) if p.is_dir()]
+        return sorted((m for m in metas if m), key=lambda m: (m.get('month') or '', m['source_file']))
+
+    def months(self):
+        return sorted({m['month'] for m in self.partitions() if m.get('month')})
+
+    def has(self, source_file):
+        """True si el fichero tiene partición."""
+        return self._read_meta(self._dir(source_file)) is not None
+
+    def remove(self, source_file):
+        """Borra la partición de un fichero (si existe)."""
+        shutil.rmtree(self._dir(source_file), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _open(self, source_file, create=False):
+        """(cube, totals, meta) de una partición en modo r+ (la crea a cero si create=True)."""
+        path = self._dir(source_file)
+        meta = self._read_meta(path)
+        if meta is None:
+            if not create:
+                return None
+            path.mkdir(parents=True, exist_ok=True)
+            cube = np.lib.format.open_memmap(path / 'cube.npy', mode='w+', dtype=np.float32, shape=CUBE_SHAPE)
+            totals = np.lib.format.open_memmap(path / 'totals.npy', mode='w+', dtype=np.float64,
+                                               shape=TOTALS_SHAPE)
+            meta = {'source_file': source_file, 'month': _month_from_name(source_file), 'trips': 0}
+            return cube, totals, meta
+        return (np.load(path / 'cube.npy', mmap_mode='r+'), np.load(path / 'totals.npy', mmap_mode='r+'), meta)
+
+    def _apply(self, source_file, platform, hour, origin, dest, values, month):
+        if len(origin) == 0:
+            return 0
+        cube, totals, meta = self._open(source_file, create=True)
+        cube_keys, cube_sums, total_keys, total_sums = _od_updates(platform, hour, origin, dest, values)
+        cube_flat = cube.reshape(N_MEASURES, -1)
+        totals_flat = totals.reshape(N_MEASURES, -1)
+        # Claves únicas: la suma con índices no pierde repeticiones
+        cube_flat[:, cube_keys] += cube_sums.astype(np.float32)
+        totals_flat[:, total_keys] += total_sums
+        cube.flush()
+        totals.flush()
+        trips = float(values['trips'].sum())
+        meta['trips'] = round(meta['trips'] + trips, 2)
+        meta['month'] = meta.get('month') or month
+        meta['updated_at'] = dt.datetime.now().isoformat(timespec='seconds')
+        self._write_meta(self._dir(source_file), meta)
+        return round(trips)
+
+    def add_frame(self, df, source_file):
+        """
+        Suma a la partición de `source_file` los viajes de un DataFrame limpio.
+
+        Returns:
+            int: Viajes de muestra equivalentes acumulados (con origen y destino válidos)
+        """
+        if len(df) == 0:
+            return 0
+        return self._apply(source_file, *frame_to_od(df))
+
+    def add_batch(self, batch, source_file):
+        """Suma un record batch de Parquet (sin limpiar: se aplican los filtros de limpieza)."""
+        return self._apply(source_file, *batch_to_od(batch))
+
+    def rebuild_from_collection(self, collection, source_file, match=None):
+        """
+        Recalcula la partición de un fichero desde los viajes de MongoDB.
+
+        Args:
+            collection: Colección de viajes (o CompactCollection)
+            source_file (str): Fichero fuente (campo source_file de los viajes)
+            match (dict, optional): Filtro en lugar de {source_file: ...} (cargas sin etiquetar)
+
+        Returns:
+            int: Viajes de muestra equivalentes acumulados
+        """
+        self.remove(source_file)
+        match = dict(match) if match is not None else {'source_file': source_file}
+        match['pickup_datetime'] = {'$type': 'date'}
+        match['PULocationID'] = {'$ne': None}
+        match['DOLocationID'] = {'$ne': None}
+        units = {'$divide': [{'$ifNull': [f'${WEIGHT_FIELD}', DEFAULT_WEIGHT]}, DEFAULT_WEIGHT]}
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': {'platform': '$hvfhs_license_num', 'hour': {'$hour': '$pickup_datetime'},
+                        'origin': '$PULocationID', 'destination': '$DOLocationID',
+                        'month': {'$dateToString': {'format': '%Y-%m', 'date': '$pickup_datetime'}}},
+                'trips': {'$sum': units},
+                'revenue': {'$sum': {'$multiply': [{'$add': [{'$ifNull': [f'${f}', 0]} for f in REVENUE_FIELDS]},
+                                                   units]}},
+                'fare': {'$sum': {'$multiply': [{'$ifNull': ['$base_passenger_fare', 0]}, units]}},
+                'miles': {'$sum': {'$multiply': [{'$ifNull': ['$trip_miles', 0]}, units]}},
+                'duration_min': {'$sum': {'$multiply': [{'$ifNull': ['$trip_duration_minutes', 0]}, units]}},
+            }},
+        ]
+        rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+        if not rows:
+            return 0
+        keys = pd.DataFrame([r['_id'] for r in rows])
+        origin = keys['origin'].to_numpy(dtype=np.int64)
+        dest = keys['destination'].to_numpy(dtype=np.int64)
+        valid = (origin >= 0) & (origin < N_ZONES) & (dest >= 0) & (dest < N_ZONES)
+        values = {m: np.array([r[m] for r in rows], dtype='float64')[valid] for m in MEASURES}
+        by_month = pd.Series(values['trips']).groupby(keys['month'][valid].to_numpy()).sum()
+        month = by_month.idxmax() if len(by_month) else None
+        # Una fila por grupo: los valores ya vienen sumados (trips incluido)
+        return self._apply(source_file, _platform_index(keys['platform'])[valid],
+                           keys['hour'].to_numpy(np.int64)[valid], origin[valid], dest[valid], values, month)
+
+    # ---------- Consultas ----------
+
+    def _slice(self, months=None, platforms=None):
+        """Particiones y plataformas del corte."""
+        parts = [m for m in self.partitions() if months is None or m.get('month') in set(months)]
+        if platforms:
+            p_idx = [PLATFORM_LABELS.index(p) if p in PLATFORM_LABELS else len(PLATFORMS) for p in platforms]
+        else:
+            p_idx = list(range(N_PLATFORMS))
+        return parts, sorted(set(p_idx))
+
+    def matrix(self, measure='trips', months=None, platforms=None, hours=None):
+        """
+        Matriz origen × destino (N_ZONES × N_ZONES) de una medida para un corte.
+
+        Args:
+            measure (str): Una de MEASURES
+            months (list, optional): Meses 'YYYY-MM' (None = todos)
+            platforms (list, optional): Códigos HV000X (None = todas)
+            hours (list, optional): Horas de recogida 0-23 (None = todas, usa totals.npy)
+
+        Returns:
+            np.ndarray: float64 [origen, destino]
+        """
+        m = MEASURES.index(measure)
+        parts, p_idx = self._slice(months, platforms)
+        out = np.zeros((N_ZONES, N_ZONES))
+        for meta in parts:
+            path = self._dir(meta['source_file'])
+            if hours is None:
+                totals = np.load(path / 'totals.npy', mmap_mode='r')
+                out += totals[m, p_idx].sum(axis=0)
+            else:
+                cube = np.load(path / 'cube.npy', mmap_mode='r')
+                out += cube[m][np.ix_(p_idx, list(hours))].sum(axis=(0, 1), dtype=np.float64)
+        return out
+
+    def matrices(self, measures=MEASURES, **slice_args):
+        return {m: self.matrix(m, **slice_args) for m in measures}
+
+    def top_flows(self, k=20, origins=None, destinations=None, min_trips=1, miles_range=None,
+                  exclude_self=False, **slice_args):
+        """
+        Flujos OD con más viajes (mismas claves que pipeline_od del notebook).
+
+        Args:
+            k (int): Número de flujos
+            origins / destinations (list, optional): Restringe las zonas
+            min_trips (int): Mínimo de viajes (de muestra equivalentes) por flujo
+            miles_range (tuple, optional): (mín, máx) de la distancia media
+            exclude_self (bool): Excluye origen == destino
+            **slice_args: months, platforms, hours (ver matrix)
+
+        Returns:
+            list: [{origin, destination, trip_count, avg_fare, avg_distance, avg_duration, revenue}]
+        """
+        mats = self.matrices(**slice_args)
+        trips = mats['trips'].copy()
+        mask = trips >= max(min_trips, 1)
+        if origins is not None:
+            keep = np.zeros(N_ZONES, dtype=bool)
+            keep[[o for o in origins if 0 <= o < N_ZONES]] = True
+            mask &= keep[:, None]
+        if destinations is not None:
+            keep = np.zeros(N_ZONES, dtype=bool)
+            keep[[d for d in destinations if 0 <= d < N_ZONES]] = True
+            mask &= keep[None, :]
+        if exclude_self:
+            np.fill_diagonal(mask, False)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg_miles = mats['miles'] / trips
+        if miles_range is not None:
+            mask &= (avg_miles >= miles_range[0]) & (avg_miles <= miles_range[1])
+
+        flat = np.where(mask, trips, -1).ravel()
+        n = int(mask.sum())
+        k = min(k, n)
+        if k == 0:
+            return []
+        top = np.argpartition(-flat, k - 1)[:k]
+        top = top[np.lexsort((top, -flat[top]))]
+        result = []
+        for cell in top.tolist():
+            o, d = divmod(cell, N_ZONES)
+            t = trips[o, d]
+            result.append({
+                'origin': o, 'destination': d, 'trip_count': round(float(t), 2),
+                'avg_fare': round(float(mats['fare'][o, d] / t), 2),
+                'avg_distance': round(float(avg_miles[o, d]), 2),
+                'avg_duration': round(float(mats['duration_min'][o, d] / t), 2),
+                'revenue': round(float(mats['revenue'][o, d]), 2),
+            })
+        return result
+
+    def zone_balance(self, measure='trips', **slice_args):
+        """
+        Salidas, llegadas y balance neto (llegadas - salidas) por zona.
+
+        Returns:
+            list: [{location_id, outbound, inbound, net, internal}] de las zonas con viajes,
+                  ordenadas por balance neto descendente
+        """
+        mat = self.matrix(measure, **slice_args)
+        outbound, inbound, internal = mat.sum(axis=1), mat.sum(axis=0), np.diag(mat)
+        active = np.flatnonzero((outbound > 0) | (inbound > 0))
+        net = inbound - outbound
+        order = active[np.argsort(-net[active], kind='stable')]
+        return [{'location_id': int(z), 'outbound': float(outbound[z]), 'inbound': float(inbound[z]),
+                 'net': float(net[z]), 'internal': float(internal[z])} for z in order]
+
+    def compare(self, slice_a, slice_b, k=20, measure='trips', min_trips=1):
+        """
+        Flujos cuya cuota sobre el total más cambia entre dos cortes.
+
+        Args:
+            slice_a / slice_b (dict): Argumentos de matrix() (months, platforms, hours)
+            k (int): Número de flujos
+            measure (str): Medida comparada
+            min_trips (int): Mínimo de la medida en alguno de los dos cortes
+
+        Returns:
+            list: [{origin, destination, a, b, share_a, share_b, change}] (change en puntos %)
+        """
+        a, b = self.matrix(measure, **slice_a), self.matrix(measure, **slice_b)
+        share_a = a / a.sum() if a.sum() else a
+        share_b = b / b.sum() if b.sum() else b
+        change = (share_b - share_a) * 100
+        candidates = np.flatnonzero(((a >= min_trips) | (b >= min_trips)).ravel())
+        if len(candidates) == 0:
+            return []
+        k = min(k, len(candidates))
+        score = np.abs(change.ravel()[candidates])
+        top = candidates[np.argsort(-score, kind='stable')[:k]]
+        result = []
+        for cell in top.tolist():
+            o, d = divmod(cell, N_ZONES)
+            result.append({'origin': o, 'destination': d, 'a': float(a[o, d]), 'b': float(b[o, d]),
+                           'share_a': round(float(share_a[o, d]) * 100, 4), 'share_b': round(float(share_b[o, d]) * 100, 4),
+                           'change': round(float(change[o, d]), 4)})
+        return result
+
+
+# ==================== CONSTRUCCIÓN DESDE PARQUET ====================
+
+def build_partition(path, root, sample_rate=1, batch_size=250000):
+    """Reconstruye la partición de un fichero Parquet (se ejecuta en un proceso worker)."""
+    store = ODStore(root)
+    filename = os.path.basename(path)
+    store.remove(filename)
+    schema_names = pq.ParquetFile(path).schema_arrow.names
+    columns = [c for c in READ_COLUMNS if c in schema_names]
+    if sample_rate == 1:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+    else:
+        batches = iter_sampled_batches(path, sample_rate, columns=columns, batch_size=batch_size)
+    trips = sum(store.add_batch(batch, filename) for batch in batches)
+    return filename, trips
+
+
+def build_from_parquet(parquet_files, root, sample_rate=1, workers=None, batch_size=250000):
+    """
+    Construye las particiones de varios ficheros en paralelo (una tarea por fichero).
+
+    Con sample_rate=N se usa la misma muestra sistemática que la carga a MongoDB.
+
+    Returns:
+        dict: {fichero: viajes acumulados}
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(parquet_files) <= 1:
+        return dict(build_partition(p, root, sample_rate, batch_size) for p in parquet_files)
+    with ProcessPoolExecutor(max_workers=min(workers, len(parquet_files))) as executor:
+        futures = [executor.submit(build_partition, str(p), str(root), sample_rate, batch_size)
+                   for p in parquet_files]
+        return dict(f.result() for f in futures)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Matrices origen-destino memory-mapped")
+    parser.add_argument('data_dir', nargs='?', default='./data')
+    parser.add_argument('--store', default=str(od_store_dir('trips_2025')), help="Directorio de las particiones")
+    parser.add_argument('--build', action='store_true', help="Construye las particiones desde los Parquet")
+    parser.add_argument('--sample-rate', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20, help="Número de flujos a mostrar")
+    parser.add_argument('--months', nargs='*', default=None, help="Meses YYYY-MM")
+    parser.add_argument('--platform', nargs='*', default=None, help="Plataformas HV000X")
+    parser.add_argument('--hours', nargs='*', type=int, default=None, help="Horas de recogida")
+    parser.add_argument('--balance', type=int, default=0, help="Muestra las N zonas con mayor/menor balance")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = ODStore(args.store)
+
+    if args.build:
+        files = sorted(glob(os.path.join(args.data_dir, 'fhvhv_tripdata_*.parquet')))
+        t0 = time.perf_counter()
+        built = build_from_parquet(files, args.store, args.sample_rate, args.workers)
+        elapsed = time.perf_counter() - t0
+        print(f"✅ {len(built)} particiones | {sum(built.values()):,} viajes en {elapsed:.1f} s")
+
+    print(f"📦 Particiones: {', '.join(store.months()) or 'ninguna'}")
+    slice_args = {'months': args.months, 'platforms': args.platform, 'hours': args.hours}
+    t0 = time.perf_counter()
+    flows = store.top_flows(args.top, exclude_self=True, **slice_args)
+    elapsed = time.perf_counter() - t0
+    print(f"\n🔄 Top {len(flows)} flujos ({elapsed * 1000:.1f} ms):")
+    for f in flows:
+        print(f"   {f['origin']:>3} → {f['destination']:<3} {f['trip_count']:>10,.0f} viajes | "
+              f"${f['avg_fare']:.2f} | {f['avg_distance']:.1f} mi | {f['avg_duration']:.1f} min")
+
+    if args.balance:
+        balance = store.zone_balance(**slice_args)
+        print("\n⚖️  Zonas con más llegadas netas:")
+        for z in balance[:args.balance]:
+            print(f"   {z['location_id']:>3}: +{z['net']:,.0f} (entran {z['inbound']:,.0f}, salen {z['outbound']:,.0f})")
+        print("⚖️  Zonas con más salidas netas:")
+        for z in balance[-args.balance:]:
+            print(f"   {z['location_id']:>3}: {z['net']:,.0f} (entran {z['inbound']:,.0f}, salen {z['outbound']:,.0f})")
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Carga en paralelo de ficheros Parquet HVFHV a MongoDB.
+
+Pipeline acotado:
+
+    procesos worker ──(lotes BSON)──> cola acotada ──> threads escritores ──> MongoDB
+
+- Los workers (ProcessPoolExecutor) leen la muestra, limpian y codifican a
+  BSON (por columnas, arrow_bson.py) un grupo de row groups (por defecto
+  uno, ROW_GROUPS_PER_TASK) o un fichero entero.
+- Los escritores comparten un único MongoClient (su pool de conexiones) y
+  vacían la cola con insert_many mientras los workers siguen trabajando.
+  Escriben con un AdaptiveBulkWriter (adaptive_writer.py): lotes según
+  bytes y latencia y reintento de los errores transitorios; un lote que
+  agota los reintentos deja su fichero con error (no se confirma).
+- La cola tiene tamaño máximo: si MongoDB va lento, los workers esperan
+  (backpressure) en lugar de acumular meses enteros en memoria. Cada
+  resultado de un worker llega entero al proceso principal antes de
+  encolarse, así que lo que acota la memoria es el tamaño de la tarea
+  (× workers): con tareas de fichero entero cada worker guarda el mes
+  muestreado completo.
+
+Los totales por fichero y los mensajes de error por lote son los mismos que
+en la carga secuencial de cargar_datos_completo.py.
+
+Con metrics (ingest_metrics.py) cada worker mide sus etapas (lectura,
+limpieza, codificación) y las devuelve con el resultado; los escritores miden
+cada insert_many en la instrumentación del proceso principal.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import bson
+import pyarrow.parquet as pq
+from bson.objectid import ObjectId
+
+from adaptive_writer import AdaptiveBulkWriter
+from aggregate_cache import bump_data_version
+from arrow_bson import encode_frame_bytes, iter_insert_batches
+from compact_schema import CompactCollection, compact_document
+from hvfhv_cleaning import clean_hvfhv_data
+from ingest_manifest import SOURCE_FILE_FIELD, sample_settings
+from ingest_metrics import IngestMetrics, measure
+from mongo_sanitize import sanitize_for_mongo
+from sample_cache import load_clean_sample
+
+ROW_GROUPS_PER_TASK = 1  # Row groups por tarea: acota los lotes codificados que devuelve cada worker
+
+
+def default_workers():
+    """Workers por defecto: todos los cores menos uno (para los escritores)."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def plan_tasks(parquet_files, row_groups_per_task=None):
+    """
+    Divide los ficheros en tareas (fichero completo o bloques de row groups).
+
+    Args:
+        parquet_files (list): Rutas de ficheros Parquet
+        row_groups_per_task (int, optional): Row groups por tarea (None o 0 = fichero entero)
+
+    Returns:
+        list: Tuplas (ruta, lista de row groups o None)
+    """
+    tasks = []
+    for path in parquet_files:
+        if not row_groups_per_task:
+            tasks.append((str(path), None))
+            continue
+        num_row_groups = pq.ParquetFile(path).metadata.num_row_groups
+        for start in range(0, num_row_groups, row_groups_per_task):
+            tasks.append((str(path), list(range(start, min(start + row_groups_per_task, num_row_groups)))))
+    return tasks
+
+
+def prepare_task(task, sample_rate, columns, read_batch_size, batch_size, tag_source=False, compact=False,
+                 sampling_plan=None, metrics_config=None, clean_options=None, cache=None):
+    """
+    Trabajo de un proceso worker: leer, limpiar y codificar a BSON.
+
+    Con tag_source=True cada documento lleva source_file/source_row (ver
+    ingest_manifest.py) para que la carga se pueda reanudar sin duplicados.
+    Con compact=True los documentos se codifican en el esquema compacto
+    (compact_schema.py). Con sampling_plan la muestra es la estratificada de
+    stratified_sampler.py (con sample_weight) en lugar de 1 de sample_rate.
+    Con metrics_config (IngestMetrics.config()) se miden las etapas del worker.
+    clean_options se pasa a clean_hvfhv_data (p. ej. {'lean': True}). Con
+    cache (SampleCache) la muestra limpia sale de sample_cache.py si el
+    fichero y los parámetros no han cambiado.
+
+    Returns:
+        dict: Filas leídas/muestreadas/limpias, lotes de documentos BSON y,
+              con metrics_config, los registros de IngestMetrics.export()
+    """
+    path, row_groups = task
+    filename = os.path.basename(path)
+    metrics = IngestMetrics(**metrics_config) if metrics_config is not None else None
+    settings = sample_settings(sample_rate, columns=columns, sampling_plan=sampling_plan)
+    df_clean, stats, _ = load_clean_sample(path, clean_hvfhv_data, settings, clean_options, cache, read_batch_size,
+                                           row_groups=row_groups, row_index=tag_source, metrics=metrics)
+    if tag_source:
+        df_clean[SOURCE_FILE_FIELD] = filename
+
+    if compact:
+        with measure(metrics, 'sanitize', file=filename, rows_in=len(df_clean)):
+            docs = sanitize_for_mongo(df_clean)
+        with measure(metrics, 'encode', file=filename, rows_in=len(docs)) as rec:
+            encoded = []
+            for doc in docs:
+                doc = compact_document(doc)
+                # _id en el worker: ObjectId es único entre procesos y bson.encode lo pone primero
+                doc['_id'] = ObjectId()
+                encoded.append(bson.encode(doc))
+            rec['bytes'] = sum(len(raw) for raw in encoded)
+    else:
+        # Mismos bytes que bson.encode de cada dict, sin construir los dicts (_id incluido)
+        with measure(metrics, 'encode', file=filename, rows_in=len(df_clean)) as rec:
+            encoded = encode_frame_bytes(df_clean)
+            rec['bytes'] = sum(len(raw) for raw in encoded)
+
+    return {
+        'file': filename,
+        'total_rows': stats['total_rows'],
+        'sampled_rows': stats['sampled_rows'],
+        'clean_rows': len(df_clean),
+        'batches': list(iter_insert_batches(encoded, batch_size)),
+        'metrics': metrics.export(filename) if metrics is not None else None,
+    }
+
+
+def insert_raw_batch(collection, raw_docs, batch_no, filename, metrics=None, writer=None):
+    """
+    Inserta un lote de documentos BSON ya codificados. Devuelve los insertados.
+
+    Lo escribe `writer` (AdaptiveBulkWriter, ver adaptive_writer.py), que
+    lo parte si su tamaño de lote es menor y reintenta los errores
+    transitorios; sin writer, uno de tamaño fijo solo para este lote. Las
+    claves duplicadas (filas ya cargadas en un intento anterior) se informan
+    aparte y no cuentan como error.
+    """
+    writer = writer or AdaptiveBulkWriter(collection, initial_batch=len(raw_docs), adaptive=False,
+                                          metrics=metrics)
+    inserted, _ = writer.write(raw_docs, filename, batch_no)
+    return inserted
+
+
+def _writer_loop(collection, work_queue, results, lock, metrics=None, writer=None):
+    """Thread escritor: vacía la cola hasta recibir None."""
+    while True:
+        item = work_queue.get()
+        try:
+            if item is None:
+                return
+            filename, batch_no, raw_docs = item
+            try:
+                inserted = insert_raw_batch(collection, raw_docs, batch_no, filename, metrics, writer)
+            except Exception as e:
+                # Lote sin escribir (p. ej. reintentos agotados): el fichero queda con error
+                print(f"❌ [{filename}] Lote {batch_no}: {str(e)[:150]}")
+                with lock:
+                    results[filename]['error'] = str(e)
+                continue
+            with lock:
+                results[filename]['inserted'] += inserted
+        finally:
+            work_queue.task_done()
+
+
+def ingest_files_parallel(parquet_files, collection, sample_rate=40, batch_size=20000, workers=None,
+                          writers=2, queue_size=None, columns=None, read_batch_size=100000,
+                          row_groups_per_task=ROW_GROUPS_PER_TASK, tag_source=False, sampling_plan=None, metrics=None,
+                          clean_options=None, writer=None, cache=None):
+    """
+    Carga varios ficheros Parquet en paralelo.
+
+    Args:
+        parquet_files (list): Rutas de ficheros Parquet
+        collection: Colección MongoDB (todos los escritores comparten su cliente);
+            con una CompactCollection los workers codifican en el esquema compacto
+        sample_rate (int): Muestreo sistemático 1 de N
+        batch_size (int): Documentos por insert_many
+        workers (int, optional): Procesos de lectura/limpieza (None = cores - 1)
+        writers (int): Threads escritores
+        queue_size (int, optional): Lotes máximos en cola (None = 2 × writers)
+        columns (list, optional): Columnas a leer (None = todas)
+        read_batch_size (int): Filas por record batch al leer Parquet
+        row_groups_per_task (int, optional): Divide cada fichero en tareas de N row
+            groups (None o 0 = una tarea por fichero, con todo el mes en memoria)
+        tag_source (bool): Añade source_file/source_row a cada documento
+        sampling_plan (SamplingPlan, optional): Muestreo estratificado con pesos
+            (stratified_sampler.py); sustituye a sample_rate
+        metrics (IngestMetrics, optional): Instrumentación por etapa (ver ingest_metrics.py)
+        clean_options (dict, optional): Opciones de clean_hvfhv_data en los workers
+            (lean, memory_budget_mb; ver hvfhv_cleaning.py)
+        writer (AdaptiveBulkWriter, optional): Escritor compartido por los
+            threads (ver adaptive_writer.py); None = uno adaptativo que empieza
+            con lotes de batch_size
+        cache (SampleCache, optional): Caché de muestras limpias de los workers
+            (ver sample_cache.py); las tareas de unos row groups sacan sus filas
+            de la entrada del fichero entero si existe (solo las tareas de
+            fichero entero la crean). None = se lee siempre el Parquet
+
+    Returns:
+        dict: {nombre_fichero: {'total_rows', 'sampled_rows', 'clean_rows', 'inserted', 'error'}}
+    """
+    workers = workers or default_workers()
+    writers = max(1, writers)
+    compact = isinstance(collection, CompactCollection)
+    work_queue = queue.Queue(maxsize=queue_size or 2 * writers)
+    lock = threading.Lock()
+    metrics_config = metrics.config() if metrics is not None else None
+    writer = writer or AdaptiveBulkWriter(collection, initial_batch=batch_size, metrics=metrics)
+
+    tasks = plan_tasks(parquet_files, row_groups_per_task)
+    results = {
+        Path(p).name: {'total_rows': 0, 'sampled_rows': 0, 'clean_rows': 0, 'inserted': 0,
+                       'batches': 0, 'error': None}
+        for p in parquet_files
+    }
+
+    print(f"⚙️  Carga paralela: {len(tasks)} tareas | {workers} workers | {writers} escritores | "
+          f"cola máx. {work_queue.maxsize} lotes")
+
+    writer_threads = [
+        threading.Thread(target=_writer_loop, args=(collection, work_queue, results, lock, metrics, writer),
+                         daemon=True)
+        for _ in range(writers)
+    ]
+    for t in writer_threads:
+        t.start()
+
+    pending_tasks = iter(tasks)
+    in_flight = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Como mucho `workers` tareas en vuelo: el resto espera a que haya sitio en la cola
+            for task in pending_tasks:
+                in_flight[executor.submit(prepare_task, task, sample_rate, columns, read_batch_size,
+                                          batch_size, tag_source, compact, sampling_plan,
+                                          metrics_config, clean_options, cache)] = task
+                if len(in_flight) >= workers:
+                    break
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, _ = in_flight.pop(future)
+                    filename = Path(path).name
+                    try:
+                        prepared = future.result()
+                    except Exception as e:
+                        print(f"❌ ERROR procesando {filename}: {str(e)}")
+                        with lock:
+                            results[filename]['error'] = str(e)
+                        prepared = None
+
+                    if prepared is not None:
+                        if prepared['metrics'] is not None:
+                            metrics.merge(prepared['metrics'])
+                        with lock:
+                            for key in ('total_rows', 'sampled_rows', 'clean_rows'):
+                                results[filename][key] += prepared[key]
+                        for raw_docs in prepared['batches']:
+                            results[filename]['batches'] += 1
+                            # Bloquea si los escritores van por detrás (backpressure)
+                            work_queue.put((filename, results[filename]['batches'], raw_docs))
+
+                    next_task = next(pending_tasks, None)
+                    if next_task is not None:
+                        in_flight[executor.submit(prepare_task, next_task, sample_rate, columns,
+                                                  read_batch_size, batch_size, tag_source, compact,
+                                                  sampling_plan, metrics_config, clean_options,
+                                                  cache)] = next_task
+    finally:
+        work_queue.join()
+        for _ in writer_threads:
+            work_queue.put(None)
+        for t in writer_threads:
+            t.join()
+        bump_data_version(collection)
+
+    for filename, res in results.items():
+        if res['error']:
+            print(f"❌ {filename}: ERROR - {res['error']}")
+        else:
+            print(f"✅ {filename}: {res['inserted']:,} documentos insertados "
+                  f"({res['sampled_rows']:,} muestreadas de {res['total_rows']:,})")
+
+    return results
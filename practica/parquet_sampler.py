@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Lector Parquet con muestreo en streaming (por row groups y record batches).
+
+En lugar de decodificar el fichero mensual completo con
+parquet_file.read().to_pandas() y quedarse después con iloc[::40], aquí:
+
+1. Se calculan con los metadatos qué filas de cada row group entran en la
+   muestra (sistemática 1 de N o aleatoria con semilla).
+2. Los row groups sin filas muestreadas no se decodifican.
+3. Del resto se leen record batches de tamaño acotado y se hace take() a
+   nivel Arrow, así la memoria depende del batch y no del fichero.
+
+La muestra sistemática es la misma que antes: filas 0, N, 2N, ... del fichero.
+"""
+
+import logging
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_METHODS = ('systematic', 'random')
+
+
+def _row_group_offsets(metadata):
+    """Índice global de la primera fila de cada row group."""
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    return np.concatenate([[0], np.cumsum(sizes)]).astype('int64'), sizes
+
+
+def _selected_rows(offset, num_rows, sample_rate, method, rng):
+    """Índices locales (dentro del row group) de las filas muestreadas."""
+    if method == 'systematic':
+        first = (-offset) % sample_rate
+        return np.arange(first, num_rows, sample_rate, dtype='int64')
+    # Aleatorio: Bernoulli con p = 1/N, reproducible con la semilla
+    return np.flatnonzero(rng.random(num_rows) < 1.0 / sample_rate).astype('int64')
+
+
+def _column_chunk_bytes(metadata, row_group, column_names):
+    """Bytes comprimidos del row group: (total, de las columnas pedidas)."""
+    rg = metadata.row_group(row_group)
+    total = selected = 0
+    for j in range(rg.num_columns):
+        chunk = rg.column(j)
+        size = chunk.total_compressed_size
+        total += size
+        top_level = chunk.path_in_schema.split('.')[0]
+        if column_names is None or top_level in column_names:
+            selected += size
+    return total, selected
+
+
+def iter_sampled_batches(path, sample_rate=40, columns=None, method='systematic', seed=None,
+                         batch_size=100000, stats=None, row_groups=None, row_index_column=None):
+    """
+    Itera record batches Arrow con solo las filas muestreadas.
+
+    Args:
+        path (str | Path): Fichero Parquet
+        sample_rate (int): Se queda 1 de cada sample_rate filas
+        columns (list, optional): Columnas a leer (None = todas)
+        method (str): 'systematic' (filas 0, N, 2N...) o 'random' (Bernoulli 1/N)
+        seed (int, optional): Semilla para method='random'
+        batch_size (int): Filas por batch decodificado (acota la memoria)
+        stats (dict, optional): Se rellena con estadísticas de lectura
+        row_groups (list, optional): Solo estos row groups (None = todos). La
+            muestra de cada row group es la misma que al leer el fichero entero.
+        row_index_column (str, optional): Si se indica, añade una columna int64 con
+            el índice global de la fila en el fichero (identifica la fila de origen)
+
+    Yields:
+        pa.RecordBatch: Filas muestreadas de cada batch
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"method debe ser uno de {SAMPLING_METHODS}, no {method!r}")
+    if sample_rate < 1:
+        raise ValueError("sample_rate debe ser >= 1")
+
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    offsets, sizes = _row_group_offsets(metadata)
+    rng = np.random.default_rng(seed)
+    column_set = set(columns) if columns is not None else None
+    wanted = set(range(metadata.num_row_groups)) if row_groups is None else set(row_groups)
+
+    if stats is None:
+        stats = {}
+    stats.update({
+        'total_rows': sum(sizes[i] for i in wanted),
+        'sampled_rows': 0,
+        'rows_decoded': 0,
+        'row_groups_total': len(wanted),
+        'row_groups_read': 0,
+        'columns_total': len(parquet_file.schema_arrow.names),
+        'columns_read': len(columns) if columns is not None else len(parquet_file.schema_arrow.names),
+        'bytes_total': 0,
+        'bytes_read': 0,
+    })
+
+    for rg_index, rg_rows in enumerate(sizes):
+        # Se calcula siempre para que el generador aleatorio avance igual
+        selected = _selected_rows(int(offsets[rg_index]), rg_rows, sample_rate, method, rng)
+        if rg_index not in wanted:
+            continue
+        total_bytes, selected_bytes = _column_chunk_bytes(metadata, rg_index, column_set)
+        stats['bytes_total'] += total_bytes
+        if len(selected) == 0:
+            continue
+
+        stats['row_groups_read'] += 1
+        stats['bytes_read'] += selected_bytes
+
+        batch_start = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[rg_index],
+                                               columns=columns):
+            batch_end = batch_start + batch.num_rows
+            lo, hi = np.searchsorted(selected, [batch_start, batch_end])
+            stats['rows_decoded'] += batch.num_rows
+            if hi > lo:
+                sampled = batch.take(pa.array(selected[lo:hi] - batch_start))
+                if row_index_column is not None:
+                    row_index = pa.array(offsets[rg_index] + selected[lo:hi], pa.int64())
+                    sampled = pa.RecordBatch.from_arrays(sampled.columns + [row_index],
+                                                         names=sampled.schema.names + [row_index_column])
+                stats['sampled_rows'] += sampled.num_rows
+                yield sampled
+            batch_start = batch_end
+
+    stats['decode_skipped_pct'] = _skipped_pct(stats)
+
+
+def _skipped_pct(stats):
+    """Porcentaje de bytes comprimidos que no se decodificaron."""
+    if stats['bytes_total'] == 0:
+        return 0.0
+    return (1 - stats['bytes_read'] / stats['bytes_total']) * 100
+
+
+def read_sampled_parquet(path, sample_rate=40, columns=None, method='systematic', seed=None,
+                         batch_size=100000, row_groups=None, row_index_column=None):
+    """
+    Lee la muestra de un fichero Parquet como DataFrame.
+
+    Args:
+        path (str | Path): Fichero Parquet
+        sample_rate (int): Se queda 1 de cada sample_rate filas
+        columns (list, optional): Columnas a leer (None = todas)
+        method (str): 'systematic' o 'random'
+        seed (int, optional): Semilla para method='random'
+        batch_size (int): Filas por batch decodificado
+        row_groups (list, optional): Solo estos row groups (None = todos)
+        row_index_column (str, optional): Columna con el índice global de cada fila
+
+    Returns:
+        tuple: (pd.DataFrame muestreado, dict de estadísticas)
+    """
+    stats = {}
+    batches = list(iter_sampled_batches(path, sample_rate, columns, method, seed, batch_size, stats,
+                                        row_groups, row_index_column))
+    if batches:
+        table = pa.Table.from_batches(batches)
+    else:
+        schema = pq.ParquetFile(path).schema_arrow
+        if columns is not None:
+            schema = pa.schema([schema.field(c) for c in columns])
+        if row_index_column is not None:
+            schema = schema.append(pa.field(row_index_column, pa.int64()))
+        table = schema.empty_table()
+
+    logger.info(
+        f"📖 Muestra {stats['sampled_rows']:,}/{stats['total_rows']:,} filas | "
+        f"row groups {stats['row_groups_read']}/{stats['row_groups_total']} | "
+        f"columnas {stats['columns_read']}/{stats['columns_total']} | "
+        f"decode evitado: {stats['decode_skipped_pct']:.1f}% de bytes"
+    )
+    return table.to_pandas(), stats
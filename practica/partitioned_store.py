@@ -0,0 +1,597 @@
+# -*- coding: utf-8 -*-
+"""
+Viajes en una colección por mes y router de consultas en paralelo.
+
+Con una sola colección (trips_2025) los índices y los recorridos de cada
+$match de ventana crecen con el año entero. En el esquema particionado cada
+mes de pickup_datetime va a su colección (trips_2025_01, trips_2025_02...,
+opcionalmente time-series) y:
+
+- Borrar o recargar un mes es un drop de su colección.
+- PartitionRouter.aggregate(pipeline) ejecuta un pipeline del notebook
+  (with_match(match_base(...), etapas)) solo en los meses de la ventana,
+  en threads en paralelo, y une los resultados:
+
+      por mes:   $match ventana + etapas hasta el primer $group (parcial)
+      router:    une los grupos parciales por _id
+      servidor:  resto de etapas ($project, $round, $sort...) sobre los
+                 grupos unidos con $documents (o una colección temporal)
+
+  Acumuladores que se pueden repartir: $sum, $count, $avg (suma y número de
+  valores numéricos por mes), $min, $max, $addToSet y $push. Un $sort +
+  $limit antes de agrupar se aplica por mes y otra vez sobre la unión (top N).
+  Cualquier otra etapa antes del primer $group lanza ValueError.
+
+Los resultados son los de la colección única salvo el orden de suma de los
+float (última cifra antes de $round) y el orden de los empates de $sort.
+
+Uso:
+    python partitioned_store.py split                    # reparte trips_2025 por meses ($out en el servidor)
+    python partitioned_store.py list
+    python partitioned_store.py drop 2025-03
+    python partitioned_store.py reload 2025-03 ./data/fhvhv_tripdata_2025-03.parquet
+    python partitioned_store.py compare 2025-01-01 2025-07-01   # notebook: colección única vs router
+    python partitioned_store.py check --timeseries      # split de viajes sintéticos a time-series
+"""
+
+import argparse
+import datetime as dt
+import os
+import re
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+from adaptive_writer import AdaptiveBulkWriter
+from aggregate_cache import DATA_VERSION_COLLECTION, bump_data_version
+from arrow_bson import documents_for
+from ingest_metrics import measure
+
+PARTITION_BASE = 'trips'
+MONTH_FORMAT = '%Y-%m'
+# Índices de cada partición (los de las ventanas y filtros del notebook)
+PARTITION_INDEXES = {
+    'pickup_datetime': [('pickup_datetime', ASCENDING)],
+    'pickup_datetime+hvfhs_license_num': [('pickup_datetime', ASCENDING), ('hvfhs_license_num', ASCENDING)],
+    'PULocationID': [('PULocationID', ASCENDING)],
+}
+TIMESERIES_OPTIONS = {'timeField': 'pickup_datetime', 'metaField': 'hvfhs_license_num', 'granularity': 'minutes'}
+# Etapas que trabajan documento a documento (se pueden ejecutar en cada mes)
+PER_DOCUMENT_STAGES = {'$match', '$project', '$addFields', '$set', '$unset', '$unwind', '$replaceRoot',
+                       '$replaceWith'}
+# Tamaño máximo de los grupos unidos que se envían en $documents (un comando no puede pasar de 16 MB)
+DOCUMENTS_MAX_BYTES = 12 * 1024 * 1024
+
+
+def month_bounds(month):
+    """[inicio, fin) de un mes 'YYYY-MM'."""
+    start = dt.datetime.strptime(month, MONTH_FORMAT)
+    end = dt.datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def months_in_window(months, start=None, end=None):
+    """Meses de `months` que se solapan con [start, end) (None = sin límite)."""
+    selected = []
+    for month in months:
+        month_start, month_end = month_bounds(month)
+        if (start is None or month_end > start) and (end is None or month_start < end):
+            selected.append(month)
+    return selected
+
+
+class PartitionedStore:
+    """
+    Colecciones por mes de pickup_datetime: <base>_YYYY_MM.
+
+    Args:
+        db: Base de datos MongoDB
+        base (str): Prefijo de las colecciones
+        timeseries (bool): Crea las particiones nuevas como colecciones
+            time-series (timeField pickup_datetime, metaField plataforma)
+    """
+
+    def __init__(self, db, base=PARTITION_BASE, timeseries=False):
+        self.db = db
+        self.base = base
+        self.timeseries = timeseries
+        self._pattern = re.compile(rf'^{re.escape(base)}_(\d{{4}})_(\d{{2}})$')
+
+    def partition_name(self, month):
+        return f"{self.base}_{month.replace('-', '_')}"
+
+    def months(self):
+        """Meses con partición, ordenados ('YYYY-MM')."""
+        months = []
+        for name in self.db.list_collection_names():
+            found = self._pattern.match(name)
+            if found:
+                months.append(f"{found.group(1)}-{found.group(2)}")
+        return sorted(months)
+
+    def partition(self, month):
+        return self.db[self.partition_name(month)]
+
+    def ensure_partition(self, month):
+        """Crea la partición (y sus índices) si no existe."""
+        name = self.partition_name(month)
+        if name not in self.db.list_collection_names(filter={'name': name}):
+            if self.timeseries:
+                self.db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+            for index_name, keys in PARTITION_INDEXES.items():
+                self.db[name].create_index(keys, name=index_name)
+        return self.db[name]
+
+    def drop_month(self, month):
+        """Borra un mes entero (drop de su colección)."""
+        self.partition(month).drop()
+
+    def clear(self):
+        for month in self.months():
+            self.drop_month(month)
+
+    # ==================== CARGA ====================
+
+    def insert_frame(self, df, writer=None, filename=None, batch_size=20000, metrics=None):
+        """
+        Inserta un DataFrame limpio repartiendo las filas por mes de pickup_datetime.
+
+        Args:
+            df (pd.DataFrame): Viajes limpios (clean_hvfhv_data)
+            writer (AdaptiveBulkWriter, optional): Escritor compartido (ver
+                adaptive_writer.py); None = uno por llamada con lotes de batch_size
+            filename (str, optional): Fichero de origen (mensajes y métricas)
+
+        Returns:
+            dict: {mes: documentos insertados}
+        """
+        months = df['pickup_datetime'].dt.strftime(MONTH_FORMAT)
+        inserted = {}
+        for month, rows in sorted(df.groupby(months, sort=False).indices.items()):
+            partition = self.ensure_partition(month)
+            with measure(metrics, 'encode', file=filename, rows_in=len(rows)) as rec:
+                records = documents_for(df.take(rows), partition)
+                rec['bytes'] = sum(len(doc.raw) for doc in records)
+            writer = writer or AdaptiveBulkWriter(partition, initial_batch=batch_size, metrics=metrics)
+            inserted[month], _ = writer.write(records, filename, collection=partition)
+            bump_data_version(partition)
+        return inserted
+
+    def replace_month(self, month, df, writer=None, filename=None, batch_size=20000, metrics=None):
+        """
+        Recarga un mes: drop de la partición e inserción de las filas de ese mes.
+
+        Las filas de `df` de otros meses se ignoran (sus particiones no se tocan).
+
+        Returns:
+            int: Documentos insertados
+        """
+        self.drop_month(month)
+        rows = df[df['pickup_datetime'].dt.strftime(MONTH_FORMAT) == month]
+        return self.insert_frame(rows, writer, filename, batch_size, metrics).get(month, 0)
+
+    def split_collection(self, collection, batch_size=20000):
+        """
+        Reparte una colección única por meses en el servidor ($match + $out por mes).
+
+        Con timeseries=True el $out crea cada partición como time-series
+        (MongoDB >= 7.0.3; $merge no puede escribir en una time-series). En
+        servidores anteriores los documentos del mes se copian con insert_many
+        en lotes de batch_size.
+
+        Returns:
+            dict: {mes: documentos}
+        """
+        months = [doc['_id'] for doc in collection.aggregate([
+            {'$group': {'_id': {'$dateToString': {'format': MONTH_FORMAT, 'date': '$pickup_datetime'}}}},
+            {'$match': {'_id': {'$ne': None}}},
+        ])]
+        counts = {}
+        for month in sorted(months):
+            start, end = month_bounds(month)
+            window = {'pickup_datetime': {'$gte': start, '$lt': end}}
+            self.drop_month(month)
+            partition = self.partition(month)
+            out = {'db': self.db.name, 'coll': partition.name, 'timeseries': TIMESERIES_OPTIONS} \
+                if self.timeseries else partition.name
+            try:
+                collection.aggregate([{'$match': window}, {'$out': out}], allowDiskUse=True)
+            except OperationFailure:
+                if not self.timeseries:
+                    raise
+                self._copy_month(collection, window, month, batch_size)  # servidor sin $out time-series
+            # $out crea la colección: vuelve a crear los índices
+            for index_name, keys in PARTITION_INDEXES.items():
+                partition.create_index(keys, name=index_name)
+            counts[month] = partition.count_documents({})
+            bump_data_version(partition)
+        return counts
+
+    def _copy_month(self, collection, window, month, batch_size):
+        """Copia los documentos de `window` a la partición (time-series) sin decodificarlos."""
+        partition = self.ensure_partition(month)
+        source = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+        writer = AdaptiveBulkWriter(partition, initial_batch=batch_size)
+        batch = []
+        for doc in source.find(window, batch_size=batch_size):
+            batch.append(doc)
+            if len(batch) == batch_size:
+                writer.write(batch, partition.name)
+                batch = []
+        if batch:
+            writer.write(batch, partition.name)
+
+
+# ==================== ROUTER ====================
+
+def _number_key(value):
+    """Valor para comparar claves de grupo: $group une 1, 1.0 e Int64(1)."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict):
+        return {k: _number_key(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_number_key(v) for v in value]
+    return value
+
+
+def _group_key(value):
+    return bson.encode({'k': _number_key(value)})
+
+
+def split_pipeline(pipeline):
+    """
+    Divide un pipeline en (etapas por mes, $group a repartir o None, etapas sobre la unión).
+
+    Las etapas por documento van a cada mes hasta el primer $group (o $count,
+    que se trata como $group); un $sort seguido de $limit se aplica en cada
+    mes y también sobre la unión.
+    """
+    per_month = []
+    for i, stage in enumerate(pipeline):
+        op = next(iter(stage))
+        if op in PER_DOCUMENT_STAGES:
+            per_month.append(stage)
+        elif op == '$group':
+            return per_month, stage, pipeline[i + 1:]
+        elif op == '$count':
+            field = stage['$count']
+            return (per_month, {'$group': {'_id': None, field: {'$sum': 1}}},
+                    [{'$project': {'_id': 0, field: 1}}] + pipeline[i + 1:])
+        elif op == '$sort' and i + 1 < len(pipeline) and '$limit' in pipeline[i + 1]:
+            return per_month + pipeline[i:i + 2], None, pipeline[i:]
+        else:
+            raise ValueError(f"Etapa {op} antes del primer $group: el pipeline no se puede repartir por meses")
+    return per_month, None, []
+
+
+def partial_group(group):
+    """
+    $group parcial de cada mes y cómo unir cada campo.
+
+    Returns:
+        tuple: ($group parcial, {campo: operador})
+    """
+    spec = group['$group']
+    partial = {'_id': spec['_id']}
+    mergers = {}
+    for field, accumulator in spec.items():
+        if field == '_id':
+            continue
+        (op, expr), = accumulator.items()
+        if op == '$avg':
+            partial[f'{field}__sum'] = {'$sum': expr}
+            partial[f'{field}__n'] = {'$sum': {'$cond': [{'$isNumber': expr}, 1, 0]}}
+        elif op == '$count':
+            partial[field] = {'$sum': 1}
+            op = '$sum'
+        elif op in ('$sum', '$min', '$max', '$addToSet', '$push'):
+            partial[field] = {op: expr}
+        else:
+            raise ValueError(f"Acumulador {op} de {field} no se puede repartir por meses")
+        mergers[field] = op
+    return {'$group': partial}, mergers
+
+
+def merge_groups(partials, mergers):
+    """Une los grupos parciales de todos los meses (mismo _id → un documento)."""
+    merged = {}
+    for doc in partials:
+        key = _group_key(doc['_id'])
+        out = merged.get(key)
+        if out is None:
+            out = merged[key] = {'_id': doc['_id']}
+            for field, op in mergers.items():
+                if op == '$avg':
+                    out[f'{field}__sum'], out[f'{field}__n'] = 0, 0
+                elif op in ('$addToSet', '$push'):
+                    out[field] = []
+                elif op == '$sum':
+                    out[field] = 0
+                else:
+                    out[field] = None
+        for field, op in mergers.items():
+            if op == '$avg':
+                out[f'{field}__sum'] += doc[f'{field}__sum']
+                out[f'{field}__n'] += doc[f'{field}__n']
+            elif op == '$sum':
+                out[field] += doc[field]
+            elif op in ('$min', '$max'):
+                value = doc[field]
+                if value is not None and (out[field] is None or
+                                          (value < out[field] if op == '$min' else value > out[field])):
+                    out[field] = value
+            else:
+                out[field].extend(doc[field])
+
+    results = []
+    for out in merged.values():
+        doc = {'_id': out['_id']}
+        for field, op in mergers.items():
+            if op == '$avg':
+                n = out[f'{field}__n']
+                doc[field] = out[f'{field}__sum'] / n if n else None
+            elif op == '$addToSet':
+                doc[field] = list({_group_key(v): v for v in out[field]}.values())
+            else:
+                doc[field] = out[field]
+        results.append(doc)
+    return results
+
+
+class PartitionRouter:
+    """
+    Ejecuta pipelines sobre las particiones de la ventana en paralelo.
+
+    Args:
+        store (PartitionedStore): Particiones por mes
+        workers (int, optional): Threads (None = número de cores)
+    """
+
+    def __init__(self, store, workers=None):
+        self.store = store
+        self.workers = workers or os.cpu_count() or 4
+        self.last_run = None
+
+    def partitions_for(self, start=None, end=None):
+        return months_in_window(self.store.months(), start, end)
+
+    def aggregate(self, pipeline, start=None, end=None):
+        """
+        Igual que collection.aggregate(pipeline) sobre la colección única.
+
+        Args:
+            pipeline (list): Pipeline completo; su primer $match se aplica en cada mes
+            start, end (datetime, optional): Ventana [start, end); por defecto la
+                del $match inicial sobre pickup_datetime (sin ventana = todos los meses)
+
+        Returns:
+            list: Documentos resultado
+        """
+        t0 = time.perf_counter()
+        if start is None and end is None and pipeline and '$match' in pipeline[0]:
+            window = pipeline[0]['$match'].get('pickup_datetime', {})
+            if isinstance(window, dict):
+                start, end = window.get('$gte'), window.get('$lt')
+        months = self.partitions_for(start, end)
+        per_month, group, rest = split_pipeline(pipeline)
+        mergers = None
+        if group is not None:
+            group, mergers = partial_group(group)
+            per_month = per_month + [group]
+
+        seconds = {}
+
+        def run(month):
+            t = time.perf_counter()
+            docs = list(self.store.partition(month).aggregate(per_month, allowDiskUse=True))
+            seconds[month] = time.perf_counter() - t
+            return docs
+
+        partials = []
+        if months:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(months))) as executor:
+                for docs in executor.map(run, months):
+                    partials.extend(docs)
+        t_merge = time.perf_counter()
+        merged = merge_groups(partials, mergers) if mergers is not None else partials
+        results = run_on_documents(self.store.db, merged, rest)
+        self.last_run = {'months': months, 'partition_s': seconds, 'partial_docs': len(partials),
+                         'merge_s': time.perf_counter() - t_merge, 'total_s': time.perf_counter() - t0}
+        return results
+
+    def count_documents(self, filter=None, start=None, end=None):
+        """count_documents sumado sobre los meses de la ventana (en paralelo)."""
+        filter = filter or {}
+        if start is None and end is None and isinstance(filter.get('pickup_datetime'), dict):
+            start, end = filter['pickup_datetime'].get('$gte'), filter['pickup_datetime'].get('$lt')
+        months = self.partitions_for(start, end)
+        if not months:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(months))) as executor:
+            return sum(executor.map(lambda m: self.store.partition(m).count_documents(filter), months))
+
+
+def run_on_documents(db, docs, stages):
+    """
+    Ejecuta etapas de agregación sobre documentos ya calculados.
+
+    Con $documents (MongoDB >= 5.1) si caben en un comando; si no, en una
+    colección temporal que se borra al terminar.
+    """
+    if not stages:
+        return docs
+    if sum(len(bson.encode(doc)) for doc in docs) <= DOCUMENTS_MAX_BYTES:
+        try:
+            return list(db.aggregate([{'$documents': docs}] + stages))
+        except OperationFailure:
+            pass  # servidor sin $documents
+    temp = db[f'_router_tmp_{uuid.uuid4().hex}']
+    try:
+        if docs:
+            temp.insert_many(docs, ordered=False)
+        return list(temp.aggregate(stages, allowDiskUse=True))
+    finally:
+        temp.drop()
+
+
+# ==================== COMPARACIÓN ====================
+
+def _same_value(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        # Orden de suma distinto: puede mover la última cifra antes de $round
+        return (a is None) == (b is None) and (a is None or abs(a - b) <= max(0.011, 1e-9 * abs(a)))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same_value(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same_value(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def same_results(expected, actual):
+    """Mismos documentos (en orden, o en cualquier orden si hay empates en $sort)."""
+    if len(expected) != len(actual):
+        return False
+    if all(_same_value(a, b) for a, b in zip(expected, actual)):
+        return True
+    key = lambda doc: repr(sorted(doc.items()))
+    return all(_same_value(a, b) for a, b in zip(sorted(expected, key=key), sorted(actual, key=key)))
+
+
+def compare_with_collection(collection, router, pipelines, repeats=3):
+    """
+    Tiempo (mediana) y resultado de cada pipeline en la colección única y con el router.
+
+    Returns:
+        list: Filas {'pipeline', 'single_s', 'routed_s', 'speedup', 'months', 'same'}
+    """
+    rows = []
+    for name, pipeline in pipelines.items():
+        single_times, routed_times = [], []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            single = list(collection.aggregate(pipeline, allowDiskUse=True))
+            single_times.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            routed = router.aggregate(pipeline)
+            routed_times.append(time.perf_counter() - t)
+        single_s, routed_s = statistics.median(single_times), statistics.median(routed_times)
+        rows.append({'pipeline': name, 'single_s': single_s, 'routed_s': routed_s,
+                     'speedup': single_s / routed_s if routed_s else None,
+                     'months': len(router.last_run['months']), 'same': same_results(single, routed)})
+    return rows
+
+
+def check_split(db, rows=50000, timeseries=True):
+    """
+    Reparte viajes sintéticos de dos meses con split_collection y comprueba las particiones.
+
+    Usa una colección y un prefijo temporales (_split_check_*) que se borran al
+    terminar. Comprueba documentos por mes, tipo de colección (time-series si
+    timeseries=True) e índices de cada partición.
+
+    Returns:
+        list: Problemas encontrados (vacía si todo cuadra)
+    """
+    import pandas as pd
+
+    from hvfhv_cleaning import clean_hvfhv_data
+    from synthetic_hvfhv import make_synthetic_trips
+
+    name = f'_split_check_{uuid.uuid4().hex[:8]}'
+    source = db[name]
+    store = PartitionedStore(db, f'{name}_p', timeseries=timeseries)
+    try:
+        df = pd.concat([clean_hvfhv_data(make_synthetic_trips(rows // 2, seed=month, month=month))
+                        for month in (1, 2)], ignore_index=True)
+        source.insert_many(documents_for(df, source), ordered=False)
+        expected = df['pickup_datetime'].dropna().dt.strftime(MONTH_FORMAT).value_counts().to_dict()
+        counts = store.split_collection(source, batch_size=max(1, rows // 10))
+
+        problems = []
+        if counts != expected:
+            problems.append(f"documentos por mes: {counts} (esperados {expected})")
+        types = {info['name']: info.get('type') for info in db.list_collections()}
+        for month in counts:
+            partition = store.partition(month)
+            kind = types.get(partition.name)
+            if (kind == 'timeseries') != timeseries:
+                problems.append(f"{partition.name}: colección de tipo {kind!r}")
+            missing = set(PARTITION_INDEXES) - set(partition.index_information())
+            if missing:
+                problems.append(f"{partition.name}: faltan los índices {sorted(missing)}")
+        return problems
+    finally:
+        source.drop()
+        store.clear()
+        db[DATA_VERSION_COLLECTION].delete_many({'_id': {'$regex': f'^{name}'}})
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Colecciones por mes y router de consultas")
+    parser.add_argument('command', choices=['split', 'list', 'drop', 'reload', 'compare', 'check'])
+    parser.add_argument('args', nargs='*', help="drop/reload: mes YYYY-MM (+ Parquet); compare: inicio fin")
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--database', default='nyc_hvfhv')
+    parser.add_argument('--collection', default='trips_2025', help="Colección única (split, compare)")
+    parser.add_argument('--base', default=PARTITION_BASE, help="Prefijo de las particiones")
+    parser.add_argument('--timeseries', action='store_true', help="Particiones nuevas como time-series")
+    parser.add_argument('--workers', type=int, default=None, help="Threads del router")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=50000, help="Viajes sintéticos de check")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    args = parse_args()
+    db = MongoClient(args.uri)[args.database]
+    store = PartitionedStore(db, args.base, timeseries=args.timeseries)
+
+    if args.command == 'split':
+        print(f"🗂️  Repartiendo {args.collection} por meses en {args.base}_YYYY_MM...")
+        for month, count in store.split_collection(db[args.collection]).items():
+            print(f"   {month}: {count:,} documentos")
+    elif args.command == 'check':
+        kind = 'time-series' if args.timeseries else 'normales'
+        print(f"🧪 split con {args.rows:,} viajes sintéticos en particiones {kind}...")
+        problems = check_split(db, args.rows, timeseries=args.timeseries)
+        for msg in problems:
+            print(f"   ❌ {msg}")
+        print("✅ Particiones correctas" if not problems else f"❌ {len(problems)} problemas")
+        raise SystemExit(1 if problems else 0)
+    elif args.command == 'list':
+        for month in store.months():
+            print(f"   {month}: {store.partition(month).estimated_document_count():,} documentos "
+                  f"({store.partition_name(month)})")
+    elif args.command == 'drop':
+        store.drop_month(args.args[0])
+        print(f"🗑️  {store.partition_name(args.args[0])} borrada")
+    elif args.command == 'reload':
+        from hvfhv_cleaning import clean_hvfhv_data
+        from parquet_sampler import read_sampled_parquet
+
+        month, path = args.args[0], args.args[1]
+        df, _ = read_sampled_parquet(path, sample_rate=40)
+        inserted = store.replace_month(month, clean_hvfhv_data(df), filename=os.path.basename(path))
+        print(f"✅ {store.partition_name(month)}: {inserted:,} documentos")
+    else:
+        from bench_pipelines import notebook_pipelines
+
+        start, end = (dt.datetime.fromisoformat(a) for a in args.args[:2])
+        router = PartitionRouter(store, args.workers)
+        rows = compare_with_collection(db[args.collection], router, notebook_pipelines(start, end), args.repeats)
+        print(f"\n   {'pipeline':28s}{'única s':>10s}{'router s':>10s}{'×':>7s}{'meses':>7s}  resultado")
+        for row in rows:
+            print(f"   {row['pipeline']:28s}{row['single_s']:>10.3f}{row['routed_s']:>10.3f}"
+                  f"{row['speedup']:>7.2f}{row['months']:>7d}  {'✅' if row['same'] else '❌ distinto'}")
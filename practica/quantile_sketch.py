@@ -0,0 +1,569 @@
+# -*- coding: utf-8 -*-
+"""
+Percentiles de tarifa, pago al conductor, duración y millas con sketches que se unen.
+
+El notebook solo da medias (avg_fare, avg_driver_pay...): una mediana o un
+p95 exigiría traer los valores a pandas u ordenar millones de documentos.
+Aquí cada celda
+
+    plataforma × mes (YYYY-MM) × hora del día × PULocationID × source_file
+
+guarda, en la colección `trips_quantiles`, un sketch por métrica (fare,
+driver_pay, duration_min, miles) calculado durante la carga. Un percentil de
+cualquier corte (plataformas, meses, horas, zonas, agrupando por cualquiera
+de esas claves) se obtiene uniendo los sketches de sus celdas: miles de
+documentos pequeños en lugar de millones de viajes.
+
+Sketch (tipo DDSketch): cubos logarítmicos de razón γ = (1 + α) / (1 - α);
+el cubo k cuenta los valores de (γ^(k-1), γ^k] y se representa por
+2γ^k / (γ + 1). Garantías, con α = RELATIVE_ACCURACY (1 %):
+
+- Error relativo: el percentil q devuelto está a menos de α·|x| del valor x
+  de la muestra con ese rango (el menor x con F(x) ≥ q, np.quantile
+  method='inverted_cdf'); con q = 0 y q = 1, el mínimo y el máximo exactos.
+- Unión exacta: unir dos sketches suma los contadores de sus cubos, así que
+  el error no crece al unir celdas, meses, particiones o ventanas.
+- Tamaño: un cubo por valor distinto a escala γ; 0,01 $ a 10.000 $ son
+  ~700 cubos como máximo (unos cientos de bytes comprimidos por celda).
+
+Los contadores usan el peso de muestreo de cada viaje (sample_weight, o
+DEFAULT_WEIGHT en la carga 1 de N), así que los percentiles son del total de
+viajes estimado; el error de muestreo es aparte del error del sketch.
+
+Mantenimiento (mismo esquema que rollup.py y od_matrix.py, por source_file):
+- SketchStore.add_frame(): une al almacén los sketches de un lote limpio.
+- SketchStore.rebuild_from_collection(): recalcula los de un fichero desde MongoDB.
+- SketchStore.remove(): borra los de un fichero (recargado o eliminado).
+
+Uso:
+    python quantile_sketch.py --check                        # error frente a np.quantile (sin MongoDB)
+    python quantile_sketch.py --build                        # recalcula desde trips_2025
+    python quantile_sketch.py --metric driver_pay --by platform hour --months 2025-01 2025-02
+"""
+
+import argparse
+import math
+import struct
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING, ReplaceOne
+
+from hvfhv_cleaning import float64_values
+from hvfhv_pipelines import DEFAULT_WEIGHT, WEIGHT_FIELD
+
+QUANTILE_COLLECTION = 'trips_quantiles'
+RELATIVE_ACCURACY = 0.01
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Valores con |x| menor que esto van al contador de ceros
+MIN_INDEXABLE = 1e-6
+# Métrica → campo del viaje
+METRICS = {
+    'fare': 'base_passenger_fare',
+    'driver_pay': 'driver_pay',
+    'duration_min': 'trip_duration_minutes',
+    'miles': 'trip_miles',
+}
+KEY_FIELDS = ['platform', 'month', 'hour', 'PULocationID', 'source_file']
+REBUILD_CHUNK_ROWS = 200000
+
+# Cubos en [-_KEY_OFFSET, _KEY_OFFSET): de 1e-6 a 1e12 con α = 1 % son unos ±1.400
+_KEY_OFFSET = 2 ** 20
+_CELL_STRIDE = 2 ** 21
+
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<BdIIdddB')  # versión, α, cubos +, cubos -, ceros, mín, máx, contadores enteros
+
+
+def _merge_bins(keys, counts):
+    """Cubos repetidos → un cubo con la suma de sus contadores (claves ordenadas)."""
+    if len(keys) == 0:
+        return np.empty(0, np.int32), np.empty(0, np.float64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique.astype(np.int32), np.bincount(inverse, weights=counts, minlength=len(unique))
+
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles con error relativo α (cubos logarítmicos, unión exacta).
+
+    Args:
+        alpha (float): Error relativo máximo de cada cuantil
+    """
+
+    def __init__(self, alpha=RELATIVE_ACCURACY):
+        if not 0 < alpha < 1:
+            raise ValueError(f"alpha debe estar entre 0 y 1: {alpha}")
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = (np.empty(0, np.int32), np.empty(0, np.float64))
+        self.negative = (np.empty(0, np.int32), np.empty(0, np.float64))
+        self.zero_count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return float(self.positive[1].sum() + self.negative[1].sum() + self.zero_count)
+
+    def bucket_keys(self, magnitudes):
+        """Cubo de cada valor absoluto (≥ MIN_INDEXABLE): k con γ^(k-1) < x ≤ γ^k."""
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int32)
+
+    def add(self, values, weights=None):
+        """Añade valores (los NaN se ignoran) con pesos opcionales. Devuelve self."""
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        ok = ~np.isnan(values)
+        values, weights = values[ok], weights[ok]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        tiny = np.abs(values) < MIN_INDEXABLE
+        self.zero_count += float(weights[tiny].sum())
+        for sign, store in ((1, 'positive'), (-1, 'negative')):
+            side = ~tiny & (np.sign(values) == sign)
+            keys, counts = getattr(self, store)
+            setattr(self, store, _merge_bins(np.concatenate([keys, self.bucket_keys(np.abs(values[side]))]),
+                                             np.concatenate([counts, weights[side]])))
+        return self
+
+    def merge(self, other):
+        """Une otro sketch (mismo α) en este. Devuelve self."""
+        if other.alpha != self.alpha:
+            raise ValueError(f"No se pueden unir sketches con α distinto ({self.alpha} y {other.alpha})")
+        for store in ('positive', 'negative'):
+            (keys, counts), (other_keys, other_counts) = getattr(self, store), getattr(other, store)
+            setattr(self, store, _merge_bins(np.concatenate([keys, other_keys]),
+                                             np.concatenate([counts, other_counts])))
+        self.zero_count += other.zero_count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merge_all(cls, sketches, alpha=RELATIVE_ACCURACY):
+        """
+        Une varios sketches (mismo α) en uno nuevo.
+
+        Concatena los cubos de todos y los agrupa una sola vez (merge() en un
+        bucle vuelve a ordenar los cubos acumulados en cada unión).
+        """
+        sketches = list(sketches)
+        merged = cls(alpha)
+        if any(sketch.alpha != alpha for sketch in sketches):
+            raise ValueError(f"No se pueden unir sketches con α distinto de {alpha}")
+        if not sketches:
+            return merged
+        for store in ('positive', 'negative'):
+            parts = [getattr(sketch, store) for sketch in sketches]
+            setattr(merged, store, _merge_bins(np.concatenate([keys for keys, _ in parts]),
+                                               np.concatenate([counts for _, counts in parts])))
+        merged.zero_count = float(sum(sketch.zero_count for sketch in sketches))
+        merged.min = min(sketch.min for sketch in sketches)
+        merged.max = max(sketch.max for sketch in sketches)
+        return merged
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        """
+        Cuantiles q ∈ [0, 1] (None si el sketch está vacío).
+
+        Returns:
+            list: Un valor por q, a menos de α en error relativo del valor exacto
+        """
+        total = self.count
+        if total <= 0:
+            return [None for _ in qs]
+        neg_keys, neg_counts = self.negative
+        pos_keys, pos_counts = self.positive
+        # Valores en orden creciente: negativos (de mayor a menor magnitud), ceros, positivos
+        values = np.concatenate([-self._representatives(neg_keys[::-1]), [0.0], self._representatives(pos_keys)])
+        cumulative = np.cumsum(np.concatenate([neg_counts[::-1], [self.zero_count], pos_counts]))
+        results = []
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError(f"Cuantil fuera de [0, 1]: {q}")
+            if q == 0:
+                results.append(self.min)
+            elif q == 1:
+                results.append(self.max)
+            else:
+                i = min(int(np.searchsorted(cumulative, q * total, side='left')), len(values) - 1)
+                results.append(float(np.clip(values[i], self.min, self.max)))
+        return results
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def _representatives(self, keys):
+        return 2 * np.power(self.gamma, keys.astype(np.float64)) / (self.gamma + 1)
+
+    # ---------- Serialización ----------
+
+    def to_bytes(self):
+        """Formato binario compacto (claves en diferencias, zlib)."""
+        pos_keys, pos_counts = self.positive
+        neg_keys, neg_counts = self.negative
+        counts = np.concatenate([pos_counts, neg_counts])
+        integral = bool(np.all(counts == np.round(counts)) and (len(counts) == 0 or counts.max() < 2 ** 32))
+        header = _HEADER.pack(_FORMAT_VERSION, self.alpha, len(pos_keys), len(neg_keys), self.zero_count,
+                              self.min, self.max, integral)
+        body = b''.join([
+            np.diff(pos_keys, prepend=0).astype('<i4').tobytes(),
+            np.diff(neg_keys, prepend=0).astype('<i4').tobytes(),
+            counts.astype('<u4' if integral else '<f8').tobytes(),
+        ])
+        return zlib.compress(header + body)
+
+    @classmethod
+    def from_bytes(cls, data):
+        raw = zlib.decompress(data)
+        version, alpha, n_pos, n_neg, zero, vmin, vmax, integral = _HEADER.unpack_from(raw)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Versión de sketch no soportada: {version}")
+        sketch = cls(alpha)
+        offset = _HEADER.size
+        pos_keys = np.cumsum(np.frombuffer(raw, '<i4', n_pos, offset)).astype(np.int32)
+        offset += 4 * n_pos
+        neg_keys = np.cumsum(np.frombuffer(raw, '<i4', n_neg, offset)).astype(np.int32)
+        offset += 4 * n_neg
+        counts = np.frombuffer(raw, '<u4' if integral else '<f8', n_pos + n_neg, offset).astype(np.float64)
+        sketch.positive = (pos_keys, counts[:n_pos])
+        sketch.negative = (neg_keys, counts[n_pos:])
+        sketch.zero_count, sketch.min, sketch.max = zero, vmin, vmax
+        return sketch
+
+
+# ==================== CELDAS ====================
+
+def _weights(df):
+    if WEIGHT_FIELD in df.columns:
+        return pd.to_numeric(df[WEIGHT_FIELD], errors='coerce').fillna(DEFAULT_WEIGHT).to_numpy(dtype='float64')
+    return np.full(len(df), float(DEFAULT_WEIGHT))
+
+
+def frame_to_sketches(df, source_file=None, alpha=RELATIVE_ACCURACY):
+    """
+    Sketches por celda de un DataFrame de viajes (limpio o leído de MongoDB).
+
+    Returns:
+        dict: {clave de celda (tupla de KEY_FIELDS): {'trips': filas, métrica: QuantileSketch}}
+    """
+    pickup = pd.to_datetime(df['pickup_datetime'], errors='coerce')
+    valid = pickup.notna().to_numpy()
+    df, pickup = df[valid], pickup[valid]
+    if len(df) == 0:
+        return {}
+    keys = pd.DataFrame({
+        'platform': df['hvfhs_license_num'].astype(object).to_numpy(),
+        'month': pickup.dt.strftime('%Y-%m').to_numpy(),
+        'hour': pickup.dt.hour.to_numpy(),
+        'PULocationID': df['PULocationID'].astype(object).to_numpy(),
+    })
+    # Plataforma o zona nulas son una celda más (None en _id): factorize sin -1 para los nulos
+    codes, uniques = zip(*(pd.factorize(keys[field], use_na_sentinel=False) for field in keys))
+    sizes = [len(u) for u in uniques]
+    flat_cells, cell_ids = np.unique(np.ravel_multi_index(codes, sizes), return_inverse=True)
+    cells = list(zip(*(u[c] for u, c in zip(uniques, np.unravel_index(flat_cells, sizes)))))
+    weights = _weights(df)
+    trips = np.bincount(cell_ids, minlength=len(cells))
+    sketches = {}
+    for metric, field in METRICS.items():
+        values = float64_values(pd.to_numeric(df[field], errors='coerce')) if field in df.columns else \
+            np.full(len(df), np.nan)
+        sketches[metric] = _cell_sketches(cell_ids, values, weights, len(cells), alpha)
+
+    out = {}
+    for c, cell in enumerate(cells):
+        cell_sketches = {'trips': int(trips[c])}
+        cell_sketches.update({metric: sketches[metric][c] for metric in METRICS})
+        _merge_cells(out, {tuple(_key_value(v) for v in cell) + (source_file,): cell_sketches})
+    return out
+
+
+def _cell_sketches(cell_ids, values, weights, n_cells, alpha):
+    """Un sketch por celda, con todas las celdas a la vez (sin un np.unique por celda)."""
+    sketches = [QuantileSketch(alpha) for _ in range(n_cells)]
+    ok = ~np.isnan(values)
+    cell_ids, values, weights = cell_ids[ok], values[ok], weights[ok]
+    if len(values) == 0:
+        return sketches
+    mins = np.full(n_cells, np.inf)
+    maxs = np.full(n_cells, -np.inf)
+    np.minimum.at(mins, cell_ids, values)
+    np.maximum.at(maxs, cell_ids, values)
+    tiny = np.abs(values) < MIN_INDEXABLE
+    zeros = np.bincount(cell_ids[tiny], weights[tiny], minlength=n_cells)
+    for store, side in (('positive', ~tiny & (values > 0)), ('negative', ~tiny & (values < 0))):
+        keys = sketches[0].bucket_keys(np.abs(values[side])).astype(np.int64)
+        # (celda, cubo) en un entero: np.unique ordena por celda y luego por cubo
+        combined, inverse = np.unique(cell_ids[side] * _CELL_STRIDE + keys + _KEY_OFFSET, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights[side], minlength=len(combined))
+        cells = combined // _CELL_STRIDE
+        bucket_keys = (combined % _CELL_STRIDE - _KEY_OFFSET).astype(np.int32)
+        bounds = np.searchsorted(cells, np.arange(n_cells + 1))
+        for c in np.flatnonzero(np.diff(bounds)):
+            setattr(sketches[c], store, (bucket_keys[bounds[c]:bounds[c + 1]], counts[bounds[c]:bounds[c + 1]]))
+    for c, sketch in enumerate(sketches):
+        sketch.zero_count, sketch.min, sketch.max = float(zeros[c]), float(mins[c]), float(maxs[c])
+    return sketches
+
+
+def _key_value(value):
+    """Valor de clave como se guarda en _id (los enteros leídos como float vuelven a int)."""
+    if pd.isna(value):
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)) and float(value).is_integer():
+        return int(value)
+    return value
+
+
+def _cell_id(key):
+    return dict(zip(KEY_FIELDS, key))
+
+
+def _merge_cells(into, cells):
+    for key, cell in cells.items():
+        current = into.get(key)
+        if current is None:
+            into[key] = cell
+            continue
+        current['trips'] += cell['trips']
+        for metric in METRICS:
+            current[metric].merge(cell[metric])
+
+
+# ==================== ALMACÉN ====================
+
+class SketchStore:
+    """Sketches por celda en una colección MongoDB (una celda por documento)."""
+
+    def __init__(self, collection, alpha=RELATIVE_ACCURACY):
+        self.collection = collection
+        self.alpha = alpha
+
+    def ensure_indexes(self):
+        self.collection.create_index([('source_file', ASCENDING)])
+        self.collection.create_index([('month', ASCENDING), ('platform', ASCENDING)])
+
+    def has(self, source_file):
+        return self.collection.find_one({'source_file': source_file}, {'_id': 1}) is not None
+
+    def remove(self, source_file):
+        """Borra los sketches de un fichero (si hay)."""
+        self.collection.delete_many({'source_file': source_file})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def months(self):
+        return sorted(m for m in self.collection.distinct('month') if m)
+
+    def _write(self, cells, merge_existing):
+        if not cells:
+            return 0
+        if merge_existing:
+            ids = [_cell_id(key) for key in cells]
+            for doc in self.collection.find({'_id': {'$in': ids}}):
+                key = tuple(doc['_id'][k] for k in KEY_FIELDS)
+                cell = cells[key]
+                cell['trips'] += doc.get('trips', 0)
+                for metric in METRICS:
+                    if metric in doc:
+                        cell[metric].merge(QuantileSketch.from_bytes(doc[metric]))
+        operations = []
+        for key, cell in cells.items():
+            doc = {**_cell_id(key), 'trips': cell['trips']}
+            doc.update({metric: cell[metric].to_bytes() for metric in METRICS})
+            operations.append(ReplaceOne({'_id': _cell_id(key)}, doc, upsert=True))
+        self.collection.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    def add_frame(self, df, source_file=None):
+        """
+        Une a las celdas del almacén los viajes de un DataFrame limpio ya insertado.
+
+        Returns:
+            int: Celdas tocadas
+        """
+        if len(df) == 0:
+            return 0
+        return self._write(frame_to_sketches(df, source_file, self.alpha), merge_existing=True)
+
+    def rebuild_from_collection(self, collection, source_file, match=None):
+        """
+        Recalcula los sketches de un fichero desde los viajes de MongoDB.
+
+        Args:
+            collection: Colección de viajes (o CompactCollection)
+            source_file (str): Fichero fuente (campo source_file de los viajes)
+            match (dict, optional): Filtro en lugar de {source_file: ...} (cargas sin etiquetar)
+
+        Returns:
+            int: Viajes leídos
+        """
+        self.remove(source_file)
+        match = dict(match) if match is not None else {'source_file': source_file}
+        match['pickup_datetime'] = {'$type': 'date'}
+        fields = ['hvfhs_license_num', 'pickup_datetime', 'PULocationID', WEIGHT_FIELD] + list(METRICS.values())
+        cursor = collection.aggregate([{'$match': match}, {'$project': {'_id': 0, **{f: 1 for f in fields}}}],
+                                      allowDiskUse=True, batchSize=REBUILD_CHUNK_ROWS)
+        cells = {}
+        rows = 0
+        chunk = []
+        for doc in cursor:
+            chunk.append(doc)
+            if len(chunk) == REBUILD_CHUNK_ROWS:
+                _merge_cells(cells, frame_to_sketches(pd.DataFrame(chunk), source_file, self.alpha))
+                rows += len(chunk)
+                chunk = []
+        if chunk:
+            _merge_cells(cells, frame_to_sketches(pd.DataFrame(chunk), source_file, self.alpha))
+            rows += len(chunk)
+        self._write(cells, merge_existing=False)
+        return rows
+
+    # ---------- Consultas ----------
+
+    def _filter(self, months=None, platforms=None, hours=None, zones=None):
+        query = {}
+        for field, values in (('month', months), ('platform', platforms), ('hour', hours),
+                              ('PULocationID', zones)):
+            if values:
+                query[field] = {'$in': list(values)}
+        return query
+
+    def sketch(self, metric, months=None, platforms=None, hours=None, zones=None):
+        """Sketch unido de una métrica para un corte (None = sin filtro)."""
+        docs = self.collection.find(self._filter(months, platforms, hours, zones), {metric: 1})
+        return QuantileSketch.merge_all((QuantileSketch.from_bytes(doc[metric]) for doc in docs if metric in doc),
+                                        self.alpha)
+
+    def percentiles(self, metric, qs=DEFAULT_QUANTILES, by=None, months=None, platforms=None, hours=None,
+                    zones=None):
+        """
+        Percentiles de una métrica por grupo.
+
+        Args:
+            metric (str): 'fare', 'driver_pay', 'duration_min' o 'miles'
+            qs (tuple): Cuantiles en [0, 1]
+            by (list, optional): Claves de grupo ('platform', 'month', 'hour', 'PULocationID')
+            months, platforms, hours, zones (list, optional): Filtros del corte
+
+        Returns:
+            pd.DataFrame: Claves de grupo, trips (filas de la muestra), trips_est
+                (suma de pesos) y una columna pNN por cuantil
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Métrica desconocida: {metric} (opciones: {', '.join(METRICS)})")
+        by = list(by or [])
+        groups = {}
+        projection = {metric: 1, 'trips': 1, **{k: 1 for k in by}}
+        for doc in self.collection.find(self._filter(months, platforms, hours, zones), projection):
+            if metric not in doc:
+                continue
+            key = tuple(doc.get(k) for k in by)
+            group = groups.setdefault(key, [0, []])
+            group[0] += doc.get('trips', 0)
+            group[1].append(QuantileSketch.from_bytes(doc[metric]))
+        rows = []
+        for key, (trips, cell_sketches) in groups.items():
+            # Un solo _merge_bins por grupo con los cubos de todas sus celdas
+            sketch = QuantileSketch.merge_all(cell_sketches, self.alpha)
+            row = dict(zip(by, key))
+            row.update({'trips': trips, 'trips_est': sketch.count})
+            row.update({_column(q): v for q, v in zip(qs, sketch.quantiles(qs))})
+            rows.append(row)
+        columns = by + ['trips', 'trips_est'] + [_column(q) for q in qs]
+        df = pd.DataFrame(rows, columns=columns)
+        return df.sort_values(by).reset_index(drop=True) if by else df
+
+
+def _column(q):
+    return f"p{q * 100:g}".replace('.', '_')
+
+
+# ==================== COMPROBACIÓN ====================
+
+def check_accuracy(df, qs=DEFAULT_QUANTILES, alpha=RELATIVE_ACCURACY):
+    """
+    Error relativo de los sketches frente a np.quantile(method='inverted_cdf').
+
+    Construye los sketches por celda, los une (como una consulta) y compara
+    con los cuantiles exactos de la muestra sin pesos.
+
+    Returns:
+        pd.DataFrame: Una fila por métrica y cuantil con exacto, sketch y error relativo
+    """
+    df = df.drop(columns=[WEIGHT_FIELD], errors='ignore')
+    cells = frame_to_sketches(df, alpha=alpha)
+    rows = []
+    for metric, field in METRICS.items():
+        merged = QuantileSketch.merge_all((QuantileSketch.from_bytes(cell[metric].to_bytes())
+                                           for cell in cells.values()), alpha)
+        values = float64_values(pd.to_numeric(df[field], errors='coerce'))
+        values = values[~np.isnan(values) & df['pickup_datetime'].notna().to_numpy()]
+        exact = np.quantile(values, qs, method='inverted_cdf')
+        for q, x, estimate in zip(qs, exact, merged.quantiles(qs)):
+            error = abs(estimate - x) / abs(x) if x else abs(estimate)
+            rows.append({'metric': metric, 'q': q, 'exact': x, 'sketch': estimate, 'rel_error': error,
+                         'within_bound': error <= alpha + 1e-12})
+    return pd.DataFrame(rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Percentiles con sketches de cuantiles")
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--database', default='nyc_hvfhv')
+    parser.add_argument('--collection', default='trips_2025', help="Colección de viajes (--build)")
+    parser.add_argument('--store', default=QUANTILE_COLLECTION, help="Colección de los sketches")
+    parser.add_argument('--check', action='store_true', help="Error frente a np.quantile con viajes sintéticos")
+    parser.add_argument('--rows', type=int, default=200000, help="Viajes sintéticos de --check")
+    parser.add_argument('--build', action='store_true', help="Recalcula todos los sketches desde la colección")
+    parser.add_argument('--metric', choices=list(METRICS), default='fare')
+    parser.add_argument('--by', nargs='*', default=['platform'], choices=KEY_FIELDS[:-1])
+    parser.add_argument('--quantiles', type=float, nargs='+', default=list(DEFAULT_QUANTILES))
+    parser.add_argument('--months', nargs='*', default=None)
+    parser.add_argument('--platforms', nargs='*', default=None)
+    parser.add_argument('--hours', type=int, nargs='*', default=None)
+    parser.add_argument('--zones', type=int, nargs='*', default=None)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.check:
+        from hvfhv_cleaning import clean_hvfhv_data
+        from synthetic_hvfhv import make_synthetic_trips
+
+        report = check_accuracy(clean_hvfhv_data(make_synthetic_trips(args.rows, seed=42)), args.quantiles)
+        print(report.to_string(index=False))
+        worst = report['rel_error'].max()
+        print(f"\n{'✅' if report['within_bound'].all() else '❌'} Error relativo máximo {worst:.4%} "
+              f"(cota α = {RELATIVE_ACCURACY:.0%})")
+        raise SystemExit(0 if report['within_bound'].all() else 1)
+
+    from pymongo import MongoClient
+
+    db = MongoClient(args.uri)[args.database]
+    store = SketchStore(db[args.store])
+    if args.build:
+        store.ensure_indexes()
+        store.clear()
+        sources = [s for s in db[args.collection].distinct('source_file') if s] or [None]
+        for source in sources:
+            t0 = time.perf_counter()
+            match = {} if source is None else None
+            rows = store.rebuild_from_collection(db[args.collection], source, match)
+            print(f"🧮 {source or args.collection}: {rows:,} viajes en {time.perf_counter() - t0:,.1f} s")
+
+    t0 = time.perf_counter()
+    result = store.percentiles(args.metric, args.quantiles, args.by, args.months, args.platforms, args.hours,
+                               args.zones)
+    print(result.to_string(index=False))
+    print(f"\n⏱️  {(time.perf_counter() - t0) * 1000:,.0f} ms (error relativo ≤ {RELATIVE_ACCURACY:.0%})")
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Regresiones de un informe de rendimiento frente a uno anterior.
+
+bench_pipelines.py (tiempos, documentos examinados e índice de cada
+pipeline, inserciones por índice) e ingest_metrics.py (filas/s por etapa,
+total y pico de memoria) comparan sus informes con la misma regla. Cada
+informe lista sus métricas como (etiqueta, antes, ahora, tipo, unidad) y
+aquí se marca la que empeora:
+
+    'time'    más es peor, con tolerancia    ahora > antes × ratio
+    'size'    igual que 'time' (MB, bytes)
+    'rate'    menos es peor, con tolerancia  ahora × ratio < antes
+    'count'   más es peor, sin tolerancia    ahora > antes
+    'same'    cualquier cambio               ahora != antes
+
+Las métricas sin valor en el informe base (None, o 0 en 'time'/'size'/'rate')
+no se comparan, salvo las de tipo 'same' (pasar de None a un valor es un cambio).
+"""
+
+KINDS = ('time', 'size', 'rate', 'count', 'same')
+
+_FORMATS = {'time': '{:,.1f}', 'size': '{:,.0f}', 'rate': '{:,.0f}', 'count': '{:,}', 'same': '{}'}
+
+
+def metric_regression(label, before, now, kind, ratio, unit=''):
+    """
+    Mensaje de regresión de una métrica (None si no empeora o no se puede comparar).
+
+    Args:
+        label (str): Nombre de la métrica en el mensaje
+        before: Valor del informe base
+        now: Valor actual
+        kind (str): Uno de KINDS
+        ratio (float): Empeoramiento tolerado en 'time', 'size' y 'rate'
+        unit (str): Unidad que se muestra tras los valores
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Tipo de métrica no soportado: {kind!r} (usa {KINDS})")
+    if before is None and kind != 'same':
+        return None
+    if kind in ('time', 'size'):
+        worse = bool(before) and (now or 0) > before * ratio
+    elif kind == 'rate':
+        worse = bool(before) and (now or 0) * ratio < before
+    elif kind == 'count':
+        worse = now > before
+    else:
+        worse = now != before
+    if not worse:
+        return None
+    fmt = _FORMATS[kind]
+    now_text = fmt.format(now if kind == 'same' else now or 0)
+    return f"{label}: {fmt.format(before)} → {now_text}{' ' + unit if unit else ''}"
+
+
+def find_regressions(metrics, ratio):
+    """
+    Regresiones de una lista de métricas.
+
+    Args:
+        metrics (iterable): Tuplas (etiqueta, antes, ahora, tipo, unidad)
+        ratio (float): Empeoramiento tolerado
+
+    Returns:
+        list: Mensajes (vacía si no hay regresiones)
+    """
+    problems = []
+    for label, before, now, kind, unit in metrics:
+        msg = metric_regression(label, before, now, kind, ratio, unit)
+        if msg:
+            problems.append(msg)
+    return problems
+
+
+def print_regressions(problems):
+    """
+    Imprime las regresiones y devuelve el código de salida (1 si hay alguna).
+    """
+    for msg in problems:
+        print(f"   ❌ {msg}")
+    print("✅ Sin regresiones" if not problems else f"❌ {len(problems)} regresiones")
+    return 1 if problems else 0
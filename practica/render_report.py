@@ -0,0 +1,836 @@
+# -*- coding: utf-8 -*-
+"""
+Informe headless: los gráficos y mapas del notebook como tareas que solo se repintan si cambian sus datos.
+
+Regenerar outputs/charts/*.png y outputs/maps/*.html exigía ejecutar el
+notebook entero: cada sección de matplotlib/seaborn/folium se pinta en serie
+aunque su resultado no haya cambiado. Aquí cada sección es una tarea
+
+    tarea                 secciones (report_engine)         salida
+    hourly_grid           hourly                            charts/hourly_analysis_grid.png
+    heatmap_day_hour      day_hour                          charts/heatmap_day_hour.png
+    revenue_components    revenue                           charts/revenue_components.png
+    driver_economics      driver                            charts/driver_economics.png
+    wav_compliance        wav, wav_platform                 charts/wav_compliance.png
+    shared_rides          shared, shared_hourly             charts/shared_rides_analysis.png
+    platform_comparison   platform                          charts/platform_comparison.png
+    fleet_evolution       fleet_evolution                   charts/fleet_evolution.png
+    pickup_map            pickup_locations                  charts/nyc_trip_hotspots_map.html
+    dropoff_map           dropoff_locations                 maps/dropoff_destinations_map.html
+    rush_hour_map         morning_rush, evening_rush        maps/temporal_comparison_map.html
+
+con una huella SHA-256 de su entrada: los documentos de sus secciones, los
+parámetros del dibujo (periodo, muestreo, dpi) y la versión de su función de
+dibujo. Las huellas de la última ejecución se guardan en
+outputs/report_manifest.json; una tarea con la misma huella y sus ficheros en
+disco se salta, y las demás se pintan en un ProcessPoolExecutor (matplotlib
+con backend Agg, un proceso por gráfico).
+
+Los datos se calculan una vez en el proceso principal:
+- MongoDB: las secciones de tiempo, ingresos, conductores y plataformas
+  desde el rollup (rollup.py) si está construido, el resto con un solo
+  aggregate por ventana (report_engine.py) a través de AggregateCache, que
+  solo vuelve a consultar cuando la carga cambia la versión de los datos.
+- --local: directamente de los Parquet (local_metrics.py), sin MongoDB; con
+  --sample-rate > 1, desde la muestra limpia de sample_cache.py.
+
+Las tareas cuya entrada no depende del mes recargado (otra ventana, otro
+filtro de plataformas) no se vuelven a pintar; las que sí dependen se pintan
+en paralelo. Las tareas de mapas necesitan folium (sin él se omiten).
+
+Uso:
+    python render_report.py                                   # MongoDB (trips_2025), solo lo que ha cambiado
+    python render_report.py --local ./data --sample-rate 40   # desde los Parquet, sin MongoDB
+    python render_report.py --only heatmap_day_hour wav_compliance --force
+    python render_report.py --list
+"""
+
+import argparse
+import datetime as dt
+import hashlib
+import importlib.util
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from aggregate_cache import _json_default
+
+DEFAULT_OUTPUT_DIR = Path(__file__).resolve().parent / 'outputs'
+MANIFEST_NAME = 'report_manifest.json'
+
+SAMPLE_RATE = 40
+DPI = 300
+TLC_WAV_TARGET = 80
+
+PLATFORM_NAMES = {'HV0003': 'Uber', 'HV0005': 'Lyft'}
+PLATFORM_COLORS = {'Uber': '#000000', 'Lyft': '#FF00BF'}
+DAY_NAMES = {1: 'Sun', 2: 'Mon', 3: 'Tue', 4: 'Wed', 5: 'Thu', 6: 'Fri', 7: 'Sat'}
+DAY_ORDER = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+NYC_CENTER = [40.7128, -74.0060]
+MIDTOWN = [40.7589, -73.9851]
+
+
+# ==================== DIBUJO (en los procesos del pool) ====================
+
+def _pyplot():
+    """matplotlib sin pantalla con el estilo del notebook (se importa dentro de cada proceso)."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.style.use('seaborn-v0_8-darkgrid')
+    # Los emojis de los títulos no están en DejaVu Sans (igual que en el notebook)
+    warnings.filterwarnings('ignore', message='Glyph .* missing from')
+    return plt
+
+
+def _save_figure(plt, fig, path, params):
+    fig.savefig(path, dpi=params['dpi'], bbox_inches='tight')
+    plt.close(fig)
+
+
+def _suptitle(plt, text, params, y=1.00):
+    plt.suptitle(f"{text} — {params['period']} (Sample Rate: 1 in {params['sample_rate']})",
+                 fontsize=16, fontweight='bold', y=y)
+
+
+def _bar_labels(ax, bars, values, fmt):
+    for bar, val in zip(bars, values):
+        ax.text(bar.get_x() + bar.get_width() / 2, val, fmt.format(val),
+                ha='center', va='bottom', fontsize=10, fontweight='bold')
+
+
+def _platform_name(code):
+    return PLATFORM_NAMES.get(code, code)
+
+
+def render_hourly_grid(data, params, paths):
+    import pandas as pd
+
+    plt = _pyplot()
+    df = pd.DataFrame(data['hourly'])
+    k = params['sample_rate']
+    fig, axes = plt.subplots(2, 2, figsize=(16, 10))
+
+    ax1 = axes[0, 0]
+    ax1.bar(df['hour'], df['trips'], color='steelblue', edgecolor='black', alpha=0.85)
+    ax1.set_title('📊 Trip Volume by Hour (Sample)', fontsize=14, fontweight='bold')
+    ax1.set_ylabel(f'Number of Trips (Sample, ×{k} for real)')
+    peak = df.loc[df['trips'].idxmax()]
+    ax1.annotate(f"Peak: {int(peak['hour'])}:00\n{peak['trips']:,.0f} trips",
+                 xy=(peak['hour'], peak['trips']), xytext=(peak['hour'] + 2, peak['trips'] * 1.1),
+                 arrowprops=dict(arrowstyle='->', color='red', lw=2), fontsize=10, fontweight='bold', color='red')
+
+    ax2 = axes[0, 1]
+    ax2.plot(df['hour'], df['total_revenue'] / 1000, marker='o', linewidth=2.5, color='darkgreen',
+             markersize=8, markerfacecolor='lime')
+    ax2.set_title('💰 Total Revenue by Hour (Sample)', fontsize=14, fontweight='bold')
+    ax2.set_ylabel(f'Revenue (Thousands $, ×{k} for real)')
+
+    ax3 = axes[1, 0]
+    ax3.plot(df['hour'], df['avg_fare'], marker='s', linewidth=2.5, color='darkorange', markersize=7,
+             markerfacecolor='gold')
+    ax3.axhline(y=df['avg_fare'].mean(), color='red', linestyle='--', label='Daily Average')
+    ax3.set_title('💵 Average Base Fare by Hour', fontsize=14, fontweight='bold')
+    ax3.set_ylabel('Average Fare ($) [Not scaled - average is valid]')
+    ax3.legend()
+
+    ax4 = axes[1, 1]
+    ax4.bar(df['hour'], df['total_revenue'] / df['trips'], color='purple', alpha=0.7, edgecolor='black')
+    ax4.set_title('📈 Revenue per Trip by Hour', fontsize=14, fontweight='bold')
+    ax4.set_ylabel('Revenue per Trip ($) [Not scaled]')
+
+    for ax in axes.flat:
+        ax.set_xlabel('Hour of Day')
+        ax.set_xticks(range(0, 24))
+        ax.grid(alpha=0.3)
+    _suptitle(plt, '📊 Hourly Temporal Analysis', params)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_heatmap_day_hour(data, params, paths):
+    import pandas as pd
+    import seaborn as sns
+
+    plt = _pyplot()
+    df = pd.DataFrame(data['day_hour'])
+    df['day_name'] = df['day_of_week'].map(DAY_NAMES)
+    pivots = [df.pivot_table(values=col, index='day_name', columns='hour', fill_value=0).reindex(DAY_ORDER)
+              for col in ('trips', 'total_revenue')]
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(20, 6))
+
+    sns.heatmap(pivots[0], cmap='YlGnBu', linewidths=0.3, linecolor='white',
+                cbar_kws={'label': f"Trips (Sample, ×{params['sample_rate']} for real)"}, ax=ax1)
+    ax1.set_title('🔥 Trips Heatmap — Day × Hour', fontsize=14, fontweight='bold')
+    sns.heatmap(pivots[1] / 1000, cmap='RdYlGn', linewidths=0.3, linecolor='white',
+                cbar_kws={'label': 'Revenue (K$, Sample)'}, ax=ax2)
+    ax2.set_title('💰 Revenue Heatmap — Day × Hour', fontsize=14, fontweight='bold')
+    for ax in (ax1, ax2):
+        ax.set_xlabel('Hour of Day')
+        ax.set_ylabel('Day of Week')
+    _suptitle(plt, '🔥 Day × Hour Heatmaps', params, y=1.02)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_revenue_components(data, params, paths):
+    plt = _pyplot()
+    rev = data['revenue'][0]
+    k = params['sample_rate']
+    components = {'Base Fare': rev['base_fare'], 'Tips': rev['tips'], 'Tolls': rev['tolls'],
+                  'Congestion Surcharge': rev['congestion'], 'Airport Fee': rev['airport_fee']}
+    total = sum(components.values())
+    colors = ['#3498db', '#2ecc71', '#f39c12', '#e74c3c', '#9b59b6']
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 7))
+
+    wedges, _, _ = ax1.pie(list(components.values()), autopct='%1.1f%%', startangle=90, colors=colors,
+                           explode=(0.05, 0.05, 0.02, 0.02, 0.02), pctdistance=0.75,
+                           textprops={'fontsize': 12, 'fontweight': 'bold', 'color': 'white'})
+    ax1.legend(wedges, [f'{name}: {value / total * 100:.1f}%' for name, value in components.items()],
+               title="Revenue Components", loc="center left", bbox_to_anchor=(0.7, 0, 0.5, 1), fontsize=12,
+               title_fontsize=13, frameon=True, fancybox=True, shadow=True)
+    ax1.set_title('💰 Revenue Composition', fontsize=14, fontweight='bold')
+
+    bottom_sample = bottom_real = 0.0
+    for color, (name, value) in zip(colors, components.items()):
+        ax2.bar([0], [value / 1e6], 0.6, bottom=[bottom_sample], label=f'{name} (${value * k / 1e6:.1f}M)',
+                color=color, edgecolor='black', alpha=0.85)
+        ax2.bar([1], [value * k / 1e6], 0.6, bottom=[bottom_real], color=color, edgecolor='black', alpha=0.85)
+        bottom_sample += value / 1e6
+        bottom_real += value * k / 1e6
+    ax2.set_xticks([0, 1])
+    ax2.set_xticklabels(['Sample', f'Real Estimate (×{k})'])
+    ax2.set_ylabel('Revenue (Millions $)')
+    ax2.set_title('💰 Revenue Comparison: Sample vs Real Estimate', fontsize=14, fontweight='bold')
+    ax2.legend(loc='upper left', fontsize=10)
+    ax2.grid(axis='y', alpha=0.3)
+
+    plt.suptitle(f"💰 Financial Analysis — Revenue Components ({params['period']})",
+                 fontsize=16, fontweight='bold', y=1.00)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_driver_economics(data, params, paths):
+    import numpy as np
+
+    plt = _pyplot()
+    drv = data['driver'][0]
+    k = params['sample_rate']
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(18, 5))
+
+    ax1.pie([drv['avg_driver_pay'], drv['avg_platform_cut']], labels=['Driver Pay', 'Platform Cut'],
+            autopct='%1.1f%%', startangle=90, colors=['#27ae60', '#e74c3c'], explode=(0.05, 0.05),
+            textprops={'fontsize': 12, 'fontweight': 'bold'})
+    ax1.set_title('💰 Revenue Split per Trip [Average]', fontsize=13, fontweight='bold')
+
+    efficiency = [drv['avg_pay_per_mile'], drv['avg_pay_per_minute']]
+    bars = ax2.bar(['Pay/Mile', 'Pay/Minute'], efficiency, color=['#3498db', '#9b59b6'], edgecolor='black',
+                   alpha=0.85)
+    _bar_labels(ax2, bars, efficiency, '${:.2f}')
+    ax2.set_title('📊 Driver Efficiency Metrics [Average]', fontsize=13, fontweight='bold')
+    ax2.set_ylabel('Pay ($)')
+    ax2.grid(axis='y', alpha=0.3)
+
+    sample_vals = [drv['total_driver_earnings'] / 1e6, drv['total_platform_revenue'] / 1e6]
+    x = np.arange(2)
+    ax3.bar(x - 0.175, sample_vals, 0.35, label='Sample', color='lightblue', edgecolor='black', alpha=0.8)
+    ax3.bar(x + 0.175, [v * k for v in sample_vals], 0.35, label=f'Real Est. (×{k})', color='darkblue',
+            edgecolor='black', alpha=0.8)
+    ax3.set_title('💵 Total Earnings Comparison', fontsize=13, fontweight='bold')
+    ax3.set_ylabel('Total Earnings (Millions $)')
+    ax3.set_xticks(x)
+    ax3.set_xticklabels(['Driver Earnings', 'Platform Revenue'])
+    ax3.legend()
+    ax3.grid(axis='y', alpha=0.3)
+
+    _suptitle(plt, '🚗 Driver Economics', params)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_wav_compliance(data, params, paths):
+    import numpy as np
+
+    plt = _pyplot()
+    wav = data['wav'][0]
+    k = params['sample_rate']
+    rate = wav['fulfillment_rate']
+    fig = plt.figure(figsize=(18, 6))
+    gs = fig.add_gridspec(2, 3, hspace=0.3, wspace=0.3)
+
+    ax1 = fig.add_subplot(gs[0, 0])
+    names = ['wav_requests', 'both_request_and_match']
+    x = np.arange(2)
+    ax1.bar(x - 0.175, [wav[n] for n in names], 0.35, label='Sample', color='lightcoral', edgecolor='black',
+            alpha=0.8)
+    ax1.bar(x + 0.175, [wav.get(f'{n}_est', wav[n] * k) for n in names], 0.35, label='Real Est.',
+            color='darkred', edgecolor='black', alpha=0.8)
+    ax1.set_title('📊 WAV Request → Fulfillment Funnel', fontsize=12, fontweight='bold')
+    ax1.set_ylabel('Number of Trips')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(['Requests', 'Fulfilled'])
+    ax1.legend()
+    ax1.grid(axis='y', alpha=0.3)
+
+    ax2 = fig.add_subplot(gs[0, 1])
+    bars = ax2.barh(['Fulfillment Rate', 'TLC Target'], [rate, TLC_WAV_TARGET],
+                    color=['#e74c3c' if rate < TLC_WAV_TARGET else '#27ae60', 'gray'], edgecolor='black',
+                    alpha=0.85)
+    for bar, val in zip(bars, [rate, TLC_WAV_TARGET]):
+        ax2.text(val, bar.get_y() + bar.get_height() / 2, f'{val:.1f}%', ha='left', va='center', fontsize=11,
+                 fontweight='bold')
+    ax2.set_xlabel('Rate (%)')
+    ax2.set_title('♿ Fulfillment vs Target', fontsize=12, fontweight='bold')
+    ax2.set_xlim(0, 100)
+    ax2.grid(axis='x', alpha=0.3)
+
+    ax3 = fig.add_subplot(gs[0, 2])
+    ax3.pie([wav['wav_requests'], wav['total_trips'] - wav['wav_requests']], labels=['WAV Requests', 'Regular Trips'],
+            autopct='%1.2f%%', startangle=90, colors=['#e74c3c', '#3498db'], explode=(0.1, 0),
+            textprops={'fontsize': 10, 'fontweight': 'bold'})
+    ax3.set_title('♿ WAV Request Proportion', fontsize=12, fontweight='bold')
+
+    ax4 = fig.add_subplot(gs[1, :])
+    platforms = data['wav_platform']
+    if len(platforms) > 1:
+        rates = [p['fulfillment_rate'] for p in platforms]
+        x_pos = np.arange(len(platforms))
+        bars = ax4.bar(x_pos, rates, color=['#27ae60' if r >= TLC_WAV_TARGET else '#e74c3c' for r in rates],
+                       edgecolor='black', alpha=0.85)
+        ax4.axhline(y=TLC_WAV_TARGET, color='red', linestyle='--', linewidth=2,
+                    label=f'TLC Target ({TLC_WAV_TARGET}%)')
+        _bar_labels(ax4, bars, rates, '{:.1f}%')
+        ax4.set_xlabel('Platform')
+        ax4.set_ylabel('Fulfillment Rate (%)')
+        ax4.set_title('♿ WAV Fulfillment Rate by Platform', fontsize=12, fontweight='bold')
+        ax4.set_xticks(x_pos)
+        ax4.set_xticklabels([_platform_name(p['platform']) for p in platforms])
+        ax4.legend()
+        ax4.grid(axis='y', alpha=0.3)
+    else:
+        ax4.text(0.5, 0.5, 'Single platform data or insufficient variation', ha='center', va='center',
+                 fontsize=12, transform=ax4.transAxes)
+        ax4.axis('off')
+
+    _suptitle(plt, '♿ WAV Accessibility Compliance Analysis', params)
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_shared_rides(data, params, paths):
+    import numpy as np
+    import pandas as pd
+
+    plt = _pyplot()
+    shared = data['shared'][0]
+    k = params['sample_rate']
+    fig, axes = plt.subplots(2, 2, figsize=(16, 11))
+
+    ax1 = axes[0, 0]
+    names = ['shared_requests', 'shared_matches']
+    x = np.arange(2)
+    ax1.bar(x - 0.175, [shared[n] for n in names], 0.35, label='Sample', color='lightgreen', edgecolor='black',
+            alpha=0.8)
+    ax1.bar(x + 0.175, [shared.get(f'{n}_est', shared[n] * k) for n in names], 0.35, label='Real Est.',
+            color='darkgreen', edgecolor='black', alpha=0.8)
+    ax1.set_title('🤝 Shared Ride Funnel', fontsize=13, fontweight='bold')
+    ax1.set_ylabel('Number of Trips')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(['Requests', 'Matches'])
+    ax1.legend()
+    ax1.grid(axis='y', alpha=0.3)
+
+    ax2 = axes[0, 1]
+    match_rate = shared['match_rate']
+    ax2.barh(['Match Rate'], [match_rate], color='#27ae60' if match_rate >= 50 else '#e67e22', edgecolor='black',
+             alpha=0.85)
+    ax2.text(match_rate, 0, f'{match_rate:.1f}%', ha='left', va='center', fontsize=12, fontweight='bold')
+    ax2.set_xlabel('Rate (%)')
+    ax2.set_title('📊 Shared Ride Match Success', fontsize=13, fontweight='bold')
+    ax2.set_xlim(0, 100)
+    ax2.grid(axis='x', alpha=0.3)
+
+    ax3 = axes[1, 0]
+    ax3.pie([shared['shared_requests'], shared['total_trips'] - shared['shared_requests']],
+            labels=['Shared Requests', 'Solo Rides'], autopct='%1.2f%%', startangle=90,
+            colors=['#2ecc71', '#95a5a6'], explode=(0.1, 0), textprops={'fontsize': 11, 'fontweight': 'bold'})
+    ax3.set_title('🤝 Shared Ride Adoption Rate', fontsize=13, fontweight='bold')
+
+    ax4 = axes[1, 1]
+    if data['shared_hourly']:
+        df = pd.DataFrame(data['shared_hourly'])
+        ax4.plot(df['hour'], df['adoption_pct'], marker='o', linewidth=2.5, color='#27ae60', markersize=8,
+                 markerfacecolor='lightgreen', markeredgecolor='black')
+        ax4.axhline(y=shared['adoption_rate'], color='red', linestyle='--',
+                    label=f"Daily Avg: {shared['adoption_rate']:.2f}%")
+        ax4.set_title('📈 Shared Ride Adoption by Hour [Percentage]', fontsize=13, fontweight='bold')
+        ax4.set_xlabel('Hour of Day')
+        ax4.set_ylabel('Adoption Rate (%)')
+        ax4.set_xticks(range(0, 24, 2))
+        ax4.grid(alpha=0.3)
+        ax4.legend()
+    else:
+        ax4.text(0.5, 0.5, 'Insufficient hourly data', ha='center', va='center', fontsize=12,
+                 transform=ax4.transAxes)
+        ax4.axis('off')
+
+    _suptitle(plt, '🤝 Shared Rides Analysis', params)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_platform_comparison(data, params, paths):
+    import numpy as np
+    import pandas as pd
+
+    plt = _pyplot()
+    df = pd.DataFrame(data['platform'])
+    platforms = [_platform_name(p) for p in df['platform']]
+    colors = [PLATFORM_COLORS.get(p, '#7f8c8d') for p in platforms]
+    fig, axes = plt.subplots(2, 3, figsize=(18, 11))
+
+    panels = [
+        (axes[0, 0], df['trip_count'], f"📊 Trip Volume (Sample, ×{params['sample_rate']} for real)",
+         'Number of Trips', '{:,.0f}'),
+        (axes[0, 1], df['total_revenue'] / 1e6, '💰 Total Revenue (M$, Sample)', 'Revenue (Millions $)', None),
+        (axes[0, 2], df['avg_fare'], '💵 Average Base Fare [Not scaled]', 'Avg Fare ($)', '${:.2f}'),
+        (axes[1, 0], df['shared_adoption_pct'], '🤝 Shared Ride Adoption %', 'Adoption Rate (%)', '{:.2f}%'),
+        (axes[1, 1], df['wav_adoption_pct'], '♿ WAV Accessibility %', 'WAV Request Rate (%)', '{:.2f}%'),
+    ]
+    for ax, values, title, ylabel, fmt in panels:
+        bars = ax.bar(platforms, values, color=colors, edgecolor='black', alpha=0.85)
+        if fmt:
+            _bar_labels(ax, bars, values, fmt)
+        ax.set_title(title, fontsize=12, fontweight='bold')
+        ax.set_ylabel(ylabel)
+        ax.grid(axis='y', alpha=0.3)
+
+    ax6 = axes[1, 2]
+    x = np.arange(len(platforms))
+    ax6.bar(x - 0.175, df['avg_miles'], 0.35, label='Avg Miles', color='lightblue', edgecolor='black', alpha=0.8)
+    ax6_twin = ax6.twinx()
+    ax6_twin.bar(x + 0.175, df['avg_duration_min'], 0.35, label='Avg Duration (min)', color='lightcoral',
+                 edgecolor='black', alpha=0.8)
+    ax6.set_title('🚗 Trip Efficiency Metrics [Averages]', fontsize=12, fontweight='bold')
+    ax6.set_ylabel('Average Miles', color='blue')
+    ax6_twin.set_ylabel('Average Duration (min)', color='red')
+    ax6.set_xticks(x)
+    ax6.set_xticklabels(platforms)
+    ax6.tick_params(axis='y', labelcolor='blue')
+    ax6_twin.tick_params(axis='y', labelcolor='red')
+    ax6.legend(loc='upper left')
+    ax6_twin.legend(loc='upper right')
+
+    _suptitle(plt, '🆚 Platform Comparison: Uber vs Lyft', params)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def render_fleet_evolution(data, params, paths):
+    import numpy as np
+    import pandas as pd
+
+    plt = _pyplot()
+    k = params['sample_rate']
+    df = pd.DataFrame(data['fleet_evolution'])
+    df = df[df['platform'].isin(list(PLATFORM_NAMES))].copy()
+    df['platform_name'] = df['platform'].map(PLATFORM_NAMES)
+    # Meses de la ventana en orden (la ventana puede cruzar un cambio de año)
+    df['period'] = df['year'] * 100 + df['month']
+    pivot = df.pivot_table(index='period', columns='platform_name', values='trip_count', aggfunc='sum',
+                           fill_value=0).sort_index() * k
+    labels = [MONTH_NAMES[p % 100 - 1] for p in pivot.index]
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+
+    for platform in pivot.columns:
+        ax1.plot(labels, pivot[platform], marker='o', linewidth=3, markersize=10, label=f'{platform} (Real Est.)',
+                 color=PLATFORM_COLORS[platform], alpha=0.8)
+    ax1.set_title(f'📈 Monthly Fleet Activity (Real Estimates ×{k})', fontsize=13, fontweight='bold')
+    ax1.set_ylabel('Number of Trips', fontsize=11)
+    ax1.legend(fontsize=11, loc='best')
+
+    x = np.arange(len(labels))
+    bottom = np.zeros(len(labels))
+    for platform in ('Uber', 'Lyft'):
+        values = pivot[platform].to_numpy() if platform in pivot else np.zeros(len(labels))
+        ax2.bar(x, values, 0.6, bottom=bottom, label=platform, color=PLATFORM_COLORS[platform], alpha=0.85)
+        bottom += values
+    ax2.set_title('📊 Market Composition (Real Estimates)', fontsize=13, fontweight='bold')
+    ax2.set_ylabel('Total Trips', fontsize=11)
+    ax2.set_xticks(x)
+    ax2.set_xticklabels(labels)
+    ax2.legend(fontsize=11)
+
+    for ax in (ax1, ax2):
+        ax.set_xlabel('Month', fontsize=11)
+        ax.grid(alpha=0.3)
+        ax.ticklabel_format(style='plain', axis='y')
+    plt.suptitle(f"🚗 Platform Fleet Activity Evolution — {params['period']}", fontsize=16, fontweight='bold',
+                 y=1.00)
+    plt.tight_layout()
+    _save_figure(plt, fig, paths[0], params)
+
+
+def _legend_html(folium, lines, position='bottom: 50px; left: 50px;', width=300):
+    body = ''.join(f'<p style="margin: 5px 0; font-size: 11px;">{line}</p>' for line in lines[1:])
+    return folium.Element(
+        f'<div style="position: fixed; {position} width: {width}px; background-color: white; '
+        f'border:2px solid grey; z-index:9999; font-size:13px; padding: 10px; border-radius: 5px;">'
+        f'<p style="margin: 0; font-weight: bold;">{lines[0]}</p>{body}</div>')
+
+
+def _zone_markers(folium, fmap, rows, zones, scale, popup, tooltip, color, fill):
+    top = max((r['trip_count'] for r in rows), default=1) or 1
+    coords = zones.coord_map()
+    for row in rows:
+        zone_id = int(row['location_id'])
+        if zone_id not in coords:
+            continue
+        base, extra, divisor = scale
+        folium.CircleMarker(location=coords[zone_id], radius=(row['trip_count'] / top * base + extra) / divisor,
+                            popup=popup(zone_id, row), tooltip=tooltip(zone_id, row), color=color, fill=True,
+                            fillColor=fill, fillOpacity=0.6, weight=2).add_to(fmap)
+
+
+def render_pickup_map(data, params, paths):
+    import folium
+
+    from zone_geometry import load_zone_index
+
+    zones = load_zone_index()
+    k = params['sample_rate']
+    rows = data['pickup_locations']
+    fmap = folium.Map(location=NYC_CENTER, zoom_start=11, tiles='OpenStreetMap')
+    folium.GeoJson(zones.to_geojson(), name='Taxi zones',
+                   style_function=lambda _: {'color': '#7f8c8d', 'weight': 0.6, 'fillOpacity': 0.03},
+                   tooltip=folium.GeoJsonTooltip(fields=['location_id', 'zone', 'borough'],
+                                                 aliases=['Zone', 'Name', 'Borough'])).add_to(fmap)
+    # Radio relativo a la zona con más viajes (igual que el top 10 del notebook)
+    _zone_markers(folium, fmap, rows, zones, (500, 100, 20),
+                  lambda z, r: (f"<b>Zone {z}</b> — {zones.label(z)}<br>Trips (Sample): {r['trip_count']:,}<br>"
+                                f"Real Est.: {r['trip_count'] * k:,}<br>Avg Fare: ${r['avg_fare']:.2f}"),
+                  lambda z, r: f"{zones.zone_name(z)}: {r['trip_count']:,} trips", 'darkred', 'red')
+    fmap.get_root().html.add_child(_legend_html(
+        folium, ['🗺️ NYC HVFHV Trip Hotspots', f"{params['period']} | Sample Rate: 1 in {k}",
+                 '<i>Circle size = Trip volume</i>'], position='top: 10px; left: 50px;', width=500))
+    fmap.save(str(paths[0]))
+
+
+def render_dropoff_map(data, params, paths):
+    import folium
+
+    from zone_geometry import load_zone_index
+
+    zones = load_zone_index()
+    k = params['sample_rate']
+    fmap = folium.Map(location=MIDTOWN, zoom_start=11, tiles='CartoDB positron')
+    _zone_markers(folium, fmap, data['dropoff_locations'][:20], zones, (600, 80, 15),
+                  lambda z, r: (f"<b>🎯 Zone {z}</b> — {zones.label(z)}<br>Dropoffs (Sample): {r['trip_count']:,}<br>"
+                                f"Real Est.: {r['trip_count'] * k:,}<br>Avg Fare: ${r['avg_fare']:.2f}"),
+                  lambda z, r: f"{zones.zone_name(z)}: {r['trip_count']:,} dropoffs", '#e74c3c', '#c0392b')
+    fmap.get_root().html.add_child(_legend_html(
+        folium, ['🎯 Dropoff Destinations', f"{params['period']} | Top 20 Zones", '🔴 Circle size = Dropoff volume',
+                 f'Sample Rate: 1 in {k}'], width=280))
+    fmap.save(str(paths[0]))
+
+
+def render_rush_hour_map(data, params, paths):
+    import folium
+
+    from zone_geometry import load_zone_index
+
+    zones = load_zone_index()
+    k = params['sample_rate']
+    fmap = folium.Map(location=MIDTOWN, zoom_start=11, tiles='OpenStreetMap')
+    for section, label, hours, color, fill in (('morning_rush', 'Morning', '6-9 AM', '#2980b9', '#3498db'),
+                                               ('evening_rush', 'Evening', '5-8 PM', '#c0392b', '#e74c3c')):
+        _zone_markers(folium, fmap, data[section][:12], zones, (400, 50, 12),
+                      lambda z, r, label=label, hours=hours: (
+                          f"<b>{label} Rush - Zone {z}</b> — {zones.label(z)}<br>"
+                          f"{hours} Pickups: {r['trip_count']:,} (Sample)<br>Real Est.: {r['trip_count'] * k:,}"),
+                      lambda z, r, label=label: f"{label}: Zone {z}", color, fill)
+    fmap.get_root().html.add_child(_legend_html(
+        folium, ['⏰ Rush Hour Comparison', '🔵 <b>Morning Rush (6-9 AM)</b>', '🔴 <b>Evening Rush (5-8 PM)</b>',
+                 'Circle size = Trip volume'], width=320))
+    fmap.save(str(paths[0]))
+
+
+# ==================== TAREAS ====================
+
+# version: súbela al cambiar el dibujo de una tarea (invalida solo su huella)
+TASKS = {
+    'hourly_grid': {'sections': ['hourly'], 'outputs': ['charts/hourly_analysis_grid.png'],
+                    'render': render_hourly_grid, 'version': 1},
+    'heatmap_day_hour': {'sections': ['day_hour'], 'outputs': ['charts/heatmap_day_hour.png'],
+                         'render': render_heatmap_day_hour, 'version': 1},
+    'revenue_components': {'sections': ['revenue'], 'outputs': ['charts/revenue_components.png'],
+                           'render': render_revenue_components, 'version': 1},
+    'driver_economics': {'sections': ['driver'], 'outputs': ['charts/driver_economics.png'],
+                         'render': render_driver_economics, 'version': 1},
+    'wav_compliance': {'sections': ['wav', 'wav_platform'], 'outputs': ['charts/wav_compliance.png'],
+                       'render': render_wav_compliance, 'version': 1},
+    'shared_rides': {'sections': ['shared', 'shared_hourly'], 'outputs': ['charts/shared_rides_analysis.png'],
+                     'render': render_shared_rides, 'version': 1},
+    'platform_comparison': {'sections': ['platform'], 'outputs': ['charts/platform_comparison.png'],
+                            'render': render_platform_comparison, 'version': 1},
+    'fleet_evolution': {'sections': ['fleet_evolution'], 'outputs': ['charts/fleet_evolution.png'],
+                        'render': render_fleet_evolution, 'version': 1},
+    'pickup_map': {'sections': ['pickup_locations'], 'outputs': ['charts/nyc_trip_hotspots_map.html'],
+                   'render': render_pickup_map, 'version': 1, 'requires': 'folium'},
+    'dropoff_map': {'sections': ['dropoff_locations'], 'outputs': ['maps/dropoff_destinations_map.html'],
+                    'render': render_dropoff_map, 'version': 1, 'requires': 'folium'},
+    'rush_hour_map': {'sections': ['morning_rush', 'evening_rush'],
+                      'outputs': ['maps/temporal_comparison_map.html'],
+                      'render': render_rush_hour_map, 'version': 1, 'requires': 'folium'},
+}
+
+
+def period_label(start, end):
+    """'Jan–Jun 2025' para la ventana [start, end)."""
+    last = end - dt.timedelta(days=1)
+    if start.year == last.year:
+        return f"{MONTH_NAMES[start.month - 1]}–{MONTH_NAMES[last.month - 1]} {last.year}"
+    return f"{MONTH_NAMES[start.month - 1]} {start.year}–{MONTH_NAMES[last.month - 1]} {last.year}"
+
+
+def render_params(start, end, sample_rate=SAMPLE_RATE, dpi=DPI):
+    """Parámetros de dibujo comunes a todas las tareas (forman parte de la huella)."""
+    return {'period': period_label(start, end), 'sample_rate': sample_rate, 'dpi': dpi}
+
+
+def task_hash(name, data, params):
+    """SHA-256 de los documentos de las secciones de la tarea + parámetros + versión del dibujo."""
+    task = TASKS[name]
+    payload = {'task': name, 'version': task['version'], 'params': params,
+               'data': {section: data.get(section) for section in task['sections']}}
+    text = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=_json_default)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def run_task(name, data, params, output_dir):
+    """
+    Pinta una tarea (en un proceso del pool o en el principal).
+
+    Returns:
+        tuple: (nombre, [ficheros], segundos)
+    """
+    t0 = time.perf_counter()
+    paths = [Path(output_dir) / rel for rel in TASKS[name]['outputs']]
+    for path in paths:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    TASKS[name]['render'](data, params, paths)
+    return name, [str(p) for p in paths], time.perf_counter() - t0
+
+
+# ==================== MANIFIESTO ====================
+
+def load_manifest(output_dir=DEFAULT_OUTPUT_DIR):
+    try:
+        with open(Path(output_dir) / MANIFEST_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'tasks': {}}
+
+
+def save_manifest(manifest, output_dir=DEFAULT_OUTPUT_DIR):
+    path = Path(output_dir) / MANIFEST_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _is_current(entry, digest, output_dir):
+    return (entry is not None and entry.get('hash') == digest
+            and all((Path(output_dir) / rel).exists() for rel in entry.get('outputs', [])))
+
+
+# ==================== INFORME ====================
+
+def sections_needed(only=None):
+    """Secciones de report_engine que necesitan las tareas seleccionadas."""
+    names = only or list(TASKS)
+    return sorted({section for name in names for section in TASKS[name]['sections']})
+
+
+def render_report(data, params, output_dir=DEFAULT_OUTPUT_DIR, only=None, force=False, workers=None):
+    """
+    Pinta las tareas cuya huella ha cambiado (o cuyos ficheros faltan).
+
+    Args:
+        data (dict): {sección: lista de documentos} (report.records o LocalMetrics.sections())
+        params (dict): Parámetros de dibujo (render_params)
+        output_dir (str | Path): Directorio outputs/ (charts/ y maps/ debajo)
+        only (list, optional): Nombres de tareas (por defecto todas)
+        force (bool): Pinta aunque la huella no haya cambiado
+        workers (int, optional): Procesos del pool (por defecto os.cpu_count())
+
+    Returns:
+        dict: {tarea: {'status': 'rendered' | 'skipped' | 'empty' | 'unavailable', 'seconds', 'outputs'}}
+    """
+    unknown = set(only or []) - set(TASKS)
+    if unknown:
+        raise ValueError(f"Tareas desconocidas: {sorted(unknown)} (disponibles: {list(TASKS)})")
+    manifest = load_manifest(output_dir)
+    results = {}
+    pending = {}
+    for name in only or list(TASKS):
+        task = TASKS[name]
+        if task.get('requires') and importlib.util.find_spec(task['requires']) is None:
+            results[name] = {'status': 'unavailable', 'seconds': 0.0, 'outputs': []}
+            continue
+        task_data = {section: data.get(section) or [] for section in task['sections']}
+        if not task_data[task['sections'][0]]:
+            results[name] = {'status': 'empty', 'seconds': 0.0, 'outputs': []}
+            continue
+        digest = task_hash(name, task_data, params)
+        if not force and _is_current(manifest['tasks'].get(name), digest, output_dir):
+            results[name] = {'status': 'skipped', 'seconds': 0.0, 'outputs': manifest['tasks'][name]['outputs']}
+            continue
+        pending[name] = (task_data, digest)
+
+    def done(name, outputs, seconds):
+        results[name] = {'status': 'rendered', 'seconds': seconds, 'outputs': outputs}
+        manifest['tasks'][name] = {
+            'hash': pending[name][1], 'outputs': TASKS[name]['outputs'], 'seconds': round(seconds, 3),
+            'rendered_at': dt.datetime.now().isoformat(timespec='seconds'),
+        }
+        # Se guarda tras cada tarea: si otra falla, las ya pintadas no se repiten
+        save_manifest(manifest, output_dir)
+
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    if workers <= 1:
+        # Una sola tarea: arrancar un pool cuesta más que pintarla aquí
+        for name, (task_data, _) in pending.items():
+            done(*run_task(name, task_data, params, output_dir))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_task, name, task_data, params, str(output_dir))
+                       for name, (task_data, _) in pending.items()]
+            for future in as_completed(futures):
+                done(*future.result())
+    return {name: results[name] for name in only or list(TASKS)}
+
+
+def mongo_sections(collection, start, end, platforms=None, cache=None, use_rollup=True, only=None):
+    """
+    Documentos de las secciones desde MongoDB, igual que en el notebook.
+
+    Las secciones que tiene el rollup se leen de él (si está construido); el
+    resto se calculan con notebook_report() en un aggregate por ventana.
+
+    Returns:
+        dict: {sección: lista de documentos}
+    """
+    import rollup
+    from report_engine import notebook_report
+
+    needed = set(sections_needed(only))
+    data = {}
+    rollup_collection = collection.database[rollup.ROLLUP_COLLECTION]
+    if use_rollup and rollup_collection.estimated_document_count() > 0:
+        # Las secciones de plataformas no aplican el filtro de plataforma (igual que en el notebook)
+        queries = {'hourly': (rollup.hourly_summary, platforms),
+                   'day_hour': (rollup.day_hour_summary, platforms),
+                   'revenue': (rollup.revenue_components, platforms),
+                   'driver': (rollup.driver_economics, platforms),
+                   'platform': (rollup.platform_comparison, None),
+                   'fleet_evolution': (rollup.fleet_evolution, None)}
+        for section, (query, section_platforms) in queries.items():
+            if section in needed:
+                data[section] = query(rollup_collection, start, end, section_platforms)
+    engine = notebook_report(collection, start, end, platforms, cache)
+    engine.sections = {name: spec for name, spec in engine.sections.items() if name in needed - set(data)}
+    if engine.sections:
+        engine.run()
+        data.update(engine.records)
+    return data
+
+
+def local_sections(data_dir, start, end, sample_rate=1, platforms=None, workers=None, cache=None, columns=None):
+    """
+    Documentos de las secciones calculados desde los Parquet (local_metrics.py).
+
+    Con cache (SampleCache) y sample_rate > 1 la muestra limpia de cada
+    fichero sale de sample_cache.py (leída con `columns`).
+    """
+    from glob import glob
+
+    from local_metrics import compute_local_metrics
+
+    files = sorted(glob(os.path.join(data_dir, "fhvhv_tripdata_*.parquet")))
+    return compute_local_metrics(files, sample_rate, start, end, workers, cache=cache,
+                                 columns=columns).sections(platforms)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gráficos y mapas del notebook, solo los que han cambiado")
+    parser.add_argument('--uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--database', default='nyc_hvfhv')
+    parser.add_argument('--collection', default='trips_2025')
+    parser.add_argument('--local', metavar='DATA_DIR', default=None, help="Calcula desde los Parquet (sin MongoDB)")
+    parser.add_argument('--sample-rate', type=int, default=SAMPLE_RATE,
+                        help="Muestreo 1 de N de los datos (con --local también el que se lee)")
+    parser.add_argument('--start', default='2025-01-01')
+    parser.add_argument('--end', default='2025-07-01')
+    parser.add_argument('--platforms', nargs='*', default=None)
+    parser.add_argument('--only', nargs='+', default=None, choices=list(TASKS), metavar='TAREA')
+    parser.add_argument('--force', action='store_true', help="Pinta todas aunque no hayan cambiado")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--dpi', type=int, default=DPI)
+    parser.add_argument('--output-dir', default=str(DEFAULT_OUTPUT_DIR))
+    parser.add_argument('--no-rollup', action='store_true', help="No usa trips_rollup")
+    parser.add_argument('--no-sample-cache', dest='sample_cache', action='store_false',
+                        help="--local: lee siempre el Parquet (sin sample_cache.py)")
+    parser.add_argument('--list', action='store_true', help="Lista las tareas y su última ejecución")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.list:
+        manifest = load_manifest(args.output_dir)
+        for name, task in TASKS.items():
+            entry = manifest['tasks'].get(name)
+            last = f"{entry['rendered_at']} ({entry['seconds']:.1f} s) {entry['hash'][:12]}" if entry else "—"
+            print(f"   {name:22s}{', '.join(task['sections']):30s}{task['outputs'][0]:40s}{last}")
+        raise SystemExit(0)
+
+    start, end = dt.datetime.fromisoformat(args.start), dt.datetime.fromisoformat(args.end)
+    t0 = time.perf_counter()
+    if args.local:
+        from cargar_datos_completo import COLUMNS
+        from sample_cache import SampleCache
+
+        cache = SampleCache() if args.sample_cache else None
+        data = local_sections(args.local, start, end, args.sample_rate, args.platforms, args.workers, cache,
+                              COLUMNS)
+    else:
+        from pymongo import MongoClient
+
+        from aggregate_cache import AggregateCache
+
+        collection = MongoClient(args.uri)[args.database][args.collection]
+        data = mongo_sections(collection, start, end, args.platforms, AggregateCache(), not args.no_rollup,
+                              args.only)
+    query_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    results = render_report(data, render_params(start, end, args.sample_rate, args.dpi), args.output_dir,
+                            args.only, args.force, args.workers)
+    render_s = time.perf_counter() - t0
+
+    icons = {'rendered': '🎨', 'skipped': '⏭️ ', 'empty': '⚠️ ', 'unavailable': '⚠️ '}
+    notes = {'skipped': 'sin cambios', 'empty': 'sin datos', 'unavailable': 'falta folium'}
+    for name, result in results.items():
+        detail = f"{result['seconds']:.1f} s" if result['status'] == 'rendered' else notes[result['status']]
+        print(f"   {icons[result['status']]} {name:22s}{detail}")
+    rendered = sum(r['status'] == 'rendered' for r in results.values())
+    print(f"✅ {rendered} de {len(results)} tareas pintadas | datos {query_s:.1f} s | dibujo {render_s:.1f} s")
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de informes en una sola pasada ($facet) para las secciones del notebook.
+
+Cada sección del notebook hace collection.count_documents(match_base) y
+después su propio aggregate: ~20 recorridos de la misma ventana temporal
+por informe. Aquí las secciones se registran como (nombre, ventana, etapas)
+y el motor ejecuta UN aggregate por ventana distinta:
+
+    [{$match: ventana},
+     {$project: solo los campos que usa alguna sección},
+     {$facet: {sección_1: [...], sección_2: [...], ..., _window_count: [{$count: 'n'}]}}]
+
+El recuento de la ventana sale de la misma pasada. Cada sección recibe su
+resultado como DataFrame (y como lista de documentos, igual que
+list(collection.aggregate(...))).
+
+Límites de $facet: el documento resultante no puede superar 16 MB (las
+secciones del notebook devuelven como mucho unas decenas de filas) y los
+sub-pipelines no usan índices, por eso el $match va antes del $facet.
+"""
+
+import json
+import logging
+import time
+
+import pandas as pd
+
+import hvfhv_pipelines as hp
+
+logger = logging.getLogger(__name__)
+
+WINDOW_COUNT_FACET = '_window_count'
+
+
+def canonical_match(match):
+    """Representación estable de un $match (sirve de clave de ventana)."""
+    return json.dumps(match, sort_keys=True, default=str)
+
+
+def referenced_fields(stages):
+    """
+    Campos de primer nivel referenciados como "$campo" en unas etapas.
+
+    Se usa para proyectar antes del $facet solo lo necesario; incluir algún
+    nombre de más (p. ej. campos creados dentro de la propia sección) no
+    cambia el resultado.
+    """
+    fields = set()
+
+    def visit(node):
+        if isinstance(node, dict):
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+        elif isinstance(node, str) and node.startswith('$') and not node.startswith('$$'):
+            fields.add(node[1:].split('.')[0])
+
+    visit(stages)
+    return fields
+
+
+class ReportEngine:
+    """Agrupa secciones por ventana y las ejecuta con un aggregate por ventana."""
+
+    def __init__(self, collection, cache=None):
+        self.collection = collection
+        self.cache = cache
+        self.sections = {}
+        self.records = {}
+        self.results = {}
+        self.window_counts = {}
+        self.stats = {}
+
+    def add(self, name, match, stages):
+        """Registra una sección (las etapas van después del $match)."""
+        if name == WINDOW_COUNT_FACET or name.startswith('$') or '.' in name:
+            raise ValueError(f"Nombre de sección no válido: {name!r}")
+        self.sections[name] = (match, list(stages))
+        return self
+
+    def windows(self):
+        """{clave de ventana: (match, [nombres de sección])}"""
+        grouped = {}
+        for name, (match, _) in self.sections.items():
+            key = canonical_match(match)
+            grouped.setdefault(key, (match, []))[1].append(name)
+        return grouped
+
+    def build_pipeline(self, match, names):
+        """Pipeline combinado de una ventana."""
+        facets = {name: self.sections[name][1] for name in names}
+        fields = set().union(*(referenced_fields(stages) for stages in facets.values()))
+        fields.discard('_id')
+        facets[WINDOW_COUNT_FACET] = [{'$count': 'n'}]
+        return [
+            {'$match': match},
+            {'$project': {'_id': 0, **{f: 1 for f in sorted(fields)}}},
+            {'$facet': facets},
+        ]
+
+    def run(self):
+        """
+        Ejecuta todas las secciones.
+
+        Returns:
+            dict: {nombre de sección: pd.DataFrame}
+        """
+        t0 = time.perf_counter()
+        windows = self.windows()
+        for key, (match, names) in windows.items():
+            pipeline = self.build_pipeline(match, names)
+            if self.cache is not None:
+                output = (self.cache.aggregate(self.collection, pipeline, allowDiskUse=True) or [{}])[0]
+            else:
+                output = next(self.collection.aggregate(pipeline, allowDiskUse=True), {})
+            count = output.get(WINDOW_COUNT_FACET) or [{'n': 0}]
+            self.window_counts[key] = count[0]['n']
+            for name in names:
+                self.records[name] = output.get(name, [])
+                self.results[name] = pd.DataFrame(self.records[name])
+
+        self.stats = self._scan_stats(windows, time.perf_counter() - t0)
+        logger.info(
+            f"📊 Informe: {self.stats['sections']} secciones en {self.stats['queries']} aggregate(s) "
+            f"(antes {self.stats['queries_before']} consultas) | documentos recorridos "
+            f"{self.stats['docs_scanned']:,} frente a {self.stats['docs_scanned_before']:,} "
+            f"({self.stats['scan_saved_pct']:.1f}% menos)"
+        )
+        return self.results
+
+    def _scan_stats(self, windows, elapsed):
+        """Consultas y documentos recorridos frente a count + aggregate por sección."""
+        docs_after = sum(self.window_counts.values())
+        # Antes: cada sección recorría su ventana dos veces (count_documents + aggregate)
+        docs_before = sum(2 * self.window_counts[key] * len(names) for key, (_, names) in windows.items())
+        return {
+            'sections': len(self.sections),
+            'windows': len(windows),
+            'queries': len(windows),
+            'queries_before': 2 * len(self.sections),
+            'docs_scanned': docs_after,
+            'docs_scanned_before': docs_before,
+            'scan_saved_pct': (1 - docs_after / docs_before) * 100 if docs_before else 0.0,
+            'seconds': elapsed,
+        }
+
+    def window_count(self, match):
+        """Recuento de una ventana ya ejecutada (None si no se ha ejecutado)."""
+        return self.window_counts.get(canonical_match(match))
+
+
+def notebook_report(collection, start, end, platforms=None, cache=None):
+    """
+    Registra todas las secciones del notebook (celdas de 4.1 a las horas punta).
+
+    Las secciones de plataformas (comparativa y evolución de la flota) no
+    aplican el filtro de plataforma, igual que en el notebook. Con `cache`
+    (aggregate_cache.AggregateCache) el informe no se recalcula mientras no
+    cambien los datos.
+
+    Returns:
+        ReportEngine: Motor listo para run()
+    """
+    window = hp.match_base(start, end, platforms)
+    all_platforms = hp.match_base(start, end)
+    engine = ReportEngine(collection, cache)
+    engine.add('hourly', window, hp.hourly_stages())
+    engine.add('daily', window, hp.daily_stages())
+    engine.add('monthly', window, hp.monthly_stages())
+    engine.add('day_hour', window, hp.day_hour_stages())
+    engine.add('revenue', window, hp.revenue_stages())
+    engine.add('driver', window, hp.driver_stages())
+    engine.add('wav', window, hp.wav_stages())
+    engine.add('wav_platform', window, hp.wav_platform_stages())
+    engine.add('shared', window, hp.shared_stages())
+    engine.add('shared_hourly', window, hp.shared_hourly_stages())
+    engine.add('platform', all_platforms, hp.platform_stages())
+    engine.add('fleet_evolution', all_platforms, hp.fleet_evolution_stages())
+    engine.add('pickup_locations', window, hp.pickup_locations_stages())
+    engine.add('dropoff_locations', window, hp.dropoff_locations_stages())
+    engine.add('top_pickups', window, hp.top_pickups_stages())
+    engine.add('od_flows', window, hp.od_flows_from_top_pickups_stages())
+    engine.add('morning_rush', window, hp.rush_hour_stages(6, 9))
+    engine.add('evening_rush', window, hp.rush_hour_stages(17, 20))
+    return engine
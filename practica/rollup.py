@@ -0,0 +1,528 @@
+# -*- coding: utf-8 -*-
+"""
+Cubo de agregados (rollup) de viajes HVFHV mantenido durante la carga.
+
+Casi todas las celdas de análisis del notebook hacen $match por
+pickup_datetime sobre los viajes y $group por plataforma, mes, día de la
+semana, hora o zona, sumando siempre los mismos importes. La colección
+`trips_rollup` guarda esas sumas ya agregadas con clave
+
+    plataforma × hora (hour_start) × PULocationID × source_file
+
+(una hora de un día concreto; source_file permite borrar/recalcular un mes).
+Cada documento tiene:
+
+    trips                             número de viajes
+    sum_<campo>                       sumas de tarifas, driver_pay, millas y trip_time
+    shared_requests, wav_requests...  recuentos de flags 'Y'
+    drv_*                             sumas de los viajes con driver_pay > 0 y
+                                      coste total > 0 (economía del conductor)
+    est_trips / var_trips,            estimaciones ponderadas (Σ w·y) y sus varianzas
+    est_revenue / var_revenue         (Σ w(w - 1)·y²) con el peso de muestreo de cada
+                                      viaje, ver stratified_sampler.py
+
+Todas las métricas del notebook (sumas, medias = suma / recuento, medias de
+ratios por viaje = suma de ratios / recuento) se obtienen de forma exacta a
+partir de estas sumas, recorriendo miles de documentos en lugar de millones.
+
+Mantenimiento:
+- apply_rollup(): $inc con upsert de los agregados de un lote recién insertado.
+- rebuild_rollup(): recalcula desde los viajes (todo o un source_file) con $merge.
+
+Las consultas (hourly_summary, monthly_summary, ...) devuelven lo mismo que
+los pipelines del notebook; los límites start/end deben caer en horas exactas.
+Las estimaciones ponderadas (<medida>_est / <medida>_var) solo están en las
+consultas de viajes y revenue (temporales, día × hora y flota):
+revenue_components, driver_economics y platform_comparison devuelven las
+sumas de la muestra, así que con un plan estratificado esas secciones se
+calculan desde los viajes.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+from pymongo import ASCENDING, UpdateOne
+
+from hvfhv_cleaning import float64_values
+from hvfhv_pipelines import DEFAULT_WEIGHT, WEIGHT_FIELD, weighted_sums
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = 'trips_rollup'
+
+# Campos sumados (nulos como 0, igual que $ifNull en el notebook)
+SUM_FIELDS = ['base_passenger_fare', 'tolls', 'tips', 'congestion_surcharge', 'airport_fee',
+              'bcf', 'sales_tax', 'driver_pay', 'trip_miles', 'trip_time']
+
+# Componentes de "revenue" en el notebook
+REVENUE_FIELDS = ['base_passenger_fare', 'tolls', 'tips', 'congestion_surcharge', 'airport_fee']
+
+# Componentes del coste total en el análisis de conductores
+TOTAL_COST_FIELDS = ['base_passenger_fare', 'tolls', 'bcf', 'sales_tax', 'congestion_surcharge', 'airport_fee']
+
+# Flag del viaje → recuento en el rollup
+FLAG_COUNTS = {
+    'shared_request_flag': 'shared_requests',
+    'shared_match_flag': 'shared_matches',
+    'wav_request_flag': 'wav_requests',
+    'wav_match_flag': 'wav_matches',
+    'access_a_ride_flag': 'access_a_ride',
+}
+
+DRIVER_MEASURES = ['drv_trips', 'drv_sum_driver_pay', 'drv_sum_total_cost', 'drv_sum_tips',
+                   'drv_sum_pay_per_mile', 'drv_sum_pay_per_minute']
+
+WEIGHTED_MEASURES = ['est_trips', 'var_trips', 'est_revenue', 'var_revenue']
+
+MEASURES = (['trips'] + [f'sum_{f}' for f in SUM_FIELDS] + list(FLAG_COUNTS.values()) + DRIVER_MEASURES
+            + WEIGHTED_MEASURES)
+
+KEY_FIELDS = ['platform', 'hour_start', 'PULocationID', 'source_file']
+
+
+# ==================== MANTENIMIENTO ====================
+
+def ensure_rollup_indexes(rollup):
+    """Índices para filtrar por rango de horas y por plataforma/mes de origen."""
+    rollup.create_index([('hour_start', ASCENDING)])
+    rollup.create_index([('platform', ASCENDING), ('hour_start', ASCENDING)])
+    rollup.create_index([('source_file', ASCENDING)])
+
+
+def _numeric(df, col):
+    """Columna como float64 con nulos a 0 (0 si la columna no existe)."""
+    if col not in df.columns:
+        return np.zeros(len(df))
+    values = float64_values(pd.to_numeric(df[col], errors='coerce'))
+    return np.where(np.isnan(values), 0.0, values)
+
+
+def frame_to_rollup(df, source_file=None):
+    """
+    Agrega un DataFrame limpio (salida de clean_hvfhv_data) al grano del rollup.
+
+    Args:
+        df (pd.DataFrame): Viajes limpios
+        source_file (str, optional): Fichero de origen (None en cargas sin etiquetar)
+
+    Returns:
+        pd.DataFrame: Una fila por clave con las columnas de MEASURES
+    """
+    pickup = pd.to_datetime(df['pickup_datetime'], errors='coerce')
+    valid = pickup.notna().to_numpy()
+    df, pickup = df[valid], pickup[valid]
+
+    values = {f: _numeric(df, f) for f in SUM_FIELDS}
+    work = pd.DataFrame({
+        'platform': df['hvfhs_license_num'].to_numpy(),
+        'hour_start': pickup.dt.floor('h').to_numpy(),
+        'PULocationID': df['PULocationID'].to_numpy(),
+        'trips': np.ones(len(df), dtype='int64'),
+    })
+    for f in SUM_FIELDS:
+        work[f'sum_{f}'] = values[f]
+    for flag, name in FLAG_COUNTS.items():
+        work[name] = (df[flag] == 'Y').to_numpy().astype('int64') if flag in df.columns else 0
+
+    # Economía del conductor: mismo filtro y ratios por viaje que pipeline_driver
+    pay = values['driver_pay']
+    total_cost = sum(values[f] for f in TOTAL_COST_FIELDS)
+    minutes = values['trip_time'] / 60
+    eligible = (pay > 0) & (total_cost > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_mile = np.where(values['trip_miles'] > 0, pay / values['trip_miles'], 0)
+        per_minute = np.where(minutes > 0, pay / minutes, 0)
+    work['drv_trips'] = eligible.astype('int64')
+    work['drv_sum_driver_pay'] = np.where(eligible, pay, 0)
+    work['drv_sum_total_cost'] = np.where(eligible, total_cost, 0)
+    work['drv_sum_tips'] = np.where(eligible, values['tips'], 0)
+    work['drv_sum_pay_per_mile'] = np.where(eligible, per_mile, 0)
+    work['drv_sum_pay_per_minute'] = np.where(eligible, per_minute, 0)
+
+    # Estimaciones ponderadas (sin sample_weight: peso fijo de la carga 1 de N)
+    if WEIGHT_FIELD in df.columns:
+        weight = pd.to_numeric(df[WEIGHT_FIELD], errors='coerce').fillna(DEFAULT_WEIGHT).to_numpy(dtype='float64')
+    else:
+        weight = np.full(len(df), float(DEFAULT_WEIGHT))
+    revenue = sum(values[f] for f in REVENUE_FIELDS)
+    work['est_trips'] = weight
+    work['var_trips'] = weight * (weight - 1)
+    work['est_revenue'] = weight * revenue
+    work['var_revenue'] = weight * (weight - 1) * revenue * revenue
+
+    grouped = work.groupby(['platform', 'hour_start', 'PULocationID'], sort=False, dropna=False).sum()
+    grouped = grouped.reset_index()
+    grouped['source_file'] = source_file
+    return grouped
+
+
+def _rollup_key(platform, hour_start, zone, source_file):
+    return {'platform': platform, 'hour_start': hour_start, 'PULocationID': zone, 'source_file': source_file}
+
+
+def _dimensions(hour_start):
+    """Campos de tiempo derivados (día de la semana con el criterio de $dayOfWeek: 1 = domingo)."""
+    return {
+        'date': hour_start.replace(hour=0),
+        'hour': hour_start.hour,
+        'day_of_week': (hour_start.weekday() + 1) % 7 + 1,
+        'month': hour_start.month,
+        'year': hour_start.year,
+    }
+
+
+def apply_rollup(rollup, df, source_file=None):
+    """
+    Suma al rollup los viajes de un lote ya insertado ($inc con upsert).
+
+    Returns:
+        int: Documentos del rollup tocados
+    """
+    if len(df) == 0:
+        return 0
+    grouped = frame_to_rollup(df, source_file)
+    hour_starts = pd.to_datetime(grouped['hour_start']).dt.to_pydatetime()
+    platforms = grouped['platform'].tolist()
+    zones = grouped['PULocationID'].tolist()
+    measures = {m: grouped[m].tolist() for m in MEASURES}
+
+    operations = []
+    for i, hour_start in enumerate(hour_starts):
+        key = _rollup_key(platforms[i], hour_start, zones[i], source_file)
+        operations.append(UpdateOne(
+            {'_id': key},
+            {'$inc': {m: measures[m][i] for m in MEASURES},
+             '$setOnInsert': {**key, **_dimensions(hour_start)}},
+            upsert=True,
+        ))
+    rollup.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _ifnull(field):
+    return {'$ifNull': [f'${field}', 0]}
+
+
+def _rollup_group_stage():
+    """$group que reproduce frame_to_rollup() en el servidor."""
+    total_cost = {'$add': [_ifnull(f) for f in TOTAL_COST_FIELDS]}
+    eligible = {'$and': [{'$gt': [_ifnull('driver_pay'), 0]}, {'$gt': [total_cost, 0]}]}
+    minutes = {'$divide': [_ifnull('trip_time'), 60]}
+
+    def if_eligible(expr):
+        return {'$sum': {'$cond': [eligible, expr, 0]}}
+
+    group = {
+        '_id': {
+            'platform': '$hvfhs_license_num',
+            'hour_start': {'$dateFromParts': {
+                'year': {'$year': '$pickup_datetime'}, 'month': {'$month': '$pickup_datetime'},
+                'day': {'$dayOfMonth': '$pickup_datetime'}, 'hour': {'$hour': '$pickup_datetime'}}},
+            'PULocationID': '$PULocationID',
+            'source_file': {'$ifNull': ['$source_file', None]},
+        },
+        'trips': {'$sum': 1},
+    }
+    for f in SUM_FIELDS:
+        group[f'sum_{f}'] = {'$sum': _ifnull(f)}
+    for flag, name in FLAG_COUNTS.items():
+        group[name] = {'$sum': {'$cond': [{'$eq': [f'${flag}', 'Y']}, 1, 0]}}
+    group['drv_trips'] = if_eligible(1)
+    group['drv_sum_driver_pay'] = if_eligible(_ifnull('driver_pay'))
+    group['drv_sum_total_cost'] = if_eligible(total_cost)
+    group['drv_sum_tips'] = if_eligible(_ifnull('tips'))
+    group['drv_sum_pay_per_mile'] = if_eligible(
+        {'$cond': [{'$gt': [_ifnull('trip_miles'), 0]}, {'$divide': [_ifnull('driver_pay'), _ifnull('trip_miles')]}, 0]})
+    group['drv_sum_pay_per_minute'] = if_eligible(
+        {'$cond': [{'$gt': [minutes, 0]}, {'$divide': [_ifnull('driver_pay'), minutes]}, 0]})
+    trips = weighted_sums('trips')
+    revenue = weighted_sums('revenue', {'$add': [_ifnull(f) for f in REVENUE_FIELDS]})
+    group.update({'est_trips': trips['trips_est'], 'var_trips': trips['trips_var'],
+                  'est_revenue': revenue['revenue_est'], 'var_revenue': revenue['revenue_var']})
+    return {'$group': group}
+
+
+def rebuild_rollup(collection, rollup, source_file=None):
+    """
+    Recalcula el rollup desde los viajes con una agregación y $merge.
+
+    Args:
+        collection: Colección de viajes
+        rollup: Colección del rollup
+        source_file (str, optional): Solo los viajes de ese fichero (None = todo)
+    """
+    match = {'pickup_datetime': {'$type': 'date'}}
+    if source_file is not None:
+        match['source_file'] = source_file
+        rollup.delete_many({'source_file': source_file})
+    else:
+        rollup.delete_many({})
+
+    dims = {k: f'$_id.{k}' for k in KEY_FIELDS}
+    hour_start = '$_id.hour_start'
+    pipeline = [
+        {'$match': match},
+        _rollup_group_stage(),
+        {'$addFields': {
+            **dims,
+            'date': {'$dateFromParts': {'year': {'$year': hour_start}, 'month': {'$month': hour_start},
+                                        'day': {'$dayOfMonth': hour_start}}},
+            'hour': {'$hour': hour_start},
+            'day_of_week': {'$dayOfWeek': hour_start},
+            'month': {'$month': hour_start},
+            'year': {'$year': hour_start},
+        }},
+        {'$merge': {'into': rollup.name, 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+    collection.aggregate(pipeline, allowDiskUse=True)
+    ensure_rollup_indexes(rollup)
+    logger.info(f"🧊 Rollup recalculado ({source_file or 'todos los ficheros'}): "
+                f"{rollup.count_documents({}):,} documentos")
+
+
+def remove_rollup_source(rollup, source_file):
+    """Borra la parte del rollup que procede de un fichero."""
+    return rollup.delete_many({'source_file': source_file}).deleted_count
+
+
+# ==================== CONSULTAS ====================
+
+def _check_hour_aligned(value, name):
+    if value is not None and (value.minute or value.second or value.microsecond):
+        raise ValueError(f"{name} debe caer en una hora exacta (grano del rollup): {value}")
+
+
+def rollup_match(start=None, end=None, platforms=None):
+    """$match del rollup equivalente a match_base del notebook."""
+    _check_hour_aligned(start, 'start')
+    _check_hour_aligned(end, 'end')
+    match = {}
+    if start is not None or end is not None:
+        match['hour_start'] = {}
+        if start is not None:
+            match['hour_start']['$gte'] = start
+        if end is not None:
+            match['hour_start']['$lt'] = end
+    if platforms:
+        match['platform'] = {'$in': list(platforms)}
+    return match
+
+
+def _revenue_sum():
+    return {'$add': [f'$sum_{f}' for f in REVENUE_FIELDS]}
+
+
+def _safe_div(numerator, denominator):
+    return {'$cond': [{'$gt': [denominator, 0]}, {'$divide': [numerator, denominator]}, None]}
+
+
+def _round(expr, places=2):
+    return {'$round': [expr, places]}
+
+
+def _weighted_totals():
+    """Sumas de las estimaciones ponderadas (los documentos anteriores a ellas usan el peso fijo)."""
+    revenue = _revenue_sum()
+    return {
+        'trips_est': {'$sum': {'$ifNull': ['$est_trips', {'$multiply': ['$trips', DEFAULT_WEIGHT]}]}},
+        'trips_var': {'$sum': {'$ifNull': ['$var_trips', {'$multiply': ['$trips', DEFAULT_WEIGHT * (DEFAULT_WEIGHT - 1)]}]}},
+        'revenue_est': {'$sum': {'$ifNull': ['$est_revenue', {'$multiply': [revenue, DEFAULT_WEIGHT]}]}},
+        'revenue_var': {'$sum': {'$ifNull': ['$var_revenue', 0]}},
+    }
+
+
+def _weighted_fields():
+    """Proyección de las estimaciones de _weighted_totals() (redondeadas) y sus varianzas."""
+    return {'trips_est': _round('$trips_est'), 'trips_var': 1, 'revenue_est': _round('$revenue_est'), 'revenue_var': 1}
+
+
+def _time_summary(rollup, key_field, start, end, platforms):
+    """Viajes, revenue y tarifa media agrupados por un campo de tiempo del rollup."""
+    pipeline = [
+        {'$match': rollup_match(start, end, platforms)},
+        {'$group': {
+            '_id': f'${key_field}',
+            'trips': {'$sum': '$trips'},
+            'total_revenue': {'$sum': _revenue_sum()},
+            'sum_fare': {'$sum': '$sum_base_passenger_fare'},
+            **_weighted_totals(),
+        }},
+        {'$project': {
+            '_id': 0,
+            key_field: '$_id',
+            'trips': 1,
+            'total_revenue': _round('$total_revenue'),
+            'avg_fare': _round(_safe_div('$sum_fare', '$trips')),
+            **_weighted_fields(),
+        }},
+        {'$sort': {key_field: 1}},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def hourly_summary(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_hourly: hour, trips, total_revenue, avg_fare."""
+    return _time_summary(rollup, 'hour', start, end, platforms)
+
+
+def daily_summary(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_daily (day_of_week con 1 = domingo)."""
+    return _time_summary(rollup, 'day_of_week', start, end, platforms)
+
+
+def monthly_summary(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_monthly."""
+    return _time_summary(rollup, 'month', start, end, platforms)
+
+
+def day_hour_summary(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_day_hour (mapa de calor día × hora)."""
+    pipeline = [
+        {'$match': rollup_match(start, end, platforms)},
+        {'$group': {
+            '_id': {'day': '$day_of_week', 'hour': '$hour'},
+            'trips': {'$sum': '$trips'},
+            'total_revenue': {'$sum': _revenue_sum()},
+            **_weighted_totals(),
+        }},
+        {'$project': {
+            '_id': 0,
+            'day_of_week': '$_id.day',
+            'hour': '$_id.hour',
+            'trips': 1,
+            'total_revenue': _round('$total_revenue'),
+            **_weighted_fields(),
+        }},
+        {'$sort': {'day_of_week': 1, 'hour': 1}},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def revenue_components(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_revenue."""
+    names = {'base_fare': 'base_passenger_fare', 'tolls': 'tolls', 'tips': 'tips',
+             'congestion': 'congestion_surcharge', 'airport_fee': 'airport_fee',
+             'bcf': 'bcf', 'sales_tax': 'sales_tax'}
+    pipeline = [
+        {'$match': rollup_match(start, end, platforms)},
+        {'$group': {
+            '_id': None,
+            **{out: {'$sum': f'$sum_{field}'} for out, field in names.items()},
+            'trip_count': {'$sum': '$trips'},
+        }},
+        {'$project': {'_id': 0, **{out: _round(f'${out}') for out in names}, 'trip_count': 1}},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def driver_economics(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_driver (viajes con driver_pay > 0 y coste total > 0)."""
+    pipeline = [
+        {'$match': rollup_match(start, end, platforms)},
+        {'$group': {'_id': None, **{m: {'$sum': f'${m}'} for m in DRIVER_MEASURES}}},
+        {'$match': {'drv_trips': {'$gt': 0}}},
+        {'$project': {
+            '_id': 0,
+            'avg_driver_pay': _round({'$divide': ['$drv_sum_driver_pay', '$drv_trips']}),
+            'avg_total_cost': _round({'$divide': ['$drv_sum_total_cost', '$drv_trips']}),
+            'avg_platform_cut': _round({'$divide': [
+                {'$subtract': ['$drv_sum_total_cost', '$drv_sum_driver_pay']}, '$drv_trips']}),
+            'total_driver_earnings': _round('$drv_sum_driver_pay'),
+            'total_platform_revenue': _round({'$subtract': ['$drv_sum_total_cost', '$drv_sum_driver_pay']}),
+            'avg_tips': _round({'$divide': ['$drv_sum_tips', '$drv_trips']}),
+            'avg_pay_per_mile': _round({'$divide': ['$drv_sum_pay_per_mile', '$drv_trips']}),
+            'avg_pay_per_minute': _round({'$divide': ['$drv_sum_pay_per_minute', '$drv_trips']}),
+            'trip_count': '$drv_trips',
+        }},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def platform_comparison(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_platform."""
+    pipeline = [
+        {'$match': rollup_match(start, end, platforms)},
+        {'$group': {
+            '_id': '$platform',
+            'trip_count': {'$sum': '$trips'},
+            'total_revenue': {'$sum': _revenue_sum()},
+            'sum_fare': {'$sum': '$sum_base_passenger_fare'},
+            'sum_tips': {'$sum': '$sum_tips'},
+            'total_miles': {'$sum': '$sum_trip_miles'},
+            'sum_trip_time': {'$sum': '$sum_trip_time'},
+            'shared_requests': {'$sum': '$shared_requests'},
+            'wav_requests': {'$sum': '$wav_requests'},
+        }},
+        {'$project': {
+            '_id': 0,
+            'platform': '$_id',
+            'trip_count': 1,
+            'total_revenue': _round('$total_revenue'),
+            'avg_fare': _round({'$divide': ['$sum_fare', '$trip_count']}),
+            'avg_tip': _round({'$divide': ['$sum_tips', '$trip_count']}),
+            'total_miles': _round('$total_miles'),
+            'avg_miles': _round({'$divide': ['$total_miles', '$trip_count']}),
+            'avg_duration_min': _round({'$divide': ['$sum_trip_time', {'$multiply': ['$trip_count', 60]}]}),
+            'shared_adoption_pct': _round({'$multiply': [{'$divide': ['$shared_requests', '$trip_count']}, 100]}),
+            'wav_adoption_pct': _round({'$multiply': [{'$divide': ['$wav_requests', '$trip_count']}, 100]}),
+        }},
+        {'$sort': {'trip_count': -1}},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def fleet_evolution(rollup, start=None, end=None, platforms=None):
+    """Equivalente a pipeline_fleet_evolution: viajes por plataforma y mes."""
+    totals = _weighted_totals()
+    pipeline = [
+        {'$match': rollup_match(start, end, platforms)},
+        {'$group': {
+            '_id': {'platform': '$platform', 'month': '$month', 'year': '$year'},
+            'trip_count': {'$sum': '$trips'},
+            'trip_count_est': totals['trips_est'],
+            'trip_count_var': totals['trips_var'],
+        }},
+        {'$project': {
+            '_id': 0,
+            'platform': '$_id.platform',
+            'month': '$_id.month',
+            'year': '$_id.year',
+            'trip_count': 1,
+            'trip_count_est': _round('$trip_count_est'),
+            'trip_count_var': 1,
+        }},
+        {'$sort': {'month': 1}},
+    ]
+    return list(rollup.aggregate(pipeline))
+
+
+def scan_comparison(collection, rollup, start=None, end=None, platforms=None):
+    """
+    Documentos que recorre una consulta sobre los viajes frente al rollup.
+
+    Returns:
+        dict: {'raw_docs', 'rollup_docs', 'reduction'}
+    """
+    raw_match = {}
+    if start is not None or end is not None:
+        raw_match['pickup_datetime'] = rollup_match(start, end)['hour_start']
+    if platforms:
+        raw_match['hvfhs_license_num'] = {'$in': list(platforms)}
+    raw_docs = collection.count_documents(raw_match)
+    rollup_docs = rollup.count_documents(rollup_match(start, end, platforms))
+    return {'raw_docs': raw_docs, 'rollup_docs': rollup_docs,
+            'reduction': raw_docs / rollup_docs if rollup_docs else None}
+
+
+if __name__ == "__main__":
+    # Recalcula el rollup completo desde la colección de viajes
+    from pymongo import MongoClient
+
+    from cargar_datos_completo import COLLECTION_NAME, DATABASE_NAME, MONGO_URI
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    db = MongoClient(MONGO_URI)[DATABASE_NAME]
+    rebuild_rollup(db[COLLECTION_NAME], db[ROLLUP_COLLECTION])
+    stats = scan_comparison(db[COLLECTION_NAME], db[ROLLUP_COLLECTION])
+    print(f"✅ Rollup: {stats['rollup_docs']:,} documentos frente a {stats['raw_docs']:,} viajes")
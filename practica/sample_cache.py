@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Caché local de la muestra limpia en ficheros Arrow IPC memory-mapped.
+
+Cada ejecución de la carga completa o del análisis local vuelve a decodificar
+el Parquet, muestrear y pasar clean_hvfhv_data aunque ni los ficheros ni los
+parámetros hayan cambiado. Aquí la muestra limpia de cada fichero se guarda
+una vez en
+
+    outputs/sample_cache/<fichero>.<clave>.arrow   Arrow IPC sin comprimir
+    outputs/sample_cache/<fichero>.<clave>.json    metadatos (checksum, parámetros, filas, tamaño, uso)
+
+con clave = SHA-256 de (checksum del Parquet, parámetros de muestreo de
+sample_settings(), CLEANING_VERSION, modo de limpieza normal/ligero y, si
+no es la de hvfhv_cleaning.py, la función de limpieza). En
+las siguientes ejecuciones el .arrow se abre con memory-map: la tabla Arrow
+apunta a las páginas del fichero sin copiarlas (get_table) y to_pandas solo
+copia las columnas que pandas no puede compartir (strings, fechas como
+objetos). El DataFrame es el mismo que devolvería clean_hvfhv_data (mismos
+tipos, categorías e índice), así que los documentos que se insertan también.
+
+El checksum de un fichero cuyo tamaño y mtime no han cambiado se reutiliza
+de los metadatos (igual que el manifiesto de ingest_manifest.py).
+
+Todas las cargas leen la muestra con load_clean_sample(): la secuencial, la
+paralela y la asíncrona, la incremental, la celda de carga del notebook y el
+análisis local (local_metrics.py, render_report.py --local). La entrada
+guarda también source_row (índice global de la fila en el Parquet), así que
+una tarea de unos row groups o un bloque de la carga incremental se sacan de
+la entrada del fichero entero; sin row_index la columna no se devuelve.
+
+Límite de tamaño: al guardar, si la caché pasa de max_mb se borran las
+entradas usadas hace más tiempo. Invalidación explícita: invalidate() por
+fichero o entera, y cualquier cambio de contenido, parámetros o de
+CLEANING_VERSION cambia la clave. Al guardar se borran las entradas del
+fichero con otro contenido; las de otros parámetros o de otra limpieza (la
+carga estratificada, el notebook) se mantienen hasta que las echa el límite.
+
+En la carga incremental los ficheros sin cambios ya se saltan con el
+manifiesto; la caché evita volver a leer un fichero recargado con los mismos
+parámetros (otra colección, --full-reload anterior). Comparación en frío/en
+caliente: bench_sample_cache.py.
+
+Uso:
+    python sample_cache.py --list
+    python sample_cache.py --invalidate fhvhv_tripdata_2025-03.parquet
+    python sample_cache.py --clear
+    python sample_cache.py --max-mb 2048                 # aplica el límite ahora
+"""
+
+import argparse
+import datetime as dt
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from hvfhv_cleaning import CLEANING_VERSION, clean_hvfhv_data
+from ingest_manifest import SOURCE_ROW_FIELD, file_fingerprint, read_sample
+from ingest_metrics import measure
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / 'outputs' / 'sample_cache'
+MAX_CACHE_MB = 4096
+
+
+class SampleCache:
+    """
+    Muestras limpias por (fichero, parámetros) en un directorio.
+
+    Args:
+        root (str | Path): Directorio de la caché
+        max_mb (float, optional): Tamaño máximo de los .arrow (None = sin límite)
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_mb=MAX_CACHE_MB):
+        self.root = Path(root)
+        self.max_mb = max_mb
+
+    # ---------- Claves y metadatos ----------
+
+    @staticmethod
+    def cacheable(settings):
+        """Una muestra aleatoria sin semilla no se repite: no se guarda."""
+        return not (settings.get('method') == 'random' and settings.get('seed') is None)
+
+    @staticmethod
+    def key(checksum, settings, clean_options=None, cleaner=None):
+        lean = bool((clean_options or {}).get('lean') or (clean_options or {}).get('memory_budget_mb'))
+        payload = {'checksum': checksum, 'settings': settings, 'cleaning_version': CLEANING_VERSION,
+                   'lean': lean, 'row_index': SOURCE_ROW_FIELD}
+        if cleaner is not None:
+            payload['cleaner'] = cleaner
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _paths(self, source_file, key):
+        base = self.root / f"{Path(source_file).name}.{key}"
+        return base.with_name(base.name + '.arrow'), base.with_name(base.name + '.json')
+
+    def _read_meta(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, path, meta):
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            # Las estadísticas del muestreo estratificado llevan arrays de NumPy
+            json.dump(meta, f, ensure_ascii=False, indent=1, default=lambda value: value.tolist())
+        os.replace(tmp, path)
+
+    def entries(self, source_file=None):
+        """Metadatos de las entradas (de un fichero o todas), de la más antigua a la más reciente en uso."""
+        if not self.root.exists():
+            return []
+        metas = [self._read_meta(p) for p in self.root.glob('*.json')]
+        metas = [m for m in metas if m and (source_file is None or m['source_file'] == Path(source_file).name)]
+        return sorted(metas, key=lambda m: m.get('last_used', ''))
+
+    def fingerprint(self, path):
+        """Tamaño, mtime y checksum (reutilizado de la caché si el fichero no ha cambiado)."""
+        previous = next((m['fingerprint'] for m in reversed(self.entries(path))), None)
+        return file_fingerprint(path, previous)
+
+    def total_mb(self):
+        return sum(m['bytes'] for m in self.entries()) / (1024 * 1024)
+
+    # ---------- Lectura y escritura ----------
+
+    def get_table(self, path, settings, clean_options=None, fingerprint=None, cleaner=None):
+        """
+        Tabla Arrow memory-mapped de la muestra limpia (None si no está en la caché).
+
+        La tabla incluye la columna source_row.
+
+        Returns:
+            tuple: (pa.Table, metadatos) o (None, None)
+        """
+        if not self.cacheable(settings):
+            return None, None
+        fingerprint = fingerprint or self.fingerprint(path)
+        key = self.key(fingerprint['checksum'], settings, clean_options, cleaner)
+        arrow_path, meta_path = self._paths(path, key)
+        meta = self._read_meta(meta_path)
+        if meta is None or not arrow_path.exists():
+            return None, None
+        table = pa.ipc.open_file(pa.memory_map(str(arrow_path), 'r')).read_all()
+        # El tamaño y el mtime del Parquet pueden cambiar sin cambiar el contenido (copia, touch)
+        meta.update(fingerprint=fingerprint, last_used=dt.datetime.now().isoformat(timespec='milliseconds'))
+        self._write_meta(meta_path, meta)
+        return table, meta
+
+    def get(self, path, settings, clean_options=None, fingerprint=None, cleaner=None):
+        """
+        DataFrame limpio desde la caché (sin la columna source_row).
+
+        Returns:
+            tuple: (pd.DataFrame, metadatos) o (None, None)
+        """
+        table, meta = self.get_table(path, settings, clean_options, fingerprint, cleaner)
+        if table is None:
+            return None, None
+        return table.drop_columns([SOURCE_ROW_FIELD]).to_pandas(), meta
+
+    def put(self, path, settings, df, clean_options=None, stats=None, fingerprint=None, cleaner=None):
+        """
+        Guarda la muestra limpia de un fichero (borra las entradas del fichero con otro contenido).
+
+        Args:
+            path (str | Path): Fichero Parquet de origen
+            settings (dict): Parámetros de muestreo (ingest_manifest.sample_settings)
+            df (pd.DataFrame): Salida de clean_hvfhv_data con la columna source_row
+            clean_options (dict, optional): Opciones con las que se limpió
+            stats (dict, optional): Estadísticas de la lectura (se devuelven con la entrada)
+            cleaner (str, optional): Función de limpieza si no es la de hvfhv_cleaning.py (cleaner_id)
+
+        Returns:
+            Path: Fichero .arrow, o None si la muestra no se puede guardar
+        """
+        if not self.cacheable(settings):
+            return None
+        fingerprint = fingerprint or self.fingerprint(path)
+        key = self.key(fingerprint['checksum'], settings, clean_options, cleaner)
+        for meta in self.entries(path):
+            if meta['key'] == key or meta['fingerprint']['checksum'] != fingerprint['checksum']:
+                self._remove(meta)
+        self.root.mkdir(parents=True, exist_ok=True)
+        arrow_path, meta_path = self._paths(path, key)
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        tmp = arrow_path.with_name(arrow_path.name + '.tmp')
+        with pa.OSFile(str(tmp), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, arrow_path)
+        now = dt.datetime.now().isoformat(timespec='milliseconds')
+        self._write_meta(meta_path, {
+            'source_file': Path(path).name, 'key': key, 'fingerprint': fingerprint, 'settings': settings,
+            'cleaning_version': CLEANING_VERSION, 'clean_options': clean_options or {}, 'rows': len(df),
+            'bytes': arrow_path.stat().st_size, 'stats': stats or {}, 'created_at': now, 'last_used': now,
+        })
+        self.enforce_limit(keep=arrow_path)
+        return arrow_path
+
+    # ---------- Invalidación y límite ----------
+
+    def _remove(self, meta):
+        arrow_path, meta_path = self._paths(meta['source_file'], meta['key'])
+        try:
+            arrow_path.unlink(missing_ok=True)
+        except OSError as e:
+            # Windows: un fichero con memory-map abierto no se puede borrar
+            print(f"⚠️  No se pudo borrar {arrow_path.name}: {e}")
+            return False
+        meta_path.unlink(missing_ok=True)
+        return True
+
+    def invalidate(self, source_file=None):
+        """
+        Borra las entradas de un fichero (None = toda la caché).
+
+        Returns:
+            int: Entradas borradas
+        """
+        return sum(self._remove(meta) for meta in self.entries(source_file))
+
+    def clear(self):
+        return self.invalidate()
+
+    def enforce_limit(self, keep=None):
+        """Borra las entradas menos usadas hasta quedar por debajo de max_mb. Devuelve las borradas."""
+        if self.max_mb is None:
+            return 0
+        entries = self.entries()
+        total = sum(m['bytes'] for m in entries)
+        removed = 0
+        for meta in entries:
+            if total <= self.max_mb * 1024 * 1024:
+                break
+            if keep is not None and self._paths(meta['source_file'], meta['key'])[0] == keep:
+                continue
+            if self._remove(meta):
+                total -= meta['bytes']
+                removed += 1
+        return removed
+
+
+def cleaner_id(clean_func):
+    """
+    Identidad de una función de limpieza en la clave (None = clean_hvfhv_data de hvfhv_cleaning.py).
+
+    Otra función (p. ej. la del notebook) da otra muestra limpia: la clave
+    lleva su nombre y un hash de su código.
+    """
+    if clean_func is clean_hvfhv_data:
+        return None
+    try:
+        code = inspect.getsource(clean_func).encode()
+    except (OSError, TypeError):
+        code = clean_func.__code__.co_code
+    return f"{clean_func.__module__}.{clean_func.__qualname__}:{hashlib.sha256(code).hexdigest()[:12]}"
+
+
+def row_group_of(path, source_rows):
+    """Row group de cada índice global de fila."""
+    metadata = pq.ParquetFile(path).metadata
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    offsets = np.cumsum([0] + sizes)
+    return np.searchsorted(offsets, source_rows, side='right') - 1, sizes
+
+
+def _take_row_groups(path, table, stats, row_groups):
+    """Filas de unos row groups de la entrada del fichero entero, con sus estadísticas."""
+    groups, sizes = row_group_of(path, table.column(SOURCE_ROW_FIELD).to_numpy())
+    table = table.filter(pa.array(np.isin(groups, list(row_groups))))
+    by_row_group = stats.get('sampled_rows_by_row_group') or [0] * len(sizes)
+    stats = dict(stats, total_rows=sum(sizes[i] for i in row_groups), row_groups_total=len(row_groups),
+                 sampled_rows=sum(by_row_group[i] for i in row_groups))
+    return table, stats
+
+
+def load_clean_sample(path, clean_func, settings, clean_options=None, cache=None, batch_size=100000,
+                      row_groups=None, row_index=False, metrics=None):
+    """
+    Muestra limpia de un fichero: desde la caché o leyendo, muestreando y limpiando (y guardándola).
+
+    Args:
+        path (str | Path): Fichero Parquet
+        clean_func (callable): Función de limpieza (clean_hvfhv_data)
+        settings (dict): Parámetros de muestreo (ingest_manifest.sample_settings)
+        clean_options (dict, optional): Opciones de clean_func
+        cache (SampleCache, optional): Caché (None = sin caché)
+        batch_size (int): Filas por record batch al leer el Parquet
+        row_groups (list, optional): Solo las filas de estos row groups. Se sacan
+            de la entrada del fichero entero; si no está, se leen solo esos row
+            groups y no se guarda nada
+        row_index (bool): Devuelve la columna source_row (índice global de la fila)
+        metrics (IngestMetrics, optional): Mide las etapas 'read' y 'clean'
+
+    Returns:
+        tuple: (pd.DataFrame limpio, estadísticas de la lectura, True si vino de la caché)
+    """
+    filename = Path(path).name
+    cleaner = cleaner_id(clean_func)
+    fingerprint = cache.fingerprint(path) if cache is not None and cache.cacheable(settings) else None
+    if fingerprint is not None:
+        with measure(metrics, 'read', file=filename) as rec:
+            table, meta = cache.get_table(path, settings, clean_options, fingerprint, cleaner)
+            if table is not None:
+                stats = meta['stats']
+                if row_groups is not None:
+                    table, stats = _take_row_groups(path, table, stats, row_groups)
+                df = (table if row_index else table.drop_columns([SOURCE_ROW_FIELD])).to_pandas()
+                rec.update(rows_in=stats['total_rows'], rows_out=len(df), bytes=meta['bytes'])
+        if table is not None:
+            return df, stats, True
+
+    store = fingerprint is not None and row_groups is None
+    with measure(metrics, 'read', file=filename) as rec:
+        df, stats = read_sample(path, settings, batch_size=batch_size, row_groups=row_groups,
+                                row_index_column=SOURCE_ROW_FIELD if row_index or store else None)
+        rec.update(rows_in=stats['total_rows'], rows_out=len(df), bytes=stats['bytes_read'])
+    if store:
+        groups, sizes = row_group_of(path, df[SOURCE_ROW_FIELD].to_numpy())
+        stats['sampled_rows_by_row_group'] = np.bincount(groups, minlength=len(sizes)).tolist()
+    with measure(metrics, 'clean', file=filename, rows_in=len(df)) as rec:
+        df = clean_func(df, **(clean_options or {}))
+        rec['rows_out'] = len(df)
+    if store:
+        cache.put(path, settings, df, clean_options, stats, fingerprint, cleaner)
+        if not row_index:
+            df = df.drop(columns=[SOURCE_ROW_FIELD])
+    return df, stats, False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Caché de muestras limpias (Arrow IPC)")
+    parser.add_argument('--dir', default=str(DEFAULT_CACHE_DIR))
+    parser.add_argument('--list', action='store_true', help="Lista las entradas")
+    parser.add_argument('--invalidate', nargs='+', metavar='FICHERO', help="Borra las entradas de estos ficheros")
+    parser.add_argument('--clear', action='store_true', help="Borra toda la caché")
+    parser.add_argument('--max-mb', type=float, default=None, help="Aplica este límite de tamaño ahora")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    cache = SampleCache(args.dir, max_mb=args.max_mb)
+    if args.clear:
+        print(f"🗑️  {cache.clear()} entradas borradas")
+    for source_file in args.invalidate or []:
+        print(f"🗑️  {source_file}: {cache.invalidate(source_file)} entradas borradas")
+    if args.max_mb is not None:
+        print(f"🧹 {cache.enforce_limit()} entradas borradas por el límite de {args.max_mb:,.0f} MB")
+    if args.list or not (args.clear or args.invalidate or args.max_mb is not None):
+        entries = cache.entries()
+        for meta in entries:
+            print(f"   {meta['source_file']:36s}{meta['rows']:>12,} filas{meta['bytes'] / 2 ** 20:>10,.1f} MB  "
+                  f"limpieza v{meta['cleaning_version']}{' ligera' if meta['clean_options'].get('lean') else ''}"
+                  f"  usado {meta['last_used']}")
+        print(f"📦 {len(entries)} entradas, {cache.total_mb():,.1f} MB en {cache.root}")
@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+Muestreo estratificado ponderado en streaming sobre los Parquet HVFHV.
+
+La carga sistemática 1 de 40 reparte la muestra igual entre todos los
+viajes, así que los estratos raros (peticiones WAV, viajes compartidos,
+aeropuertos) quedan con muy pocas filas y, para que sus cifras sean
+estables, hay que cargar mucho más de lo necesario. Aquí cada fila se
+asigna a un estrato
+
+    plataforma × mes × hora × grupo de zona × clase de viaje
+
+    plataforma   PLATFORM_LABELS (HV0002..HV0005, OTHER)
+    mes / hora   de pickup_datetime
+    zona         ZONE_GROUPS de PULocationID: airport (EWR, JFK, LGA), manhattan, outer
+    clase        TRIP_CLASSES: wav (wav_request_flag = Y), shared (shared_request_flag = Y), regular
+
+y SamplingPlan decide cuántas filas se quedan de cada uno:
+
+- Tasas (Poisson): cada fila entra con probabilidad 1 / tasa de su estrato.
+  Peso = tasa. Una pasada; cada row group tiene su propio generador
+  (semilla, row group), así que su muestra no depende de los demás y la
+  carga incremental se puede reanudar por row groups.
+- Reservoir: como mucho `reservoir_size` filas por estrato y fichero
+  (muestra aleatoria simple sin reemplazo). Peso = N_h / n_h. Dos pasadas:
+  la primera solo lee las columnas que definen el estrato.
+
+Cada fila muestreada lleva sample_weight (float64) y sample_stratum (int32).
+
+Estimación (Horvitz-Thompson): total Ŷ = Σ w·y con varianza estimada
+V̂ = Σ w(w - 1)·y² (exacta para el muestreo de Poisson, conservadora para
+el reservoir). hvfhv_pipelines.weighted_sums() da los acumuladores $group y
+confidence_interval() / add_intervals() los intervalos de confianza. Los
+documentos sin sample_weight (cargas 1 de N) cuentan con el peso fijo
+DEFAULT_WEIGHT, así que las colecciones antiguas siguen siendo válidas.
+
+Uso:
+    python stratified_sampler.py ./data/fhvhv_tripdata_2025-01.parquet
+    python stratified_sampler.py ./data/fhvhv_tripdata_2025-01.parquet --rate 80 --rule trip_class=wav:2
+    python stratified_sampler.py ./data/fhvhv_tripdata_2025-01.parquet --reservoir 50
+"""
+
+import argparse
+import math
+import os
+import time
+from statistics import NormalDist
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from hvfhv_pipelines import WEIGHT_FIELD
+from local_metrics import N_ZONES, PLATFORM_LABELS, PLATFORMS, _flag, _timestamps
+from parquet_sampler import _column_chunk_bytes, _skipped_pct
+
+STRATUM_FIELD = 'sample_stratum'
+
+ZONE_GROUPS = ['outer', 'manhattan', 'airport']
+AIRPORT_ZONES = [1, 132, 138]  # EWR, JFK, LaGuardia
+TRIP_CLASSES = ['regular', 'shared', 'wav']
+N_MONTHS = 12
+N_HOURS = 24
+
+# Dimensiones del estrato (orden del código: la última varía más rápido)
+DIMENSIONS = {
+    'platform': PLATFORM_LABELS,
+    'month': list(range(1, N_MONTHS + 1)),
+    'hour': list(range(N_HOURS)),
+    'zone_group': ZONE_GROUPS,
+    'trip_class': TRIP_CLASSES,
+}
+STRATA_SHAPE = tuple(len(values) for values in DIMENSIONS.values())
+N_STRATA = int(np.prod(STRATA_SHAPE))
+STRATUM_COLUMNS = ['hvfhs_license_num', 'pickup_datetime', 'PULocationID', 'shared_request_flag',
+                   'wav_request_flag']
+
+_ZONE_GROUP_OF = None
+_RESERVOIR_CACHE = {}
+
+
+def zone_group_lookup():
+    """Grupo de zona (índice en ZONE_GROUPS) de cada LocationID 0..N_ZONES-1."""
+    global _ZONE_GROUP_OF
+    if _ZONE_GROUP_OF is None:
+        from zone_geometry import load_zone_index
+
+        zones = load_zone_index()
+        lookup = np.zeros(N_ZONES, dtype=np.int64)
+        for location_id in range(N_ZONES):
+            if zones.borough(location_id) == 'Manhattan':
+                lookup[location_id] = ZONE_GROUPS.index('manhattan')
+        lookup[AIRPORT_ZONES] = ZONE_GROUPS.index('airport')
+        _ZONE_GROUP_OF = lookup
+    return _ZONE_GROUP_OF
+
+
+def stratum_codes(batch):
+    """
+    Código de estrato de cada fila de un record batch.
+
+    Las filas sin pickup_datetime van al mes 1 / hora 0 (la limpieza las descarta).
+
+    Returns:
+        np.ndarray: int64 en [0, N_STRATA)
+    """
+    platform = pc.fill_null(pc.index_in(batch.column('hvfhs_license_num'), value_set=pa.array(PLATFORMS)),
+                            len(PLATFORMS)).to_numpy(zero_copy_only=False).astype(np.int64)
+    pickup = _timestamps(batch, 'pickup_datetime')
+    valid = ~np.isnat(pickup)
+    pickup = np.where(valid, pickup, np.datetime64(0, 'us'))
+    month = np.where(valid, pickup.astype('datetime64[M]').astype(np.int64) % 12, 0)
+    days = pickup.astype('datetime64[D]')
+    hour = np.where(valid, (pickup - days) // np.timedelta64(1, 'h'), 0).astype(np.int64)
+
+    zone = pc.fill_null(batch.column('PULocationID').cast(pa.int64()), 0).to_numpy(zero_copy_only=False)
+    zone = np.where((zone >= 0) & (zone < N_ZONES), zone, 0)
+    zone_group = zone_group_lookup()[zone]
+
+    trip_class = np.zeros(batch.num_rows, dtype=np.int64)
+    if 'shared_request_flag' in batch.schema.names:
+        trip_class[_flag(batch, 'shared_request_flag')] = TRIP_CLASSES.index('shared')
+    if 'wav_request_flag' in batch.schema.names:
+        trip_class[_flag(batch, 'wav_request_flag')] = TRIP_CLASSES.index('wav')
+    return np.ravel_multi_index((platform, month, hour, zone_group, trip_class), STRATA_SHAPE)
+
+
+def describe_stratum(code):
+    """{dimensión: valor} de un código de estrato."""
+    index = np.unravel_index(int(code), STRATA_SHAPE)
+    return {dim: values[i] for (dim, values), i in zip(DIMENSIONS.items(), index)}
+
+
+# ==================== PLAN DE MUESTREO ====================
+
+class SamplingPlan:
+    """
+    Tasas (o tamaños de reservoir) por estrato.
+
+    Args:
+        default_rate (int): Tasa 1 de N de los estratos sin regla
+        rates (dict, optional): Reglas {dimensión: {valor: tasa}}; si un estrato
+            cumple varias se usa la menor tasa (la que más muestrea). Ej.:
+            {'trip_class': {'wav': 1, 'shared': 5}, 'zone_group': {'airport': 10}}
+        reservoir_size (int, optional): Si se indica, muestreo reservoir con
+            como mucho este número de filas por estrato y fichero
+        reservoir_sizes (dict, optional): Reglas {dimensión: {valor: tamaño}}
+            (se usa el mayor tamaño de las reglas que cumple el estrato)
+        seed (int): Semilla de los generadores aleatorios
+    """
+
+    def __init__(self, default_rate=40, rates=None, reservoir_size=None, reservoir_sizes=None, seed=0):
+        if default_rate < 1:
+            raise ValueError("default_rate debe ser >= 1")
+        self.default_rate = int(default_rate)
+        self.rates = rates or {}
+        self.reservoir_size = reservoir_size
+        self.reservoir_sizes = reservoir_sizes or {}
+        self.seed = int(seed)
+        self.rate_table = self._table(self.default_rate, self.rates, np.minimum)
+        if reservoir_size is not None:
+            self.size_table = self._table(int(reservoir_size), self.reservoir_sizes, np.maximum).astype(np.int64)
+        else:
+            self.size_table = None
+
+    @property
+    def method(self):
+        return 'reservoir' if self.reservoir_size is not None else 'rates'
+
+    @staticmethod
+    def _table(default, rules, combine):
+        """Valor por estrato: `default` combinado con cada regla que cumple."""
+        table = np.full(STRATA_SHAPE, np.nan)
+        for dim, values in rules.items():
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Dimensión desconocida {dim!r}: usa una de {list(DIMENSIONS)}")
+            axis = list(DIMENSIONS).index(dim)
+            for value, setting in values.items():
+                index = [slice(None)] * len(STRATA_SHAPE)
+                index[axis] = DIMENSIONS[dim].index(type(DIMENSIONS[dim][0])(value))
+                table[tuple(index)] = np.where(np.isnan(table[tuple(index)]), setting,
+                                               combine(table[tuple(index)], setting))
+        table = np.where(np.isnan(table), default, table)
+        if (table < 1).any():
+            raise ValueError("Las tasas y tamaños deben ser >= 1")
+        return table.reshape(-1)
+
+    def to_dict(self):
+        """Parámetros serializables (se guardan en el manifiesto de la carga)."""
+        return {'default_rate': self.default_rate,
+                'rates': {dim: {str(k): v for k, v in values.items()} for dim, values in self.rates.items()},
+                'reservoir_size': self.reservoir_size,
+                'reservoir_sizes': {dim: {str(k): v for k, v in values.items()}
+                                    for dim, values in self.reservoir_sizes.items()},
+                'seed': self.seed}
+
+    @classmethod
+    def from_dict(cls, params):
+        return cls(**params)
+
+    def __repr__(self):
+        if self.method == 'reservoir':
+            return f"SamplingPlan(reservoir_size={self.reservoir_size}, reservoir_sizes={self.reservoir_sizes})"
+        return f"SamplingPlan(default_rate={self.default_rate}, rates={self.rates})"
+
+
+# Un cuarto de la colección 1 de 40 en los viajes normales; WAV, compartidos y
+# aeropuertos se muestrean mucho más para que sus cifras tengan poco error
+RARE_STRATA_PLAN = SamplingPlan(default_rate=160, rates={
+    'trip_class': {'wav': 2, 'shared': 10},
+    'zone_group': {'airport': 20},
+})
+
+
+# ==================== LECTURA ====================
+
+def _with_weights(batch, rows, weights, strata, keep_columns, row_offset, row_index_column):
+    """Filas `rows` del batch con sample_weight/sample_stratum (y el índice global de la fila)."""
+    sampled = batch.take(pa.array(rows))
+    arrays = [sampled.column(name) for name in keep_columns]
+    names = list(keep_columns)
+    if row_index_column is not None:
+        arrays.append(pa.array(row_offset + rows, pa.int64()))
+        names.append(row_index_column)
+    arrays += [pa.array(weights, pa.float64()), pa.array(strata, pa.int32())]
+    names += [WEIGHT_FIELD, STRATUM_FIELD]
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def _reservoir_selection(path, plan, batch_size):
+    """
+    Filas elegidas de cada estrato (claves uniformes: se quedan las `size` menores).
+
+    Returns:
+        tuple: (filas globales ordenadas, peso de cada una, estrato de cada una, población por estrato)
+    """
+    st = os.stat(path)
+    cache_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, repr(plan.to_dict()))
+    if cache_key in _RESERVOIR_CACHE:
+        return _RESERVOIR_CACHE[cache_key]
+
+    parquet_file = pq.ParquetFile(path)
+    columns = [c for c in STRATUM_COLUMNS if c in parquet_file.schema_arrow.names]
+    population = np.zeros(N_STRATA, dtype=np.int64)
+    kept_strata = np.empty(0, dtype=np.int64)
+    kept_keys = np.empty(0)
+    kept_rows = np.empty(0, dtype=np.int64)
+    row = 0
+    for rg in range(parquet_file.metadata.num_row_groups):
+        rng = np.random.default_rng([plan.seed, rg])
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[rg], columns=columns):
+            strata = stratum_codes(batch)
+            population += np.bincount(strata, minlength=N_STRATA)
+            kept_strata = np.concatenate([kept_strata, strata])
+            kept_keys = np.concatenate([kept_keys, rng.random(batch.num_rows)])
+            kept_rows = np.concatenate([kept_rows, np.arange(row, row + batch.num_rows)])
+            row += batch.num_rows
+            # Las `size` claves menores de cada estrato (memoria acotada por los tamaños)
+            order = np.lexsort((kept_keys, kept_strata))
+            sorted_strata = kept_strata[order]
+            rank = np.arange(len(order)) - np.searchsorted(sorted_strata, sorted_strata)
+            order = order[rank < plan.size_table[sorted_strata]]
+            kept_strata, kept_keys, kept_rows = kept_strata[order], kept_keys[order], kept_rows[order]
+
+    order = np.argsort(kept_rows)
+    rows, strata = kept_rows[order], kept_strata[order]
+    sampled = np.bincount(strata, minlength=N_STRATA)
+    weights = population[strata] / sampled[strata]
+    _RESERVOIR_CACHE.clear()
+    _RESERVOIR_CACHE[cache_key] = (rows, weights, strata, population)
+    return _RESERVOIR_CACHE[cache_key]
+
+
+def iter_stratified_batches(path, plan, columns=None, batch_size=100000, stats=None, row_groups=None,
+                            row_index_column=None):
+    """
+    Itera record batches con las filas muestreadas y sus columnas sample_weight / sample_stratum.
+
+    Args:
+        path (str | Path): Fichero Parquet
+        plan (SamplingPlan): Tasas o tamaños por estrato
+        columns (list, optional): Columnas a devolver (None = todas); las del
+            estrato se leen siempre
+        batch_size (int): Filas por batch decodificado (acota la memoria)
+        stats (dict, optional): Se rellena con estadísticas de lectura y, en
+            'population' / 'sampled', las filas por estrato
+        row_groups (list, optional): Solo estos row groups (None = todos). La
+            muestra de cada row group es la misma que al leer el fichero entero.
+        row_index_column (str, optional): Columna con el índice global de cada fila
+
+    Yields:
+        pa.RecordBatch: Filas muestreadas de cada batch
+    """
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    names = parquet_file.schema_arrow.names
+    keep_columns = names if columns is None else list(columns)
+    read_columns = keep_columns + [c for c in STRATUM_COLUMNS if c in names and c not in keep_columns]
+    sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    wanted = set(range(metadata.num_row_groups)) if row_groups is None else set(row_groups)
+
+    if stats is None:
+        stats = {}
+    stats.update({
+        'total_rows': sum(sizes[i] for i in wanted),
+        'sampled_rows': 0,
+        'rows_decoded': 0,
+        'row_groups_total': len(wanted),
+        'row_groups_read': 0,
+        'columns_total': len(names),
+        'columns_read': len(read_columns),
+        'bytes_total': 0,
+        'bytes_read': 0,
+        'population': np.zeros(N_STRATA, dtype=np.int64),
+        'sampled': np.zeros(N_STRATA, dtype=np.int64),
+    })
+
+    selection = _reservoir_selection(path, plan, batch_size) if plan.method == 'reservoir' else None
+
+    for rg in sorted(wanted):
+        total_bytes, selected_bytes = _column_chunk_bytes(metadata, rg, set(read_columns))
+        stats['bytes_total'] += total_bytes
+        if selection is not None:
+            lo, hi = np.searchsorted(selection[0], [offsets[rg], offsets[rg + 1]])
+            if hi == lo:
+                continue
+            rg_rows, rg_weights, rg_strata = (a[lo:hi] for a in selection[:3])
+        else:
+            rng = np.random.default_rng([plan.seed, rg])
+
+        stats['row_groups_read'] += 1
+        stats['bytes_read'] += selected_bytes
+        batch_start = int(offsets[rg])
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=[rg], columns=read_columns):
+            stats['rows_decoded'] += batch.num_rows
+            if selection is not None:
+                lo, hi = np.searchsorted(rg_rows, [batch_start, batch_start + batch.num_rows])
+                rows = rg_rows[lo:hi] - batch_start
+                weights, strata = rg_weights[lo:hi], rg_strata[lo:hi]
+                stats['population'] += np.bincount(stratum_codes(batch), minlength=N_STRATA)
+            else:
+                all_strata = stratum_codes(batch)
+                stats['population'] += np.bincount(all_strata, minlength=N_STRATA)
+                rates = plan.rate_table[all_strata]
+                rows = np.flatnonzero(rng.random(batch.num_rows) * rates < 1)
+                weights, strata = rates[rows], all_strata[rows]
+            if len(rows):
+                stats['sampled'] += np.bincount(strata, minlength=N_STRATA)
+                stats['sampled_rows'] += len(rows)
+                yield _with_weights(batch, rows, weights, strata, keep_columns, batch_start, row_index_column)
+            batch_start += batch.num_rows
+
+    stats['decode_skipped_pct'] = _skipped_pct(stats)
+
+
+def read_stratified_parquet(path, plan, columns=None, batch_size=100000, row_groups=None, row_index_column=None):
+    """
+    Lee la muestra estratificada de un fichero como DataFrame (ver iter_stratified_batches).
+
+    Returns:
+        tuple: (pd.DataFrame con sample_weight / sample_stratum, dict de estadísticas)
+    """
+    stats = {}
+    batches = list(iter_stratified_batches(path, plan, columns, batch_size, stats, row_groups,
+                                           row_index_column))
+    if batches:
+        return pa.Table.from_batches(batches).to_pandas(), stats
+    schema = pq.ParquetFile(path).schema_arrow
+    fields = [schema.field(c) for c in (columns if columns is not None else schema.names)]
+    if row_index_column is not None:
+        fields.append(pa.field(row_index_column, pa.int64()))
+    fields += [pa.field(WEIGHT_FIELD, pa.float64()), pa.field(STRATUM_FIELD, pa.int32())]
+    return pa.schema(fields).empty_table().to_pandas(), stats
+
+
+# ==================== ESTIMACIÓN ====================
+
+def ht_estimate(weights, values=None):
+    """
+    Total de Horvitz-Thompson y su varianza estimada a partir de una muestra.
+
+    Args:
+        weights (array): Peso de cada fila muestreada
+        values (array, optional): Valor de cada fila (None = recuento)
+
+    Returns:
+        tuple: (estimación, varianza)
+    """
+    w = np.asarray(weights, dtype=np.float64)
+    y = np.ones_like(w) if values is None else np.asarray(values, dtype=np.float64)
+    return float(np.sum(w * y)), float(np.sum(w * (w - 1) * y * y))
+
+
+def confidence_interval(estimate, variance, level=0.95):
+    """(mínimo, máximo) del intervalo normal al nivel de confianza `level`."""
+    half = NormalDist().inv_cdf(0.5 + level / 2) * math.sqrt(max(variance, 0.0))
+    return estimate - half, estimate + half
+
+
+def add_intervals(df, names, level=0.95):
+    """
+    Añade <nombre>_ci (semiamplitud del intervalo) a un DataFrame con <nombre>_est y <nombre>_var.
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame
+    """
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    for name in names:
+        df[f'{name}_ci'] = z * np.sqrt(df[f'{name}_var'].clip(lower=0))
+    return df
+
+
+def relative_error(estimate, variance, level=0.95):
+    """Semiamplitud del intervalo en % de la estimación (None si la estimación es 0)."""
+    low, high = confidence_interval(estimate, variance, level)
+    return (high - low) / 2 / estimate * 100 if estimate else None
+
+
+def parse_rule(text):
+    """'trip_class=wav:2' → ('trip_class', 'wav', 2)."""
+    dim, rest = text.split('=', 1)
+    value, setting = rest.rsplit(':', 1)
+    return dim, value, int(setting)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Muestreo estratificado ponderado de un fichero Parquet")
+    parser.add_argument('path', help="Fichero Parquet")
+    parser.add_argument('--rate', type=int, default=None, help="Tasa por defecto 1 de N")
+    parser.add_argument('--rule', action='append', default=[],
+                        help="Regla dimensión=valor:tasa (o tamaño con --reservoir), repetible")
+    parser.add_argument('--reservoir', type=int, default=None, help="Filas por estrato (muestreo reservoir)")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def _report(label, estimate, variance, truth, n):
+    error = relative_error(estimate, variance)
+    error_txt = f"±{error:5.1f}%" if error is not None else "    -  "
+    print(f"   {label:<14} n={n:>8,} | real {truth:>12,.0f} | est. {estimate:>14,.0f} {error_txt}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rules = {}
+    for dim, value, setting in map(parse_rule, args.rule):
+        rules.setdefault(dim, {})[value] = setting
+    if args.reservoir is not None:
+        plan = SamplingPlan(reservoir_size=args.reservoir, reservoir_sizes=rules, seed=args.seed)
+    elif args.rate is not None or rules:
+        plan = SamplingPlan(args.rate or 40, rules, seed=args.seed)
+    else:
+        plan = RARE_STRATA_PLAN
+
+    t0 = time.perf_counter()
+    df, stats = read_stratified_parquet(args.path, plan, columns=STRATUM_COLUMNS)
+    elapsed = time.perf_counter() - t0
+    print(f"📖 {plan}")
+    print(f"   {stats['sampled_rows']:,}/{stats['total_rows']:,} filas "
+          f"({stats['sampled_rows'] / max(stats['total_rows'], 1) * 100:.2f}%) en {elapsed:.1f} s")
+
+    # Precisión frente a la muestra sistemática del mismo tamaño (peso constante)
+    weights = df[WEIGHT_FIELD].to_numpy()
+    strata = np.unravel_index(df[STRATUM_FIELD].to_numpy(), STRATA_SHAPE)
+    population = stats['population'].reshape(STRATA_SHAPE)
+    flat_w = stats['total_rows'] / max(stats['sampled_rows'], 1)
+    for dim_index, dim in [(3, 'zone_group'), (4, 'trip_class')]:
+        print(f"\n📊 {dim} (estratificado | sistemático con el mismo tamaño):")
+        truth = population.sum(axis=tuple(i for i in range(len(STRATA_SHAPE)) if i != dim_index))
+        for i, value in enumerate(DIMENSIONS[dim]):
+            in_group = strata[dim_index] == i
+            _report(value, *ht_estimate(weights[in_group]), truth[i], int(in_group.sum()))
+            expected_n = truth[i] / flat_w
+            _report('  sistemático', expected_n * flat_w, expected_n * flat_w * (flat_w - 1), truth[i],
+                    int(round(expected_n)))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Generador de datos HVFHV sintéticos (reproducibles con semilla).
+
+Produce DataFrames con el mismo esquema que los ficheros
+fhvhv_tripdata_2025-*.parquet del TLC para benchmarks sin descargar datos.
+
+Uso:
+    python synthetic_hvfhv.py ./data/synthetic 2 200000
+    (escribe 2 ficheros mensuales de 200.000 filas cada uno)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PLATFORMS = ['HV0003', 'HV0005']
+PLATFORM_WEIGHTS = [0.73, 0.27]
+BASES = ['B03404', 'B03406', 'B02764', 'B02510', 'B02872']
+FLAG_COLS = ['shared_request_flag', 'shared_match_flag', 'access_a_ride_flag',
+             'wav_request_flag', 'wav_match_flag']
+# Probabilidad de 'Y' para cada flag (aprox. a los datos reales)
+FLAG_RATES = {'shared_request_flag': 0.03, 'shared_match_flag': 0.01,
+              'access_a_ride_flag': 0.002, 'wav_request_flag': 0.003,
+              'wav_match_flag': 0.05}
+
+
+def make_synthetic_trips(n_rows, seed=42, year=2025, month=1, null_rate=0.01):
+    """
+    Genera viajes HVFHV sintéticos con el esquema crudo del Parquet TLC.
+
+    Args:
+        n_rows (int): Número de filas
+        seed (int): Semilla del generador
+        year (int): Año de los viajes
+        month (int): Mes de los viajes
+        null_rate (float): Fracción de nulos en columnas opcionales
+
+    Returns:
+        pd.DataFrame: Viajes con columnas y dtypes del Parquet original
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(year=year, month=month, day=1)
+    end = start + pd.offsets.MonthBegin(1)
+    span_s = int((end - start).total_seconds())
+
+    request = start + pd.to_timedelta(rng.integers(0, span_s, n_rows), unit='s')
+    wait = pd.to_timedelta(rng.integers(60, 900, n_rows), unit='s')
+    on_scene = request + wait
+    pickup = on_scene + pd.to_timedelta(rng.integers(0, 180, n_rows), unit='s')
+    trip_time = rng.gamma(2.0, 600.0, n_rows).astype('int64') + 60
+    dropoff = pickup + pd.to_timedelta(trip_time, unit='s')
+
+    trip_miles = np.round(rng.gamma(1.6, 3.0, n_rows), 3)
+    base_fare = np.round(2.5 + trip_miles * 2.2 + trip_time / 60 * 0.6, 2)
+    tolls = np.where(rng.random(n_rows) < 0.05, 6.94, 0.0)
+    tips = np.where(rng.random(n_rows) < 0.2, np.round(base_fare * 0.15, 2), 0.0)
+    airport_fee = np.where(rng.random(n_rows) < 0.06, 2.5, 0.0)
+
+    df = pd.DataFrame({
+        'hvfhs_license_num': rng.choice(PLATFORMS, n_rows, p=PLATFORM_WEIGHTS),
+        'dispatching_base_num': rng.choice(BASES, n_rows),
+        'originating_base_num': rng.choice(BASES, n_rows).astype(object),
+        'request_datetime': request,
+        'on_scene_datetime': on_scene,
+        'pickup_datetime': pickup,
+        'dropoff_datetime': dropoff,
+        'PULocationID': rng.integers(1, 266, n_rows).astype('int32'),
+        'DOLocationID': rng.integers(1, 266, n_rows).astype('int32'),
+        'trip_miles': trip_miles,
+        'trip_time': trip_time,
+        'base_passenger_fare': base_fare,
+        'tolls': tolls,
+        'bcf': np.round(base_fare * 0.025, 2),
+        'sales_tax': np.round(base_fare * 0.08875, 2),
+        'congestion_surcharge': np.where(rng.random(n_rows) < 0.4, 2.75, 0.0),
+        'airport_fee': airport_fee,
+        'tips': tips,
+        'driver_pay': np.round(base_fare * 0.75 + tips, 2),
+    })
+    for col in FLAG_COLS:
+        df[col] = np.where(rng.random(n_rows) < FLAG_RATES[col], 'Y', 'N').astype(object)
+    df['cbd_congestion_fee'] = np.where(rng.random(n_rows) < 0.3, 1.5, 0.0)
+
+    # Nulos como en el dataset real: on_scene, originating_base, airport_fee
+    if null_rate > 0:
+        df.loc[rng.random(n_rows) < null_rate, 'on_scene_datetime'] = pd.NaT
+        df.loc[rng.random(n_rows) < null_rate, 'originating_base_num'] = None
+        df.loc[rng.random(n_rows) < null_rate, 'airport_fee'] = np.nan
+    # Algunos viajes inválidos para que la limpieza tenga trabajo
+    bad = rng.random(n_rows) < 0.005
+    df.loc[bad, 'trip_miles'] = 0.0
+
+    return df
+
+
+def add_derived_columns(df):
+    """Añade las columnas que crea clean_hvfhv_data() (para benchmarks sin Mongo)."""
+    df = df.copy()
+    df['trip_duration_minutes'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
+    df['pickup_hour'] = df['pickup_datetime'].dt.hour
+    df['pickup_day_of_week'] = df['pickup_datetime'].dt.dayofweek
+    df['pickup_day_name'] = df['pickup_datetime'].dt.day_name()
+    df['pickup_month'] = df['pickup_datetime'].dt.month
+    df['pickup_date'] = df['pickup_datetime'].dt.date
+    return df
+
+
+def write_synthetic_month_files(output_dir, n_files=2, rows_per_file=200000, seed=42, year=2025,
+                                row_group_size=100000):
+    """
+    Escribe ficheros fhvhv_tripdata_YYYY-MM.parquet sintéticos.
+
+    Returns:
+        list: Rutas de los ficheros generados
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_files):
+        month = i + 1
+        df = make_synthetic_trips(rows_per_file, seed=seed + i, year=year, month=month)
+        path = output_dir / f"fhvhv_tripdata_{year}-{month:02d}.parquet"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=row_group_size)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else './data/synthetic'
+    n_files = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+    for p in write_synthetic_month_files(out_dir, n_files, rows):
+        print(f"✅ {p}")
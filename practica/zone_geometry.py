@@ -0,0 +1,561 @@
+# -*- coding: utf-8 -*-
+"""
+Geometría de las zonas de taxi de NYC (NY.geojson) en arrays NumPy.
+
+NY.geojson (263 features MultiPolygon, ~100.000 vértices) se parsea UNA vez
+y se guarda en outputs/zone_cache/ como ficheros .npy que se abren con
+memory-map (np.load(mmap_mode='r')); las siguientes cargas no leen el JSON
+y tardan milisegundos. La caché se regenera sola si cambia el GeoJSON
+(tamaño / fecha) o la tolerancia de simplificación.
+
+Contenido del índice (una fila por LocationID; los features repetidos de
+una misma zona se unen; 57, 104 y 105 son alias de 56 y 103, ver
+ZONE_ALIASES):
+
+    location_ids   LocationID de cada fila (ordenados)
+    centroids      [lat, lon] del centroide (de área); si cae fuera de la
+                   zona (zonas cóncavas) se usa un punto interior
+    bboxes         [min_lon, min_lat, max_lon, max_lat]
+    vertices       anillos simplificados (Douglas-Peucker) concatenados,
+                   en [lon, lat] como el GeoJSON (ring_offsets / ring_zone)
+    grid           rejilla uniforme con las zonas cuya bbox toca cada celda
+
+Consultas vectorizadas:
+    zones = load_zone_index()
+    zones.centroids_for([161, 237, 999])   # → [[lat, lon], [lat, lon], [nan, nan]]
+    zones.coord_map()                      # {LocationID: [lat, lon]} de todas las zonas
+    zones.locate(lats, lons)               # LocationID que contiene cada punto (-1 = ninguna)
+    zones.to_geojson()                     # polígonos simplificados para folium.GeoJson
+    zones.rings()                          # anillos [lon, lat] para matplotlib
+
+Uso:
+    python zone_geometry.py                 # construye / carga la caché y muestra tiempos
+    python zone_geometry.py --rebuild
+    python zone_geometry.py --locate 40.7580 -73.9855
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GEOJSON_PATH = Path(__file__).resolve().parent / 'NY.geojson'
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / 'outputs' / 'zone_cache'
+CACHE_VERSION = 1
+SIMPLIFY_TOLERANCE = 1e-4  # grados (~10 m)
+GRID_SIZE = 64  # celdas por lado de la rejilla de búsqueda
+NO_ZONE = -1
+LOCATE_CHUNK = 4_000_000  # puntos × aristas por bloque en locate()
+
+# LocationID de los viajes que NY.geojson dibuja dentro de otra zona
+# (Corona 56/57, Governor's Island/Ellis Island/Liberty Island 103/104/105)
+ZONE_ALIASES = {57: 56, 104: 103, 105: 103}
+
+ARRAY_NAMES = ['location_ids', 'centroids', 'bboxes', 'vertices', 'ring_offsets', 'ring_zone', 'ring_hole',
+               'grid_offsets', 'grid_zones']
+
+_INDEX_CACHE = {}
+
+
+# ==================== GEOMETRÍA ====================
+
+def simplify_ring(ring, tolerance):
+    """
+    Douglas-Peucker sobre un anillo cerrado (array k × 2). Conserva primer y último vértice.
+
+    Returns:
+        np.ndarray: Anillo simplificado (al menos 4 vértices si el original los tiene)
+    """
+    n = len(ring)
+    if n <= 4 or tolerance <= 0:
+        return ring
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    # El anillo es cerrado: se parte por el vértice más alejado del primero
+    far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    keep[far] = True
+    stack = [(0, far), (far, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, b = ring[i], ring[j]
+        seg = b - a
+        pts = ring[i + 1:j] - a
+        norm = np.hypot(*seg)
+        if norm == 0:
+            dist = np.hypot(*pts.T)
+        else:
+            dist = np.abs(seg[0] * pts[:, 1] - seg[1] * pts[:, 0]) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.extend([(i, k), (k, j)])
+    simplified = ring[keep]
+    return simplified if len(simplified) >= 4 else ring
+
+
+def _ring_area_centroid(ring):
+    """Área con signo y centroide (lon, lat) de un anillo (fórmula del polígono)."""
+    x, y = ring[:, 0], ring[:, 1]
+    cross = x[:-1] * y[1:] - x[1:] * y[:-1]
+    area = cross.sum() / 2
+    if area == 0:
+        return 0.0, ring.mean(axis=0)
+    cx = ((x[:-1] + x[1:]) * cross).sum() / (6 * area)
+    cy = ((y[:-1] + y[1:]) * cross).sum() / (6 * area)
+    return area, np.array([cx, cy])
+
+
+def _ring_edges(vertices, ring_offsets):
+    """Aristas (x0, y0, x1, y1) de todos los anillos y anillo al que pertenece cada una."""
+    starts, ends = ring_offsets[:-1], ring_offsets[1:]
+    # Una arista por vértice salvo el último de cada anillo
+    is_edge = np.ones(len(vertices), dtype=bool)
+    is_edge[ends - 1] = False
+    idx = np.flatnonzero(is_edge)
+    edges = np.hstack([vertices[idx], vertices[idx + 1]])
+    ring_of_edge = np.searchsorted(starts, idx, side='right') - 1
+    return edges, ring_of_edge
+
+
+def _crossings_inside(edges, lon, lat):
+    """Regla par-impar: True si cada punto queda dentro del conjunto de anillos `edges`."""
+    x0, y0, x1, y1 = (edges[:, k][None, :] for k in range(4))
+    px, py = lon[:, None], lat[:, None]
+    straddle = (y0 > py) != (y1 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    return ((straddle & (px < x_cross)).sum(axis=1) % 2) == 1
+
+
+def _interior_point(edges, lat):
+    """Punto interior a la latitud `lat`: centro del tramo más ancho dentro del polígono."""
+    x0, y0, x1, y1 = edges.T
+    straddle = (y0 > lat) != (y1 > lat)
+    xs = np.sort(x0[straddle] + (lat - y0[straddle]) * (x1[straddle] - x0[straddle]) /
+                 (y1[straddle] - y0[straddle]))
+    if len(xs) < 2:
+        return None
+    starts, stops = xs[0::2], xs[1::2]
+    k = int(np.argmax(stops - starts[:len(stops)]))
+    return np.array([(starts[k] + stops[k]) / 2, lat])
+
+
+# ==================== CONSTRUCCIÓN ====================
+
+def _features_by_zone(geojson_path):
+    """Lee el GeoJSON y agrupa los polígonos por LocationID."""
+    with open(geojson_path, encoding='utf-8') as f:
+        data = json.load(f)
+    zones = {}
+    for feature in data['features']:
+        props = feature['properties']
+        location_id = int(props['location_id'])
+        geometry = feature['geometry']
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        zone = zones.setdefault(location_id, {'zone': props.get('zone'), 'borough': props.get('borough'),
+                                              'polygons': []})
+        zone['polygons'].extend(polygons)
+    return zones
+
+
+def _build_grid(bboxes, bounds, grid_size):
+    """Rejilla uniforme: para cada celda, filas de zona cuya bbox la toca (formato CSR)."""
+    min_lon, min_lat, max_lon, max_lat = bounds
+    cell_w = (max_lon - min_lon) / grid_size
+    cell_h = (max_lat - min_lat) / grid_size
+    ix0 = np.clip(((bboxes[:, 0] - min_lon) / cell_w).astype(int), 0, grid_size - 1)
+    ix1 = np.clip(((bboxes[:, 2] - min_lon) / cell_w).astype(int), 0, grid_size - 1)
+    iy0 = np.clip(((bboxes[:, 1] - min_lat) / cell_h).astype(int), 0, grid_size - 1)
+    iy1 = np.clip(((bboxes[:, 3] - min_lat) / cell_h).astype(int), 0, grid_size - 1)
+    cells, zones = [], []
+    for row in range(len(bboxes)):
+        xs, ys = np.meshgrid(np.arange(ix0[row], ix1[row] + 1), np.arange(iy0[row], iy1[row] + 1))
+        cells.append((ys * grid_size + xs).ravel())
+        zones.append(np.full(xs.size, row))
+    cells, zones = np.concatenate(cells), np.concatenate(zones)
+    order = np.lexsort((zones, cells))
+    counts = np.bincount(cells, minlength=grid_size * grid_size)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return offsets.astype(np.int64), zones[order].astype(np.int32)
+
+
+def build_zone_arrays(geojson_path=GEOJSON_PATH, tolerance=SIMPLIFY_TOLERANCE, grid_size=GRID_SIZE):
+    """
+    Parsea el GeoJSON y construye los arrays del índice.
+
+    Returns:
+        tuple: (dict de arrays, dict de metadatos con nombres, distritos y límites)
+    """
+    zones = _features_by_zone(geojson_path)
+    location_ids = np.array(sorted(zones), dtype=np.int32)
+
+    rings, ring_zone, ring_hole = [], [], []
+    centroids = np.empty((len(location_ids), 2))
+    bboxes = np.empty((len(location_ids), 4))
+    for row, location_id in enumerate(location_ids):
+        area_sum, weighted = 0.0, np.zeros(2)
+        zone_rings = []
+        for polygon in zones[location_id]['polygons']:
+            for k, coords in enumerate(polygon):
+                ring = np.asarray(coords, dtype=np.float64)[:, :2]
+                area, center = _ring_area_centroid(ring)
+                # Exterior suma, agujeros restan (independiente de la orientación del anillo)
+                signed = abs(area) if k == 0 else -abs(area)
+                area_sum += signed
+                weighted += signed * center
+                zone_rings.append(ring)
+                simplified = simplify_ring(ring, tolerance)
+                rings.append(simplified)
+                ring_zone.append(row)
+                ring_hole.append(k > 0)
+        all_points = np.vstack(zone_rings)
+        bboxes[row] = [*all_points.min(axis=0), *all_points.max(axis=0)]
+        center = weighted / area_sum if area_sum else all_points.mean(axis=0)
+        centroids[row] = center[::-1]
+
+    vertices = np.vstack(rings)
+    ring_offsets = np.concatenate([[0], np.cumsum([len(r) for r in rings])]).astype(np.int64)
+    ring_zone = np.array(ring_zone, dtype=np.int32)
+    ring_hole = np.array(ring_hole, dtype=bool)
+
+    # Centroides fuera de su zona (formas en C, islas): punto interior a la misma latitud
+    edges, ring_of_edge = _ring_edges(vertices, ring_offsets)
+    edge_zone = ring_zone[ring_of_edge]
+    for row in range(len(location_ids)):
+        zone_edges = edges[edge_zone == row]
+        lat, lon = centroids[row]
+        if not _crossings_inside(zone_edges, np.array([lon]), np.array([lat]))[0]:
+            point = _interior_point(zone_edges, lat)
+            if point is None:
+                point = _interior_point(zone_edges, (bboxes[row, 1] + bboxes[row, 3]) / 2)
+            if point is not None:
+                centroids[row] = point[::-1]
+
+    bounds = [float(v) for v in (*bboxes[:, :2].min(axis=0), *bboxes[:, 2:].max(axis=0))]
+    grid_offsets, grid_zones = _build_grid(bboxes, bounds, grid_size)
+
+    arrays = {
+        'location_ids': location_ids, 'centroids': centroids, 'bboxes': bboxes,
+        'vertices': vertices, 'ring_offsets': ring_offsets, 'ring_zone': ring_zone, 'ring_hole': ring_hole,
+        'grid_offsets': grid_offsets, 'grid_zones': grid_zones,
+    }
+    meta = {
+        'names': [zones[i]['zone'] for i in location_ids.tolist()],
+        'boroughs': [zones[i]['borough'] for i in location_ids.tolist()],
+        'bounds': bounds,
+        'grid_size': grid_size,
+    }
+    return arrays, meta
+
+
+# ==================== CACHÉ ====================
+
+def _source_signature(geojson_path, tolerance):
+    stat = os.stat(geojson_path)
+    return {'version': CACHE_VERSION, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns,
+            'tolerance': tolerance}
+
+
+def _read_cache(cache_dir, signature):
+    """Arrays memory-mapped y metadatos de la caché, o None si falta o está desactualizada."""
+    meta_path = cache_dir / 'meta.json'
+    if not meta_path.exists():
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('signature') != signature:
+            return None
+        arrays = {name: np.load(cache_dir / f'{name}.npy', mmap_mode='r') for name in ARRAY_NAMES}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Caché de zonas ilegible ({e}), se reconstruye")
+        return None
+    return arrays, meta
+
+
+def _write_cache(cache_dir, arrays, meta):
+    """Guarda los arrays (.npy) y, al final, meta.json (marca de caché válida)."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = cache_dir / 'meta.json'
+    if meta_path.exists():
+        meta_path.unlink()
+    for name, values in arrays.items():
+        np.save(cache_dir / f'{name}.npy', values)
+    tmp = meta_path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, meta_path)
+
+
+def load_zone_index(geojson_path=GEOJSON_PATH, cache_dir=DEFAULT_CACHE_DIR, tolerance=SIMPLIFY_TOLERANCE,
+                    rebuild=False):
+    """
+    Índice de zonas desde la caché (memory-map) o construyéndolo desde el GeoJSON.
+
+    Dentro de un mismo proceso el índice se reutiliza (las celdas del
+    notebook pueden llamar a esta función tantas veces como quieran).
+
+    Args:
+        geojson_path (str): GeoJSON de zonas (properties location_id, zone, borough)
+        cache_dir (str): Directorio de la caché .npy
+        tolerance (float): Tolerancia de simplificación en grados
+        rebuild (bool): Ignora la caché y la regenera
+
+    Returns:
+        ZoneIndex
+    """
+    geojson_path, cache_dir = Path(geojson_path), Path(cache_dir)
+    signature = _source_signature(geojson_path, tolerance)
+    key = (str(geojson_path), str(cache_dir), tolerance)
+    cached = _INDEX_CACHE.get(key)
+    if cached is not None and not rebuild and cached.signature == signature:
+        return cached
+
+    loaded = None if rebuild else _read_cache(cache_dir, signature)
+    if loaded is None:
+        t0 = time.perf_counter()
+        arrays, meta = build_zone_arrays(geojson_path, tolerance)
+        meta['signature'] = signature
+        try:
+            _write_cache(cache_dir, arrays, meta)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la caché de zonas en {cache_dir}: {e}")
+        logger.info(f"Índice de zonas construido en {time.perf_counter() - t0:.2f} s "
+                    f"({len(arrays['location_ids'])} zonas, {len(arrays['vertices']):,} vértices)")
+        loaded = arrays, meta
+
+    index = ZoneIndex(*loaded)
+    _INDEX_CACHE[key] = index
+    return index
+
+
+# ==================== ÍNDICE ====================
+
+class ZoneIndex:
+    """Zonas de taxi en arrays (centroides, bboxes, polígonos simplificados, rejilla)."""
+
+    def __init__(self, arrays, meta):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.names = meta['names']
+        self.boroughs = meta['boroughs']
+        self.bounds = meta['bounds']
+        self.grid_size = meta['grid_size']
+        self.signature = meta.get('signature')
+
+        # LocationID → fila (tabla directa, los IDs son pequeños); los alias apuntan a su zona
+        self.row_of_id = np.full(max(int(self.location_ids.max()), *ZONE_ALIASES) + 1, -1, dtype=np.int32)
+        self.row_of_id[self.location_ids] = np.arange(len(self.location_ids), dtype=np.int32)
+        for alias, target in ZONE_ALIASES.items():
+            if self.row_of_id[alias] < 0:
+                self.row_of_id[alias] = self.row_of_id[target]
+        self.known_ids = np.flatnonzero(self.row_of_id >= 0)
+
+        edges, ring_of_edge = _ring_edges(np.asarray(self.vertices), np.asarray(self.ring_offsets))
+        edge_zone = np.asarray(self.ring_zone)[ring_of_edge]
+        order = np.argsort(edge_zone, kind='stable')
+        self._edges = edges[order]
+        self._edge_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(edge_zone, minlength=len(self.location_ids)))])
+
+    def __len__(self):
+        return len(self.location_ids)
+
+    def __contains__(self, location_id):
+        return self._rows([location_id])[0] >= 0
+
+    def _rows(self, location_ids):
+        """Fila de cada LocationID (-1 si no existe)."""
+        ids = np.asarray(location_ids, dtype=np.float64).reshape(-1)
+        valid = np.isfinite(ids) & (ids >= 0) & (ids < len(self.row_of_id))
+        rows = np.full(len(ids), -1, dtype=np.int32)
+        rows[valid] = self.row_of_id[ids[valid].astype(np.int64)]
+        return rows
+
+    # ---------- Centroides / atributos ----------
+
+    def centroids_for(self, location_ids):
+        """Matriz n × 2 [lat, lon] de cada LocationID (NaN si la zona no existe, p. ej. 264/265)."""
+        rows = self._rows(location_ids)
+        out = np.full((len(rows), 2), np.nan)
+        found = rows >= 0
+        out[found] = self.centroids[rows[found]]
+        return out
+
+    def centroid(self, location_id):
+        """[lat, lon] de una zona, o None si no existe."""
+        lat, lon = self.centroids_for([location_id])[0]
+        return None if np.isnan(lat) else [float(lat), float(lon)]
+
+    def coord_map(self, location_ids=None):
+        """{LocationID: [lat, lon]} (por defecto, de todas las zonas y sus alias)."""
+        ids = self.known_ids if location_ids is None else np.asarray(location_ids)
+        coords = self.centroids_for(ids)
+        return {int(i): [float(lat), float(lon)] for i, (lat, lon) in zip(ids.tolist(), coords)
+                if not np.isnan(lat)}
+
+    def zone_name(self, location_id):
+        """Nombre de la zona ('Zone N' si no existe)."""
+        row = self._rows([location_id])[0]
+        return self.names[row] if row >= 0 else f"Zone {location_id}"
+
+    def borough(self, location_id):
+        row = self._rows([location_id])[0]
+        return self.boroughs[row] if row >= 0 else None
+
+    def label(self, location_id):
+        """Etiqueta corta para gráficos: 'Nombre (Distrito)'."""
+        row = self._rows([location_id])[0]
+        return f"{self.names[row]} ({self.boroughs[row]})" if row >= 0 else f"Zone {location_id}"
+
+    # ---------- Punto en zona ----------
+
+    def locate(self, lats, lons):
+        """
+        LocationID que contiene cada punto (NO_ZONE si ninguno).
+
+        Candidatos por la rejilla (celda del punto) y filtro por bbox; el test
+        punto-en-polígono (par-impar) se hace por zona sobre todos sus
+        puntos candidatos a la vez.
+
+        Args:
+            lats (array-like): Latitudes
+            lons (array-like): Longitudes
+
+        Returns:
+            np.ndarray: LocationID por punto (int32)
+        """
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        result = np.full(len(lats), NO_ZONE, dtype=np.int32)
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        size = self.grid_size
+        inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+        points = np.flatnonzero(inside)
+        if len(points) == 0:
+            return result
+
+        ix = np.minimum(((lons[points] - min_lon) / (max_lon - min_lon) * size).astype(np.int64), size - 1)
+        iy = np.minimum(((lats[points] - min_lat) / (max_lat - min_lat) * size).astype(np.int64), size - 1)
+        cell = iy * size + ix
+        start = np.asarray(self.grid_offsets)[cell]
+        counts = np.asarray(self.grid_offsets)[cell + 1] - start
+        # Pares (punto, zona candidata)
+        pair_point = np.repeat(points, counts)
+        within = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_zone = np.asarray(self.grid_zones)[np.repeat(start, counts) + within]
+        box = self.bboxes[pair_zone]
+        px, py = lons[pair_point], lats[pair_point]
+        keep = (px >= box[:, 0]) & (px <= box[:, 2]) & (py >= box[:, 1]) & (py <= box[:, 3])
+        pair_point, pair_zone = pair_point[keep], pair_zone[keep]
+
+        order = np.argsort(pair_zone, kind='stable')
+        pair_point, pair_zone = pair_point[order], pair_zone[order]
+        bounds = np.flatnonzero(np.diff(pair_zone)) + 1
+        for candidates, zone in zip(np.split(pair_point, bounds), pair_zone[np.r_[0, bounds]]):
+            edges = self._edges[self._edge_offsets[zone]:self._edge_offsets[zone + 1]]
+            step = max(1, LOCATE_CHUNK // max(len(edges), 1))
+            for i in range(0, len(candidates), step):
+                chunk = candidates[i:i + step]
+                hit = _crossings_inside(edges, lons[chunk], lats[chunk])
+                # Las zonas no se solapan: la primera que contiene el punto gana
+                chunk = chunk[hit & (result[chunk] == NO_ZONE)]
+                result[chunk] = self.location_ids[zone]
+        return result
+
+    # ---------- Exportación ----------
+
+    def rings(self):
+        """Anillos simplificados como lista de arrays k × 2 [lon, lat] (p. ej. para LineCollection)."""
+        return np.split(np.asarray(self.vertices), np.asarray(self.ring_offsets)[1:-1])
+
+    def to_geojson(self, location_ids=None, properties=None):
+        """
+        FeatureCollection con los polígonos simplificados (para folium.GeoJson / Choropleth).
+
+        Args:
+            location_ids (list, optional): Zonas a incluir (None = todas)
+            properties (dict, optional): {LocationID: {campo: valor}} añadidos a cada feature
+
+        Returns:
+            dict: GeoJSON
+        """
+        rows = np.arange(len(self)) if location_ids is None else self._rows(location_ids)
+        ring_zone = np.asarray(self.ring_zone)
+        ring_first = np.searchsorted(ring_zone, np.arange(len(self) + 1))
+        properties = properties or {}
+        features = []
+        for row in rows[rows >= 0].tolist():
+            polygons = []
+            for r in range(ring_first[row], ring_first[row + 1]):
+                ring = np.asarray(self.vertices[self.ring_offsets[r]:self.ring_offsets[r + 1]]).round(6).tolist()
+                if not self.ring_hole[r] or not polygons:
+                    polygons.append([ring])
+                else:
+                    polygons[-1].append(ring)
+            location_id = int(self.location_ids[row])
+            features.append({
+                'type': 'Feature',
+                'properties': {'location_id': location_id, 'zone': self.names[row],
+                               'borough': self.boroughs[row], **properties.get(location_id, {})},
+                'geometry': {'type': 'MultiPolygon', 'coordinates': polygons},
+            })
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Índice de geometría de zonas de taxi (NY.geojson)")
+    parser.add_argument('--geojson', default=str(GEOJSON_PATH))
+    parser.add_argument('--cache-dir', default=str(DEFAULT_CACHE_DIR))
+    parser.add_argument('--tolerance', type=float, default=SIMPLIFY_TOLERANCE,
+                        help="Tolerancia de simplificación en grados")
+    parser.add_argument('--rebuild', action='store_true', help="Regenera la caché")
+    parser.add_argument('--locate', nargs=2, type=float, metavar=('LAT', 'LON'),
+                        help="Zona que contiene un punto")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    t0 = time.perf_counter()
+    zones = load_zone_index(args.geojson, args.cache_dir, args.tolerance, rebuild=args.rebuild)
+    t_load = time.perf_counter() - t0
+    _INDEX_CACHE.clear()
+    t0 = time.perf_counter()
+    load_zone_index(args.geojson, args.cache_dir, args.tolerance)
+    t_mmap = time.perf_counter() - t0
+
+    print("=" * 80)
+    print("🗺️  ÍNDICE DE ZONAS DE TAXI")
+    print("=" * 80)
+    print(f"   Zonas: {len(zones)} | Vértices simplificados: {len(zones.vertices):,} | Anillos: {len(zones.ring_zone):,}")
+    print(f"   Carga inicial: {t_load * 1000:.1f} ms | Desde caché (mmap): {t_mmap * 1000:.1f} ms")
+
+    rng = np.random.default_rng(0)
+    min_lon, min_lat, max_lon, max_lat = zones.bounds
+    lats = rng.uniform(min_lat, max_lat, 200000)
+    lons = rng.uniform(min_lon, max_lon, 200000)
+    t0 = time.perf_counter()
+    found = zones.locate(lats, lons)
+    elapsed = time.perf_counter() - t0
+    print(f"   locate(): {len(lats):,} puntos en {elapsed * 1000:.0f} ms "
+          f"({len(lats) / elapsed:,.0f} puntos/s, {np.mean(found != NO_ZONE) * 100:.1f}% dentro de alguna zona)")
+
+    if args.locate:
+        lat, lon = args.locate
+        location_id = int(zones.locate([lat], [lon])[0])
+        if location_id == NO_ZONE:
+            print(f"\n📍 ({lat}, {lon}) no está en ninguna zona")
+        else:
+            print(f"\n📍 ({lat}, {lon}) → {location_id}: {zones.label(location_id)}")